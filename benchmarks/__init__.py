@@ -0,0 +1 @@
+"""Runner performance benchmarks (``python -m benchmarks``); see harness.py."""
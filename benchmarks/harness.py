@@ -0,0 +1,294 @@
+"""End-to-end runner benchmarks against the local stand-in site.
+
+Measures, per run of ``python -m benchmarks``:
+
+- browser startup (Playwright start + Chromium launch + close), percentiles
+- per-flow wall time and per-step ``ms`` (taken from the run trace), percentiles
+- peak RSS of this process, of reaped children and of the live process tree
+- TraceSink cost per record for each compression / background mode
+
+Results are written as JSON; ``--compare BASELINE`` flags metrics that got
+slower than the baseline by more than ``--threshold`` (exit status 1).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .site import StandInSite
+
+FLOWS_DIR = Path(__file__).resolve().parent / "flows"
+DEFAULT_OUT = Path("artifacts") / "bench" / "results.json"
+PERCENTILES = (50, 90, 95, 99)
+
+
+# ---- statistics ----
+def percentiles(values: Iterable[float]) -> Dict[str, float]:
+    """Nearest-rank percentiles plus mean/max/n (empty input -> {"n": 0})."""
+    data = sorted(values)
+    if not data:
+        return {"n": 0}
+    out: Dict[str, float] = {}
+    for p in PERCENTILES:
+        rank = max(1, -(-p * len(data) // 100))  # ceil without floats
+        out[f"p{p}"] = round(data[rank - 1], 3)
+    out["mean"] = round(sum(data) / len(data), 3)
+    out["max"] = round(data[-1], 3)
+    out["n"] = len(data)
+    return out
+
+
+def flatten(metrics: Mapping[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for k, v in metrics.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, Mapping):
+            flat.update(flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool) and not key.endswith(".n"):
+            flat[key] = float(v)
+    return flat
+
+
+def compare(
+    current: Mapping[str, Any], baseline: Mapping[str, Any], threshold: float = 0.2, min_abs: float = 5.0
+) -> List[Tuple[str, float, float, float]]:
+    """Metrics (lower is better) that regressed: ``(key, baseline, current, ratio)``.
+
+    A metric regresses when it grew by more than ``threshold`` (relative) and by
+    more than ``min_abs`` (absolute, in the metric's own unit) so that
+    sub-millisecond jitter does not fail a comparison.
+    """
+    cur = flatten(current.get("metrics", current))
+    base = flatten(baseline.get("metrics", baseline))
+    regressions = []
+    for key in sorted(cur.keys() & base.keys()):
+        b, c = base[key], cur[key]
+        if b <= 0:
+            continue
+        ratio = c / b
+        if ratio > 1 + threshold and c - b > min_abs:
+            regressions.append((key, b, c, round(ratio, 3)))
+    return regressions
+
+
+# ---- memory ----
+def _proc_tree_rss_kb(root: int) -> Optional[int]:
+    """Sum VmRSS over ``root`` and its descendants (Linux /proc only)."""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for d in proc.iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            status = (d / "status").read_text()
+        except OSError:
+            continue
+        fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+        pid = int(d.name)
+        children.setdefault(int(fields.get("PPid", "0").strip() or 0), []).append(pid)
+        rss[pid] = int(fields.get("VmRSS", "0 kB").split()[0])
+    total, stack = 0, [root]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, ()))
+    return total
+
+
+class RssSampler:
+    """Background sampler of the process-tree RSS peak (browser processes included)."""
+
+    def __init__(self, interval_s: float = 0.1) -> None:
+        self.interval_s = interval_s
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="wao-bench-rss", daemon=True)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            kb = _proc_tree_rss_kb(os.getpid())
+            if kb is None:
+                return
+            self.peak_kb = max(self.peak_kb, kb)
+            self._stop.wait(self.interval_s)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+# ---- measurements ----
+def measure_startup(iterations: int, headless: bool = True) -> List[float]:
+    from playwright.sync_api import sync_playwright
+
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        pw = sync_playwright().start()
+        try:
+            browser = pw.chromium.launch(headless=headless)
+            samples.append((time.perf_counter() - t0) * 1000)
+            browser.close()
+        finally:
+            pw.stop()
+    return samples
+
+
+def _step_times(trace_path: Path) -> Dict[str, float]:
+    from wao.trace import open_trace
+
+    names: Dict[int, str] = {}
+    times: Dict[str, float] = {}
+    with open_trace(trace_path) as fh:
+        for line in fh:
+            rec = json.loads(line)
+            if rec.get("kind") == "step_start":
+                step = rec.get("step") or {}
+                names[rec["i"]] = f'{rec["i"]:02d}_{step.get("name") or step.get("act") or step.get("action")}'
+            elif rec.get("kind") == "step_ok":
+                times[names.get(rec["i"], str(rec["i"]))] = float(rec.get("ms", 0))
+    return times
+
+
+def run_flows(flows: List[Path], iterations: int, base_url: str, headless: bool = True) -> Dict[str, Any]:
+    """Run each flow ``iterations`` times through Runner on a warm BrowserPool."""
+    from wao.browser_pool import BrowserPool
+    from wao.runner import Runner
+
+    os.environ["WAO_BENCH_BASE"] = base_url
+    results: Dict[str, Any] = {}
+    with BrowserPool(size=1, headless=headless, prewarm=True) as pool:
+        for flow_path in flows:
+            dsl = json.loads(flow_path.read_text(encoding="utf-8"))
+            run_ms: List[float] = []
+            steps: Dict[str, List[float]] = {}
+            trace_bytes: List[float] = []
+            for _ in range(iterations):
+                runner = Runner(dsl, pool=pool)
+                t0 = time.perf_counter()
+                runner.run()
+                run_ms.append((time.perf_counter() - t0) * 1000)
+                for name, ms in _step_times(runner.trace_path).items():
+                    steps.setdefault(name, []).append(ms)
+                trace_bytes.append(runner.trace_path.stat().st_size)
+            results[flow_path.stem] = {
+                "run_ms": percentiles(run_ms),
+                "steps_ms": {name: percentiles(v) for name, v in sorted(steps.items())},
+                "trace_bytes": percentiles(trace_bytes),
+            }
+    return results
+
+
+def measure_trace_overhead(records: int = 20000) -> Dict[str, float]:
+    """Microseconds per trace record (step_start + step_ok pairs) for each sink mode."""
+    from wao.trace import TraceSink
+
+    step = json.dumps({"act": "click", "name": "click_submit", "selector": "#submit"})
+    out: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for compress in ("none", "gzip"):
+            for background in (False, True):
+                sink = TraceSink(
+                    Path(tmp) / f"t_{compress}_{background}.jsonl", compress=compress, background=background
+                )
+                t0 = time.perf_counter()
+                for i in range(records // 2):
+                    sink.write("step_start", {"i": i}, {"step": step})
+                    sink.write("step_ok", {"i": i, "ms": 12, "url": "http://127.0.0.1/home"})
+                sink.close()
+                label = compress + ("+bg" if background else "")
+                out[label] = round((time.perf_counter() - t0) * 1e6 / records, 3)
+    return out
+
+
+def run_suite(flows: List[Path], iterations: int, startup_iterations: int, headless: bool = True) -> Dict[str, Any]:
+    with StandInSite() as site, RssSampler() as rss:
+        startup = measure_startup(startup_iterations, headless)
+        flow_results = run_flows(flows, iterations, site.base_url, headless)
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "headless": headless,
+        },
+        "metrics": {
+            "startup_ms": percentiles(startup),
+            "flows": flow_results,
+            "rss_peak_kb": {"self": self_kb, "children": children_kb, "tree": rss.peak_kb},
+            "trace_us_per_record": measure_trace_overhead(),
+        },
+    }
+
+
+# ---- CLI ----
+def _print_summary(result: Mapping[str, Any]) -> None:
+    m = result["metrics"]
+    print(f"startup   p50={m['startup_ms']['p50']:.0f}ms p95={m['startup_ms']['p95']:.0f}ms")
+    for name, flow in m["flows"].items():
+        r = flow["run_ms"]
+        print(f"{name:<10} p50={r['p50']:.0f}ms p95={r['p95']:.0f}ms p99={r['p99']:.0f}ms")
+        for step, s in flow["steps_ms"].items():
+            print(f"  {step:<24} p50={s['p50']:.0f}ms p95={s['p95']:.0f}ms")
+    print("rss_peak  " + " ".join(f"{k}={v / 1024:.0f}MiB" for k, v in m["rss_peak_kb"].items()))
+    print("trace     " + " ".join(f"{k}={v}us" for k, v in m["trace_us_per_record"].items()))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks", description="Runner benchmarks on a local stand-in site")
+    ap.add_argument("--flows", nargs="*", help="flow names under benchmarks/flows (default: all)")
+    ap.add_argument("--iterations", type=int, default=5, help="runs per flow")
+    ap.add_argument("--startup-iterations", type=int, default=3, help="browser launches to time")
+    ap.add_argument("--headed", action="store_true", help="run Chromium headed")
+    ap.add_argument("--out", type=Path, default=DEFAULT_OUT, help="where to write the JSON results")
+    ap.add_argument("--input", type=Path, help="skip running and use this results file (with --compare)")
+    ap.add_argument("--compare", type=Path, metavar="BASELINE", help="compare against a saved baseline JSON")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    ap.add_argument("--min-abs", type=float, default=5.0, help="ignore absolute differences below this")
+    args = ap.parse_args(argv)
+
+    if args.input:
+        result = json.loads(args.input.read_text(encoding="utf-8"))
+    else:
+        names = args.flows or sorted(p.stem for p in FLOWS_DIR.glob("*.json"))
+        flows = [FLOWS_DIR / f"{n}.json" for n in names]
+        missing = [str(p) for p in flows if not p.is_file()]
+        if missing:
+            print(f"unknown flow(s): {', '.join(missing)}", file=sys.stderr)
+            return 2
+        result = run_suite(flows, args.iterations, args.startup_iterations, headless=not args.headed)
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        _print_summary(result)
+        print(f"results: {args.out}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.threshold, args.min_abs)
+        for key, b, c, ratio in regressions:
+            print(f"REGRESSION {key}: {b:g} -> {c:g} (x{ratio})")
+        if regressions:
+            return 1
+        print(f"no regressions vs {args.compare} (threshold {args.threshold:.0%})")
+    return 0
@@ -0,0 +1,205 @@
+"""Local HTTP stand-in for the sites the demo flows hit.
+
+Routes (all synthetic, no external network):
+
+- ``/login``            login form (``#username``, ``#password``, ``#submit``); POST sets a cookie and
+                        redirects (303) to ``/home``
+- ``/home``             "Logged In Successfully" page; redirects to ``/login`` without the cookie
+- ``/redirect/<n>``     a chain of ``n`` 302 redirects ending at ``/home``
+- ``/slow?ms=<ms>``     a page whose response is delayed by ``ms`` milliseconds
+- ``/assets?n=<n>``     a page referencing ``n`` images, ``n`` fonts-ish CSS and one third-party script
+- ``/img/<i>.png``      a tiny PNG (sent with a small delay so blocking has a measurable effect)
+- ``/files``            a listing linking to ``/download/<size>.bin``
+- ``/download/<size>``  ``size`` bytes (suffix k/m allowed) streamed as an attachment; honours a single
+                        ``Range`` (and ``If-Range`` against its ETag) so direct HTTP downloads can resume
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+_CHUNK = b"\0" * (256 * 1024)
+_SIZE = re.compile(r"^(\d+)([kKmM]?)(?:\.bin)?$")
+_RANGE = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+
+def parse_size(text: str) -> int:
+    m = _SIZE.match(text)
+    if m is None:
+        raise ValueError(f"bad size: {text}")
+    return int(m.group(1)) * {"": 1, "k": 1024, "m": 1024 * 1024}[m.group(2).lower()]
+
+
+def _page(title: str, body: str = "") -> bytes:
+    return f"<!doctype html><html><head><title>{title}</title></head><body>{body}</body></html>".encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StandInSite._Server"
+
+    def log_message(self, format: str, *args: object) -> None:  # keep benchmark output clean
+        pass
+
+    # ---- helpers ----
+    def _send(self, status: int, body: bytes = b"", ctype: str = "text/html; charset=utf-8", **headers: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k.replace("_", "-"), v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _redirect(self, location: str, status: int = 302, **headers: str) -> None:
+        self._send(status, b"", Location=location, **headers)
+
+    def _logged_in(self) -> bool:
+        return "wao_bench_sid=ok" in (self.headers.get("Cookie") or "")
+
+    # ---- routes ----
+    def do_HEAD(self) -> None:
+        self.do_GET()
+
+    def do_GET(self) -> None:  # noqa: C901
+        url = urlparse(self.path)
+        qs = parse_qs(url.query)
+        path = url.path
+        self.server.hits += 1
+        if path in ("/", "/login"):
+            form = (
+                '<form method="post" action="/login">'
+                '<input id="username" name="username"><input id="password" name="password" type="password">'
+                '<button id="submit" type="submit">Submit</button></form>'
+            )
+            self._send(200, _page("Test Login", form))
+        elif path == "/home":
+            if not self._logged_in():
+                self._redirect("/login")
+            else:
+                self._send(200, _page("Logged In Successfully", '<h1 id="welcome">Welcome</h1>'))
+        elif path.startswith("/redirect/"):
+            n = int(path.rsplit("/", 1)[1] or 0)
+            self._redirect(f"/redirect/{n - 1}" if n > 1 else "/home")
+        elif path == "/slow":
+            time.sleep(int(qs.get("ms", ["200"])[0]) / 1000.0)
+            self._send(200, _page("Slow", '<p id="done">done</p>'))
+        elif path == "/assets":
+            n = int(qs.get("n", ["20"])[0])
+            imgs = "".join(f'<img src="/img/{i}.png">' for i in range(n))
+            third = f'<script src="http://127.0.0.2:{self.server.server_port}/tracker.js"></script>'
+            self._send(200, _page("Assets", imgs + third + '<p id="done">done</p>'))
+        elif path.startswith("/img/"):
+            time.sleep(0.01)
+            self._send(200, _PNG, ctype="image/png", Cache_Control="no-store")
+        elif path == "/tracker.js":
+            time.sleep(0.05)
+            self._send(200, b"void 0;", ctype="application/javascript")
+        elif path == "/files":
+            links = "".join(f'<a href="/download/{s}">{s}.bin</a> ' for s in ("1m", "10m", "100m"))
+            self._send(200, _page("Files", links))
+        elif path.startswith("/download/"):
+            self._download(path.rsplit("/", 1)[1])
+        else:
+            self._send(404, _page("Not Found"))
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.hits += 1
+        if urlparse(self.path).path == "/login":
+            self._redirect("/home", 303, Set_Cookie="wao_bench_sid=ok; Path=/; HttpOnly")
+        else:
+            self._send(404, _page("Not Found"))
+
+    def _download(self, spec: str) -> None:
+        try:
+            size = parse_size(spec)
+        except ValueError:
+            self._send(404, _page("Not Found"))
+            return
+        name = spec if spec.endswith(".bin") else f"{spec}.bin"
+        etag = f'"{size:x}"'  # zero-filled bodies: the size identifies the content
+        start, end = 0, size - 1
+        rng = _RANGE.match(self.headers.get("Range") or "")
+        if_range = self.headers.get("If-Range")
+        partial = rng is not None and (if_range is None or if_range == etag)
+        if partial and rng is not None:
+            start = int(rng.group(1))
+            end = min(int(rng.group(2)), size - 1) if rng.group(2) else size - 1
+            if start >= size:
+                self._send(416, b"", Content_Range=f"bytes */{size}")
+                return
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        left = end - start + 1
+        while left > 0:
+            n = min(left, len(_CHUNK))
+            self.wfile.write(_CHUNK[:n])
+            left -= n
+
+
+class StandInSite:
+    """Threaded HTTP server on 127.0.0.1 for benchmarks and tests (``with StandInSite() as site:``)."""
+
+    class _Server(ThreadingHTTPServer):
+        daemon_threads = True
+        hits = 0
+
+    def __init__(self, port: int = 0) -> None:
+        self._server = self._Server(("127.0.0.1", port), _Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def hits(self) -> int:
+        return self._server.hits
+
+    def start(self) -> "StandInSite":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="wao-bench-site", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "StandInSite":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    with StandInSite(8765) as site:
+        print(f"stand-in site on {site.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
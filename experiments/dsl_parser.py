@@ -3,11 +3,13 @@ import sys
 from pathlib import Path
 from typing import Any, Dict, cast
 
-from jsonschema import Draft202012Validator, exceptions
+from jsonschema import exceptions
 
+from wao.validator import load_schema
 
-def _load_schema() -> Dict[str, Any]:
-    """Load shared flow schema from flows/schema.flow.v1.json (Single Source of Truth)."""
+
+def _schema_path() -> Path:
+    """Shared flow schema flows/schema.flow.v1.json (Single Source of Truth)."""
     here = Path(__file__).resolve()
     # repo_root = <repo>/ (assuming experiments/ is directly under repo root)
     repo_root = here.parents[1]
@@ -17,7 +19,7 @@ def _load_schema() -> Dict[str, Any]:
     ]
     for p in candidates:
         if p.is_file():
-            return cast(Dict[str, Any], json.loads(p.read_text(encoding="utf-8")))
+            return p
     searched = "\n- ".join(map(str, candidates))
     raise FileNotFoundError("Schema file not found. Looked for:\n- " + searched)
 
@@ -31,9 +33,8 @@ def _format_error(e: exceptions.ValidationError) -> str:
 
 
 def validate_scenario(data: Dict[str, Any]) -> None:
-    schema = _load_schema()
-    validator = Draft202012Validator(schema)
-    errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
+    # compiled once per process (keyed by schema path + mtime) and shared with wao.validator
+    errors = sorted(load_schema(_schema_path()).iter_errors(data), key=lambda e: [str(p) for p in e.path])
     if errors:
         msgs = "\n".join(_format_error(e) for e in errors)
         raise ValueError("DSL schema validation failed:\n" + msgs)
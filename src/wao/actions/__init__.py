@@ -0,0 +1,11 @@
+"""Compiled step handlers (Command + Registry, see docs/design-patterns-policy.md).
+
+Importing this package registers the built-in actions. New actions subclass
+:class:`Action` and are bound to DSL names with :func:`register`.
+"""
+
+from . import assertions, control, data, files, interaction, messages, navigation, waits  # noqa: F401  (registration)
+from .base import Action, StepCompileError
+from .registry import compile_steps, create, register, registered
+
+__all__ = ["Action", "StepCompileError", "compile_steps", "create", "register", "registered"]
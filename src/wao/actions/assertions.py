@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Pattern
+
+from ..hashing import DigestResult, check_algos, mismatches, multi_digest, submit
+from .base import Action, log, static
+from .registry import register
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+
+@register("assert_title")
+class AssertTitleAction(Action):
+    __slots__ = ("expected", "match_mode", "regex", "regex_error", "message", "includes", "equals")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.expected: Optional[str] = raw.get("expected")
+        self.match_mode = raw.get("match_mode", "equals")
+        self.message: Optional[str] = raw.get("message")
+        self.includes: List[str] = list(raw.get("includes") or [])
+        self.equals: Optional[str] = raw.get("equals")
+        self.regex: Optional[Pattern[str]] = None
+        self.regex_error = ""
+        if self.expected is not None and self.match_mode == "matches":
+            try:
+                self.regex = re.compile(self.expected)
+            except re.error as e:
+                # Reported (and failed) at execution time, like before compilation existed
+                self.regex_error = str(e)
+        elif self.expected is not None and self.match_mode not in ("equals", "contains"):
+            log.warning("  ! unknown match_mode=%s (fallback equals)", self.match_mode)
+            self.match_mode = "equals"
+
+    def check(self, actual: str) -> Optional[str]:
+        """Return a failure message, or None when the title matches."""
+        log.info("  → assert_title against: %s", actual)
+        if self.expected is not None:
+            if self.match_mode == "contains":
+                failed = self.expected not in actual
+            elif self.match_mode == "matches":
+                if self.regex is None:
+                    log.error("assert_title regex error: %s", self.regex_error)
+                    failed = True
+                else:
+                    failed = self.regex.search(actual) is None
+            else:
+                failed = actual != self.expected
+            if not failed:
+                return None
+            msg = self.message or (
+                f"assert_title failed: mode={self.match_mode} expected='{self.expected}' got='{actual}'"
+            )
+            log.error("%s", msg)
+            return msg
+        # Backward compatibility with old DSL (includes/equals)
+        errors = []
+        for s in self.includes:
+            if s not in actual:
+                errors.append(f"assert_title failed: '{s}' not in '{actual}'")
+        if self.equals is not None and actual != self.equals:
+            errors.append(f"assert_title failed: expected '{self.equals}', got '{actual}'")
+        for e in errors:
+            log.error("%s", e)
+        return "; ".join(errors) or None
+
+    def execute(self, ctx: "Runner") -> None:
+        try:
+            actual = ctx.page.title() or ""
+        except Exception:
+            actual = ctx.state.get("title", "")
+        msg = self.check(actual)
+        if msg is not None:
+            ctx.fail("assert_title", msg)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        try:
+            actual = await ctx.page.title() or ""
+        except Exception:
+            actual = ctx.state.get("title", "")
+        msg = self.check(actual)
+        if msg is not None:
+            await ctx.fail("assert_title", msg)
+
+
+@register("verify_file")
+class VerifyFileAction(Action):
+    """Check one or more digests of ``path`` in a single read.
+
+    ``expected`` is either a hex string (with ``hash``) or an ``{algo: hex}``
+    object. With ``background: true`` hashing runs on the ``wao-hash`` pool while
+    the next steps execute, and the result is checked before ``run_end``.
+    """
+
+    __slots__ = ("path", "expected", "background")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        path_val = raw.get("path")
+        algo = (raw.get("hash") or "").lower()
+        expected = raw.get("expected")
+        if not path_val or not expected or (not algo and not isinstance(expected, Mapping)):
+            raise ValueError("verify_file requires 'path', 'hash', and 'expected'")
+        if isinstance(expected, Mapping):
+            pairs = {str(k).lower(): str(v).lower() for k, v in expected.items()}
+        else:
+            pairs = {algo: str(expected).lower()}
+        try:
+            check_algos(pairs)
+        except ValueError:
+            raise ValueError("verify_file 'hash' must be one of: sha256, sha1, md5") from None
+        self.path = Path(static(path_val))
+        self.expected: Dict[str, str] = pairs
+        self.background = bool(raw.get("background", False))
+
+    def _precheck(self) -> None:
+        if not self.path.is_file():
+            raise FileNotFoundError(f"verify_file: not found: {self.path}")
+
+    def _check(self, ctx: Any, result: DigestResult) -> Optional[str]:
+        ctx._trace("hash", {"i": self.index, **result.trace_payload(self.path)})
+        bad = mismatches(result.digests, self.expected)
+        if not bad:
+            log.info("  → verify_file OK: %s (%s, %s)", ", ".join(self.expected), self.path, result.mode)
+            return None
+        msg = "; ".join(
+            f"verify_file failed: {a} expected={self.expected[a]} actual={actual} path={self.path}"
+            for a, actual in bad.items()
+        )
+        log.error("%s", msg)
+        return msg
+
+    def execute(self, ctx: "Runner") -> None:
+        self._precheck()
+        if self.background:
+            future = submit(multi_digest, self.path, tuple(self.expected))
+            ctx.defer("verify_file", future, lambda result: self._check(ctx, result))
+            log.info("  → verify_file queued: %s", self.path)
+            return
+        msg = self._check(ctx, multi_digest(self.path, self.expected))
+        if msg is not None:
+            ctx.fail("verify_file", msg)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self._precheck()
+        future = submit(multi_digest, self.path, tuple(self.expected))
+        if self.background:
+            ctx.defer("verify_file", future, lambda result: self._check(ctx, result))
+            log.info("  → verify_file queued: %s", self.path)
+            return
+        # Hash in a worker thread so other flows on the loop keep running
+        msg = self._check(ctx, await asyncio.wrap_future(future))
+        if msg is not None:
+            await ctx.fail("verify_file", msg)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any, Mapping, Optional
+
+from .. import secrets
+from ..logging_setup import get_logger
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+log = get_logger("wao.runner")
+
+
+class StepCompileError(ValueError):
+    """A step could not be compiled into an Action (raised before the browser starts)."""
+
+
+class Action:
+    """A compiled, pre-bound flow step (Command pattern).
+
+    Subclasses parse their parameters once in ``compile()`` into ``__slots__``
+    attributes, so ``execute(ctx)`` does no dict lookups or int parsing per run.
+    ``execute`` drives the sync :class:`~wao.runner.Runner`; ``aexecute`` the
+    :class:`~wao.async_runner.AsyncRunner` (optional).
+    """
+
+    __slots__ = ("index", "kind", "name", "segment", "idempotent", "raw", "_raw_json")
+
+    #: Safe to execute again after a failure (retried in place); steps may override with "idempotent"
+    IDEMPOTENT = False
+    #: Re-establishes page state (navigation, wait-for): a retry may rewind here; see :meth:`is_checkpoint`
+    CHECKPOINT = False
+    #: Renders its own ``{{var}}`` templates (control-flow steps); others are wrapped in TemplatedAction
+    TEMPLATED = False
+
+    def __init__(self, index: int, kind: str, raw: Mapping[str, Any]) -> None:
+        self.index = index
+        self.kind = kind
+        self.name = str(raw.get("name", ""))
+        self.segment: Optional[str] = raw.get("segment")
+        self.idempotent = bool(raw.get("idempotent", self.IDEMPOTENT))
+        self.raw = raw
+        self._raw_json: Optional[str] = None
+        self.compile(raw)
+
+    def trace_json(self) -> str:
+        """The raw step dict JSON-encoded once, for step_start trace records."""
+        if self._raw_json is None:
+            self._raw_json = json.dumps(dict(self.raw), ensure_ascii=False, default=str)
+        return self._raw_json
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        """Parse ``raw`` into slots. Raise ValueError/KeyError for malformed steps."""
+
+    def execute(self, ctx: "Runner") -> None:
+        raise NotImplementedError
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        raise NotImplementedError(f"act '{self.kind}' is not supported by AsyncRunner")
+
+    @classmethod
+    def supports_async(cls) -> bool:
+        return cls.aexecute is not Action.aexecute
+
+    def is_checkpoint(self) -> bool:
+        """Whether a later non-idempotent step may rewind to this one (``CHECKPOINT`` or ``"idempotent": true``)."""
+        return self.CHECKPOINT or self.raw.get("idempotent") is True
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} #{self.index} {self.kind} {self.name!r}>"
+
+
+class UnknownAction(Action):
+    __slots__ = ()
+    IDEMPOTENT = True
+
+    def execute(self, ctx: "Runner") -> None:
+        log.warning("  ! unknown act/action: %s (skip)", self.kind)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        log.warning("  ! unknown act/action: %s (skip)", self.kind)
+
+
+def static(value: Any) -> Any:
+    """Resolve ``${ENV:...}`` placeholders once at compile time (non-secret fields only)."""
+    return secrets.resolve(value)
+
+
+def as_int(raw: Mapping[str, Any], key: str, default: int) -> int:
+    return int(raw.get(key, default))
@@ -0,0 +1,502 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence
+
+from ..policies import RetryPolicy
+from ..templating import Renderer, Template, compile_value, scope_of
+from .base import Action, as_int, log
+from .registry import compile_steps, register
+from .waits import track_requests
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+JOIN_MODES = ("all", "any")
+
+
+class BranchError(RuntimeError):
+    """A parallel group did not satisfy its join condition."""
+
+
+class _Stopped(Exception):
+    """The group was settled (join "any" won / join "all" failed) before this branch finished."""
+
+
+class Branch:
+    __slots__ = ("name", "plan")
+
+    def __init__(self, name: str, plan: List[Action]) -> None:
+        self.name = name
+        self.plan = plan
+
+
+def branch_runtime(ctx: Any, page: Any, context: Any, parent: int, name: str) -> Any:
+    """A shallow copy of the runner bound to a branch page.
+
+    Trace sink, failure capture, download store, artifact uploads and
+    deferred checks are shared with the parent run; ``state`` starts as a
+    copy of the parent's and is merged back when the group settles.
+    """
+    rt = copy.copy(ctx)
+    rt._page = page
+    if ctx._track_network:
+        track_requests(page)
+    rt._context = context
+    rt.state = dict(ctx.state)
+    rt.vars = scope_of(ctx).fork(rt.state)
+    rt._profiler = None
+    rt._session = None
+    rt._pool = None  # helper threads are busy running this group: nested groups launch their own browsers
+    rt._trace_scope = {**ctx._trace_scope, "parent": parent, "branch": name}
+    return rt
+
+
+def block_scope(ctx: Any, parent: int, **extra: Any) -> Dict[str, Any]:
+    """Trace keys for steps nested in a block: the enclosing scope plus parent step, nesting depth and ``extra``."""
+    outer = ctx._trace_scope
+    return {**outer, "parent": parent, "depth": outer.get("depth", 0) + 1, **extra}
+
+
+def run_block(ctx: Any, plan: Sequence[Action], scope: Dict[str, Any], label: str) -> None:
+    """Run nested steps on ``ctx``; their step records carry ``scope`` (see :func:`block_scope`)."""
+    outer = ctx._trace_scope
+    ctx._trace_scope = scope
+    try:
+        for action in plan:
+            log.info("Step %s.%d: act=%s", label, action.index, action.kind)
+            with ctx._step_scope(action):
+                action.execute(ctx)
+    finally:
+        ctx._trace_scope = outer
+
+
+async def arun_block(ctx: Any, plan: Sequence[Action], scope: Dict[str, Any], label: str) -> None:
+    outer = ctx._trace_scope
+    ctx._trace_scope = scope
+    try:
+        for action in plan:
+            log.info("Step %s.%d: act=%s", label, action.index, action.kind)
+            async with ctx._step_scope(action):
+                await action.aexecute(ctx)
+    finally:
+        ctx._trace_scope = outer
+
+
+class _Block(Action):
+    """A step that runs a nested ``steps`` list (compiled once, with the enclosing plan)."""
+
+    __slots__ = ("plan",)
+    TEMPLATED = True
+
+    def _compile_plan(self, raw: Mapping[str, Any]) -> None:
+        self.plan = compile_steps(raw["steps"])
+        if not self.plan:
+            raise ValueError(f"{self.kind} needs at least one step")
+        # a block is a safe retry checkpoint only if everything in it is
+        self.idempotent = bool(raw.get("idempotent", all(a.idempotent for a in self.plan)))
+
+    def supports_async(self) -> bool:  # type: ignore[override]
+        return all(a.supports_async() for a in self.plan)
+
+
+@register("foreach")
+class ForeachAction(_Block):
+    """Run ``steps`` once per element of a list, with the element bound to ``item``.
+
+    The list comes from ``listVar`` (a variable path such as ``reports`` or
+    ``page.rows``) or ``items`` (a literal array or a template). ``item``
+    and ``varIndex`` (0-based) live in a loop frame and disappear after the
+    loop; ``set_var`` / ``extract`` inside the loop write to the run's state
+    unless the name is a loop variable. Every iteration is traced as
+    ``loop_iter`` and its steps carry ``iter``.
+    """
+
+    __slots__ = ("items", "item", "index_var")
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        if raw.get("listVar"):
+            self.items: Renderer = Template("{{" + str(raw["listVar"]) + "}}").value
+        elif "items" in raw:
+            self.items = compile_value(raw["items"])
+        else:
+            raise ValueError("foreach requires 'listVar' or 'items'")
+        self.item = str(raw.get("item") or "item")
+        self.index_var: Optional[str] = raw.get("varIndex")
+        self._compile_plan(raw)
+
+    def _values(self, ctx: Any) -> List[Any]:
+        values = self.items(scope_of(ctx))
+        if isinstance(values, Mapping):
+            return [{"key": k, "value": v} for k, v in values.items()]
+        if not isinstance(values, (list, tuple)):
+            raise ValueError(f"foreach: expected a list, got {type(values).__name__}")
+        log.info("  → foreach %s: %d item(s)", self.item, len(values))
+        return list(values)
+
+    def _frame(self, n: int, value: Any) -> Dict[str, Any]:
+        frame = {self.item: value}
+        if self.index_var:
+            frame[self.index_var] = n
+        return frame
+
+    def _iter_end(self, ctx: Any, n: int, t0: float, err: Optional[BaseException]) -> None:
+        payload: Dict[str, Any] = {"i": self.index, **ctx._trace_scope, "iter": n}
+        payload.update(status="ok" if err is None else "error", ms=int((time.perf_counter() - t0) * 1000))
+        if err is not None:
+            payload["error"] = str(err) or type(err).__name__
+        ctx._trace("loop_iter", payload)
+
+    def execute(self, ctx: "Runner") -> None:
+        scope = scope_of(ctx)
+        for n, value in enumerate(self._values(ctx)):
+            t0 = time.perf_counter()
+            try:
+                with scope.frame(self._frame(n, value)):
+                    run_block(ctx, self.plan, block_scope(ctx, self.index, iter=n), f"{self.index}[{n}]")
+            except Exception as e:
+                self._iter_end(ctx, n, t0, e)
+                raise
+            self._iter_end(ctx, n, t0, None)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        scope = scope_of(ctx)
+        for n, value in enumerate(self._values(ctx)):
+            t0 = time.perf_counter()
+            try:
+                with scope.frame(self._frame(n, value)):
+                    await arun_block(ctx, self.plan, block_scope(ctx, self.index, iter=n), f"{self.index}[{n}]")
+            except Exception as e:
+                self._iter_end(ctx, n, t0, e)
+                raise
+            self._iter_end(ctx, n, t0, None)
+
+
+@register("retry")
+class RetryBlockAction(_Block):
+    """Run ``steps`` again from the top when one of them fails, up to ``max_attempts`` times.
+
+    Backoff is :class:`~wao.policies.RetryPolicy`'s (exponential from
+    ``backoff_ms`` with jitter); ``retry_on`` defaults to any error. Each
+    retried attempt is traced as ``block_retry`` and its steps carry ``attempt``.
+    """
+
+    __slots__ = ("policy",)
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.policy = RetryPolicy(
+            attempts=as_int(raw, "max_attempts", 3),
+            backoff_ms=as_int(raw, "backoff_ms", 1000),
+            multiplier=float(raw.get("multiplier", 2.0)),
+            max_backoff_ms=as_int(raw, "max_backoff_ms", 30000),
+            retry_on=raw.get("retry_on") or ("any",),
+        )
+        self._compile_plan(raw)
+
+    def _again(self, ctx: Any, attempt: int, exc: Exception) -> Optional[float]:
+        """Backoff before the next attempt, or None to give up."""
+        if attempt >= self.policy.attempts or not self.policy.retryable(exc):
+            return None
+        delay = self.policy.delay_s(attempt)
+        log.warning(
+            "Step %d: block attempt %d/%d failed (%s); again in %.1fs",
+            self.index,
+            attempt,
+            self.policy.attempts,
+            exc,
+            delay,
+        )
+        payload = {"attempt": attempt + 1, "max_attempts": self.policy.attempts, "delay_ms": int(delay * 1000)}
+        ctx._trace("block_retry", {"i": self.index, **ctx._trace_scope, **payload, "error": str(exc)})
+        return delay
+
+    def execute(self, ctx: "Runner") -> None:
+        attempt = 1
+        while True:
+            try:
+                run_block(ctx, self.plan, block_scope(ctx, self.index, attempt=attempt), f"{self.index}#{attempt}")
+                return
+            except Exception as e:
+                delay = self._again(ctx, attempt, e)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        attempt = 1
+        while True:
+            try:
+                scope = block_scope(ctx, self.index, attempt=attempt)
+                await arun_block(ctx, self.plan, scope, f"{self.index}#{attempt}")
+                return
+            except Exception as e:
+                delay = self._again(ctx, attempt, e)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+@register("timeout")
+class TimeoutBlockAction(_Block):
+    """Fail unless ``steps`` complete within ``ms``.
+
+    AsyncRunner cancels the block at the deadline. The sync API cannot be
+    interrupted mid-call, so the sync Runner checks the deadline before each
+    nested step and once more at the end.
+    """
+
+    __slots__ = ("ms",)
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.ms = as_int(raw, "ms", 0)
+        if self.ms <= 0:
+            raise ValueError("timeout requires 'ms' > 0")
+        self._compile_plan(raw)
+
+    def _expired(self) -> TimeoutError:
+        return TimeoutError(f"timeout: steps did not complete within {self.ms} ms")
+
+    def execute(self, ctx: "Runner") -> None:
+        deadline = time.perf_counter() + self.ms / 1000.0
+        scope = block_scope(ctx, self.index)
+        for action in self.plan:
+            if time.perf_counter() > deadline:
+                raise self._expired()
+            run_block(ctx, (action,), scope, str(self.index))
+        if time.perf_counter() > deadline:
+            raise self._expired()
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                arun_block(ctx, self.plan, block_scope(ctx, self.index), str(self.index)), self.ms / 1000.0
+            )
+        except asyncio.TimeoutError as e:
+            if time.perf_counter() - t0 < self.ms / 1000.0:
+                raise  # a nested step's own timeout (the same class on Python >= 3.11)
+            raise self._expired() from e
+
+
+@register("parallel")
+class ParallelAction(Action):
+    """Run independent step lists ("branches") concurrently, each on its own page.
+
+    AsyncRunner opens every branch page in the run's own (authenticated)
+    context and schedules branches as tasks. The sync API is bound to the
+    thread that started it, so the sync Runner opens branch contexts from the
+    run context's ``storage_state`` on worker threads: the run's BrowserPool
+    helper threads (warm browsers) when it has a pool, else threads that each
+    launch a browser for the group. At most ``max_concurrency`` branches run at
+    once. ``join: "all"`` fails on the first failed branch, ``"any"``
+    succeeds on the first successful one; remaining branches are cancelled
+    (sync: before their next step).
+    """
+
+    __slots__ = ("branches", "max_concurrency", "join")
+    TEMPLATED = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.join = str(raw.get("join", "all"))
+        if self.join not in JOIN_MODES:
+            raise ValueError(f"join must be one of: {', '.join(JOIN_MODES)}")
+        self.branches: List[Branch] = []
+        for n, spec in enumerate(raw["branches"], start=1):
+            steps = spec if isinstance(spec, list) else spec["steps"]
+            name = f"b{n}" if isinstance(spec, list) else str(spec.get("name") or f"b{n}")
+            self.branches.append(Branch(name, compile_steps(steps)))
+        if not self.branches:
+            raise ValueError("parallel needs at least one branch")
+        if len({b.name for b in self.branches}) != len(self.branches):
+            raise ValueError("parallel branch names must be unique")
+        self.max_concurrency = max(1, as_int(raw, "max_concurrency", len(self.branches)))
+
+    def supports_async(self) -> bool:  # type: ignore[override]
+        return all(a.supports_async() for b in self.branches for a in b.plan)
+
+    def _log(self) -> None:
+        log.info(
+            "  → parallel branches=%d max_concurrency=%d join=%s", len(self.branches), self.max_concurrency, self.join
+        )
+
+    # ---- shared ----
+    def _begin(self, ctx: Any, branch: Branch) -> float:
+        ctx._trace("branch_start", {"i": self.index, "branch": branch.name})
+        return time.perf_counter()
+
+    def _end(self, ctx: Any, results: Dict[str, Dict[str, Any]], branch: Branch, t0: float, rt: Any, err: Any) -> None:
+        status = (
+            "ok" if err is None else "cancelled" if isinstance(err, (_Stopped, asyncio.CancelledError)) else "error"
+        )
+        res: Dict[str, Any] = {"status": status, "ms": int((time.perf_counter() - t0) * 1000)}
+        if status == "error":
+            res["error"] = str(err) or type(err).__name__
+        ctx._trace("branch_end", {"i": self.index, "branch": branch.name, **res})
+        res["state"] = rt.state if rt is not None else {}
+        results[branch.name] = res
+
+    def _settle(self, ctx: Any, results: Dict[str, Dict[str, Any]], t0: float, missing: str = "not started") -> None:
+        base = dict(ctx.state)
+        merged: Dict[str, Any] = {}
+        summary = {"ok": 0, "error": 0, "cancelled": 0}
+        first_error: Optional[str] = None
+        for b in self.branches:
+            res = results.get(b.name) or {"status": "error", "error": missing, "state": {}}
+            summary[res["status"]] += 1
+            if res["status"] == "ok":
+                changed = {k: v for k, v in res["state"].items() if k not in base or base[k] is not v}
+                ctx.state.update(changed)
+                merged[b.name] = changed
+            elif res["status"] == "error" and first_error is None:
+                first_error = f"branch '{b.name}' failed: {res.get('error')}"
+        ctx.state["branches"] = merged
+        ctx._trace(
+            "parallel", {"i": self.index, "join": self.join, "ms": int((time.perf_counter() - t0) * 1000), **summary}
+        )
+        if self.join == "all" and first_error is not None:
+            raise BranchError(f"parallel: {first_error}")
+        if self.join == "any" and summary["ok"] == 0:
+            raise BranchError(f"parallel: no branch succeeded ({first_error or 'all cancelled'})")
+
+    # ---- sync: one thread (and browser) per concurrent branch ----
+    def execute(self, ctx: "Runner") -> None:
+        self._log()
+        t0 = time.perf_counter()
+        state = ctx._context.storage_state() if ctx._context is not None else None
+        pending: "queue.SimpleQueue[Branch]" = queue.SimpleQueue()
+        for b in self.branches:
+            pending.put(b)
+        stop = threading.Event()
+        results: Dict[str, Dict[str, Any]] = {}
+        launch_errors: List[str] = []
+        n = min(self.max_concurrency, len(self.branches))
+
+        def work(pool: Any) -> None:
+            self._worker(ctx, pool, pending, state, stop, results, launch_errors)
+
+        if ctx._pool is not None:
+            ctx._pool.run_threads(work, n)
+        else:
+            workers = [threading.Thread(target=work, args=(None,), name=f"wao-branch-{k}") for k in range(n)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        self._settle(ctx, results, t0, f"browser unavailable: {launch_errors[0]}" if launch_errors else "not started")
+
+    def _worker(
+        self,
+        ctx: "Runner",
+        pool: Any,
+        pending: "queue.SimpleQueue[Branch]",
+        state: Any,
+        stop: threading.Event,
+        results: Dict[str, Dict[str, Any]],
+        launch_errors: List[str],
+    ) -> None:
+        try:
+            with ctx._branch_browser(pool) as browser:
+                while True:
+                    try:
+                        branch = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    self._run_sync(ctx, browser, state, branch, stop, results)
+        except Exception as e:
+            log.error("parallel: branch browser failed: %s", e)
+            launch_errors.append(str(e))
+
+    def _run_sync(
+        self,
+        ctx: "Runner",
+        browser: Any,
+        state: Any,
+        branch: Branch,
+        stop: threading.Event,
+        results: Dict[str, Dict[str, Any]],
+    ) -> None:
+        t0 = self._begin(ctx, branch)
+        rt: Any = None
+        err: Optional[BaseException] = None
+        try:
+            with ctx._branch_context(browser, state) as context:
+                rt = branch_runtime(ctx, context.new_page(), context, self.index, branch.name)
+                err = self._steps(rt, branch, stop)
+        except Exception as e:  # the branch context could not be opened
+            err = e
+        if (err is None) == (self.join == "any") and not isinstance(err, _Stopped):
+            stop.set()
+        self._end(ctx, results, branch, t0, rt, err)
+
+    def _steps(self, rt: Any, branch: Branch, stop: threading.Event) -> Optional[BaseException]:
+        """Run one branch's steps on its runtime; returns what stopped it (artifacts saved while the page is open)."""
+        try:
+            for action in branch.plan:
+                if stop.is_set():
+                    raise _Stopped()
+                log.info("Step %d.%s.%d: act=%s", self.index, branch.name, action.index, action.kind)
+                with rt._step_scope(action):
+                    action.execute(rt)
+        except _Stopped as e:
+            return e
+        except BaseException as e:  # incl. SystemExit from ctx.fail() inside the branch
+            if not isinstance(e, SystemExit):
+                rt._save_failure_artifacts(reason="branch")
+            return e
+        return None
+
+    # ---- async: one task and one page per branch in the run's context ----
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self._log()
+        t0 = time.perf_counter()
+        sem = asyncio.Semaphore(self.max_concurrency)
+        results: Dict[str, Dict[str, Any]] = {}
+        tasks = [asyncio.ensure_future(self._run_async(ctx, b, sem, results)) for b in self.branches]
+        pending = set(tasks)
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            done = [r["status"] for r in results.values()]
+            if ("error" in done and self.join == "all") or ("ok" in done and self.join == "any"):
+                break
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._settle(ctx, results, t0)
+
+    async def _run_async(
+        self, ctx: "AsyncRunner", branch: Branch, sem: asyncio.Semaphore, results: Dict[str, Dict[str, Any]]
+    ) -> None:
+        rt: Any = None
+        t0 = time.perf_counter()
+        try:
+            async with sem:
+                t0 = self._begin(ctx, branch)
+                page = await ctx._context.new_page()  # type: ignore[union-attr]
+                rt = branch_runtime(ctx, page, ctx._context, self.index, branch.name)
+                try:
+                    for action in branch.plan:
+                        log.info("Step %d.%s.%d: act=%s", self.index, branch.name, action.index, action.kind)
+                        async with rt._step_scope(action):
+                            await action.aexecute(rt)
+                except Exception:
+                    await rt._save_failure_artifacts(reason="branch")
+                    raise
+                finally:
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+        except asyncio.CancelledError as e:
+            self._end(ctx, results, branch, t0, rt, e)
+            raise
+        except Exception as e:
+            self._end(ctx, results, branch, t0, rt, e)
+            return
+        self._end(ctx, results, branch, t0, rt, None)
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import csv
+import json
+import re
+import time
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Pattern
+
+from ..templating import Renderer, compile_value, scope_of
+from .base import Action, as_int, log
+from .registry import register
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+
+@register("set_var")
+class SetVarAction(Action):
+    """Assign ``value`` (templates rendered; ``"{{rows}}"`` keeps the list) to the variable ``var``.
+
+    ``var`` defaults to the step ``name``. Inside a loop the variable is set
+    in the run's state unless it is a loop variable or ``scope`` is ``"local"``.
+    """
+
+    __slots__ = ("var", "value", "local")
+    IDEMPOTENT = True
+    TEMPLATED = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.var = str(raw.get("var") or raw["name"])
+        self.value: Renderer = compile_value(raw.get("value"))
+        self.local = raw.get("scope") == "local"
+
+    def execute(self, ctx: "Runner") -> None:
+        scope = scope_of(ctx)
+        value = self.value(scope)
+        log.info("  → set_var %s", self.var)
+        scope.set(self.var, value, self.local)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self.execute(ctx)  # type: ignore[arg-type]  # no page I/O
+
+
+def _clean(value: Any, regex: Optional[Pattern[str]]) -> Optional[str]:
+    """Strip a read value and keep ``regex``'s first group (or whole match); None if absent/unmatched."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if regex is None:
+        return text
+    m = regex.search(text)
+    if m is None:
+        return None
+    return m.group(1) if regex.groups else m.group(0)
+
+
+def _number(text: Optional[str]) -> Any:
+    """``"¥12,340"`` -> 12340, ``"-1.5 %"`` -> -1.5; None when no digits remain."""
+    digits = re.sub(r"[^0-9.\-]", "", text or "")
+    try:
+        return float(digits) if "." in digits else int(digits)
+    except ValueError:
+        return None
+
+
+# One round trip per extract: read the field in the page rather than one call per property
+_READ = """(el, attr) => attr === "text" ? el.innerText : attr === "value" ? el.value
+  : attr === "html" ? el.innerHTML : el.getAttribute(attr)"""
+_READ_ALL = f"(els, attr) => els.map((el) => ({_READ})(el, attr))"
+
+
+@register("extract")
+class ExtractAction(Action):
+    """Read ``attr`` (``text`` | ``value`` | ``html`` | any attribute) of ``selector`` into the variable ``as``.
+
+    ``regex`` keeps its first group (or the whole match). With ``all`` every
+    match is read into a list (elements without a value are dropped); else
+    the first element is awaited and a missing value fails the step unless
+    ``default`` is given.
+    """
+
+    __slots__ = ("selector", "attr", "regex", "target", "all", "default", "timeout", "local")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.selector = str(raw["selector"])
+        self.attr = str(raw.get("attr") or "text")
+        regex = raw.get("regex")
+        self.regex: Optional[Pattern[str]] = re.compile(regex) if regex else None
+        self.target = str(raw["as"])
+        self.all = bool(raw.get("all", False))
+        self.default: Any = raw.get("default")
+        self.timeout = as_int(raw, "timeout", 10000)
+        self.local = raw.get("scope") == "local"
+
+    def _store(self, ctx: Any, raw: List[Any]) -> None:
+        values = [v for v in (_clean(r, self.regex) for r in raw) if v is not None]
+        if self.all:
+            result: Any = values
+        elif values:
+            result = values[0]
+        elif self.default is not None:
+            result = self.default
+        else:
+            pattern = f" matching /{self.regex.pattern}/" if self.regex is not None else ""
+            raise ValueError(f"extract: no {self.attr} for {self.selector}{pattern}")
+        log.info("  → extract %s[%s] -> %s", self.selector, self.attr, self.target)
+        scope_of(ctx).set(self.target, result, self.local)
+
+    def execute(self, ctx: "Runner") -> None:
+        loc = ctx.page.locator(self.selector)
+        if self.all:
+            raw = loc.evaluate_all(_READ_ALL, self.attr)
+        else:
+            raw = [loc.first.evaluate(_READ, self.attr, timeout=self.timeout)]
+        self._store(ctx, raw)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        loc = ctx.page.locator(self.selector)
+        if self.all:
+            raw = await loc.evaluate_all(_READ_ALL, self.attr)
+        else:
+            raw = [await loc.first.evaluate(_READ, self.attr, timeout=self.timeout)]
+        self._store(ctx, raw)
+
+
+# All fields of all rows in one evaluate: [rows selector | null, fields, offset, limit] -> records
+_READ_RECORDS = f"""([rows, fields, offset, limit]) => {{
+  const read = {_READ};
+  const pick = (root, f) => {{
+    const node = root === document ? document.documentElement : root;
+    if (f.all) return Array.from(f.sel ? root.querySelectorAll(f.sel) : [node], (el) => read(el, f.attr));
+    const el = f.sel ? root.querySelector(f.sel) : node;
+    return el ? read(el, f.attr) : null;
+  }};
+  const record = (root) => Object.fromEntries(fields.map((f) => [f.name, pick(root, f)]));
+  if (rows === null) return [record(document)];
+  const all = Array.from(document.querySelectorAll(rows));
+  return all.slice(offset, limit ? offset + limit : undefined).map(record);
+}}"""
+
+
+class _Field:
+    __slots__ = ("name", "selector", "attr", "all", "regex", "number")
+
+    def __init__(self, name: str, spec: Any) -> None:
+        if isinstance(spec, str):
+            spec = {"selector": spec}
+        self.name = name
+        col = spec.get("col")
+        # "col": n is the row's n-th cell (0-based)
+        self.selector = f":scope > :nth-child({int(col) + 1})" if col is not None else str(spec.get("selector") or "")
+        self.attr = str(spec.get("attr") or "text")
+        self.all = bool(spec.get("all", False))
+        self.regex: Optional[Pattern[str]] = re.compile(spec["regex"]) if spec.get("regex") else None
+        self.number = spec.get("type") == "number"
+        if spec.get("type") not in (None, "string", "number"):
+            raise ValueError(f"field '{name}': type must be 'string' or 'number'")
+
+    def js(self) -> Dict[str, Any]:
+        return {"name": self.name, "sel": self.selector, "attr": self.attr, "all": self.all}
+
+    def value(self, raw: Any) -> Any:
+        if self.all:
+            return [self._one(v) for v in raw or []]
+        return self._one(raw)
+
+    def _one(self, raw: Any) -> Any:
+        text = _clean(raw, self.regex)
+        return _number(text) if self.number else text
+
+
+class _RecordSink:
+    """Records appended to a JSONL or CSV artifact as they arrive (CSV columns = field order)."""
+
+    def __init__(self, path: Path, fmt: str, columns: List[str]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._fh: IO[str] = open(path, "w", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._fh, fieldnames=columns) if fmt == "csv" else None
+        if self._csv is not None:
+            self._csv.writeheader()
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        if self._csv is None:
+            self._fh.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+            return
+        for r in records:
+            self._csv.writerow(
+                {k: json.dumps(v, ensure_ascii=False) if isinstance(v, list) else v for k, v in r.items()}
+            )
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class _ExtractFields(Action):
+    """Shared by extract_many / extract_table: ``fields`` read in the page, post-processed here."""
+
+    __slots__ = ("fields", "target", "out", "format", "keep", "batch")
+    IDEMPOTENT = True
+
+    def _compile_fields(self, raw: Mapping[str, Any]) -> None:
+        fields = raw.get("fields")
+        if not isinstance(fields, Mapping) or not fields:
+            raise ValueError(f"{self.kind} requires 'fields' (a map of name to selector or field object)")
+        self.fields = [_Field(str(name), spec) for name, spec in fields.items()]
+        self.target = str(raw["as"])
+        out = raw.get("out")
+        self.out: Optional[Path] = Path(str(out)) if out else None
+        self.format = str(
+            raw.get("format") or ("csv" if self.out is not None and self.out.suffix == ".csv" else "jsonl")
+        )
+        if self.format not in ("jsonl", "csv"):
+            raise ValueError("format must be 'jsonl' or 'csv'")
+        self.keep = bool(raw.get("keep", True))
+        self.batch = max(0, as_int(raw, "batch", 0))
+
+    def _records(self, raw: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [{f.name: f.value(r.get(f.name)) for f in self.fields} for r in raw]
+
+    def _sink(self) -> Optional[_RecordSink]:
+        return _RecordSink(self.out, self.format, [f.name for f in self.fields]) if self.out is not None else None
+
+    def _finish(self, ctx: Any, result: Any, rows: int, calls: int, t0: float) -> None:
+        ms = int((time.perf_counter() - t0) * 1000)
+        log.info("  → %s %d row(s) in %d call(s), %d ms -> %s", self.kind, rows, calls, ms, self.out or self.target)
+        if self.keep:
+            scope_of(ctx).set(self.target, result)
+        ctx.state["last_extract"] = {"rows": rows, "path": str(self.out) if self.out is not None else None}
+        ctx._trace(
+            "extract",
+            {"i": self.index, "rows": rows, "calls": calls, "ms": ms, "path": ctx.state["last_extract"]["path"]},
+        )
+
+
+@register("extract_many")
+class ExtractManyAction(_ExtractFields):
+    """Read several page fields at once into a dict ``as`` (one ``evaluate`` call)."""
+
+    __slots__ = ()
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self._compile_fields(raw)
+
+    def _done(self, ctx: Any, raw: List[Dict[str, Any]], t0: float) -> None:
+        records = self._records(raw)
+        sink = self._sink()
+        if sink is not None:
+            sink.write(records)
+            sink.close()
+        self._finish(ctx, records[0], 1, 1, t0)
+
+    def execute(self, ctx: "Runner") -> None:
+        t0 = time.perf_counter()
+        self._done(ctx, ctx.page.evaluate(_READ_RECORDS, [None, [f.js() for f in self.fields], 0, 0]), t0)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        t0 = time.perf_counter()
+        self._done(ctx, await ctx.page.evaluate(_READ_RECORDS, [None, [f.js() for f in self.fields], 0, 0]), t0)
+
+
+@register("extract_table")
+class ExtractTableAction(_ExtractFields):
+    """One record per ``rows`` element, its ``fields`` read relative to the row, into the list ``as``.
+
+    The whole table is read in one ``evaluate`` call, or in calls of
+    ``batch`` rows for very large tables. With ``out`` (.jsonl / .csv) each
+    batch is appended to the artifact as it arrives; ``keep: false`` then
+    leaves only ``state["last_extract"]`` (row count and path) in memory.
+    """
+
+    __slots__ = ("rows",)
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.rows = str(raw["rows"])
+        self._compile_fields(raw)
+
+    def _args(self, offset: int) -> List[Any]:
+        return [self.rows, [f.js() for f in self.fields], offset, self.batch]
+
+    def _take(self, kept: List[Dict[str, Any]], sink: Optional[_RecordSink], raw: List[Dict[str, Any]]) -> bool:
+        """Consume one batch; True when more rows may follow."""
+        records = self._records(raw)
+        if sink is not None:
+            sink.write(records)
+        if self.keep:
+            kept.extend(records)
+        return bool(self.batch) and len(raw) == self.batch
+
+    def execute(self, ctx: "Runner") -> None:
+        t0 = time.perf_counter()
+        kept: List[Dict[str, Any]] = []
+        rows = calls = 0
+        sink = self._sink()
+        try:
+            more = True
+            while more:
+                raw = ctx.page.evaluate(_READ_RECORDS, self._args(rows))
+                calls += 1
+                rows += len(raw)
+                more = self._take(kept, sink, raw)
+        finally:
+            if sink is not None:
+                sink.close()
+        self._finish(ctx, kept, rows, calls, t0)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        t0 = time.perf_counter()
+        kept: List[Dict[str, Any]] = []
+        rows = calls = 0
+        sink = self._sink()
+        try:
+            more = True
+            while more:
+                raw = await ctx.page.evaluate(_READ_RECORDS, self._args(rows))
+                calls += 1
+                rows += len(raw)
+                more = self._take(kept, sink, raw)
+        finally:
+            if sink is not None:
+                sink.close()
+        self._finish(ctx, kept, rows, calls, t0)
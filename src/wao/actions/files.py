@@ -0,0 +1,602 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple
+
+from ..artifact_store import is_remote
+from ..downloads import conditional_headers, is_unchanged, skip_mode
+from ..hashing import DigestResult, check_algos, copy_with_digest, mismatches, multi_digest
+from ..httpfetch import FetchResult, HttpDownload
+from .base import Action, as_int, log, static
+from .registry import register
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+
+def _local_or_remote(value: Any) -> Tuple[Optional[Path], Optional[str]]:
+    """A DSL destination as ``(local path, None)`` or, for ``s3://...`` and other store URIs, ``(None, uri)``."""
+    if not value:
+        return None, None
+    value = static(value)
+    if is_remote(value):
+        return None, str(value)
+    return Path(value), None
+
+
+def _upload(ctx: Any, path: Path, remote: Optional[str], kind: str) -> Optional[str]:
+    """Queue a saved file for its store URI (or the run's mirror); returns the object URI."""
+    uploads = getattr(ctx, "uploads", None)
+    if uploads is None:
+        if remote:
+            raise RuntimeError(f"no artifact uploader for {remote}")
+        return None
+    uri: Optional[str] = uploads.submit(path, remote) if remote else uploads.mirror(path, kind)
+    return uri
+
+
+@register("screenshot")
+class ScreenshotAction(Action):
+    __slots__ = ("path", "remote", "target", "selector")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.path, self.remote = _local_or_remote(raw.get("path"))
+        self.target = raw.get("target", "viewport")  # fullpage | viewport | selector
+        self.selector: Optional[str] = raw.get("selector") if self.target == "selector" else None
+
+    def _local(self, ctx: Any) -> Optional[Path]:
+        if self.remote:
+            # saved under artifacts/screenshots first, then uploaded in the background
+            name = self.remote.rsplit("/", 1)[-1] or f"step{self.index}.png"
+            return Path(ctx.artifacts_dir) / "screenshots" / name
+        if self.path is None:
+            log.warning("  ! screenshot skipped: path is required")
+        return self.path
+
+    def _saved(self, ctx: Any, path: Path) -> None:
+        log.info("  → screenshot saved: %s", str(path))
+        uri = _upload(ctx, path, self.remote, "screenshots")
+        if uri is not None:
+            log.info("  → screenshot upload queued: %s", uri)
+
+    def execute(self, ctx: "Runner") -> None:
+        path = self._local(ctx)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            page = ctx.page
+            if self.selector:
+                page.locator(self.selector).screenshot(path=str(path))
+            else:
+                page.screenshot(path=str(path), full_page=self.target == "fullpage")
+            self._saved(ctx, path)
+        except Exception as e:
+            log.error("  ! screenshot failed: %s", e)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        path = self._local(ctx)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            page = ctx.page
+            if self.selector:
+                await page.locator(self.selector).screenshot(path=str(path))
+            else:
+                await page.screenshot(path=str(path), full_page=self.target == "fullpage")
+            self._saved(ctx, path)
+        except Exception as e:
+            log.error("  ! screenshot failed: %s", e)
+
+
+class _HashOnSave:
+    """``hash`` / ``expected`` options shared by download and wait_download.
+
+    With ``hash: [algos]`` the finished download is copied from Playwright's
+    temp file to its destination while being digested, so the saved file is
+    never read back (verify_file on the same path reuses these digests).
+    Remote browsers have no local temp file; then the file is hashed after
+    ``save_as``. A verified file whose destination is a store URI
+    (``s3://bucket/reports/``) is saved under ``downloads_dir`` and queued
+    for upload; ``last_download_uri`` names the object.
+    """
+
+    __slots__ = ()
+    index: int
+    hash: Tuple[str, ...]
+    expected: Dict[str, str]
+    remote: Optional[str]
+
+    def _compile_hash(self, raw: Mapping[str, Any]) -> Tuple[Tuple[str, ...], Dict[str, str]]:
+        expected = {str(k).lower(): str(v).lower() for k, v in (raw.get("expected") or {}).items()}
+        algos = [*(raw.get("hash") or ()), *expected]
+        return (check_algos(algos) if algos else ()), expected
+
+    def _finish(self, ctx: Any, dest: Path, result: Optional[DigestResult]) -> Optional[str]:
+        ctx.state["last_download_path"] = str(dest)
+        bad: Dict[str, str] = {}
+        if result is not None:
+            ctx.state["last_download_digests"] = result.digests
+            ctx._trace("hash", {"i": self.index, **result.trace_payload(dest)})
+            bad = mismatches(result.digests, self.expected)
+        if not bad:
+            uri = _upload(ctx, dest, self.remote, "downloads")
+            if uri is not None:
+                ctx.state["last_download_uri"] = uri
+                log.info("  → upload queued: %s", uri)
+            return None
+        msg = "; ".join(f"download digest mismatch: {a} actual={v} path={dest}" for a, v in bad.items())
+        log.error("%s", msg)
+        return msg
+
+    def _save(self, ctx: Any, download: Any, dest: Path, extra: Tuple[str, ...] = ()) -> Optional[DigestResult]:
+        algos = tuple(dict.fromkeys(self.hash + extra))
+        result: Optional[DigestResult] = None
+        src = None
+        if algos:
+            try:
+                src = download.path()
+            except Exception:
+                src = None
+        if src is not None:
+            result = copy_with_digest(Path(src), dest, algos)
+        else:
+            download.save_as(str(dest))
+            if algos:
+                result = multi_digest(dest, algos)
+        msg = self._finish(ctx, dest, result)
+        if msg is not None:
+            ctx.fail("download_hash", msg)
+        return result
+
+    def _hashed(self, ctx: Any, dest: Path, extra: Tuple[str, ...] = ()) -> Optional[DigestResult]:
+        """Hash a file written without ``_save`` (direct HTTP downloads land in place)."""
+        algos = tuple(dict.fromkeys(self.hash + extra))
+        result = multi_digest(dest, algos) if algos else None
+        msg = self._finish(ctx, dest, result)
+        if msg is not None:
+            ctx.fail("download_hash", msg)
+        return result
+
+    async def _ahashed(self, ctx: Any, dest: Path, extra: Tuple[str, ...] = ()) -> Optional[DigestResult]:
+        algos = tuple(dict.fromkeys(self.hash + extra))
+        result = await asyncio.to_thread(multi_digest, dest, algos) if algos else None
+        msg = self._finish(ctx, dest, result)
+        if msg is not None:
+            await ctx.fail("download_hash", msg)
+        return result
+
+    async def _asave(self, ctx: Any, download: Any, dest: Path, extra: Tuple[str, ...] = ()) -> Optional[DigestResult]:
+        algos = tuple(dict.fromkeys(self.hash + extra))
+        result: Optional[DigestResult] = None
+        src = None
+        if algos:
+            try:
+                src = await download.path()
+            except Exception:
+                src = None
+        if src is not None:
+            result = await asyncio.to_thread(copy_with_digest, Path(src), dest, algos)
+        else:
+            await download.save_as(str(dest))
+            if algos:
+                result = await asyncio.to_thread(multi_digest, dest, algos)
+        msg = self._finish(ctx, dest, result)
+        if msg is not None:
+            await ctx.fail("download_hash", msg)
+        return result
+
+
+class _Incremental:
+    """``skip_if_unchanged`` / ``dedupe`` options shared by download and wait_download.
+
+    Both default to the flow's ``options.downloads``. With ``skip_if_unchanged``
+    the step looks up the site's download manifest first: ``"manifest"`` skips
+    whenever the recorded file is still present (or restorable from the content
+    store); ``"conditional"`` (``true``) additionally sends a HEAD with
+    ``If-None-Match`` / ``If-Modified-Since`` through the context's request API
+    (same cookies as the page) and skips on 304 or matching validators.
+    Opted-in downloads are hashed with sha256 while saving, recorded in the
+    manifest and, with ``dedupe``, hard-linked into the content store.
+    """
+
+    __slots__ = ()
+    index: int
+    name: str
+    raw: Mapping[str, Any]
+    timeout: int
+    skip: Optional[str]
+    dedupe: Optional[bool]
+
+    def _compile_store(self, raw: Mapping[str, Any]) -> Tuple[Optional[str], Optional[bool]]:
+        dedupe = raw.get("dedupe")
+        return skip_mode(raw.get("skip_if_unchanged")), (None if dedupe is None else bool(dedupe))
+
+    def _modes(self, ctx: Any) -> Tuple[Optional[str], bool]:
+        store = ctx.download_store
+        skip = self.skip if "skip_if_unchanged" in self.raw else store.skip_if_unchanged
+        return skip, store.dedupe if self.dedupe is None else self.dedupe
+
+    def _key(self, ctx: Any, url: Optional[str]) -> str:
+        return str(ctx.download_store.key(url, self.name or str(self.index)))
+
+    def _checked(
+        self, ctx: Any, entry: Optional[Dict[str, Any]], url: str, status: int, headers: Dict[str, str]
+    ) -> Optional[Dict[str, Any]]:
+        unchanged = entry is not None and is_unchanged(entry, status, headers)
+        ctx._trace("download_check", {"i": self.index, "url": url, "status": status, "unchanged": unchanged})
+        return entry if unchanged else None
+
+    def _head(self, ctx: Any, url: str, entry: Optional[Dict[str, Any]]) -> Optional[Tuple[int, Dict[str, str]]]:
+        try:
+            resp = ctx.page.context.request.head(url, headers=conditional_headers(entry or {}), timeout=self.timeout)
+            try:
+                return int(resp.status), dict(resp.headers)
+            finally:
+                resp.dispose()
+        except Exception as e:
+            log.warning("  ! download check failed (%s): %s", url, e)
+            return None
+
+    async def _ahead(self, ctx: Any, url: str, entry: Optional[Dict[str, Any]]) -> Optional[Tuple[int, Dict[str, str]]]:
+        try:
+            resp = await ctx.page.context.request.head(
+                url, headers=conditional_headers(entry or {}), timeout=self.timeout
+            )
+            try:
+                return int(resp.status), dict(resp.headers)
+            finally:
+                await resp.dispose()
+        except Exception as e:
+            log.warning("  ! download check failed (%s): %s", url, e)
+            return None
+
+    def _precheck(
+        self, ctx: Any, key: str, mode: str, url: Optional[str], dest: Optional[Path]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, str]]]:
+        """``(manifest entry to reuse or None, response headers from the check or None)``."""
+        entry = ctx.download_store.lookup(key, dest)
+        if mode == "manifest":
+            return entry, None
+        url = url or (entry or {}).get("url")
+        head = self._head(ctx, url, entry) if url else None
+        if head is None:
+            return None, None
+        return self._checked(ctx, entry, str(url), *head), head[1]
+
+    async def _aprecheck(
+        self, ctx: Any, key: str, mode: str, url: Optional[str], dest: Optional[Path]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, str]]]:
+        entry = ctx.download_store.lookup(key, dest)
+        if mode == "manifest":
+            return entry, None
+        url = url or (entry or {}).get("url")
+        head = await self._ahead(ctx, url, entry) if url else None
+        if head is None:
+            return None, None
+        return self._checked(ctx, entry, str(url), *head), head[1]
+
+    def _skipped(self, ctx: Any, entry: Mapping[str, Any]) -> None:
+        ctx.state["last_download_path"] = entry["path"]
+        if entry.get("sha256"):
+            ctx.state["last_download_digests"] = {"sha256": entry["sha256"]}
+        ctx._trace("download_skip", {"i": self.index, "path": entry["path"], "size": entry.get("size")})
+        log.info("  → unchanged, skipped: %s", entry["path"])
+
+    def _record(
+        self,
+        ctx: Any,
+        key: str,
+        dest: Path,
+        suggested: str,
+        url: Optional[str],
+        result: Optional[DigestResult],
+        headers: Optional[Dict[str, str]],
+        dedupe: bool,
+    ) -> None:
+        try:
+            entry = ctx.download_store.record(
+                key,
+                dest,
+                suggested,
+                url,
+                result.digests if result else {},
+                headers,
+                dedupe,
+            )
+        except OSError as e:
+            log.warning("  ! download manifest not updated: %s", e)
+            return
+        if entry.get("deduplicated"):
+            log.info("  → deduplicated: %s (sha256=%s)", dest, entry["sha256"])
+
+
+@register("wait_download")
+class WaitDownloadAction(_Incremental, _HashOnSave, Action):
+    """Wait for a download (triggered by ``selector`` or an earlier step) and save it under ``to``.
+
+    The file's URL is only known once the download starts, so ``skip_if_unchanged``
+    needs ``url`` (what ``selector`` downloads, e.g. templated per month) or a
+    ``key`` naming the file; the step name alone would match last month's file.
+    """
+
+    __slots__ = (
+        "pattern",
+        "timeout",
+        "to",
+        "remote",
+        "selector",
+        "hash",
+        "expected",
+        "skip",
+        "dedupe",
+        "url",
+        "key",
+    )
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        pattern = raw.get("pattern")
+        if not pattern:
+            raise ValueError("wait_download requires 'pattern' (regex)")
+        self.pattern = re.compile(pattern)
+        self.timeout = as_int(raw, "timeout", 30000)
+        # "to": "s3://bucket/reports/" saves to downloads_dir and uploads from there
+        self.to, self.remote = _local_or_remote(raw.get("to"))
+        self.selector: Optional[str] = raw.get("selector")
+        self.hash, self.expected = self._compile_hash(raw)
+        self.skip, self.dedupe = self._compile_store(raw)
+        self.url: Optional[str] = raw.get("url")
+        self.key: Optional[str] = raw.get("key")
+        if self.skip and not (self.url or self.key):
+            raise ValueError("wait_download skip_if_unchanged requires 'url' or 'key' to identify the file")
+
+    def _modes(self, ctx: Any) -> Tuple[Optional[str], bool]:
+        skip, dedupe = super()._modes(ctx)
+        # without a selector another step triggers the download, so there is nothing to skip;
+        # without url/key a new file (this month's statement) would match the last one recorded
+        return (skip if self.selector and (self.url or self.key) else None), dedupe
+
+    def _key(self, ctx: Any, url: Optional[str]) -> str:
+        return str(ctx.download_store.key(self.url, self.key or self.name or str(self.index)))
+
+    def _dest(self, ctx: Any, suggested: str) -> Path:
+        if self.pattern.search(suggested) is None:
+            raise ValueError(f"Downloaded filename '{suggested}' does not match pattern '{self.pattern.pattern}'")
+        return (self.to or ctx.downloads_dir) / suggested
+
+    def _start(self, ctx: Any) -> None:
+        to_dir = self.to or ctx.downloads_dir
+        to_dir.mkdir(parents=True, exist_ok=True)
+        log.info("  → wait_download pattern=%s timeout=%d to=%s", self.pattern.pattern, self.timeout, to_dir)
+        if self.selector:
+            log.info("  → click selector=%s (to trigger download)", self.selector)
+
+    def execute(self, ctx: "Runner") -> None:
+        page = ctx.page
+        skip, dedupe = self._modes(ctx)
+        key = self._key(ctx, self.url) if skip or dedupe else ""
+        headers = None
+        if skip:
+            entry, headers = self._precheck(ctx, key, skip, self.url, None)
+            if entry is not None:
+                self._skipped(ctx, entry)
+                return
+        self._start(ctx)
+        # Expect the download, optionally trigger a click
+        with page.expect_download(timeout=self.timeout) as dl_info:
+            if self.selector:
+                page.click(self.selector)
+        download = dl_info.value
+        dest_path = self._dest(ctx, download.suggested_filename)
+        if not (skip or dedupe):
+            self._save(ctx, download, dest_path)
+        else:
+            result = self._save(ctx, download, dest_path, ("sha256",))
+            if skip == "conditional" and headers is None:
+                head = self._head(ctx, download.url, None)
+                headers = head[1] if head else None
+            self._record(ctx, key, dest_path, download.suggested_filename, download.url, result, headers, dedupe)
+        log.info("  → downloaded: %s", dest_path)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        page = ctx.page
+        skip, dedupe = self._modes(ctx)
+        key = self._key(ctx, self.url) if skip or dedupe else ""
+        headers = None
+        if skip:
+            entry, headers = await self._aprecheck(ctx, key, skip, self.url, None)
+            if entry is not None:
+                self._skipped(ctx, entry)
+                return
+        self._start(ctx)
+        async with page.expect_download(timeout=self.timeout) as dl_info:
+            if self.selector:
+                await page.click(self.selector)
+        download = await dl_info.value
+        dest_path = self._dest(ctx, download.suggested_filename)
+        if not (skip or dedupe):
+            await self._asave(ctx, download, dest_path)
+        else:
+            result = await self._asave(ctx, download, dest_path, ("sha256",))
+            if skip == "conditional" and headers is None:
+                head = await self._ahead(ctx, download.url, None)
+                headers = head[1] if head else None
+            self._record(ctx, key, dest_path, download.suggested_filename, download.url, result, headers, dedupe)
+        log.info("  → downloaded: %s", dest_path)
+
+
+@register("download")
+class DownloadAction(_Incremental, _HashOnSave, Action):
+    """Click ``selector`` or open a direct ``url``, then save the download to ``path``.
+
+    ``path`` defaults to ``artifacts/downloads/<suggested filename>``; an
+    ``s3://...`` path is saved there and uploaded in the background.
+    With ``mode: "http"`` a ``url`` is fetched outside the browser
+    (:mod:`wao.httpfetch`) using the context's cookies, in ``segments``
+    parallel ranges for large files, resuming an interrupted ``.part``.
+    """
+
+    __slots__ = (
+        "timeout",
+        "selector",
+        "url",
+        "dest",
+        "remote",
+        "hash",
+        "expected",
+        "skip",
+        "dedupe",
+        "mode",
+        "segments",
+    )
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.timeout = as_int(raw, "timeout", 30000)
+        self.selector: Optional[str] = raw.get("selector")
+        url = raw.get("url")
+        if not self.selector and not url:
+            raise ValueError("download requires either 'selector' or 'url'")
+        self.url: Optional[str] = str(static(url)) if url else None
+        self.dest, self.remote = _local_or_remote(raw.get("path"))
+        self.hash, self.expected = self._compile_hash(raw)
+        self.skip, self.dedupe = self._compile_store(raw)
+        self.mode = str(raw.get("mode", "browser"))
+        if self.mode not in ("browser", "http"):
+            raise ValueError("download mode must be 'browser' or 'http'")
+        if self.mode == "http" and not self.url:
+            raise ValueError("download mode 'http' requires 'url'")
+        self.segments = as_int(raw, "segments", 4)
+
+    def _save_path(self, ctx: Any, suggested: str) -> Path:
+        dest_path = self.dest or ctx.downloads_dir / suggested
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        return dest_path
+
+    def _log_trigger(self) -> None:
+        log.info("  → download start timeout=%d selector=%s url=%s", self.timeout, self.selector, self.url)
+        if self.selector:
+            log.info("  → click selector=%s (to trigger download)", self.selector)
+        else:
+            log.info("  → open download URL: %s", self.url)
+
+    # ---- mode "http" ----
+    def _http(self, ctx: Any, cookies: List[Any], user_agent: str, referer: str) -> HttpDownload:
+        headers = {"User-Agent": user_agent, "Accept": "*/*"}
+        if cookies:
+            headers["Cookie"] = "; ".join(f"{c['name']}={c['value']}" for c in cookies)
+        if referer.startswith(("http://", "https://")):
+            headers["Referer"] = referer
+
+        def progress(done: int, total: Optional[int], seconds: float) -> None:
+            payload: Dict[str, Any] = {"i": self.index, "bytes": done, "total": total}
+            if total:
+                payload["pct"] = round(done * 100 / total, 1)
+            if seconds > 0:
+                payload["mb_s"] = round(done / seconds / 1e6, 1)
+            ctx._trace("download_progress", payload)
+
+        log.info("  → download (http) url=%s segments=%d", self.url, self.segments)
+        return HttpDownload(
+            str(self.url),
+            headers,
+            segments=self.segments,
+            timeout_s=self.timeout / 1000.0,
+            insecure=bool(ctx.ignore_https_errors),
+            progress=progress,
+        )
+
+    def _fetched(self, ctx: Any, res: FetchResult, skip: Optional[str], dedupe: bool) -> Tuple[str, ...]:
+        ctx._trace("download_http", {"i": self.index, **res.trace_payload()})
+        log.info("  → download saved: %s (%d bytes, %s MB/s)", res.path, res.size, res.trace_payload()["mb_s"])
+        return ("sha256",) if skip or dedupe else ()
+
+    def _execute_http(self, ctx: "Runner", key: str, skip: Optional[str], dedupe: bool) -> None:
+        page = ctx.page
+        cookies = page.context.cookies([str(self.url)])
+        dl = self._http(ctx, list(cookies), page.evaluate("() => navigator.userAgent"), page.url)
+        res = dl.fetch(lambda probe: self._save_path(ctx, probe.filename))
+        extra = self._fetched(ctx, res, skip, dedupe)
+        result = self._hashed(ctx, res.path, extra)
+        if extra:
+            self._record(ctx, key, res.path, res.path.name, self.url, result, res.headers, dedupe)
+
+    async def _aexecute_http(self, ctx: "AsyncRunner", key: str, skip: Optional[str], dedupe: bool) -> None:
+        page = ctx.page
+        cookies = await page.context.cookies([str(self.url)])
+        dl = self._http(ctx, list(cookies), await page.evaluate("() => navigator.userAgent"), page.url)
+        # the transfer runs off the event loop; the page stays free for other work
+        res = await asyncio.to_thread(dl.fetch, lambda probe: self._save_path(ctx, probe.filename))
+        extra = self._fetched(ctx, res, skip, dedupe)
+        result = await self._ahashed(ctx, res.path, extra)
+        if extra:
+            self._record(ctx, key, res.path, res.path.name, self.url, result, res.headers, dedupe)
+
+    def execute(self, ctx: "Runner") -> None:
+        page = ctx.page
+        skip, dedupe = self._modes(ctx)
+        key = self._key(ctx, self.url) if skip or dedupe else ""
+        headers = None
+        if skip:
+            entry, headers = self._precheck(ctx, key, skip, self.url, self.dest)
+            if entry is not None:
+                self._skipped(ctx, entry)
+                return
+        if self.mode == "http":
+            self._execute_http(ctx, key, skip, dedupe)
+            return
+        self._log_trigger()
+        with page.expect_download(timeout=self.timeout) as dl_info:
+            if self.selector:
+                page.click(self.selector)
+            else:
+                # Direct URL download (navigate to the file URL)
+                page.goto(str(self.url))
+        download = dl_info.value
+        suggested = download.suggested_filename
+        dest_path = self._save_path(ctx, suggested)
+        if not (skip or dedupe):
+            self._save(ctx, download, dest_path)
+        else:
+            result = self._save(ctx, download, dest_path, ("sha256",))
+            if skip == "conditional" and headers is None:
+                head = self._head(ctx, download.url, None)
+                headers = head[1] if head else None
+            self._record(ctx, key, dest_path, download.suggested_filename, download.url, result, headers, dedupe)
+        log.info("  → download saved: %s (suggested=%s)", dest_path, suggested)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        page = ctx.page
+        skip, dedupe = self._modes(ctx)
+        key = self._key(ctx, self.url) if skip or dedupe else ""
+        headers = None
+        if skip:
+            entry, headers = await self._aprecheck(ctx, key, skip, self.url, self.dest)
+            if entry is not None:
+                self._skipped(ctx, entry)
+                return
+        if self.mode == "http":
+            await self._aexecute_http(ctx, key, skip, dedupe)
+            return
+        self._log_trigger()
+        async with page.expect_download(timeout=self.timeout) as dl_info:
+            if self.selector:
+                await page.click(self.selector)
+            else:
+                await page.goto(str(self.url))
+        download = await dl_info.value
+        suggested = download.suggested_filename
+        dest_path = self._save_path(ctx, suggested)
+        if not (skip or dedupe):
+            await self._asave(ctx, download, dest_path)
+        else:
+            result = await self._asave(ctx, download, dest_path, ("sha256",))
+            if skip == "conditional" and headers is None:
+                head = await self._ahead(ctx, download.url, None)
+                headers = head[1] if head else None
+            self._record(ctx, key, dest_path, download.suggested_filename, download.url, result, headers, dedupe)
+        log.info("  → download saved: %s (suggested=%s)", dest_path, suggested)
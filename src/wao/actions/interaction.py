@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Mapping, Optional
+
+from .. import secrets
+from .base import Action, log
+from .registry import register
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+
+@register("fill")
+class FillAction(Action):
+    __slots__ = ("selector", "value", "mask")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.selector = str(raw["selector"])
+        # Backward-compat: allow "text" if "value" missing
+        value = raw.get("value")
+        self.value = raw.get("text", "") if value is None else value
+        self.mask = bool(raw.get("mask", False))
+
+    def _value(self) -> str:
+        # Resolved per execution: fill values are where secrets live, keep them out of the plan
+        return str(secrets.resolve(self.value))
+
+    def execute(self, ctx: "Runner") -> None:
+        val = self._value()
+        log.info("  → fill %s value=%s", self.selector, ("***" if self.mask else val))
+        ctx.page.fill(self.selector, val)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        val = self._value()
+        log.info("  → fill %s value=%s", self.selector, ("***" if self.mask else val))
+        await ctx.page.fill(self.selector, val)
+
+
+@register("click")
+class ClickAction(Action):
+    __slots__ = ("selector",)
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.selector: Optional[str] = raw.get("selector")
+
+    def execute(self, ctx: "Runner") -> None:
+        log.info("  → click selector=%s", self.selector)
+        if self.selector:
+            ctx.page.click(self.selector)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        log.info("  → click selector=%s", self.selector)
+        if self.selector:
+            await ctx.page.click(self.selector)
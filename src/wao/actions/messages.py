@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable, Mapping
+
+from .base import Action, log
+from .registry import register
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+
+@register("log")
+class LogAction(Action):
+    __slots__ = ("emit", "message")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        level = raw.get("level", "info")
+        self.emit: Callable[..., None] = {"warn": log.warning, "error": log.error}.get(level, log.info)
+        self.message = raw.get("message", "")
+
+    def execute(self, ctx: "Runner") -> None:
+        self.emit("%s", self.message)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self.emit("%s", self.message)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Mapping
+
+from .base import Action, log, static
+from .registry import register
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+
+@register("open_url", "goto")
+class OpenUrlAction(Action):
+    __slots__ = ("url",)
+    IDEMPOTENT = True
+    CHECKPOINT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.url = str(static(raw["url"]))
+
+    def execute(self, ctx: "Runner") -> None:
+        log.info("  → goto %s", self.url)
+        ctx.page.goto(self.url)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        log.info("  → goto %s", self.url)
+        await ctx.page.goto(self.url)
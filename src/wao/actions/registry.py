@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Sequence, TypeVar
+
+from ..templating import compile_value, has_templates, scope_of
+from .base import Action, StepCompileError, UnknownAction
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+# An Action subclass, or any factory with the same (index, kind, raw) signature
+ActionFactory = Callable[[int, str, Mapping[str, Any]], Action]
+
+_REGISTRY: Dict[str, ActionFactory] = {}
+
+F = TypeVar("F", bound=ActionFactory)
+
+
+def register(*names: str) -> Callable[[F], F]:
+    """Decorator: bind one or more DSL ``act``/``action`` names to an Action class/factory."""
+
+    def deco(cls: F) -> F:
+        for name in names:
+            _REGISTRY[name] = cls
+        return cls
+
+    return deco
+
+
+def registered() -> List[str]:
+    return sorted(_REGISTRY)
+
+
+def _build(factory: ActionFactory, index: int, kind: str, step: Mapping[str, Any]) -> Action:
+    try:
+        return factory(index, kind, step)
+    except StepCompileError:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise StepCompileError(f"step {index} ({kind}): {e}") from e
+
+
+class TemplatedAction(Action):
+    """A step with ``{{var}}`` templates in its fields.
+
+    The templates are parsed once here. Each execution renders them against
+    the run's variables and runs the concrete action compiled from the
+    rendered step, cached per distinct rendering (a ``foreach`` over 12
+    months compiles 12 actions once, not once per run of the loop).
+    """
+
+    __slots__ = ("factory", "render", "probe", "bound")
+
+    #: Distinct renderings kept per step
+    CACHE = 64
+
+    def __init__(self, index: int, kind: str, raw: Mapping[str, Any], factory: ActionFactory) -> None:
+        self.factory = factory
+        super().__init__(index, kind, raw)
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.render = compile_value(dict(raw))
+        self.bound: Dict[str, Action] = {}
+        # Compiling the unrendered step catches most mistakes before the browser starts; fields that
+        # only become valid once rendered (e.g. "timeout": "{{t}}") are checked at execution instead
+        try:
+            self.probe: Action = _build(self.factory, self.index, self.kind, raw)
+        except StepCompileError:
+            self.probe = UnknownAction(self.index, self.kind, raw)
+        else:
+            self.idempotent = self.probe.idempotent
+
+    def supports_async(self) -> bool:  # type: ignore[override]
+        return self.probe.supports_async()
+
+    def is_checkpoint(self) -> bool:
+        return self.probe.is_checkpoint()
+
+    def bind(self, ctx: Any) -> Action:
+        step = self.render(scope_of(ctx))
+        key = json.dumps(step, sort_keys=True, ensure_ascii=False, default=str)
+        action = self.bound.get(key)
+        if action is None:
+            action = _build(self.factory, self.index, self.kind, step)
+            if len(self.bound) >= self.CACHE:
+                self.bound.pop(next(iter(self.bound)))
+            self.bound[key] = action
+        return action
+
+    def execute(self, ctx: "Runner") -> None:
+        self.bind(ctx).execute(ctx)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        await self.bind(ctx).aexecute(ctx)
+
+
+def create(index: int, step: Mapping[str, Any]) -> Action:
+    """Compile one raw step dict into its pre-bound Action."""
+    # New DSL uses "act", old one used "action"
+    kind = str(step.get("act") or step.get("action"))
+    cls = _REGISTRY.get(kind, UnknownAction)
+    if not getattr(cls, "TEMPLATED", False) and has_templates(step):
+        return _build(lambda i, k, s: TemplatedAction(i, k, s, cls), index, kind, step)
+    return _build(cls, index, kind, step)
+
+
+def compile_steps(steps: Sequence[Mapping[str, Any]], start: int = 1) -> List[Action]:
+    """Turn validated flow steps into a plan of Actions (done once, before the browser starts)."""
+    return [create(i, s) for i, s in enumerate(steps, start=start)]
@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import time
+import weakref
+from typing import TYPE_CHECKING, Any, Callable, Dict, Mapping, Optional, Pattern, Set, Tuple, Type, Union
+
+from playwright.async_api import expect as async_expect
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import expect
+
+from .base import Action, as_int, log
+from .registry import register
+
+if TYPE_CHECKING:
+    from ..async_runner import AsyncRunner
+    from ..runner import Runner
+
+
+class WaitAction(Action):
+    """Fixed sleep; prefer a condition (``"for"``) so the step ends as soon as the page is ready."""
+
+    __slots__ = ("timeout",)
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.timeout = as_int(raw, "timeout", 1000)
+
+    def execute(self, ctx: "Runner") -> None:
+        log.info("  → %s timeout=%d ms", self.kind, self.timeout)
+        time.sleep(self.timeout / 1000.0)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        log.info("  → %s timeout=%d ms", self.kind, self.timeout)
+        await asyncio.sleep(self.timeout / 1000.0)
+
+
+@register("wait_for_selector")
+class WaitForSelectorAction(Action):
+    __slots__ = ("selector", "state", "timeout")
+    IDEMPOTENT = True
+    CHECKPOINT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.selector = str(raw["selector"])
+        self.timeout = as_int(raw, "timeout", 10000)
+        # "attached" | "detached" | "hidden" | "visible"
+        self.state: Any = raw.get("state") or "visible"
+
+    def _log(self) -> None:
+        log.info(
+            "  → wait_for_selector selector=%s state=%s timeout=%d",
+            self.selector,
+            self.state,
+            self.timeout,
+        )
+
+    def execute(self, ctx: "Runner") -> None:
+        self._log()
+        ctx.page.wait_for_selector(self.selector, state=self.state, timeout=self.timeout)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self._log()
+        await ctx.page.wait_for_selector(self.selector, state=self.state, timeout=self.timeout)
+
+
+@register("wait_for")
+def _wait_for(index: int, kind: str, raw: Mapping[str, Any]) -> Action:
+    # Spec: wait_for(selector?, state?, timeout?) — without a selector it is a plain wait
+    if raw.get("selector"):
+        return WaitForSelectorAction(index, kind, raw)
+    return WaitAction(index, kind, raw)
+
+
+URL_WAIT_STATES = ("commit", "domcontentloaded", "load", "networkidle")
+
+
+@register("wait_for_url")
+class WaitForUrlAction(Action):
+    """Wait until the page URL matches, driven by Playwright navigation events.
+
+    Match by substring (``url_substr``/``contains``), Playwright ``glob`` or
+    ``regex`` (searched). ``wait_until`` picks the load state that must also be
+    reached (default ``load``; ``commit`` continues as soon as the URL commits).
+    """
+
+    __slots__ = ("matcher", "describe", "timeout", "wait_until")
+    IDEMPOTENT = True
+    CHECKPOINT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        substr: Optional[str] = raw.get("url_substr") or raw.get("contains")
+        self.matcher: Union[str, Pattern[str], Callable[[str], bool]]
+        if substr:
+            self.matcher = lambda url: substr in url
+            self.describe = f"contain '{substr}'"
+        elif raw.get("regex"):
+            self.matcher = re.compile(raw["regex"])
+            self.describe = f"match /{raw['regex']}/"
+        elif raw.get("glob"):
+            self.matcher = str(raw["glob"])
+            self.describe = f"match glob '{raw['glob']}'"
+        else:
+            raise ValueError("wait_for_url requires 'url_substr' (or 'contains'), 'glob' or 'regex'")
+        self.timeout = as_int(raw, "timeout", 10000)
+        self.wait_until: Any = raw.get("wait_until", "load")
+        if self.wait_until not in URL_WAIT_STATES:
+            raise ValueError(f"wait_for_url 'wait_until' must be one of: {', '.join(URL_WAIT_STATES)}")
+
+    def _timeout_error(self, url: str) -> TimeoutError:
+        return TimeoutError(f"URL did not {self.describe} within {self.timeout} ms (last={url})")
+
+    def execute(self, ctx: "Runner") -> None:
+        log.info("  → wait_for_url %s wait_until=%s timeout=%d", self.describe, self.wait_until, self.timeout)
+        page = ctx.page
+        try:
+            page.wait_for_url(self.matcher, wait_until=self.wait_until, timeout=self.timeout)
+        except PlaywrightTimeoutError as e:
+            raise self._timeout_error(page.url) from e
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        log.info("  → wait_for_url %s wait_until=%s timeout=%d", self.describe, self.wait_until, self.timeout)
+        page = ctx.page
+        try:
+            await page.wait_for_url(self.matcher, wait_until=self.wait_until, timeout=self.timeout)
+        except PlaywrightTimeoutError as e:
+            raise self._timeout_error(page.url) from e
+
+
+@register("sleep_random")
+class SleepRandomAction(Action):
+    __slots__ = ("min_ms", "max_ms")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        min_ms = as_int(raw, "min_ms", 0)
+        max_ms = as_int(raw, "max_ms", min_ms)
+        if max_ms < min_ms:
+            min_ms, max_ms = max_ms, min_ms
+        self.min_ms, self.max_ms = min_ms, max_ms
+
+    def _pick(self) -> int:
+        dur = random.randint(self.min_ms, self.max_ms)
+        log.info("  → sleep_random %d ms", dur)
+        return dur
+
+    def execute(self, ctx: "Runner") -> None:
+        time.sleep(self._pick() / 1000.0)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        await asyncio.sleep(self._pick() / 1000.0)
+
+
+# ---- condition waits: {"act": "wait", "for": ...} ----
+def glob_to_regex(glob: str) -> Pattern[str]:
+    """Playwright-style URL glob: ``**`` any characters, ``*`` anything but ``/``."""
+    out = []
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif glob[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        else:
+            out.append(re.escape(glob[i]))
+            i += 1
+    return re.compile("^" + "".join(out) + "$")
+
+
+def url_predicate(raw: Mapping[str, Any]) -> Tuple[Callable[[str], bool], str]:
+    """(predicate on a URL, description) from ``url_substr``/``contains``, ``glob`` or ``regex``."""
+    substr: Optional[str] = raw.get("url_substr") or raw.get("contains")
+    if substr:
+        return (lambda url: substr in url), f"containing '{substr}'"
+    if raw.get("regex"):
+        rx = re.compile(raw["regex"])
+        return (lambda url: rx.search(url) is not None), f"matching /{raw['regex']}/"
+    if raw.get("glob"):
+        gx = glob_to_regex(str(raw["glob"]))
+        return (lambda url: gx.match(url) is not None), f"matching glob '{raw['glob']}'"
+    raise ValueError("a URL condition requires 'url_substr' (or 'contains'), 'glob' or 'regex'")
+
+
+class _Inflight:
+    """Requests in flight on one page, tracked from page creation (see :func:`track_requests`)."""
+
+    def __init__(self, page: Any) -> None:
+        self.requests: Set[Any] = set()
+        self.changed = time.monotonic()
+        page.on("request", self._start)
+        page.on("requestfinished", self._done)
+        page.on("requestfailed", self._done)
+
+    def _start(self, request: Any) -> None:
+        self.requests.add(request)
+        self.changed = time.monotonic()
+
+    def _done(self, request: Any) -> None:
+        self.requests.discard(request)
+        self.changed = time.monotonic()
+
+
+_INFLIGHT: "weakref.WeakKeyDictionary[Any, _Inflight]" = weakref.WeakKeyDictionary()
+
+
+def _inflight(page: Any) -> _Inflight:
+    tracker = _INFLIGHT.get(page)
+    if tracker is None:
+        tracker = _INFLIGHT[page] = _Inflight(page)
+    return tracker
+
+
+def track_requests(page: Any) -> None:
+    """Start counting ``page``'s requests; runners call this as they open a page for a flow with network_idle."""
+    _inflight(page)
+
+
+def uses_network_idle(steps: Any) -> bool:
+    """Whether raw steps (nested blocks and branches included) contain a ``network_idle`` wait."""
+    if isinstance(steps, dict):
+        return steps.get("for") == "network_idle" or any(uses_network_idle(v) for v in steps.values())
+    if isinstance(steps, list):
+        return any(uses_network_idle(v) for v in steps)
+    return False
+
+
+class WaitNetworkIdleAction(Action):
+    """Return once at most ``max_inflight`` requests are pending and nothing started/ended for ``quiet_ms``.
+
+    The quiet window always runs inside the wait, so a request fired just
+    after a click is still awaited. The runners start tracking when the page
+    is opened, so requests started by earlier steps are counted too; on a page
+    opened elsewhere tracking starts at the first such wait.
+    """
+
+    __slots__ = ("timeout", "quiet_s", "max_inflight")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.timeout = as_int(raw, "timeout", 10000)
+        self.quiet_s = as_int(raw, "quiet_ms", 500) / 1000.0
+        self.max_inflight = as_int(raw, "max_inflight", 0)
+
+    def _left(self, tracker: _Inflight, start: float, now: float) -> float:
+        """Seconds until the quiet window completes (0 = idle); inf while too many requests are pending."""
+        if len(tracker.requests) > self.max_inflight:
+            return float("inf")
+        return max(0.0, max(tracker.changed, start) + self.quiet_s - now)
+
+    def _log(self) -> None:
+        log.info(
+            "  → wait for network_idle quiet=%d ms max_inflight=%d timeout=%d",
+            self.quiet_s * 1000,
+            self.max_inflight,
+            self.timeout,
+        )
+
+    def _timeout_error(self, tracker: _Inflight) -> TimeoutError:
+        return TimeoutError(f"network not idle within {self.timeout} ms ({len(tracker.requests)} request(s) pending)")
+
+    def execute(self, ctx: "Runner") -> None:
+        self._log()
+        page = ctx.page
+        tracker = _inflight(page)
+        start = time.monotonic()
+        deadline = start + self.timeout / 1000.0
+        while True:
+            now = time.monotonic()
+            left = self._left(tracker, start, now)
+            if left <= 0:
+                return
+            if now >= deadline:
+                raise self._timeout_error(tracker)
+            # a driver round trip: lets the sync API dispatch request events meanwhile
+            page.wait_for_timeout(min(left, deadline - now, 0.1) * 1000)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self._log()
+        tracker = _inflight(ctx.page)
+        start = time.monotonic()
+        deadline = start + self.timeout / 1000.0
+        while True:
+            now = time.monotonic()
+            left = self._left(tracker, start, now)
+            if left <= 0:
+                return
+            if now >= deadline:
+                raise self._timeout_error(tracker)
+            await asyncio.sleep(min(left, deadline - now, 0.1))
+
+
+_DOM_STABLE_JS = """([sel, quiet, timeout]) => new Promise((resolve) => {
+  const root = sel ? document.querySelector(sel) : document.documentElement;
+  if (!root) { resolve({ok: false, missing: true, mutations: 0}); return; }
+  let mutations = 0, timer = null, limit = null;
+  const finish = (ok) => { obs.disconnect(); clearTimeout(timer); clearTimeout(limit); resolve({ok, mutations}); };
+  const obs = new MutationObserver((records) => {
+    mutations += records.length;
+    clearTimeout(timer);
+    timer = setTimeout(() => finish(true), quiet);
+  });
+  obs.observe(root, {subtree: true, childList: true, attributes: true, characterData: true});
+  timer = setTimeout(() => finish(true), quiet);
+  limit = setTimeout(() => finish(false), timeout);
+})"""
+
+
+class WaitDomStableAction(Action):
+    """Return once the DOM (or ``selector``'s subtree) had no mutation for ``quiet_ms``; one page round trip."""
+
+    __slots__ = ("timeout", "quiet_ms", "selector")
+    IDEMPOTENT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.timeout = as_int(raw, "timeout", 10000)
+        self.quiet_ms = as_int(raw, "quiet_ms", 300)
+        self.selector: Optional[str] = raw.get("selector")
+
+    def _args(self) -> Any:
+        log.info("  → wait for dom_stable quiet=%d ms root=%s timeout=%d", self.quiet_ms, self.selector, self.timeout)
+        return [self.selector, self.quiet_ms, self.timeout]
+
+    def _check(self, result: Dict[str, Any]) -> None:
+        if result.get("missing"):
+            raise TimeoutError(f"dom_stable root not found: {self.selector}")
+        if not result.get("ok"):
+            raise TimeoutError(f"DOM still changing after {self.timeout} ms ({result.get('mutations')} mutations)")
+
+    def execute(self, ctx: "Runner") -> None:
+        self._check(ctx.page.evaluate(_DOM_STABLE_JS, self._args()))
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self._check(await ctx.page.evaluate(_DOM_STABLE_JS, self._args()))
+
+
+class WaitSelectorAction(Action):
+    """Element conditions: exact ``count``, at least ``min_count`` and/or containing ``text``."""
+
+    __slots__ = ("timeout", "selector", "count", "min_count", "text", "state")
+    IDEMPOTENT = True
+    CHECKPOINT = True
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.timeout = as_int(raw, "timeout", 10000)
+        self.selector = str(raw["selector"])
+        self.count: Optional[int] = int(raw["count"]) if raw.get("count") is not None else None
+        self.min_count = max(1, as_int(raw, "min_count", 1))
+        self.text: Optional[str] = raw.get("text")
+        self.state: Any = raw.get("state") or "attached"
+
+    def _locator(self, page: Any) -> Any:
+        if self.count is not None:
+            log.info("  → wait for %d x %s text=%r timeout=%d", self.count, self.selector, self.text, self.timeout)
+        else:
+            log.info(
+                "  → wait for >=%d x %s text=%r timeout=%d", self.min_count, self.selector, self.text, self.timeout
+            )
+        loc = page.locator(self.selector)
+        return loc.filter(has_text=self.text) if self.text else loc
+
+    def _timeout_error(self) -> TimeoutError:
+        want = f"{self.count}" if self.count is not None else f">={self.min_count}"
+        text = f" containing {self.text!r}" if self.text else ""
+        return TimeoutError(f"expected {want} element(s) {self.selector}{text} within {self.timeout} ms")
+
+    def execute(self, ctx: "Runner") -> None:
+        loc = self._locator(ctx.page)
+        try:
+            if self.count is not None:
+                expect(loc).to_have_count(self.count, timeout=self.timeout)
+            else:
+                loc.nth(self.min_count - 1).wait_for(state=self.state, timeout=self.timeout)
+        except (AssertionError, PlaywrightTimeoutError) as e:
+            raise self._timeout_error() from e
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        loc = self._locator(ctx.page)
+        try:
+            if self.count is not None:
+                await async_expect(loc).to_have_count(self.count, timeout=self.timeout)
+            else:
+                await loc.nth(self.min_count - 1).wait_for(state=self.state, timeout=self.timeout)
+        except (AssertionError, PlaywrightTimeoutError) as e:
+            raise self._timeout_error() from e
+
+
+class WaitResponseAction(Action):
+    """Return when a response whose URL matches (and ``status``, if set) arrives.
+
+    Only responses after the step starts count; with ``trigger`` the selector
+    is clicked after the listener is armed, so a fast response is not missed.
+    The matched response is kept in ``state["last_response"]``.
+    """
+
+    __slots__ = ("timeout", "match", "describe", "status", "trigger")
+    IDEMPOTENT = False
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.timeout = as_int(raw, "timeout", 10000)
+        self.match, self.describe = url_predicate(raw)
+        self.status: Optional[int] = int(raw["status"]) if raw.get("status") is not None else None
+        self.trigger: Optional[str] = raw.get("trigger")
+
+    def _predicate(self, response: Any) -> bool:
+        return bool(self.match(response.url)) and (self.status is None or response.status == self.status)
+
+    def _log(self) -> None:
+        log.info("  → wait for response %s status=%s trigger=%s", self.describe, self.status, self.trigger)
+
+    def _done(self, ctx: Any, response: Any) -> None:
+        ctx.state["last_response"] = {"url": response.url, "status": response.status}
+
+    def _timeout_error(self) -> TimeoutError:
+        return TimeoutError(f"no response {self.describe} within {self.timeout} ms")
+
+    def execute(self, ctx: "Runner") -> None:
+        self._log()
+        page = ctx.page
+        try:
+            if self.trigger:
+                with page.expect_response(self._predicate, timeout=self.timeout) as info:
+                    page.click(self.trigger)
+                response = info.value
+            else:
+                response = page.wait_for_event("response", predicate=self._predicate, timeout=self.timeout)
+        except PlaywrightTimeoutError as e:
+            raise self._timeout_error() from e
+        self._done(ctx, response)
+
+    async def aexecute(self, ctx: "AsyncRunner") -> None:
+        self._log()
+        page = ctx.page
+        try:
+            if self.trigger:
+                async with page.expect_response(self._predicate, timeout=self.timeout) as info:
+                    await page.click(self.trigger)
+                response = await info.value
+            else:
+                response = await page.wait_for_event("response", predicate=self._predicate, timeout=self.timeout)
+        except PlaywrightTimeoutError as e:
+            raise self._timeout_error() from e
+        self._done(ctx, response)
+
+
+WAIT_CONDITIONS: Dict[str, Type[Action]] = {
+    "network_idle": WaitNetworkIdleAction,
+    "dom_stable": WaitDomStableAction,
+    "selector": WaitSelectorAction,
+    "response": WaitResponseAction,
+}
+
+
+@register("wait")
+def _wait(index: int, kind: str, raw: Mapping[str, Any]) -> Action:
+    # {"act": "wait", "timeout": ms} sleeps; with "for" it waits for a condition (timeout = upper bound)
+    condition = raw.get("for")
+    if condition is None:
+        return WaitAction(index, kind, raw)
+    cls = WAIT_CONDITIONS.get(str(condition))
+    if cls is None:
+        raise ValueError(f"wait 'for' must be one of: {', '.join(WAIT_CONDITIONS)}")
+    return cls(index, kind, raw)
@@ -0,0 +1,385 @@
+"""Artifact stores and the per-run background uploader (docs/50-operations.md).
+
+Artifacts are always written locally first (``artifacts/``); a store is
+where finished files are shipped afterwards:
+
+* ``s3://bucket/prefix/`` -- S3-compatible object storage (AWS, MinIO, ...)
+  through boto3, with server-side encryption and multipart uploads.
+* ``file:///srv/wao/`` or a plain path -- a local/NFS directory, for hosts
+  without object storage and for tests.
+
+Every object key starts with the tenant (``options.artifacts.tenant``, else
+the session account), so one bucket never mixes users, and carries its
+expiry (``ttl_days``, default 90) as object metadata and tags that the
+bucket's lifecycle rule (or :meth:`LocalStore.prune`) deletes by.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from . import secrets
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+MIB = 1024 * 1024
+# S3 rejects multipart parts below 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * MIB
+# docs/50-operations.md: signed URLs live at most 15 minutes
+MAX_URL_SECONDS = 900
+MIRROR_KINDS = ("downloads", "screenshots", "failed", "trace")
+SSE_MODES = ("AES256", "aws:kms")
+META_SUFFIX = ".meta.json"
+
+
+def _segment(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", value).strip(".") or "_"
+
+
+def is_remote(value: Any) -> bool:
+    """Whether a DSL path (``to``/``path``) names a store URI rather than a local path."""
+    return isinstance(value, str) and "://" in value
+
+
+class ArtifactStore:
+    """Destination of finished artifact files; ``put`` runs on an uploader thread."""
+
+    def put(self, path: Path, key: str, meta: Mapping[str, str]) -> Dict[str, Any]:
+        """Store ``path`` under ``key``; returns ``{"bytes", "parts"}`` for the trace."""
+        raise NotImplementedError
+
+    def uri(self, key: str) -> str:
+        raise NotImplementedError
+
+
+class LocalStore(ArtifactStore):
+    """A directory tree; each file gets a ``<name>.meta.json`` sidecar with its tenant and expiry."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def put(self, path: Path, key: str, meta: Mapping[str, str]) -> Dict[str, Any]:
+        dest = self.root / key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f"{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, dest)
+        dest.with_name(dest.name + META_SUFFIX).write_text(json.dumps(dict(meta)), encoding="utf-8")
+        return {"bytes": dest.stat().st_size, "parts": 1}
+
+    def uri(self, key: str) -> str:
+        return (self.root / key).resolve().as_uri()
+
+    def prune(self, today: Optional[date] = None) -> int:
+        """Delete files whose ``expires`` date has passed; returns how many were removed."""
+        today = today or date.today()
+        removed = 0
+        for meta in self.root.rglob("*" + META_SUFFIX):
+            try:
+                expires = json.loads(meta.read_text(encoding="utf-8")).get("expires")
+                if expires and date.fromisoformat(expires) < today:
+                    meta.with_name(meta.name[: -len(META_SUFFIX)]).unlink(missing_ok=True)
+                    meta.unlink()
+                    removed += 1
+            except (OSError, ValueError) as e:
+                log.warning("Artifact store: cannot prune %s: %s", meta, e)
+        return removed
+
+
+class S3Store(ArtifactStore):
+    """An S3-compatible bucket, written with server-side encryption.
+
+    Files up to ``part_size`` go in one ``put_object``; larger ones use a
+    multipart upload whose parts are read from disk one at a time, so an
+    upload never holds more than one part in memory. A failed multipart
+    upload is aborted so no orphaned parts are billed.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        client: Any = None,
+        part_size: int = 8 * MIB,
+        sse: str = "AES256",
+        kms_key_id: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+    ) -> None:
+        if sse not in SSE_MODES:
+            raise ValueError(f"artifacts.sse must be one of: {', '.join(SSE_MODES)}")
+        self.bucket = bucket
+        self.part_size = max(MIN_PART_SIZE, int(part_size))
+        self.sse = sse
+        self.kms_key_id = kms_key_id
+        self.endpoint_url = endpoint_url
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        with self._lock:
+            if self._client is None:
+                try:
+                    import boto3
+                except ImportError as e:
+                    raise RuntimeError("s3:// artifact stores need boto3 (pip install boto3)") from e
+                self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+            return self._client
+
+    def _extra(self, meta: Mapping[str, str]) -> Dict[str, Any]:
+        extra: Dict[str, Any] = {
+            "Metadata": dict(meta),
+            "ServerSideEncryption": self.sse,
+            # lifecycle rules filter on tags, not on metadata
+            "Tagging": urlencode({"wao-tenant": meta.get("tenant", ""), "wao-ttl-days": meta.get("ttl-days", "")}),
+        }
+        if self.sse == "aws:kms" and self.kms_key_id:
+            extra["SSEKMSKeyId"] = self.kms_key_id
+        return extra
+
+    def put(self, path: Path, key: str, meta: Mapping[str, str]) -> Dict[str, Any]:
+        client = self.client
+        size = path.stat().st_size
+        extra = self._extra(meta)
+        if size <= self.part_size:
+            with open(path, "rb") as fh:
+                client.put_object(Bucket=self.bucket, Key=key, Body=fh.read(), **extra)
+            return {"bytes": size, "parts": 1}
+        upload_id = client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra)["UploadId"]
+        parts: List[Dict[str, Any]] = []
+        try:
+            with open(path, "rb") as fh:
+                while True:
+                    chunk = fh.read(self.part_size)
+                    if not chunk:
+                        break
+                    number = len(parts) + 1
+                    resp = client.upload_part(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=chunk
+                    )
+                    parts.append({"ETag": resp["ETag"], "PartNumber": number})
+            client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            try:
+                client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except Exception as e:
+                log.warning("Artifact store: abort of s3://%s/%s failed: %s", self.bucket, key, e)
+            raise
+        return {"bytes": size, "parts": len(parts)}
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def signed_url(self, key: str, seconds: int = MAX_URL_SECONDS) -> str:
+        """A GET URL for sharing one object, valid for at most 15 minutes."""
+        return str(
+            self.client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": self.bucket, "Key": key},
+                ExpiresIn=max(1, min(int(seconds), MAX_URL_SECONDS)),
+            )
+        )
+
+
+class ArtifactOptions:
+    """``options.artifacts``: local directory, mirror store, tenant, TTL, encryption and upload pool."""
+
+    __slots__ = (
+        "dir",
+        "store",
+        "mirror",
+        "tenant",
+        "ttl_days",
+        "sse",
+        "kms_key_id",
+        "endpoint_url",
+        "part_size_mb",
+        "max_workers",
+    )
+
+    def __init__(
+        self,
+        dir: str = "artifacts",
+        store: Optional[str] = None,
+        mirror: Optional[List[str]] = None,
+        tenant: str = "default",
+        ttl_days: int = 90,
+        sse: str = "AES256",
+        kms_key_id: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        part_size_mb: int = 8,
+        max_workers: int = 4,
+    ) -> None:
+        mirror = list(MIRROR_KINDS if mirror is None else mirror)
+        unknown = sorted(set(mirror) - set(MIRROR_KINDS))
+        if unknown:
+            raise ValueError(f"artifacts.mirror: unknown kind(s) {', '.join(unknown)}")
+        if sse not in SSE_MODES:
+            raise ValueError(f"artifacts.sse must be one of: {', '.join(SSE_MODES)}")
+        self.dir = dir
+        self.store = store
+        self.mirror = tuple(mirror)
+        self.tenant = _segment(str(tenant))
+        self.ttl_days = max(1, int(ttl_days))
+        self.sse = sse
+        self.kms_key_id = kms_key_id
+        self.endpoint_url = endpoint_url
+        self.part_size_mb = max(5, int(part_size_mb))
+        self.max_workers = max(1, int(max_workers))
+
+    @classmethod
+    def from_flow(cls, dsl: Mapping[str, Any]) -> "ArtifactOptions":
+        """``options.artifacts`` > ``WAO_ARTIFACTS_DIR`` / ``WAO_ARTIFACT_STORE`` / ``WAO_TENANT`` / ``WAO_S3_*``."""
+        opts = dsl.get("options") or {}
+        raw = dict(secrets.resolve(dict(opts.get("artifacts") or {})))
+        env = {
+            "dir": "WAO_ARTIFACTS_DIR",
+            "store": "WAO_ARTIFACT_STORE",
+            "tenant": "WAO_TENANT",
+            "endpoint_url": "WAO_S3_ENDPOINT",
+            "kms_key_id": "WAO_S3_KMS_KEY_ID",
+        }
+        for key, name in env.items():
+            if raw.get(key) is None and secrets.get(name):
+                raw[key] = secrets.get(name)
+        if raw.get("tenant") is None:
+            # docs/50-operations.md: artifacts are separated per user -- the session account by default
+            raw["tenant"] = secrets.resolve((opts.get("session") or {}).get("account", "default"))
+        return cls(**{k: raw[k] for k in cls.__slots__ if raw.get(k) is not None})
+
+
+class ArtifactUploads:
+    """Background uploads of one run's finished files.
+
+    ``submit`` only queues the file: a bounded thread pool ships it while the
+    steps go on, so the step thread never waits on the network, and memory
+    stays under ``max_workers`` x ``part_size``. Each upload is traced as
+    ``artifact_upload``. ``drain`` (called by the runner before ``run_end``)
+    waits for everything queued and returns the errors.
+    """
+
+    def __init__(
+        self,
+        options: ArtifactOptions,
+        run_id: str,
+        trace: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        stores: Optional[Callable[[str], ArtifactStore]] = None,
+    ) -> None:
+        self.options = options
+        self.run_id = run_id
+        self._trace = trace
+        self._make_store = stores or self._default_store
+        self._stores: Dict[str, ArtifactStore] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending: List["Future[Any]"] = []
+        self._errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def _default_store(self, root: str) -> ArtifactStore:
+        parts = urlsplit(root)
+        if parts.scheme == "s3":
+            opts = self.options
+            return S3Store(parts.netloc, None, opts.part_size_mb * MIB, opts.sse, opts.kms_key_id, opts.endpoint_url)
+        if parts.scheme in ("", "file"):
+            return LocalStore(Path(parts.path if parts.scheme else root))
+        raise ValueError(f"unsupported artifact store: {root} (use s3://bucket/prefix or a directory)")
+
+    def target(self, uri: str, filename: str) -> Tuple[ArtifactStore, str]:
+        """The store and tenant-prefixed key for ``uri`` (a trailing ``/`` means "into this folder")."""
+        parts = urlsplit(uri)
+        base = (self.options.store or "").rstrip("/")
+        if parts.scheme == "s3":
+            root, rest = f"s3://{parts.netloc}", parts.path.lstrip("/")
+        elif base and uri.startswith(base + "/"):
+            # a directory store: the tenant goes right under the configured root
+            root, rest = base, uri[len(base) + 1 :]
+        else:
+            root, rest = uri, ""
+        if not rest or rest.endswith("/"):
+            rest += filename
+        with self._lock:
+            store = self._stores.get(root)
+            if store is None:
+                store = self._stores[root] = self._make_store(root)
+        return store, f"{self.options.tenant}/{rest}"
+
+    def _meta(self) -> Dict[str, str]:
+        ttl = self.options.ttl_days
+        return {
+            "tenant": self.options.tenant,
+            "run": self.run_id,
+            "ttl-days": str(ttl),
+            "expires": (date.today() + timedelta(days=ttl)).isoformat(),
+        }
+
+    def submit(self, path: Path, uri: str) -> str:
+        """Queue ``path`` for upload to ``uri``; returns the object's URI at once."""
+        store, key = self.target(uri, path.name)
+        dest = store.uri(key)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.options.max_workers, thread_name_prefix="wao-upload")
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(self._pool.submit(self._upload, store, Path(path), key, dest, self._meta()))
+        return dest
+
+    def mirror(self, path: Path, kind: str) -> Optional[str]:
+        """Ship a locally saved artifact to the configured store (if ``kind`` is mirrored)."""
+        store = self.options.store
+        if not store or kind not in self.options.mirror:
+            return None
+        return self.submit(path, f"{store.rstrip('/')}/{self.run_id}/{kind}/")
+
+    def _upload(self, store: ArtifactStore, path: Path, key: str, dest: str, meta: Dict[str, str]) -> None:
+        t0 = time.perf_counter()
+        payload: Dict[str, Any] = {"uri": dest, "path": str(path)}
+        try:
+            payload.update(store.put(path, key, meta))
+            payload["ok"] = True
+            log.info("Artifact uploaded: %s", dest)
+        except Exception as e:
+            payload.update(ok=False, error=str(e))
+            log.error("Artifact upload failed (%s): %s", dest, e)
+            with self._lock:
+                self._errors.append(f"upload of {path} to {dest} failed: {e}")
+        payload["ms"] = int((time.perf_counter() - t0) * 1000)
+        if self._trace is not None:
+            self._trace("artifact_upload", payload)
+
+    def drain(self, timeout: Optional[float] = None) -> List[str]:
+        """Wait for every queued upload; returns (and clears) the upload errors."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            _, not_done = wait(pending, timeout=timeout)
+            if not_done:
+                with self._lock:
+                    self._errors.append(f"{len(not_done)} artifact upload(s) still running after {timeout}s")
+        with self._lock:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def ship_trace(self, path: Path) -> None:
+        """Upload the closed run trace, wait for it and stop the pool (the run is over; nothing is traced)."""
+        if path.exists() and self.mirror(path, "trace") is not None:
+            for err in self.drain():
+                log.error("%s", err)
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+from . import secrets
+from .actions import Action, StepCompileError, compile_steps
+from .actions.waits import track_requests, uses_network_idle
+from .artifact_store import ArtifactOptions, ArtifactUploads
+from .capture import CaptureOptions, FailureCapture
+from .downloads import DownloadStore
+from .logging_setup import get_logger
+from .network import NetworkPolicy
+from .policies import RetryPlan
+from .profiling import ProfileOptions, StepProfiler
+from .session_cache import SessionPlan
+from .templating import Scope
+from .trace import TraceSink
+
+log = get_logger(__name__)
+
+
+class FlowAssertionError(AssertionError):
+    """assert_title / verify_file failure (the sync Runner exits with status 1 instead)."""
+
+
+class AsyncRunner:
+    """Runs a flow DSL on ``playwright.async_api``.
+
+    Step semantics match :class:`wao.runner.Runner`, but every wait yields to the
+    event loop, so one process can drive many flows concurrently. Pass a shared
+    ``browser`` to give each runner only its own context (see :func:`run_many`).
+    """
+
+    def __init__(self, dsl: Dict[str, Any], browser: Optional[Browser] = None):
+        self.dsl = dsl
+        self.state: Dict[str, Any] = {}
+        # {{var}} lookups: loop frames (foreach) over state
+        self.vars = Scope(self.state)
+        self.artifact_options = ArtifactOptions.from_flow(self.dsl)
+        self.artifacts_dir = Path(self.artifact_options.dir)
+        self.failed_dir = self.artifacts_dir / "failed"
+        self.downloads_dir = self.artifacts_dir / "downloads"
+        self.trace_dir = self.artifacts_dir / "trace"
+        for d in (self.artifacts_dir, self.failed_dir, self.downloads_dir):
+            d.mkdir(parents=True, exist_ok=True)
+        self._tracer = TraceSink.for_run(self.trace_dir, (self.dsl.get("options") or {}).get("trace"))
+        self.trace_path = self._tracer.path
+        self.uploads = ArtifactUploads(self.artifact_options, self.trace_path.name.split(".")[0], self._trace)
+
+        self._shared_browser = browser
+        self._pw: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._context: Optional[BrowserContext] = None
+        self._page: Optional[Page] = None
+
+        _opts = self.dsl.get("options") or {}
+        _opt_ignore = _opts.get("ignore_https_errors")
+        if _opt_ignore is not None:
+            self.ignore_https_errors = bool(_opt_ignore)
+        else:
+            _env_val = secrets.get("WAO_IGNORE_HTTPS_ERRORS", "0") or "0"
+            self.ignore_https_errors = str(_env_val).strip().lower() in {"1", "true", "on", "yes"}
+        self._network = NetworkPolicy.from_options(_opts.get("network"), self.dsl.get("site"))
+
+        # Same compiled plan as the sync Runner; reject actions without an async handler up front
+        self._plan: List[Action] = compile_steps(self.dsl.get("steps", []))
+        for action in self._plan:
+            if not action.supports_async():
+                raise StepCompileError(f"step {action.index}: act '{action.kind}' is not supported by AsyncRunner")
+        self._track_network = uses_network_idle(self.dsl.get("steps"))
+        self._session = SessionPlan.from_flow(self.dsl, self._plan, self.artifacts_dir / "sessions")
+        self.download_store = DownloadStore.from_flow(self.dsl, self.downloads_dir)
+        self._probing = False
+        self._retries = RetryPlan(self._plan, _opts.get("retry"))
+        self._capture = FailureCapture(
+            self.failed_dir, CaptureOptions.from_options(_opts.get("failure_artifacts")), self._trace
+        )
+        self._deferred: List[Tuple[str, "Future[Any]", Callable[[Any], Optional[str]]]] = []
+        self._trace_scope: Dict[str, Any] = {}
+        _profile = ProfileOptions.from_options(_opts.get("profile"))
+        self._profiler = (
+            StepProfiler(_profile, str(self.dsl.get("site", "-")), self._trace) if _profile.enabled else None
+        )
+        if self._session is not None and not all(a.supports_async() for a in self._session.probe):
+            raise StepCompileError("options.session.probe uses an act not supported by AsyncRunner")
+
+    # ---- lifecycle ----
+    async def _start(self) -> None:
+        browser = self._shared_browser
+        if browser is None:
+            self._pw = await async_playwright().start()
+            self._browser = browser = await self._pw.chromium.launch(headless=True)
+        context_options: Dict[str, Any] = {
+            "accept_downloads": True,
+            "ignore_https_errors": self.ignore_https_errors,
+        }
+        if self._session is not None and self._session.state is not None:
+            context_options["storage_state"] = self._session.state
+        self._context = await browser.new_context(**context_options)
+        log.info("Browser context: ignore_https_errors=%s", self.ignore_https_errors)
+        if self._network is not None:
+            await self._network.install_async(self._context)
+        self._page = await self._context.new_page()
+        if self._track_network:
+            track_requests(self._page)
+        if self._profiler is not None:
+            await self._profiler.aattach(self._context, self._page)
+
+    async def _stop(self) -> None:
+        if self._context is not None:
+            try:
+                await self._context.close()
+            except Exception:
+                pass
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+        if self._pw is not None:
+            await self._pw.stop()
+
+    def _page_req(self) -> Page:
+        if self._page is None:
+            raise RuntimeError("Playwright page not initialized")
+        return self._page
+
+    @property
+    def page(self) -> Page:
+        return self._page_req()
+
+    async def fail(self, reason: str, message: str) -> None:
+        """Assertion-style failure (assert_title / verify_file): save artifacts and raise."""
+        if self._probing:
+            raise FlowAssertionError(message)
+        await self._save_failure_artifacts(reason=reason)
+        raise FlowAssertionError(message)
+
+    def _trace(self, kind: str, payload: Dict[str, Any], encoded: Optional[Dict[str, str]] = None) -> None:
+        self._tracer.write(kind, payload, encoded)
+
+    @asynccontextmanager
+    async def _step_scope(self, action: Action) -> AsyncIterator[None]:
+        idx = action.index
+        t0 = time.perf_counter()
+        self._trace("step_start", {"i": idx, **self._trace_scope}, {"step": action.trace_json()})
+        prof = self._profiler
+        snap = await prof.abegin() if prof is not None else None
+        try:
+            yield
+        except Exception as e:
+            ms = int((time.perf_counter() - t0) * 1000)
+            if prof is not None and snap is not None:
+                await prof.aend(snap, action, self._page, False)
+            self._trace("step_err", {"i": idx, **self._trace_scope, "ms": ms, "url": self._url(), "error": str(e)})
+            raise
+        ms = int((time.perf_counter() - t0) * 1000)
+        if prof is not None and snap is not None:
+            await prof.aend(snap, action, self._page, True)
+        self._trace("step_ok", {"i": idx, **self._trace_scope, "ms": ms, "url": self._url()})
+
+    def _url(self) -> str:
+        try:
+            return getattr(self._page, "url", "") or ""
+        except Exception:
+            return ""
+
+    def defer(self, reason: str, future: "Future[Any]", check: Callable[[Any], Optional[str]]) -> None:
+        """Register background work (e.g. verify_file hashing) that is checked before run_end."""
+        self._deferred.append((reason, future, check))
+
+    async def _join_deferred(self) -> None:
+        while self._deferred:
+            reason, future, check = self._deferred.pop(0)
+            msg = check(await asyncio.wrap_future(future))
+            if msg is not None:
+                await self.fail(reason, msg)
+        errors = await asyncio.to_thread(self.uploads.drain)
+        if errors:
+            raise RuntimeError("; ".join(errors))
+
+    def _retry_point(self, pos: int, exc: BaseException) -> Optional[Tuple[int, float]]:
+        """Resume position and backoff after a failed step (traced as step_retry), or None to fail the run."""
+        decision = self._retries.on_error(pos, exc)
+        if decision is None:
+            return None
+        resume, delay, payload = decision
+        action, target = self._plan[pos], self._plan[resume]
+        log.warning(
+            "Step %d failed (%s): attempt %d/%d from step %d in %.1fs",
+            action.index,
+            exc,
+            payload["attempt"],
+            payload["max_attempts"],
+            target.index,
+            delay,
+        )
+        self._trace("step_retry", {"i": action.index, "resume_at": target.index, **payload})
+        return resume, delay
+
+    async def _probe_session(self, session: SessionPlan) -> bool:
+        t0 = time.perf_counter()
+        self._probing = True
+        try:
+            for action in session.probe:
+                await action.aexecute(self)
+        except Exception as e:
+            log.info("Cached session rejected by probe: %s", e)
+            self._trace("session_probe", {"ok": False, "ms": int((time.perf_counter() - t0) * 1000)})
+            await asyncio.to_thread(session.cache.invalidate, session.site, session.account)
+            if self._context is not None:
+                await self._context.clear_cookies()
+            return False
+        finally:
+            self._probing = False
+        log.info("Cached session reused: login steps skipped")
+        self._trace("session_probe", {"ok": True, "ms": int((time.perf_counter() - t0) * 1000)})
+        return True
+
+    async def _save_session(self, session: SessionPlan) -> None:
+        try:
+            if self._context is not None:
+                state = await self._context.storage_state()
+                await asyncio.to_thread(session.cache.save, session.site, session.account, state, session.started_at)
+        except Exception as e:
+            log.warning("Could not save session cache: %s", e)
+
+    async def run(self) -> None:  # noqa: C901
+        log.info("Run started: site=%s version=%s", self.dsl.get("site", "-"), self.dsl.get("version", "-"))
+        self._trace("run_start", {"site": self.dsl.get("site", "-"), "version": self.dsl.get("version", "-")})
+        run_status = "ok"
+        run_error = None
+        try:
+            await self._start()
+            session = self._session
+            if session is not None and session.state is not None:
+                session.reused = await self._probe_session(session)
+            pos = 0
+            while pos < len(self._plan):
+                action = self._plan[pos]
+                if session is not None and session.skip(action.index):
+                    log.info("Step %d: act=%s (skipped: cached session)", action.index, action.kind)
+                    self._trace("step_skip", {"i": action.index, "reason": "session"})
+                    pos += 1
+                    continue
+                log.info("Step %d: act=%s", action.index, action.kind)
+                try:
+                    async with self._step_scope(action):
+                        await action.aexecute(self)
+                    if session is not None and not session.reused and action.index == session.last_login:
+                        await self._save_session(session)
+                except FlowAssertionError as e:
+                    run_status, run_error = "error", str(e)
+                    raise
+                except Exception as e:
+                    retry = self._retry_point(pos, e)
+                    if retry is not None:
+                        await asyncio.sleep(retry[1])
+                        pos = retry[0]
+                        continue
+                    log.error("Step %d failed: %s", action.index, e)
+                    run_status, run_error = "error", str(e)
+                    await self._save_failure_artifacts(reason="step")
+                    raise
+                pos += 1
+            try:
+                await self._join_deferred()
+            except FlowAssertionError as e:
+                run_status, run_error = "error", str(e)
+                raise
+            except Exception as e:
+                log.error("Background check failed: %s", e)
+                run_status, run_error = "error", str(e)
+                await self._save_failure_artifacts(reason="step")
+                raise
+        except BaseException as e:
+            # browser start / session probe failures and cancellation end the run too
+            run_status, run_error = "error", str(e) or type(e).__name__
+            raise
+        finally:
+            if self._network is not None:
+                self._trace("network", self._network.stats())
+            try:
+                await self._stop()
+            finally:
+                await asyncio.to_thread(self._capture.flush)
+                for path in self._capture.saved:
+                    self.uploads.mirror(path, "failed")
+                for err in await asyncio.to_thread(self.uploads.drain):
+                    log.error("%s", err)
+                if self._profiler is not None:
+                    await asyncio.to_thread(self._profiler.finish, run_status)
+                payload: Dict[str, Any] = {"status": run_status}
+                if run_error:
+                    payload["error"] = run_error
+                self._trace("run_end", payload)
+                # drain + fsync so run_end is durable
+                self._tracer.close()
+                await asyncio.to_thread(self.uploads.ship_trace, self.trace_path)
+        log.info("Run finished")
+
+    # ---- helpers ----
+    async def _save_failure_artifacts(self, reason: str = "error") -> None:
+        if self._page is not None:
+            await self._capture.acapture(self._page, reason)
+
+
+async def run_flow(dsl: Dict[str, Any], browser: Optional[Browser] = None) -> None:
+    """Run one flow; with ``browser`` given, only a new context is created on it."""
+    await AsyncRunner(dsl, browser=browser).run()
+
+
+async def run_many(
+    flows: Sequence[Dict[str, Any]],
+    concurrency: int = 10,
+    headless: bool = True,
+) -> List[Optional[BaseException]]:
+    """Run flows concurrently on one event loop and one shared Chromium.
+
+    At most ``concurrency`` flows are in flight. Returns one entry per flow:
+    ``None`` on success, else the exception that failed it.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=headless)
+        try:
+
+            async def _one(dsl: Dict[str, Any]) -> None:
+                async with sem:
+                    await run_flow(dsl, browser=browser)
+
+            results = await asyncio.gather(*(_one(f) for f in flows), return_exceptions=True)
+        finally:
+            await browser.close()
+    return [r if isinstance(r, BaseException) else None for r in results]
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import glob
+import multiprocessing
+import queue
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import urlparse
+
+from . import secrets
+from .logging_setup import get_logger
+from .validator import FlowValidationError, validate_flow
+
+log = get_logger(__name__)
+
+MODES = ("thread", "process")
+
+
+@dataclass
+class FlowResult:
+    path: str
+    site: str
+    status: str  # "ok" | "failed" | "invalid"
+    duration_s: float = 0.0
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+@dataclass
+class FlowJob:
+    """One validated flow to run: its input position, path, site and (optional) ``state["params"]``."""
+
+    index: int
+    path: str
+    site: str
+    flow: Dict[str, Any]
+    params: Optional[Dict[str, Any]] = None
+
+
+def collect_flows(target: str) -> List[Path]:
+    """Expand a directory (``*.json``, schema files excluded) or a glob into flow paths."""
+    p = Path(target)
+    if p.is_dir():
+        found = sorted(p.glob("*.json"))
+    else:
+        found = sorted(Path(x) for x in glob.glob(target, recursive=True))
+    return [f for f in found if f.is_file() and not f.name.startswith("schema.")]
+
+
+def flow_site(flow: Dict[str, Any]) -> str:
+    """The flow's ``site`` field, else the host of its first open_url step."""
+    site = flow.get("site")
+    if site:
+        return str(site)
+    for step in flow.get("steps") or []:
+        if (step.get("act") or step.get("action")) in ("open_url", "goto") and step.get("url"):
+            host = urlparse(str(secrets.resolve(step["url"]))).hostname
+            if host:
+                return host
+    return "-"
+
+
+def execute_flow(job: FlowJob, pool: Any) -> FlowResult:
+    """Run one flow on a context leased from ``pool``; failures become a "failed" result, never an exception."""
+    # Imported here so that process workers only pay for Playwright when they run
+    from .runner import Runner
+
+    t0 = time.perf_counter()
+    try:
+        runner = Runner(job.flow, pool=pool)
+        if job.params is not None:
+            runner.state["params"] = dict(job.params)
+        runner.run()
+        status, error = "ok", ""
+    except SystemExit as e:  # assert_title / verify_file exit(1)
+        status, error = ("ok", "") if not e.code else ("failed", f"exit code {e.code}")
+    except Exception as e:
+        status, error = "failed", str(e)
+    return FlowResult(job.path, job.site, status, time.perf_counter() - t0, error)
+
+
+def _worker(jobs: Any, results: Any) -> None:
+    """Worker loop: one warm browser per worker, a fresh context per flow."""
+    from .browser_pool import BrowserPool
+
+    pool = BrowserPool.from_env(size=1)
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            results.put((job.index, execute_flow(job, pool)))
+    finally:
+        pool.close()
+
+
+class _Worker:
+    """A worker thread/process with its own job queue, so the dispatcher knows which job each one holds."""
+
+    def __init__(self, mode: str, done: Any) -> None:
+        if mode == "process":
+            ctx = multiprocessing.get_context("spawn")
+            self.jobs: Any = ctx.Queue()
+            self.proc: Any = ctx.Process(target=_worker, args=(self.jobs, done), daemon=True)
+        else:
+            self.jobs = queue.Queue()
+            self.proc = threading.Thread(target=_worker, args=(self.jobs, done), daemon=True)
+        self.job: Optional[FlowJob] = None
+        self.proc.start()
+
+    @property
+    def idle(self) -> bool:
+        return self.job is None and self.proc.is_alive()
+
+
+def run_many(  # noqa: C901
+    paths: List[Path],
+    workers: int = 4,
+    mode: str = "thread",
+    per_site: int = 1,
+) -> List[FlowResult]:
+    """Run flows concurrently on ``workers`` threads/processes.
+
+    At most ``per_site`` flows of the same site run at once; the dispatcher holds
+    back further jobs for that site until one finishes. Invalid flows are reported
+    without being dispatched. A worker that dies (e.g. a crashed process) fails the
+    flow it was running and is replaced. Results are returned in input order.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+    per_site = max(1, per_site)
+
+    results: List[Optional[FlowResult]] = [None] * len(paths)
+    pending: Deque[FlowJob] = deque()
+    for i, p in enumerate(paths):
+        try:
+            flow = validate_flow(str(p))
+        except (FlowValidationError, OSError, ValueError) as e:
+            results[i] = FlowResult(str(p), "-", "invalid", error=str(e))
+            continue
+        pending.append(FlowJob(i, str(p), flow_site(flow), flow))
+    if not pending:
+        return [r for r in results if r is not None]
+
+    done: Any = multiprocessing.get_context("spawn").Queue() if mode == "process" else queue.Queue()
+    pool = [_Worker(mode, done) for _ in range(min(max(1, workers), len(pending)))]
+    running: Counter[str] = Counter()
+    inflight: Dict[int, FlowJob] = {}
+    try:
+        while pending or inflight:
+            # Dispatch every job whose site still has headroom to an idle worker, keeping input order
+            for job in list(pending):
+                worker = next((w for w in pool if w.idle), None)
+                if worker is None:
+                    break
+                if running[job.site] < per_site:
+                    pending.remove(job)
+                    running[job.site] += 1
+                    inflight[job.index] = worker.job = job
+                    worker.jobs.put(job)
+            try:
+                index, res = done.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            else:
+                for w in pool:
+                    if w.job is not None and w.job.index == index:
+                        w.job = None
+                finished = inflight.pop(index, None)
+                if finished is not None:  # else already failed as "worker died"
+                    running[finished.site] -= 1
+                    results[index] = res
+                    log.info("[%s] %s (%.1fs)", res.status.upper(), res.path, res.duration_s)
+            for i, w in enumerate(pool):
+                if w.job is None or w.proc.is_alive():
+                    continue
+                job, w.job = w.job, None
+                inflight.pop(job.index, None)
+                running[job.site] -= 1
+                results[job.index] = FlowResult(job.path, job.site, "failed", error="worker died")
+                log.warning("[FAILED] %s: worker died", job.path)
+                if pending:
+                    pool[i] = _Worker(mode, done)
+            if not any(w.proc.is_alive() for w in pool):
+                for job in [*inflight.values(), *pending]:
+                    results[job.index] = FlowResult(job.path, job.site, "failed", error="worker died")
+                break
+    finally:
+        for w in pool:
+            w.jobs.put(None)
+        for w in pool:
+            w.proc.join(timeout=30)
+    return [r for r in results if r is not None]
+
+
+def summarize(results: List[FlowResult]) -> str:
+    lines = [f"[{r.status.upper():7}] {r.duration_s:7.1f}s  {r.site:24} {r.path}" for r in results]
+    for r in results:
+        if r.error:
+            lines.append(f"  {r.path}: {r.error}")
+    ok = sum(1 for r in results if r.ok)
+    wall = sum(r.duration_s for r in results)
+    lines.append(f"{ok}/{len(results)} flows succeeded (sum of run times {wall:.1f}s)")
+    return "\n".join(lines)
+
+
+def exit_code(results: List[FlowResult]) -> int:
+    """0 when every flow succeeded, 1 otherwise (invalid flows count as failures)."""
+    return 0 if results and all(r.ok for r in results) else 1
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from playwright.sync_api import Browser, BrowserContext, Playwright, sync_playwright
+
+from . import secrets
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(secrets.get(key) or default)
+    except ValueError:
+        return default
+
+
+def _env_flag(key: str) -> bool:
+    return str(secrets.get(key, "0") or "0").strip().lower() in {"1", "true", "on", "yes"}
+
+
+class _PooledBrowser:
+    """Bookkeeping for one launched Chromium instance."""
+
+    __slots__ = ("browser", "born", "served", "active", "retiring")
+
+    def __init__(self, browser: Browser) -> None:
+        self.browser = browser
+        self.born = time.monotonic()
+        self.served = 0
+        self.active = 0
+        self.retiring = False
+
+    def healthy(self) -> bool:
+        try:
+            return bool(self.browser.is_connected())
+        except Exception:
+            return False
+
+
+class BrowserLease:
+    """An isolated BrowserContext checked out from a BrowserPool."""
+
+    __slots__ = ("context", "_slot")
+
+    def __init__(self, context: BrowserContext, slot: _PooledBrowser) -> None:
+        self.context = context
+        self._slot = slot
+
+
+class _Helper:
+    """A long-lived thread with its own one-browser pool (see :meth:`BrowserPool.run_threads`)."""
+
+    def __init__(self, parent: "BrowserPool", k: int) -> None:
+        self.pool = BrowserPool(
+            1, parent.max_contexts, parent.max_age_s, parent.headless, launch_options=parent.launch_options
+        )
+        self._calls: "queue.SimpleQueue[Optional[Tuple[Callable[[BrowserPool], None], Future[None]]]]"
+        self._calls = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name=f"wao-branch-{k}", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn: Callable[["BrowserPool"], None]) -> "Future[None]":
+        fut: "Future[None]" = Future()
+        self._calls.put((fn, fut))
+        return fut
+
+    def stop(self) -> None:
+        self._calls.put(None)
+
+    def _run(self) -> None:
+        try:
+            while True:
+                item = self._calls.get()
+                if item is None:
+                    return
+                fn, fut = item
+                try:
+                    fn(self.pool)
+                except BaseException as e:
+                    fut.set_exception(e)
+                else:
+                    fut.set_result(None)
+        finally:
+            self.pool.close()  # on its own thread, as the sync API requires
+
+
+class BrowserPool:
+    """Long-lived Chromium instances that hand out fresh BrowserContexts.
+
+    Each ``acquire()`` returns a brand-new context (no cookies/storage shared with
+    previous runs); only the browser process is reused. Browsers are recycled once
+    they served ``max_contexts`` contexts or are older than ``max_age_s`` seconds,
+    and dropped as soon as a health check finds them disconnected.
+
+    Playwright's sync API is thread-affine: a pool must be used from the thread
+    that started it. Use one pool per worker thread/process; work that needs
+    browsers on several threads at once goes through :meth:`run_threads`.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        max_contexts: int = 100,
+        max_age_s: float = 1800.0,
+        headless: bool = True,
+        prewarm: bool = False,
+        launch_options: Optional[Dict[str, Any]] = None,
+        playwright: Optional[Playwright] = None,
+    ) -> None:
+        if size < 1:
+            raise ValueError("BrowserPool size must be >= 1")
+        self.size = size
+        self.max_contexts = max_contexts
+        self.max_age_s = max_age_s
+        self.headless = headless
+        self.prewarm = prewarm
+        self.launch_options: Dict[str, Any] = dict(launch_options or {})
+        self._pw: Optional[Playwright] = playwright
+        self._owns_pw = playwright is None
+        self._slots: List[_PooledBrowser] = []
+        self._owner: Optional[int] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._helpers: List[_Helper] = []
+        self.launched = 0
+
+    @classmethod
+    def from_env(cls, **overrides: Any) -> "BrowserPool":
+        """Build a pool from WAO_POOL_* environment variables (explicit kwargs win)."""
+        kwargs: Dict[str, Any] = {
+            "size": _env_int("WAO_POOL_SIZE", 1),
+            "max_contexts": _env_int("WAO_POOL_MAX_CONTEXTS", 100),
+            "max_age_s": float(_env_int("WAO_POOL_MAX_AGE_S", 1800)),
+            "prewarm": _env_flag("WAO_POOL_PREWARM"),
+        }
+        kwargs.update(overrides)
+        return cls(**kwargs)
+
+    # ---- lifecycle ----
+    def start(self) -> "BrowserPool":
+        if self._owner is not None:
+            return self
+        self._owner = threading.get_ident()
+        if self._pw is None:
+            self._pw = sync_playwright().start()
+        if self.prewarm:
+            with self._lock:
+                while len(self._slots) < self.size:
+                    self._slots.append(self._launch())
+            log.info("Browser pool pre-warmed: %d browser(s)", len(self._slots))
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            slots, self._slots = self._slots, []
+            helpers, self._helpers = self._helpers, []
+            self._closed = True
+        for h in helpers:
+            h.stop()
+        for h in helpers:
+            h.thread.join(timeout=30)
+        for slot in slots:
+            self._close_browser(slot)
+        if self._pw is not None and self._owns_pw:
+            try:
+                self._pw.stop()
+            except Exception:
+                pass
+        self._pw = None
+
+    def __enter__(self) -> "BrowserPool":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ---- leasing ----
+    def acquire(self, **context_options: Any) -> BrowserLease:
+        """Check out a fresh, isolated context (kwargs go to ``browser.new_context``)."""
+        self.start()
+        self._check_thread()
+        if self._closed:
+            raise RuntimeError("BrowserPool is closed")
+        # One retry: a browser may die between the health check and new_context().
+        for attempt in (1, 2):
+            with self._lock:
+                self._reap()
+                slot = self._pick()
+                slot.active += 1
+            try:
+                context = slot.browser.new_context(**context_options)
+            except Exception as e:
+                with self._lock:
+                    slot.active -= 1
+                    slot.retiring = True
+                    drop = slot.active == 0 and slot in self._slots
+                    if drop:
+                        self._slots.remove(slot)
+                if drop:
+                    self._close_browser(slot)
+                log.warning("Browser pool: new_context failed (attempt %d): %s", attempt, e)
+                if attempt == 2:
+                    raise
+                continue
+            with self._lock:
+                slot.served += 1
+                if self._expired(slot):
+                    slot.retiring = True
+            return BrowserLease(context, slot)
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    def release(self, lease: BrowserLease) -> None:
+        """Close the leased context and recycle its browser when due."""
+        try:
+            lease.context.close()
+        except Exception:
+            pass
+        slot = lease._slot
+        with self._lock:
+            slot.active = max(0, slot.active - 1)
+            drop = (slot.retiring or self._closed) and slot.active == 0
+            if drop and slot in self._slots:
+                self._slots.remove(slot)
+        if drop:
+            self._close_browser(slot)
+
+    def run_threads(self, fn: Callable[["BrowserPool"], None], n: int) -> None:
+        """Run ``fn(pool)`` on ``n`` helper threads at once and wait for all of them.
+
+        This pool's browsers cannot serve other threads, so each helper thread
+        owns a one-browser pool with the same recycling limits. Helpers live
+        until :meth:`close`, so ``parallel`` branches reuse their warm browsers
+        across groups and runs instead of launching Chromium every time.
+        """
+        self._check_thread()
+        if self._closed:
+            raise RuntimeError("BrowserPool is closed")
+        with self._lock:
+            while len(self._helpers) < n:
+                self._helpers.append(_Helper(self, len(self._helpers)))
+            helpers = self._helpers[:n]
+        for fut in [h.submit(fn) for h in helpers]:
+            fut.result()
+
+    def health_check(self) -> int:
+        """Drop disconnected/expired idle browsers; returns the number still alive."""
+        self._check_thread()
+        with self._lock:
+            self._reap()
+            return len(self._slots)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "browsers": len(self._slots),
+                "active": sum(s.active for s in self._slots),
+                "launched": self.launched,
+            }
+
+    # ---- internals (call with self._lock held) ----
+    def _pick(self) -> _PooledBrowser:
+        live = [s for s in self._slots if not s.retiring]
+        idle = [s for s in live if s.active == 0]
+        if idle:
+            return idle[0]
+        if len(live) < self.size:
+            slot = self._launch()
+            self._slots.append(slot)
+            return slot
+        # Pool is saturated: share the least-loaded browser (contexts stay isolated).
+        return min(live, key=lambda s: s.active)
+
+    def _reap(self) -> None:
+        for slot in list(self._slots):
+            if not slot.healthy():
+                log.warning("Browser pool: dropping disconnected browser")
+                self._slots.remove(slot)
+                self._close_browser(slot)
+            elif slot.retiring or self._expired(slot):
+                slot.retiring = True
+                if slot.active == 0:
+                    self._slots.remove(slot)
+                    self._close_browser(slot)
+
+    def _expired(self, slot: _PooledBrowser) -> bool:
+        if self.max_contexts and slot.served >= self.max_contexts:
+            return True
+        return bool(self.max_age_s) and (time.monotonic() - slot.born) >= self.max_age_s
+
+    def _launch(self) -> _PooledBrowser:
+        if self._pw is None:
+            raise RuntimeError("BrowserPool not started")
+        browser = self._pw.chromium.launch(headless=self.headless, **self.launch_options)
+        self.launched += 1
+        log.info("Browser pool: launched browser #%d", self.launched)
+        return _PooledBrowser(browser)
+
+    def _check_thread(self) -> None:
+        if self._owner is not None and self._owner != threading.get_ident():
+            raise RuntimeError("BrowserPool must be used from the thread that started it")
+
+    @staticmethod
+    def _close_browser(slot: _PooledBrowser) -> None:
+        try:
+            slot.browser.close()
+        except Exception:
+            pass
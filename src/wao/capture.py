@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .logging_setup import get_logger
+from .session_cache import file_lock
+
+log = get_logger(__name__)
+
+INDEX_NAME = "index.json"
+# Volatile tokens (ids, timestamps, CSRF nonces) that would make every failure page unique
+_VOLATILE = re.compile(rb"[0-9a-fA-F]{16,}|\d+")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _writer() -> ThreadPoolExecutor:
+    """The process-wide ``wao-artifacts`` writer; drained at interpreter exit."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wao-artifacts")
+            atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+class CaptureOptions:
+    """``options.failure_artifacts``: formats, size caps and de-duplication of failure captures."""
+
+    __slots__ = (
+        "screenshot",
+        "full_page",
+        "quality",
+        "html",
+        "max_screenshot_bytes",
+        "max_html_bytes",
+        "dedupe_window_s",
+        "background",
+    )
+
+    def __init__(
+        self,
+        screenshot: str = "png",
+        full_page: bool = True,
+        quality: int = 70,
+        html: str = "plain",
+        max_screenshot_bytes: int = 5 * 1024 * 1024,
+        max_html_bytes: int = 2 * 1024 * 1024,
+        dedupe_window_s: float = 0.0,
+        background: bool = True,
+    ) -> None:
+        if screenshot not in ("png", "jpeg", "none"):
+            raise ValueError("failure_artifacts.screenshot must be png, jpeg or none")
+        if html not in ("plain", "gzip", "none"):
+            raise ValueError("failure_artifacts.html must be plain, gzip or none")
+        self.screenshot = screenshot
+        self.full_page = full_page
+        self.quality = max(1, min(100, int(quality)))
+        self.html = html
+        self.max_screenshot_bytes = int(max_screenshot_bytes)
+        self.max_html_bytes = int(max_html_bytes)
+        self.dedupe_window_s = float(dedupe_window_s)
+        self.background = background
+
+    @classmethod
+    def from_options(cls, raw: Optional[Mapping[str, Any]]) -> "CaptureOptions":
+        return cls(**{k: raw[k] for k in cls.__slots__ if k in raw}) if raw else cls()
+
+    def screenshot_attempts(self) -> List[Dict[str, Any]]:
+        """``page.screenshot`` kwargs to try in order until one fits ``max_screenshot_bytes``."""
+        if self.screenshot == "none":
+            return []
+        first: Dict[str, Any] = {"type": self.screenshot, "full_page": self.full_page}
+        if self.screenshot == "jpeg":
+            first["quality"] = self.quality
+        attempts = [first, {**first, "full_page": False}, {"type": "jpeg", "quality": 40, "full_page": False}]
+        unique: List[Dict[str, Any]] = []
+        for a in attempts:
+            if a not in unique:
+                unique.append(a)
+        return unique
+
+
+def dom_key(html: bytes) -> str:
+    """Hash of the page with volatile tokens collapsed, so repeats of the same failure match."""
+    return hashlib.sha1(_VOLATILE.sub(b"#", html)).hexdigest()
+
+
+def truncate(data: bytes, limit: int) -> bytes:
+    if limit <= 0 or len(data) <= limit:
+        return data
+    return data[:limit] + f"\n<!-- wao: truncated {len(data) - limit} bytes -->\n".encode()
+
+
+class FailureCapture:
+    """Screenshot + HTML capture for failed steps, written off the critical path.
+
+    The page is read on the caller's (Playwright) thread; compression, file
+    writes and the persisted de-duplication index (``failed/index.json``) are
+    handled by a single background writer. A failure whose normalized DOM (or
+    screenshot) matches one captured within ``dedupe_window_s`` only bumps the
+    index counter, skipping the screenshot entirely when the DOM already
+    matched. The window runs from the last capture that wrote files, so a
+    failure that keeps recurring is captured again once per window.
+    ``flush()`` waits for this capture's pending writes; the writer is also
+    drained at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        failed_dir: Path,
+        options: Optional[CaptureOptions] = None,
+        trace: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> None:
+        self.failed_dir = Path(failed_dir)
+        self.options = options or CaptureOptions()
+        self._trace = trace
+        self.index_path = self.failed_dir / INDEX_NAME
+        # files written so far (the runner mirrors them to the artifact store)
+        self.saved: List[Path] = []
+        self._recent: Dict[str, float] = {}  # keys captured by this process, not yet necessarily on disk
+        self._pending: List["Future[None]"] = []
+        self._lock = threading.Lock()
+
+    # ---- index ----
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _seen(self, keys: List[str], now: float) -> Optional[str]:
+        window = self.options.dedupe_window_s
+        if window <= 0:
+            return None
+        with self._lock:
+            for k in keys:
+                if now - self._recent.get(k, 0.0) < window:
+                    return k
+        index = self._read_index()
+        for k in keys:
+            entry = index.get(k)
+            if isinstance(entry, dict) and now - float(entry.get("captured", 0)) < window:
+                return k
+        return None
+
+    def _update_index(self, keys: List[str], reason: str, files: List[str], now: float) -> None:
+        """Count an occurrence of each key; a capture that wrote ``files`` restarts the key's window."""
+        window = self.options.dedupe_window_s
+        with file_lock(self.index_path):
+            index = self._read_index()
+            # drop entries that can no longer match (keeps the file small during incident storms)
+            horizon = now - max(window, 0.0) * 4
+            index = {k: v for k, v in index.items() if isinstance(v, dict) and float(v.get("last", 0)) >= horizon}
+            for k in keys:
+                entry = index.setdefault(k, {"first": now, "count": 0, "reason": reason})
+                entry["last"] = now
+                entry["count"] = int(entry.get("count", 0)) + 1
+                if files:
+                    entry["captured"] = now
+                    entry["files"] = files
+            tmp = self.index_path.with_name(f"{INDEX_NAME}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+
+    # ---- capture ----
+    def _prepare(self, reason: str, html: Optional[bytes]) -> Tuple[str, List[str], Optional[str], float]:
+        """(timestamp, dedupe keys, key of an earlier identical capture or None, now)."""
+        now = time.time()
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        keys = [f"{reason}:dom:{dom_key(html)}"] if html is not None else []
+        return ts, keys, self._seen(keys, now), now
+
+    def _fit_shot(self, shots: List[Tuple[Dict[str, Any], bytes]]) -> Optional[Tuple[str, bytes]]:
+        for kwargs, data in shots:
+            if len(data) <= self.options.max_screenshot_bytes:
+                return ("jpg" if kwargs["type"] == "jpeg" else "png"), data
+        return None
+
+    def _commit(
+        self,
+        reason: str,
+        ts: str,
+        keys: List[str],
+        now: float,
+        html: Optional[bytes],
+        shot: Optional[Tuple[str, bytes]],
+        dup: Optional[str],
+        t0: float,
+    ) -> None:
+        opts = self.options
+        files: List[Tuple[Path, bytes, bool]] = []
+        if dup is None:
+            if shot is not None:
+                files.append((self.failed_dir / f"failed_{reason}_{ts}.{shot[0]}", shot[1], False))
+            if html is not None:
+                body = truncate(html, opts.max_html_bytes)
+                gz = opts.html == "gzip"
+                files.append((self.failed_dir / f"failed_{reason}_{ts}.html{'.gz' if gz else ''}", body, gz))
+        names = [p.name for p, _, _ in files]
+        if dup is None:
+            with self._lock:
+                for k in keys:
+                    self._recent[k] = now
+        payload: Dict[str, Any] = {"reason": reason, "files": names, "ms": int((time.perf_counter() - t0) * 1000)}
+        if dup is not None:
+            payload["deduped"] = dup
+            log.error("Failure artifacts skipped: same failure captured within %.0fs (%s)", opts.dedupe_window_s, dup)
+        if self._trace is not None:
+            self._trace("failure_artifacts", payload)
+
+        if not opts.background:
+            self._write(files, keys, reason, names, now)
+            return
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(_writer().submit(self._write, files, keys, reason, names, now))
+
+    def _write(
+        self, files: List[Tuple[Path, bytes, bool]], keys: List[str], reason: str, names: List[str], now: float
+    ) -> None:
+        for path, data, gz in files:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(gzip.compress(data, compresslevel=6) if gz else data)
+                log.error("Saved failure artifact: %s", path)
+                with self._lock:
+                    self.saved.append(path)
+            except OSError as e:
+                log.error("Failure artifact not written (%s): %s", path.name, e)
+        if keys and self.options.dedupe_window_s > 0:
+            try:
+                self._update_index(keys, reason, names, now)
+            except OSError as e:
+                log.warning("Failure artifact index not updated: %s", e)
+
+    def capture(self, page: Any, reason: str) -> None:
+        """Capture a sync Playwright page; never raises."""
+        t0 = time.perf_counter()
+        html = None
+        if self.options.html != "none" or self.options.dedupe_window_s > 0:
+            try:
+                html = page.content().encode("utf-8")
+            except Exception as e:
+                log.debug("Failure HTML unavailable: %s", e)
+        ts, keys, dup, now = self._prepare(reason, html)
+        shots: List[Tuple[Dict[str, Any], bytes]] = []
+        if dup is None:
+            for kwargs in self.options.screenshot_attempts():
+                try:
+                    shots.append((kwargs, page.screenshot(**kwargs)))
+                except Exception as e:
+                    log.debug("Failure screenshot failed: %s", e)
+                    break
+                if len(shots[-1][1]) <= self.options.max_screenshot_bytes:
+                    break
+        self._finish(reason, ts, keys, now, html, shots, dup, t0)
+
+    async def acapture(self, page: Any, reason: str) -> None:
+        """Capture an async Playwright page; never raises."""
+        t0 = time.perf_counter()
+        html = None
+        if self.options.html != "none" or self.options.dedupe_window_s > 0:
+            try:
+                html = (await page.content()).encode("utf-8")
+            except Exception as e:
+                log.debug("Failure HTML unavailable: %s", e)
+        ts, keys, dup, now = self._prepare(reason, html)
+        shots: List[Tuple[Dict[str, Any], bytes]] = []
+        if dup is None:
+            for kwargs in self.options.screenshot_attempts():
+                try:
+                    shots.append((kwargs, await page.screenshot(**kwargs)))
+                except Exception as e:
+                    log.debug("Failure screenshot failed: %s", e)
+                    break
+                if len(shots[-1][1]) <= self.options.max_screenshot_bytes:
+                    break
+        self._finish(reason, ts, keys, now, html, shots, dup, t0)
+
+    def _finish(
+        self,
+        reason: str,
+        ts: str,
+        keys: List[str],
+        now: float,
+        html: Optional[bytes],
+        shots: List[Tuple[Dict[str, Any], bytes]],
+        dup: Optional[str],
+        t0: float,
+    ) -> None:
+        shot = self._fit_shot(shots)
+        if shots and shot is None:
+            log.error("Failure screenshot dropped: over %d bytes", self.options.max_screenshot_bytes)
+        if shot is not None and dup is None:
+            shot_key = f"{reason}:shot:{hashlib.sha1(shot[1]).hexdigest()}"
+            dup = self._seen([shot_key], now)
+            keys = keys + [shot_key]
+        try:
+            self._commit(reason, ts, keys, now, html if self.options.html != "none" else None, shot, dup, t0)
+        except Exception as e:
+            log.error("Failure artifacts not saved: %s", e)
+
+    def flush(self, timeout: Optional[float] = 30.0) -> None:
+        """Wait until this capture's queued artifacts are on disk."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            wait(pending, timeout=timeout)
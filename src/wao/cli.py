@@ -1,23 +1,37 @@
 from __future__ import annotations
 
 import argparse
+import json
+import sys
+import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Tuple
 
+from . import secrets
 from .logging_setup import get_logger
-from .runner import Runner
-from .validator import FlowValidationError, validate_flow
+from .validator import FlowValidationError, lint_flow, validate_flow, validate_many
 
 log = get_logger(__name__)
 
 
 def main(argv: list[str] | None = None) -> int:
-    """Minimal CLI entry: validate a flow JSON then execute with Runner."""
+    """Minimal CLI entry: validate a flow JSON then execute with Runner (or a subcommand)."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SUBCOMMANDS:
+        return SUBCOMMANDS[argv[0]](argv[1:])
     p = argparse.ArgumentParser(description="Web Automatic Operation CLI")
     p.add_argument("--run", type=Path, help="Path to a flow JSON to execute")
     p.add_argument("--validate", action="store_true", help="Only validate the flow and exit")
+    p.add_argument("--lint", action="store_true", help="Validate, then report fixed waits; exit 1 on findings")
+    p.add_argument("--run-many", metavar="DIR_OR_GLOB", help="Run every flow JSON in a directory or glob concurrently")
+    p.add_argument("--workers", type=int, default=4, help="Concurrent flows for --run-many (default: 4)")
+    p.add_argument("--mode", choices=("thread", "process"), default="thread", help="Worker type for --run-many")
+    p.add_argument("--per-site", type=int, default=1, help="Max concurrent flows per site for --run-many (default: 1)")
     args = p.parse_args(argv)
 
+    if args.run_many:
+        return _run_many(args)
+
     if not args.run:
         p.print_help()
         return 2
@@ -28,13 +42,241 @@ def main(argv: list[str] | None = None) -> int:
         log.error("%s", str(e))
         return 1
 
-    if args.validate:
+    if args.validate or args.lint:
         print(f"[OK] Flow is valid: {args.run}")
-        return 0
+        return _print_lint({str(args.run): flow}) if args.lint else 0
+
+    # Playwright is only imported once we actually run something
+    from .runner import Runner
 
     Runner(flow).run()
     return 0
 
 
+def _run_many(args: argparse.Namespace) -> int:
+    from . import batch
+
+    paths = batch.collect_flows(args.run_many)
+    if not paths:
+        log.error("No flow JSON files matched: %s", args.run_many)
+        return 2
+
+    if args.validate or args.lint:
+        try:
+            report = validate_many(paths)
+        except FlowValidationError as e:
+            log.error("%s", str(e))
+            return 1
+        for path, errors in report.items():
+            if not errors:
+                print(f"[OK] Flow is valid: {path}")
+            for err in errors:
+                print(f"[NG] {path}: {err}")
+        if any(report.values()):
+            return 1
+        if args.lint:
+            return _print_lint({str(p): validate_flow(str(p)) for p in paths})
+        return 0
+
+    t0 = time.perf_counter()
+    results = batch.run_many(paths, workers=args.workers, mode=args.mode, per_site=args.per_site)
+    print(batch.summarize(results))
+    print(f"Wall time: {time.perf_counter() - t0:.1f}s ({args.workers} {args.mode} worker(s))")
+    return batch.exit_code(results)
+
+
+def _print_lint(flows: Dict[str, Dict[str, Any]]) -> int:
+    found = 0
+    for path, flow in flows.items():
+        for finding in lint_flow(flow):
+            print(f"[LINT] {path}: {finding}")
+            found += 1
+    return 1 if found else 0
+
+
+def _default_spool() -> Path:
+    return Path(secrets.get("WAO_SPOOL_DIR") or "artifacts/spool")
+
+
+def _serve_main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(prog="wao serve", description="Run flows from a job queue on warm browsers")
+    p.add_argument("--workers", type=int, default=2, help="Concurrent jobs, one warm browser each (default: 2)")
+    p.add_argument("--host", default="127.0.0.1", help="HTTP bind address (default: 127.0.0.1)")
+    p.add_argument("--port", type=int, default=8787, help="HTTP port (default: 8787)")
+    p.add_argument("--socket", metavar="PATH", help="Serve the API on a Unix socket instead of TCP")
+    p.add_argument("--spool", type=Path, default=_default_spool(), help="Spool directory (default: artifacts/spool)")
+    p.add_argument("--max-queue", type=int, default=1000, help="Reject jobs beyond this queue depth")
+    p.add_argument("--db", type=Path, help="SQLite job queue kept across restarts (default: <spool>/queue.sqlite)")
+    p.add_argument(
+        "--schedule", type=Path, metavar="JSON", help="Per-site rate/session limits, jitter and tenant weights"
+    )
+    args = p.parse_args(argv)
+
+    from .daemon import serve
+
+    db = args.db or args.spool / "queue.sqlite"
+    return serve(args.workers, args.spool, args.host, args.port, args.socket, args.max_queue, db, args.schedule)
+
+
+def _parse_params(items: List[str]) -> Dict[str, Any]:
+    params: Dict[str, Any] = {}
+    for item in items:
+        key, sep, raw = item.partition("=")
+        if not sep:
+            raise ValueError(f"--param expects KEY=VALUE: {item}")
+        try:
+            params[key] = json.loads(raw)
+        except ValueError:
+            params[key] = raw
+    return params
+
+
+def _enqueue_main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(prog="wao enqueue", description="Queue a flow for a running `wao serve`")
+    p.add_argument("flow", type=Path, help="Flow JSON path")
+    p.add_argument("--param", action="append", default=[], metavar="KEY=VALUE", help="Job parameter (repeatable)")
+    p.add_argument("--inline", action="store_true", help="Send the flow contents instead of its path")
+    p.add_argument(
+        "--tenant", help="Fair-share tenant (default: the flow's options.artifacts.tenant / session account)"
+    )
+    p.add_argument("--spool", type=Path, default=_default_spool(), help="Spool directory (default: artifacts/spool)")
+    p.add_argument("--url", help="Submit over HTTP instead, e.g. http://127.0.0.1:8787")
+    args = p.parse_args(argv)
+
+    try:
+        body: Dict[str, Any] = {"params": _parse_params(args.param)}
+        if args.tenant:
+            body["tenant"] = args.tenant
+        if args.inline:
+            body["flow"] = json.loads(args.flow.read_text(encoding="utf-8"))
+        else:
+            body["flow_path"] = str(args.flow.resolve())
+    except (OSError, ValueError) as e:
+        log.error("%s", e)
+        return 2
+
+    if args.url:
+        import urllib.error
+        import urllib.request
+
+        req = urllib.request.Request(
+            args.url.rstrip("/") + "/jobs",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                print(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            log.error("enqueue rejected (%d): %s", e.code, e.read().decode("utf-8", "replace"))
+            return 1
+        return 0
+
+    from .daemon import spool_job
+
+    print(spool_job(args.spool, body))
+    return 0
+
+
+def _profiled_runs(flow: Dict[str, Any], args: argparse.Namespace) -> Tuple[List[Path], bool]:
+    """Run ``flow`` ``--iterations`` times with options.profile forced on; (trace paths, any failed)."""
+    from .runner import Runner
+
+    opts = flow.setdefault("options", {})
+    prof = dict(opts["profile"]) if isinstance(opts.get("profile"), dict) else {}
+    prof["enabled"] = True
+    if args.spans:
+        prof["spans"] = args.spans
+    if args.prom_file:
+        prof["prometheus_file"] = args.prom_file
+    opts["profile"] = prof
+
+    traces: List[Path] = []
+    failed = False
+    for n in range(max(1, args.iterations)):
+        runner = Runner(json.loads(json.dumps(flow)))
+        traces.append(runner.trace_path)
+        try:
+            runner.run()
+        except (Exception, SystemExit) as e:
+            log.error("Profiled run %d failed: %s", n + 1, e)
+            failed = True
+    return traces, failed
+
+
+def _profile_main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(prog="wao profile", description="Run a flow with profiling and report hot steps")
+    p.add_argument("flow", type=Path, nargs="?", help="Flow JSON path")
+    p.add_argument("--iterations", type=int, default=1, help="Runs to aggregate (median per step, default: 1)")
+    p.add_argument("--sort", choices=("ms", "bytes", "requests", "cpu", "rss_mb"), default="ms", help="Sort key")
+    p.add_argument("--top", type=int, default=0, help="Show only the N hottest steps")
+    p.add_argument("--trace", type=Path, action="append", default=[], help="Report from existing trace file(s)")
+    p.add_argument("--spans", metavar="PATH", help="Also append OpenTelemetry-style spans to PATH (JSONL)")
+    p.add_argument("--prom-file", metavar="PATH", help="Also write Prometheus metrics to PATH")
+    p.add_argument("--json", action="store_true", help="Print the report rows as JSON")
+    args = p.parse_args(argv)
+
+    from . import profiling
+
+    traces, failed = list(args.trace), False
+    if not traces:
+        if args.flow is None:
+            p.print_help()
+            return 2
+        try:
+            flow: Dict[str, Any] = validate_flow(str(args.flow))
+        except FlowValidationError as e:
+            log.error("%s", str(e))
+            return 1
+        traces, failed = _profiled_runs(flow, args)
+
+    rows = profiling.hot_steps(profiling.read_profiles(traces), sort=args.sort)
+    if args.json:
+        print(json.dumps(rows[: args.top] if args.top else rows, ensure_ascii=False, indent=2))
+    else:
+        print(profiling.format_report(rows, args.top or None))
+    return 1 if failed else 0
+
+
+def _trace_main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(prog="wao trace", description="Run trace analytics")
+    sub = p.add_subparsers(dest="command", required=True)
+    st = sub.add_parser("stats", help="Success rate, p50/p95/p99, slowest steps and error clusters")
+    st.add_argument(
+        "--dir", type=Path, default=Path("artifacts/trace"), help="Trace directory (default: artifacts/trace)"
+    )
+    st.add_argument("--db", type=Path, help="Index database (default: <dir>/.index.sqlite)")
+    st.add_argument("--site", help="Only this site")
+    st.add_argument("--since", help="Only runs started at or after this time (e.g. 2026-10-01)")
+    st.add_argument("--top", type=int, default=10, help="Rows for slowest steps / error clusters (default: 10)")
+    st.add_argument("--prune", action="store_true", help="Drop index entries of deleted trace files")
+    st.add_argument("--json", action="store_true", help="Print the aggregates as JSON")
+    args = p.parse_args(argv)
+
+    from .trace_stats import TraceIndex, format_stats
+
+    t0 = time.perf_counter()
+    with TraceIndex(args.db or args.dir / ".index.sqlite") as index:
+        parsed, unchanged = index.update(args.dir)
+        if args.prune:
+            index.prune()
+        stats = index.stats(args.top, args.site, args.since)
+    log.info("Trace index: %d new/changed, %d unchanged (%.2fs)", parsed, unchanged, time.perf_counter() - t0)
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    else:
+        print(format_stats(stats))
+    return 0
+
+
+SUBCOMMANDS: Dict[str, Callable[[List[str]], int]] = {
+    "serve": _serve_main,
+    "enqueue": _enqueue_main,
+    "profile": _profile_main,
+    "trace": _trace_main,
+}
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -0,0 +1,435 @@
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .artifact_store import ArtifactOptions
+from .batch import FlowJob, FlowResult, execute_flow, flow_site
+from .logging_setup import get_logger
+from .scheduler import SchedulePolicy, Scheduler, Ticket
+from .validator import FlowValidationError, validate_flow, validate_flow_dict
+
+log = get_logger(__name__)
+
+
+class JobRejected(ValueError):
+    """A submitted job is malformed, invalid, already queued, or the queue is full."""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Job:
+    id: str
+    site: str
+    flow: Dict[str, Any] = field(repr=False)
+    params: Dict[str, Any] = field(default_factory=dict)
+    path: str = ""
+    source: str = "http"  # "http" | "spool"
+    tenant: str = "default"
+    status: str = "queued"  # queued | running | ok | failed
+    error: str = ""
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def public(self) -> Dict[str, Any]:
+        out = asdict(self)
+        out.pop("flow")
+        return out
+
+    def record(self) -> Dict[str, Any]:
+        """What the scheduler persists to rebuild this job after a restart."""
+        return {
+            "flow": self.flow,
+            "params": self.params,
+            "path": self.path,
+            "source": self.source,
+            "submitted_at": self.submitted_at,
+        }
+
+    @classmethod
+    def restore(cls, ticket: Ticket) -> "Job":
+        rec = ticket.payload
+        job = cls(ticket.id, ticket.site, rec["flow"], rec["params"], rec["path"], rec["source"], ticket.tenant)
+        job.submitted_at = rec["submitted_at"]
+        return job
+
+
+def job_tenant(body: Mapping[str, Any], flow: Mapping[str, Any]) -> str:
+    """The request's ``tenant``, else the flow's artifact tenant (``options.artifacts.tenant`` / session account)."""
+    if body.get("tenant"):
+        return str(body["tenant"])
+    return ArtifactOptions.from_flow(flow).tenant
+
+
+def parse_request(body: Mapping[str, Any]) -> Tuple[Dict[str, Any], str, Dict[str, Any]]:
+    """Validate a job request ``{"flow_path"| "flow", "params"}`` -> (flow, path, params)."""
+    params = body.get("params") or {}
+    if not isinstance(params, Mapping):
+        raise JobRejected("'params' must be an object")
+    path = body.get("flow_path")
+    try:
+        if path:
+            flow = validate_flow(str(path))
+        elif isinstance(body.get("flow"), Mapping):
+            flow = validate_flow_dict(body["flow"])
+        else:
+            raise JobRejected("job needs 'flow_path' or an inline 'flow'")
+    except (FlowValidationError, OSError, ValueError) as e:
+        if isinstance(e, JobRejected):
+            raise
+        raise JobRejected(str(e)) from e
+    return flow, str(path or ""), dict(params)
+
+
+class Daemon:
+    """Long-running worker: warm browsers, a bounded job queue, HTTP/Unix-socket and spool intake.
+
+    Each worker thread owns a one-browser :class:`~wao.browser_pool.BrowserPool`
+    (the sync Playwright API is thread-affine) and runs jobs through
+    :class:`~wao.runner.Runner` with ``state["params"]`` set from the job.
+    Spool jobs are JSON files dropped into ``<spool>/incoming``; they are
+    claimed by renaming into ``accepted/`` and their result is written to
+    ``done/``. Claimed-but-unfinished files are re-queued on restart.
+    Which queued job starts next is decided by a
+    :class:`~wao.scheduler.Scheduler` (per-site limits, fair sharing between
+    tenants); with a ``db_path`` its queue survives restarts.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        spool_dir: Optional[Path] = None,
+        max_queue: int = 1000,
+        keep_finished: int = 1000,
+        spool_interval_s: float = 1.0,
+        execute: Optional[Callable[[FlowJob, Any], FlowResult]] = None,
+        pool_factory: Optional[Callable[[], Any]] = None,
+        scheduler: Optional[Scheduler] = None,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.spool_interval_s = spool_interval_s
+        self.keep_finished = keep_finished
+        self._execute = execute or execute_flow
+        self._pool_factory = pool_factory or _default_pool
+        self.max_queue = max(1, max_queue)
+        self._sched = scheduler or Scheduler()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._started_at = time.time()
+        self._counts: Dict[str, int] = {"ok": 0, "failed": 0}
+
+    # ---- intake ----
+    def submit(self, body: Mapping[str, Any], source: str = "http", job_id: Optional[str] = None) -> Job:
+        if self._stopping.is_set():
+            raise JobRejected("daemon is shutting down", status=503)
+        flow, path, params = parse_request(body)
+        try:
+            tenant = job_tenant(body, flow)
+        except ValueError as e:
+            raise JobRejected(str(e)) from e
+        job = Job(job_id or uuid.uuid4().hex[:16], flow_site(flow), flow, params, path, source, tenant)
+        with self._lock:
+            known = self._jobs.get(job.id)
+            if known is not None and known.finished_at is None:
+                raise JobRejected(f"job {job.id} is already queued", status=409)
+            self._jobs[job.id] = job
+        try:
+            ticket = self._sched.push(job.id, job.site, job.tenant, job.record(), capacity=self.max_queue)
+        except ValueError as e:  # the id is still in the queue (e.g. recovered, or a racing submit)
+            self._forget(job, known)
+            raise JobRejected(str(e), status=409) from e
+        if ticket is None:
+            self._forget(job, known)
+            raise JobRejected("queue is full", status=503)
+        log.info("Job %s queued (%s, site=%s, tenant=%s)", job.id, source, job.site, job.tenant)
+        return job
+
+    def _forget(self, job: Job, previous: Optional[Job]) -> None:
+        """Undo ``submit``'s registration of a rejected ``job`` (restoring the finished job it replaced)."""
+        with self._lock:
+            if self._jobs.get(job.id) is job:
+                if previous is None:
+                    del self._jobs[job.id]
+                else:
+                    self._jobs[job.id] = previous
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [j.public() for j in list(self._jobs.values())[-limit:]]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j.status == "running")
+            counts = dict(self._counts)
+        return {
+            "queue_depth": self._sched.depth(),
+            "running": running,
+            "workers": self.workers,
+            "completed": counts,
+            "sites": self._sched.stats(),
+            "uptime_s": round(time.time() - self._started_at, 1),
+            "stopping": self._stopping.is_set(),
+        }
+
+    # ---- workers ----
+    def start(self) -> "Daemon":
+        for ticket in self._sched.recover():
+            job = Job.restore(ticket)
+            with self._lock:
+                self._jobs[job.id] = job
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"wao-serve-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self.spool_dir is not None:
+            for sub in ("incoming", "accepted", "done"):
+                (self.spool_dir / sub).mkdir(parents=True, exist_ok=True)
+            self._recover_spool()
+            t = threading.Thread(target=self._spool_loop, name="wao-serve-spool", daemon=True)
+            t.start()
+            self._threads.append(t)
+        log.info("wao serve: %d worker(s), spool=%s", self.workers, self.spool_dir)
+        return self
+
+    def stop(self, timeout: float = 60.0) -> None:
+        """Stop intake, let running jobs finish, then stop workers (queued jobs are recovered on restart)."""
+        self._stopping.set()
+        self._sched.stop()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
+        if not any(t.is_alive() for t in self._threads):
+            self._sched.close()
+
+    def _worker(self) -> None:
+        pool = self._pool_factory()
+        try:
+            while True:
+                ticket = self._sched.pop()
+                if ticket is None:
+                    return  # stopping: queued jobs stay in the store / spool accepted/
+                try:
+                    job = self.get(ticket.id)
+                    if job is not None:
+                        self._run(job, pool)
+                finally:
+                    self._sched.done(ticket)
+        finally:
+            if pool is not None:
+                pool.close()
+
+    def _run(self, job: Job, pool: Any) -> None:
+        with self._lock:
+            job.status, job.started_at = "running", time.time()
+        res = self._execute(FlowJob(0, job.path or job.id, job.site, job.flow, job.params), pool)
+        with self._lock:
+            job.status = "ok" if res.ok else "failed"
+            job.error = res.error
+            job.finished_at = time.time()
+            self._counts[job.status] = self._counts.get(job.status, 0) + 1
+            self._trim()
+        log.info("Job %s %s (%.1fs)", job.id, job.status, res.duration_s)
+        if job.source == "spool" and self.spool_dir is not None:
+            self._spool_done(job)
+
+    def _trim(self) -> None:
+        finished = [k for k, j in self._jobs.items() if j.finished_at is not None]
+        for k in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[k]
+
+    # ---- spool ----
+    def _spool_loop(self) -> None:
+        while not self._stopping.wait(self.spool_interval_s):
+            self.scan_spool()
+
+    def scan_spool(self) -> int:
+        """Claim every ``incoming/*.json`` request (rename = lock across daemons); returns how many."""
+        assert self.spool_dir is not None
+        claimed = 0
+        for src in sorted(self.spool_dir.glob("incoming/*.json"), key=lambda p: p.stat().st_mtime):
+            job_id = src.stem
+            dest = self.spool_dir / "accepted" / f"{job_id}.json"
+            try:
+                os.rename(src, dest)
+            except OSError:
+                continue  # claimed by another daemon
+            if self._submit_spooled(dest, job_id):
+                claimed += 1
+        return claimed
+
+    def _recover_spool(self) -> None:
+        assert self.spool_dir is not None
+        for path in sorted(self.spool_dir.glob("accepted/*.json")):
+            # with a persistent scheduler the job may already be back in the queue
+            if not (self.spool_dir / "done" / path.name).exists() and self.get(path.stem) is None:
+                self._submit_spooled(path, path.stem)
+
+    def _submit_spooled(self, path: Path, job_id: str) -> bool:
+        try:
+            body = json.loads(path.read_text(encoding="utf-8"))
+            self.submit(body, source="spool", job_id=job_id)
+            return True
+        except (JobRejected, OSError, ValueError) as e:
+            log.error("Spool job %s rejected: %s", job_id, e)
+            self._write_done(job_id, {"id": job_id, "status": "invalid", "error": str(e)})
+            return False
+
+    def _spool_done(self, job: Job) -> None:
+        self._write_done(job.id, job.public())
+
+    def _write_done(self, job_id: str, record: Dict[str, Any]) -> None:
+        assert self.spool_dir is not None
+        dest = self.spool_dir / "done" / f"{job_id}.json"
+        tmp = dest.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(record, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, dest)
+        except OSError as e:
+            log.warning("Could not write spool result %s: %s", dest, e)
+
+
+def _default_pool() -> Any:
+    from .browser_pool import BrowserPool
+
+    return BrowserPool.from_env(size=1)
+
+
+def spool_job(spool_dir: Path, body: Mapping[str, Any]) -> str:
+    """Drop a job request into ``<spool>/incoming`` atomically (what cron calls); returns the job id."""
+    incoming = Path(spool_dir) / "incoming"
+    incoming.mkdir(parents=True, exist_ok=True)
+    job_id = time.strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    tmp = incoming / f".{job_id}.tmp"
+    tmp.write_text(json.dumps(dict(body), ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, incoming / f"{job_id}.json")
+    return job_id
+
+
+# ---- HTTP API ----
+class _Handler(BaseHTTPRequestHandler):
+    """GET /status, GET /jobs, GET /jobs/<id>, POST /jobs."""
+
+    server: Any
+
+    def address_string(self) -> str:  # Unix sockets have no peer address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        log.debug("%s %s", self.address_string(), format % args)
+
+    def _json(self, status: int, body: Any) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        daemon: Daemon = self.server.daemon
+        if self.path == "/status":
+            self._json(200, daemon.status())
+        elif self.path == "/jobs":
+            self._json(200, daemon.jobs())
+        elif self.path.startswith("/jobs/"):
+            job = daemon.get(self.path[len("/jobs/") :])
+            self._json(200, job.public()) if job else self._json(404, {"error": "no such job"})
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        daemon: Daemon = self.server.daemon
+        if self.path != "/jobs":
+            self._json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise JobRejected("request body must be a JSON object")
+            job = daemon.submit(body)
+        except JobRejected as e:
+            self._json(e.status, {"error": str(e)})
+            return
+        except ValueError as e:
+            self._json(400, {"error": f"invalid JSON: {e}"})
+            return
+        self._json(202, {"id": job.id, "status": job.status})
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(daemon: Daemon, host: str = "127.0.0.1", port: int = 8787, socket_path: Optional[str] = None) -> Any:
+    """HTTP API bound to a Unix socket (preferred: file permissions gate access) or a local TCP port."""
+    server: Any
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixServer(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+    else:
+        server = _TCPServer((host, port), _Handler)
+    server.daemon = daemon
+    return server
+
+
+def serve(
+    workers: int = 2,
+    spool_dir: Optional[Path] = None,
+    host: str = "127.0.0.1",
+    port: int = 8787,
+    socket_path: Optional[str] = None,
+    max_queue: int = 1000,
+    db_path: Optional[Path] = None,
+    schedule: Optional[Path] = None,
+) -> int:
+    """Run the daemon until SIGINT/SIGTERM."""
+    import signal
+
+    policy = SchedulePolicy.from_file(schedule) if schedule else None
+    daemon = Daemon(workers=workers, spool_dir=spool_dir, max_queue=max_queue, scheduler=Scheduler(policy, db_path))
+    daemon.start()
+    server = make_server(daemon, host, port, socket_path)
+    where = socket_path or f"http://{host}:{server.server_address[1]}"
+    log.info("wao serve listening on %s", where)
+
+    def _terminate(signum: int, frame: Any) -> None:
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        daemon.stop()
+    return 0
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from .logging_setup import get_logger
+from .session_cache import file_lock
+
+log = get_logger(__name__)
+
+SKIP_MODES = ("conditional", "manifest")
+# Response headers kept in the manifest (lower-case, as Playwright reports them)
+VALIDATORS = ("etag", "last-modified", "content-length")
+
+
+def _safe(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-._" else "_" for c in name) or "_"
+
+
+def skip_mode(value: Any) -> Optional[str]:
+    """Normalize ``skip_if_unchanged`` (bool or mode name) to a mode or None."""
+    if value is None or value is False:
+        return None
+    if value is True:
+        return "conditional"
+    if value in SKIP_MODES:
+        return str(value)
+    raise ValueError(f"skip_if_unchanged must be a boolean or one of: {', '.join(SKIP_MODES)}")
+
+
+def validators(headers: Mapping[str, str]) -> Dict[str, str]:
+    lower = {k.lower(): v for k, v in headers.items()}
+    return {k: lower[k] for k in VALIDATORS if lower.get(k)}
+
+
+def conditional_headers(entry: Mapping[str, Any]) -> Dict[str, str]:
+    """``If-None-Match`` / ``If-Modified-Since`` built from a manifest entry."""
+    out: Dict[str, str] = {}
+    if entry.get("etag"):
+        out["If-None-Match"] = str(entry["etag"])
+    if entry.get("last_modified"):
+        out["If-Modified-Since"] = str(entry["last_modified"])
+    return out
+
+
+def is_unchanged(entry: Mapping[str, Any], status: int, headers: Mapping[str, str]) -> bool:
+    """Whether a (conditional) HEAD response says the recorded file is still current.
+
+    304 is trusted. For 200 the strongest validator both sides have decides:
+    ETag, else Last-Modified (plus Content-Length when present). Without any
+    shared validator the answer is "changed" so the file is fetched.
+    """
+    if status == 304:
+        return True
+    if status != 200:
+        return False
+    got = validators(headers)
+    if entry.get("etag") and got.get("etag"):
+        return bool(got["etag"] == entry["etag"])
+    if entry.get("last_modified") and got.get("last-modified"):
+        if got["last-modified"] != entry["last_modified"]:
+            return False
+        length = got.get("content-length")
+        return length is None or int(length) == int(entry.get("size", -1))
+    return False
+
+
+class ContentStore:
+    """Content-addressed blobs ``root/<sha256[:2]>/<sha256>`` shared by every site and account.
+
+    Saved downloads are hard links into the store, so identical files cost
+    their bytes once no matter how many runs, accounts or paths refer to them.
+    Where hard links are impossible (another filesystem) files stay as plain
+    copies and are simply not deduplicated.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def adopt(self, path: Path, sha256: str) -> bool:
+        """Make ``path`` a link to the stored blob (storing it first if new); True when deduplicated."""
+        blob = self.path_for(sha256)
+        try:
+            if blob.exists():
+                if os.path.samefile(blob, path):
+                    return True
+                tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.lnk")
+                os.link(blob, tmp)
+                os.replace(tmp, path)
+                return True
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.link(path, blob)
+        except FileExistsError:  # another run stored the same blob meanwhile
+            return self.adopt(path, sha256)
+        except OSError as e:
+            log.debug("Content store: not linking %s (%s)", path, e)
+        return False
+
+    def restore(self, sha256: str, dest: Path) -> bool:
+        """Recreate ``dest`` from the store (hard link, else copy); False when the blob is gone."""
+        blob = self.path_for(sha256)
+        if not blob.is_file():
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + f".{os.getpid()}.{threading.get_ident()}.lnk")
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, dest)
+        return True
+
+
+class DownloadManifest:
+    """Per-site record of fetched files: ``root/.manifest/<site>.json``.
+
+    Each entry (keyed by account + URL or step) holds the suggested filename,
+    saved path, size, sha256, ETag/Last-Modified when the server sent them and
+    the time it was saved. Updates are read-modify-write under a file lock so
+    concurrent runs of the same site do not lose each other's entries.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            entries = data.get("entries") if isinstance(data, dict) else None
+            return entries if isinstance(entries, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            log.warning("Download manifest unreadable (%s): %s", self.path.name, e)
+            return {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._read().get(key)
+        return dict(entry) if isinstance(entry, dict) else None
+
+    def put(self, key: str, entry: Mapping[str, Any]) -> None:
+        with file_lock(self.path):
+            entries = self._read()
+            entries[key] = dict(entry)
+            tmp = self.path.with_name(self.path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"version": 1, "entries": entries}, ensure_ascii=False, indent=1), "utf-8")
+            os.replace(tmp, self.path)
+
+
+class DownloadStore:
+    """Manifest + content store for one run, with the flow's ``options.downloads`` defaults.
+
+    Nothing touches the disk until a download step opts in with
+    ``skip_if_unchanged`` or ``dedupe``.
+    """
+
+    def __init__(self, root: Path, site: str, options: Optional[Mapping[str, Any]] = None) -> None:
+        opts = options or {}
+        self.root = Path(root)
+        self.site = site
+        self.skip_if_unchanged = skip_mode(opts.get("skip_if_unchanged"))
+        self.dedupe = bool(opts.get("dedupe", False))
+        account = str(opts.get("account", "default"))
+        # account names never appear on disk (same as the session cache)
+        self._account = hashlib.sha256(account.encode("utf-8")).hexdigest()[:16]
+        self.manifest = DownloadManifest(self.root / ".manifest" / f"{_safe(site)}.json")
+        self.cas = ContentStore(self.root / ".store")
+
+    @classmethod
+    def from_flow(cls, dsl: Mapping[str, Any], root: Path) -> "DownloadStore":
+        from . import secrets
+
+        opts = dict((dsl.get("options") or {}).get("downloads") or {})
+        session = (dsl.get("options") or {}).get("session") or {}
+        opts.setdefault("account", session.get("account", "default"))
+        opts["account"] = secrets.resolve(opts["account"])
+        return cls(root, str(dsl.get("site") or dsl.get("name") or "-"), opts)
+
+    def key(self, url: Optional[str], step: str) -> str:
+        return f"{self._account}|{url or 'step:' + step}"
+
+    def lookup(self, key: str, dest: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+        """The manifest entry when its file is (or can be made) present locally, else None."""
+        entry = self.manifest.get(key)
+        if entry is None:
+            return None
+        path = dest or Path(entry["path"])
+        try:
+            if path.stat().st_size == int(entry.get("size", -1)):
+                entry["path"] = str(path)
+                return entry
+        except OSError:
+            pass
+        if entry.get("sha256") and self.cas.restore(entry["sha256"], path):
+            log.info("  → restored %s from the content store", path)
+            entry["path"] = str(path)
+            return entry
+        return None
+
+    def record(
+        self,
+        key: str,
+        dest: Path,
+        suggested: str,
+        url: Optional[str],
+        digests: Mapping[str, str],
+        headers: Optional[Mapping[str, str]] = None,
+        dedupe: bool = False,
+    ) -> Dict[str, Any]:
+        got = validators(headers or {})
+        entry: Dict[str, Any] = {
+            "suggested_filename": suggested,
+            "path": str(dest),
+            "url": url,
+            "size": dest.stat().st_size,
+            "sha256": digests.get("sha256"),
+            "etag": got.get("etag"),
+            "last_modified": got.get("last-modified"),
+            "saved_at": time.time(),
+        }
+        if dedupe and entry["sha256"]:
+            entry["deduplicated"] = self.cas.adopt(dest, entry["sha256"])
+        self.manifest.put(key, entry)
+        return entry
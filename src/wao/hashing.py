@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+HASH_ALGOS = ("sha256", "sha1", "md5")
+CHUNK_SIZE = 8 * 1024 * 1024
+# Below this size a plain read is cheaper than setting up a mapping
+MMAP_MIN_SIZE = 64 * 1024 * 1024
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# (resolved path, size, mtime_ns) -> digests computed while the file was written
+_known: Dict[Tuple[str, int, int], Dict[str, str]] = {}
+_known_lock = threading.Lock()
+
+
+class DigestResult(NamedTuple):
+    digests: Dict[str, str]
+    size: int
+    seconds: float
+    mode: str  # "read" | "mmap" | "copy" | "cached"
+
+    def trace_payload(self, path: Path) -> Dict[str, Any]:
+        """Trace record body: bytes, elapsed ms and MB/s throughput."""
+        mb_s = round(self.size / self.seconds / 1e6, 1) if self.seconds > 0 else None
+        return {
+            "path": str(path),
+            "algos": sorted(self.digests),
+            "bytes": self.size,
+            "ms": int(self.seconds * 1000),
+            "mb_s": mb_s,
+            "mode": self.mode,
+        }
+
+
+def check_algos(algos: Iterable[str]) -> Tuple[str, ...]:
+    names = tuple(dict.fromkeys(a.lower() for a in algos))
+    unknown = [a for a in names if a not in HASH_ALGOS]
+    if unknown or not names:
+        raise ValueError(f"hash must be one of: {', '.join(HASH_ALGOS)}")
+    return names
+
+
+def _key(path: Path) -> Tuple[str, int, int]:
+    st = path.stat()
+    return (str(path.resolve()), st.st_size, st.st_mtime_ns)
+
+
+def remember(path: Path, digests: Dict[str, str]) -> None:
+    """Record digests computed while writing ``path``, so verify_file need not read it back."""
+    try:
+        key = _key(path)
+    except OSError:
+        return
+    with _known_lock:
+        _known[key] = dict(digests)
+
+
+def recall(path: Path, algos: Iterable[str]) -> Optional[Dict[str, str]]:
+    """Digests remembered for the unchanged file, when they cover every requested algorithm."""
+    try:
+        key = _key(path)
+    except OSError:
+        return None
+    with _known_lock:
+        known = _known.get(key)
+    if known is None or any(a not in known for a in algos):
+        return None
+    return {a: known[a] for a in algos}
+
+
+def multi_digest(path: Path, algos: Iterable[str], chunk_size: int = CHUNK_SIZE) -> DigestResult:
+    """Compute every digest in ``algos`` in a single pass over ``path``.
+
+    Large files are memory-mapped; smaller ones are read in ``chunk_size``
+    blocks into one reused buffer. hashlib releases the GIL on large updates,
+    so this runs well on a worker thread (see :func:`submit`).
+    """
+    names = check_algos(algos)
+    t0 = time.perf_counter()
+    cached = recall(path, names)
+    if cached is not None:
+        return DigestResult(cached, path.stat().st_size, time.perf_counter() - t0, "cached")
+    hashers = [hashlib.new(a) for a in names]
+    size = 0
+    with open(path, "rb") as rf:
+        length = os.fstat(rf.fileno()).st_size
+        if length >= MMAP_MIN_SIZE:
+            mode = "mmap"
+            with mmap.mmap(rf.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for off in range(0, length, chunk_size):
+                        block = view[off : off + chunk_size]
+                        for h in hashers:
+                            h.update(block)
+                        block.release()
+                finally:
+                    view.release()
+            size = length
+        else:
+            mode = "read"
+            buf = bytearray(chunk_size)
+            view = memoryview(buf)
+            while True:
+                n = rf.readinto(buf)
+                if not n:
+                    break
+                for h in hashers:
+                    h.update(view[:n])
+                size += n
+    digests = {a: h.hexdigest() for a, h in zip(names, hashers)}
+    return DigestResult(digests, size, time.perf_counter() - t0, mode)
+
+
+def copy_with_digest(src: Path, dest: Path, algos: Iterable[str], chunk_size: int = CHUNK_SIZE) -> DigestResult:
+    """Copy ``src`` to ``dest`` (atomically) while digesting the bytes as they are written."""
+    names = check_algos(algos)
+    t0 = time.perf_counter()
+    hashers = [hashlib.new(a) for a in names]
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    size = 0
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    try:
+        with open(src, "rb") as rf, open(tmp, "wb") as wf:
+            while True:
+                n = rf.readinto(buf)
+                if not n:
+                    break
+                block = view[:n]
+                wf.write(block)
+                for h in hashers:
+                    h.update(block)
+                size += n
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    digests = {a: h.hexdigest() for a, h in zip(names, hashers)}
+    remember(dest, digests)
+    return DigestResult(digests, size, time.perf_counter() - t0, "copy")
+
+
+def submit(fn: Callable[..., DigestResult], *args: Any) -> "Future[DigestResult]":
+    """Run a hashing job on the shared ``wao-hash`` worker pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, min(4, (os.cpu_count() or 2) // 2))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wao-hash")
+    return _executor.submit(fn, *args)
+
+
+def mismatches(actual: Dict[str, str], expected: Dict[str, str]) -> Dict[str, str]:
+    """Algorithms whose digest differs from ``expected`` (hex compared case-insensitively)."""
+    return {a: actual.get(a, "") for a, want in expected.items() if actual.get(a, "").lower() != want.lower()}
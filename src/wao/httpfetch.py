@@ -0,0 +1,409 @@
+"""Direct HTTP downloads for ``download`` steps with ``mode: "http"``.
+
+The browser only contributes its cookies, User-Agent and Referer; the bytes are
+streamed by ``http.client`` on keep-alive connections from a process-wide pool.
+A one-byte ranged probe tells whether the server supports ``Range``. If it
+does, large files are fetched as parallel segments into a preallocated
+``<dest>.part`` file. Progress is persisted to ``<dest>.part.json`` so an
+interrupted transfer resumes where each segment stopped, guarded by
+``If-Range`` so a changed file restarts from zero.
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import re
+import ssl
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlsplit
+
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Files below this size are fetched on one connection even when segments > 1
+SEGMENT_MIN_SIZE = 16 * 1024 * 1024
+MAX_REDIRECTS = 5
+_REDIRECTS = (301, 302, 303, 307, 308)
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+_FILENAME_STAR = re.compile(r"filename\*\s*=\s*([^']*)'[^']*'([^;]+)", re.I)
+_FILENAME = re.compile(r'filename\s*=\s*"?([^";]+)"?', re.I)
+
+Progress = Callable[[int, Optional[int], float], None]
+
+
+class FetchError(OSError):
+    """The server answered with an unusable status for a direct download."""
+
+
+class ConnectionPool:
+    """Idle keep-alive ``http.client`` connections per (scheme, host, port, TLS verification)."""
+
+    def __init__(self, max_idle_per_host: int = 8) -> None:
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[Tuple[str, str, int, bool], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url: str, insecure: bool) -> Tuple[str, str, int, bool]:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"direct download needs an http(s) URL: {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return parts.scheme, parts.hostname, port, insecure
+
+    def acquire(self, url: str, timeout_s: float, insecure: bool = False) -> http.client.HTTPConnection:
+        key = self._key(url, insecure)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()
+                conn.timeout = timeout_s
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout_s)
+                return conn
+        scheme, host, port, _ = key
+        if scheme == "https":
+            ctx = ssl._create_unverified_context() if insecure else ssl.create_default_context()
+            return http.client.HTTPSConnection(host, port, timeout=timeout_s, context=ctx)
+        return http.client.HTTPConnection(host, port, timeout=timeout_s)
+
+    def release(self, url: str, conn: http.client.HTTPConnection, insecure: bool = False) -> None:
+        key = self._key(url, insecure)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for c in conns:
+            c.close()
+
+
+_POOL = ConnectionPool()
+
+
+def filename_from(headers: Any, url: str) -> str:
+    """Suggested filename: Content-Disposition (RFC 6266 ``filename*`` first), else the URL's last segment."""
+    cd = headers.get("Content-Disposition") or ""
+    m = _FILENAME_STAR.search(cd)
+    name = unquote(m.group(2).strip(), encoding=m.group(1) or "utf-8") if m else None
+    if name is None:
+        m = _FILENAME.search(cd)
+        name = m.group(1).strip() if m else unquote(urlsplit(url).path.rsplit("/", 1)[-1])
+    name = os.path.basename(name.replace("\\", "/"))
+    return name if name not in ("", ".", "..") else "download"
+
+
+class Probe(NamedTuple):
+    url: str  # after redirects
+    status: int
+    total: Optional[int]
+    ranges: bool
+    filename: str
+    headers: Dict[str, str]  # lower-case names
+
+
+class FetchResult(NamedTuple):
+    url: str
+    path: Path
+    size: int
+    seconds: float
+    segments: int
+    resumed: int  # bytes already present from an earlier, interrupted attempt
+    headers: Dict[str, str]
+
+    def trace_payload(self) -> Dict[str, Any]:
+        mb_s = round(self.size / self.seconds / 1e6, 1) if self.seconds > 0 else None
+        return {
+            "url": self.url,
+            "path": str(self.path),
+            "bytes": self.size,
+            "ms": int(self.seconds * 1000),
+            "mb_s": mb_s,
+            "segments": self.segments,
+            "resumed": self.resumed,
+        }
+
+
+class HttpDownload:
+    """One direct transfer: ``probe()`` then ``save(dest)`` (or ``fetch(dest_for)`` for both).
+
+    ``segments`` connections are used for files of at least ``segment_min_size``
+    bytes when the server honours ``Range``; ``progress(done, total, seconds)``
+    is called from the calling thread about every ``progress_interval_s``.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        *,
+        segments: int = 4,
+        segment_min_size: int = SEGMENT_MIN_SIZE,
+        chunk_size: int = CHUNK_SIZE,
+        timeout_s: float = 30.0,
+        insecure: bool = False,
+        progress: Optional[Progress] = None,
+        progress_interval_s: float = 0.5,
+        pool: Optional[ConnectionPool] = None,
+    ) -> None:
+        self.url = url
+        self.headers = dict(headers or {})
+        self.segments = max(1, segments)
+        self.segment_min_size = segment_min_size
+        self.chunk_size = chunk_size
+        self.timeout_s = timeout_s
+        self.insecure = insecure
+        self.progress = progress
+        self.progress_interval_s = progress_interval_s
+        self.pool = pool or _POOL
+        self._done = 0
+        self._done_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._restarted = False
+        self._probe: Optional[Probe] = None
+        # body of a probe answered with 200 (no Range support), consumed by save()
+        self._pending: Optional[Tuple[str, http.client.HTTPConnection, http.client.HTTPResponse]] = None
+
+    # ---- HTTP ----
+    def _open(
+        self, url: str, extra: Optional[Dict[str, str]] = None
+    ) -> Tuple[str, http.client.HTTPConnection, http.client.HTTPResponse]:
+        """GET ``url`` following redirects; returns (final url, connection, response with unread body)."""
+        headers = {**self.headers, **(extra or {})}
+        origin = urlsplit(url).netloc
+        for _ in range(MAX_REDIRECTS + 1):
+            conn = self.pool.acquire(url, self.timeout_s, self.insecure)
+            parts = urlsplit(url)
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            if parts.netloc != origin:
+                # the browser's cookies were selected for the original origin only
+                headers = {k: v for k, v in headers.items() if k.lower() not in ("cookie", "authorization")}
+            try:
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                # a pooled keep-alive connection may have been closed by the server: reconnect once
+                conn.close()
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+            location = resp.getheader("Location")
+            if resp.status in _REDIRECTS and location:
+                self._finish(url, conn, resp)
+                url = urljoin(url, location)
+                continue
+            return url, conn, resp
+        raise FetchError(f"too many redirects: {self.url}")
+
+    def _finish(self, url: str, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        """Drain what is left of a small body and give the connection back (or close it)."""
+        try:
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            return
+        if resp.will_close:
+            conn.close()
+        else:
+            self.pool.release(url, conn, self.insecure)
+
+    def probe(self) -> Probe:
+        """A ``Range: bytes=0-0`` request: total size, Range support, filename and validators."""
+        url, conn, resp = self._open(self.url, {"Range": "bytes=0-0"})
+        headers = {k.lower(): v for k, v in resp.getheaders()}
+        if resp.status == 206:
+            m = _CONTENT_RANGE.match(headers.get("content-range", ""))
+            total = int(m.group(3)) if m and m.group(3) != "*" else None
+            self._finish(url, conn, resp)
+            ranges = total is not None
+        elif resp.status == 200:
+            length = headers.get("content-length")
+            total = int(length) if length and length.isdigit() else None
+            self._pending = (url, conn, resp)
+            ranges = False
+        elif resp.status == 416:  # empty file: "bytes=0-0" is unsatisfiable
+            self._finish(url, conn, resp)
+            total, ranges = 0, False
+        else:
+            self._finish(url, conn, resp)
+            raise FetchError(f"HTTP {resp.status} for {self.url}")
+        self._probe = Probe(url, resp.status, total, ranges, filename_from(resp.headers, url), headers)
+        return self._probe
+
+    # ---- transfer ----
+    def _advance(self, n: int) -> None:
+        with self._done_lock:
+            self._done += n
+
+    def _stream(self, resp: http.client.HTTPResponse, part: Path, offset: int, state: Optional[List[int]]) -> None:
+        buf = bytearray(self.chunk_size)
+        view = memoryview(buf)
+        with open(part, "r+b") as wf:
+            wf.seek(offset)
+            while not self._stop.is_set():
+                n = resp.readinto(buf)
+                if not n:
+                    break
+                wf.write(view[:n])
+                if state is not None:
+                    state[2] += n
+                self._advance(n)
+
+    def _segment(self, part: Path, validator: Optional[str], state: List[int]) -> None:
+        start, end, done = state
+        if start + done > end:
+            return
+        extra = {"Range": f"bytes={start + done}-{end}"}
+        if validator:
+            extra["If-Range"] = validator
+        url, conn, resp = self._open(self.url, extra)
+        try:
+            if resp.status == 200:
+                raise _Changed(resp.status)
+            if resp.status != 206:
+                raise FetchError(f"HTTP {resp.status} for a ranged request to {self.url}")
+            self._stream(resp, part, start + done, state)
+        except BaseException:
+            conn.close()
+            raise
+        self._finish(url, conn, resp)
+
+    def _plan(self, part: Path, sidecar: Path, probe: Probe) -> Tuple[List[List[int]], int]:
+        """Segment states ``[start, end(inclusive), bytes done]`` (resumed when the sidecar still matches).
+
+        The sidecar is only trusted while ``part`` still holds the bytes it counts.
+        """
+        total = int(probe.total or 0)
+        stamp = {"total": total, "etag": probe.headers.get("etag"), "last_modified": probe.headers.get("last-modified")}
+        try:
+            saved = json.loads(sidecar.read_text(encoding="utf-8")) if part.exists() else {}
+            if {k: saved.get(k) for k in stamp} == stamp and (stamp["etag"] or stamp["last_modified"]):
+                segs = [list(map(int, s)) for s in saved["segments"]]
+                return segs, sum(s[2] for s in segs)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        n = self.segments if total >= self.segment_min_size else 1
+        size = -(-total // n)
+        return [[i, min(i + size, total) - 1, 0] for i in range(0, total, size)] or [[0, -1, 0]], 0
+
+    def save(self, dest: Path) -> FetchResult:
+        """Transfer to ``dest`` (atomically, via ``<dest>.part``)."""
+        probe = self._probe or self.probe()
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + ".part")
+        sidecar = dest.with_name(dest.name + ".part.json")
+        t0 = time.perf_counter()
+        if self._pending is not None or not probe.ranges:
+            segments, resumed = 1, 0
+            self._single(part)
+        else:
+            plan, resumed = self._plan(part, sidecar, probe)
+            segments = len(plan)
+            try:
+                self._segmented(part, sidecar, probe, plan, resumed)
+            except _Changed:
+                sidecar.unlink(missing_ok=True)
+                if self._restarted:
+                    raise FetchError(f"{self.url} keeps changing during the download") from None
+                log.info("  → %s changed on the server; restarting the download", self.url)
+                self._restarted = True
+                self._probe = None
+                self._stop.clear()
+                return self.save(dest)
+        os.replace(part, dest)
+        sidecar.unlink(missing_ok=True)
+        size = dest.stat().st_size
+        return FetchResult(probe.url, dest, size, time.perf_counter() - t0, segments, resumed, probe.headers)
+
+    def fetch(self, dest_for: Callable[[Probe], Path]) -> FetchResult:
+        return self.save(dest_for(self._probe or self.probe()))
+
+    def _single(self, part: Path) -> None:
+        part.write_bytes(b"")
+        self._done = 0
+        if self._pending is not None:
+            url, conn, resp = self._pending
+            self._pending = None
+        else:
+            url, conn, resp = self._open(self.url)
+            if resp.status != 200:
+                self._finish(url, conn, resp)
+                raise FetchError(f"HTTP {resp.status} for {self.url}")
+        total = self._probe.total if self._probe else None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="wao-http") as ex:
+            fut = ex.submit(self._stream, resp, part, 0, None)
+            try:
+                self._watch([fut], total, None)
+            except BaseException:
+                conn.close()
+                raise
+        self._finish(url, conn, resp)
+        if total is not None and self._done != total:
+            # readinto() returns 0 on an early close when the server sent no Content-Length
+            raise FetchError(f"{self.url}: connection closed after {self._done} of {total} bytes")
+
+    def _segmented(self, part: Path, sidecar: Path, probe: Probe, plan: List[List[int]], resumed: int) -> None:
+        total = int(probe.total or 0)
+        if not part.exists() or resumed == 0:
+            with open(part, "wb") as wf:
+                wf.truncate(total)
+        self._done = resumed
+        validator = probe.headers.get("etag") or probe.headers.get("last-modified")
+        stamp = {"total": total, "etag": probe.headers.get("etag"), "last_modified": probe.headers.get("last-modified")}
+
+        def persist() -> None:
+            tmp = sidecar.with_name(sidecar.name + ".tmp")
+            tmp.write_text(json.dumps({**stamp, "url": self.url, "segments": plan}), encoding="utf-8")
+            os.replace(tmp, sidecar)
+
+        with ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix="wao-http") as ex:
+            futures = [ex.submit(self._segment, part, validator, s) for s in plan]
+            try:
+                self._watch(futures, total, persist)
+            finally:
+                if validator:
+                    persist()
+        short = sum(1 for start, end, done in plan if done != end - start + 1)
+        if short:
+            # a server may answer a range with fewer bytes than asked; the sidecar lets the next run finish them
+            raise FetchError(f"{self.url}: {short} of {len(plan)} segments ended early ({self._done} of {total} bytes)")
+
+    def _watch(
+        self, futures: List["Future[None]"], total: Optional[int], persist: Optional[Callable[[], None]]
+    ) -> None:
+        """Wait for the workers, reporting progress (and persisting resume state) between waits."""
+        t0 = time.perf_counter()
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=self.progress_interval_s, return_when=FIRST_EXCEPTION)
+                for f in done:
+                    f.result()  # re-raise the first worker error
+                if persist is not None:
+                    persist()
+                if self.progress is not None and pending:
+                    self.progress(self._done, total, time.perf_counter() - t0)
+        except BaseException:
+            self._stop.set()  # the other workers stop at their next chunk
+            raise
+
+
+class _Changed(Exception):
+    """A ranged request got a full (non-206) answer: the resource changed since the probe."""
+
+    def __init__(self, status: int) -> None:
+        super().__init__(f"unexpected HTTP {status} for a ranged request")
+        self.status = status
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Pattern, Set
+from urllib.parse import urlparse
+
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+RESOURCE_TYPES = ("image", "media", "font", "stylesheet", "script", "xhr", "fetch", "websocket", "other")
+
+# Second-level labels under which registrable domains take three labels (example.co.jp)
+_SLD = {"co", "or", "ne", "ac", "go", "lg", "ed", "gr", "com", "net", "org", "gov", "edu"}
+
+
+def site_of(host: str) -> str:
+    """Naive registrable domain (eTLD+1) — good enough to tell first from third party."""
+    labels = host.lower().strip(".").split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SLD:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+class NetworkPolicy:
+    """Declarative request blocking from a flow's ``options.network`` block.
+
+    Requests are aborted when their resource type is listed, their URL matches a
+    Playwright glob in ``block_urls`` or a regex in ``block_url_regex``, or (with
+    ``block_third_party``) their registrable domain is neither one the main frame
+    navigated to nor listed in ``allow_domains``. Documents are never blocked as
+    third party, so cross-domain logins (SSO) keep working.
+    """
+
+    def __init__(
+        self,
+        block_resource_types: Iterable[str] = (),
+        block_urls: Iterable[str] = (),
+        block_url_regex: Iterable[str] = (),
+        block_third_party: bool = False,
+        allow_domains: Iterable[str] = (),
+    ) -> None:
+        self.block_types: Set[str] = set(block_resource_types)
+        unknown = self.block_types.difference(RESOURCE_TYPES)
+        if unknown:
+            raise ValueError(f"unknown resource type(s): {', '.join(sorted(unknown))}")
+        self.block_urls: List[str] = list(block_urls)
+        self.block_regex: List[Pattern[str]] = [re.compile(r) for r in block_url_regex]
+        self.block_third_party = bool(block_third_party)
+        self.first_party: Set[str] = {site_of(d) for d in allow_domains}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.allowed_bytes = 0
+        self.blocked_by_type: Counter[str] = Counter()
+        self.blocked_by_reason: Counter[str] = Counter()
+
+    @classmethod
+    def from_options(cls, opts: Optional[Mapping[str, Any]], site: Optional[str] = None) -> Optional["NetworkPolicy"]:
+        """Build the policy for a flow, or None when nothing is blocked."""
+        if not opts:
+            return None
+        policy = cls(
+            block_resource_types=opts.get("block_resource_types") or (),
+            block_urls=opts.get("block_urls") or (),
+            block_url_regex=opts.get("block_url_regex") or (),
+            block_third_party=bool(opts.get("block_third_party", False)),
+            allow_domains=[*(opts.get("allow_domains") or ()), *([site] if site and "." in site else [])],
+        )
+        if not (policy.block_types or policy.block_urls or policy.block_regex or policy.block_third_party):
+            return None
+        return policy
+
+    # ---- decision ----
+    def check(self, url: str, resource_type: str, is_navigation: bool = False) -> Optional[str]:
+        """Return the block reason for a request, or None to let it through."""
+        if resource_type in self.block_types:
+            return "type"
+        for rx in self.block_regex:
+            if rx.search(url):
+                return "regex"
+        host = urlparse(url).hostname or ""
+        if is_navigation:
+            # the main frame's own destinations are first party by definition
+            if host:
+                with self._lock:
+                    self.first_party.add(site_of(host))
+            return None
+        if self.block_third_party and host and resource_type != "document":
+            if self.first_party and site_of(host) not in self.first_party:
+                return "third_party"
+        return None
+
+    def _record(self, reason: Optional[str], resource_type: str) -> None:
+        with self._lock:
+            if reason is None:
+                self.allowed += 1
+            else:
+                self.blocked_by_reason[reason] += 1
+                self.blocked_by_type[resource_type] += 1
+
+    def _record_response(self, headers: Mapping[str, str]) -> None:
+        try:
+            size = int(headers.get("content-length", 0))
+        except ValueError:
+            return
+        with self._lock:
+            self.allowed_bytes += size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "blocked": sum(self.blocked_by_reason.values()),
+                "blocked_by_type": dict(self.blocked_by_type),
+                "blocked_by_reason": dict(self.blocked_by_reason),
+                "allowed": self.allowed,
+                "allowed_bytes": self.allowed_bytes,
+            }
+
+    # ---- Playwright wiring ----
+    def _is_main_navigation(self, request: Any) -> bool:
+        try:
+            return bool(request.is_navigation_request()) and request.frame.parent_frame is None
+        except Exception:
+            return False
+
+    def install(self, context: Any) -> None:
+        """Register route handlers on a sync BrowserContext."""
+
+        def _glob_route(route: Any) -> None:
+            self._record("url", route.request.resource_type)
+            route.abort("blockedbyclient")
+
+        def _route(route: Any) -> None:
+            req = route.request
+            reason = self.check(req.url, req.resource_type, self._is_main_navigation(req))
+            self._record(reason, req.resource_type)
+            if reason:
+                route.abort("blockedbyclient")
+            else:
+                route.fallback()
+
+        if self._needs_catch_all():
+            context.route("**/*", _route)
+        # Registered last so they are consulted first: pure globs never reach Python twice
+        for glob in self.block_urls:
+            context.route(glob, _glob_route)
+        context.on("response", lambda resp: self._record_response(resp.headers))
+        log.info("Network policy installed: %s", self.describe())
+
+    async def install_async(self, context: Any) -> None:
+        """Register route handlers on an async BrowserContext."""
+
+        async def _glob_route(route: Any) -> None:
+            self._record("url", route.request.resource_type)
+            await route.abort("blockedbyclient")
+
+        async def _route(route: Any) -> None:
+            req = route.request
+            reason = self.check(req.url, req.resource_type, self._is_main_navigation(req))
+            self._record(reason, req.resource_type)
+            if reason:
+                await route.abort("blockedbyclient")
+            else:
+                await route.fallback()
+
+        if self._needs_catch_all():
+            await context.route("**/*", _route)
+        for glob in self.block_urls:
+            await context.route(glob, _glob_route)
+        context.on("response", lambda resp: self._record_response(resp.headers))
+        log.info("Network policy installed: %s", self.describe())
+
+    def _needs_catch_all(self) -> bool:
+        # glob-only policies are matched by Playwright itself; no per-request Python callback
+        return bool(self.block_types or self.block_regex or self.block_third_party)
+
+    def describe(self) -> str:
+        parts = []
+        if self.block_types:
+            parts.append("types=" + ",".join(sorted(self.block_types)))
+        if self.block_urls:
+            parts.append(f"globs={len(self.block_urls)}")
+        if self.block_regex:
+            parts.append(f"regex={len(self.block_regex)}")
+        if self.block_third_party:
+            parts.append("third_party")
+        return " ".join(parts)
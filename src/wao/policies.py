@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import random
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+ERROR_CLASSES = ("timeout", "network", "playwright", "any")
+_NETWORK_MARKERS = ("net::ERR_", "ECONNRESET", "ECONNREFUSED", "Connection closed", "Target closed")
+
+
+def error_classes(exc: BaseException) -> FrozenSet[str]:
+    """Retry classes an exception belongs to (matched by name so Playwright need not be imported)."""
+    names = {c.__name__ for c in type(exc).__mro__}
+    out = {"any"}
+    if "TimeoutError" in names:
+        out.add("timeout")
+    if type(exc).__module__.startswith("playwright"):
+        out.add("playwright")
+    msg = str(exc)
+    if isinstance(exc, ConnectionError) or any(m in msg for m in _NETWORK_MARKERS):
+        out.add("network")
+    return frozenset(out)
+
+
+class RetryPolicy:
+    """Attempts, exponential backoff with jitter, and which error classes are retried.
+
+    ``delay_s(n)`` after the n-th failed attempt is
+    ``min(backoff_ms * multiplier**(n-1), max_backoff_ms)`` reduced by up to
+    ``jitter`` (a fraction) so that parallel runs do not retry in lockstep.
+    """
+
+    __slots__ = ("attempts", "backoff_ms", "multiplier", "max_backoff_ms", "jitter", "retry_on")
+
+    def __init__(
+        self,
+        attempts: int = 1,
+        backoff_ms: int = 500,
+        multiplier: float = 2.0,
+        max_backoff_ms: int = 30000,
+        jitter: float = 0.5,
+        retry_on: Iterable[str] = ("timeout", "network"),
+    ) -> None:
+        self.attempts = max(1, int(attempts))
+        self.backoff_ms = max(0, int(backoff_ms))
+        self.multiplier = max(1.0, float(multiplier))
+        self.max_backoff_ms = max(0, int(max_backoff_ms))
+        self.jitter = min(1.0, max(0.0, float(jitter)))
+        self.retry_on = frozenset(retry_on)
+        unknown = self.retry_on.difference(ERROR_CLASSES)
+        if unknown:
+            raise ValueError(f"unknown retry_on class(es): {', '.join(sorted(unknown))}")
+
+    @classmethod
+    def from_options(cls, raw: Any, base: Optional["RetryPolicy"] = None) -> "RetryPolicy":
+        """Build from ``retry`` (an attempt count or an object), inheriting unset fields from ``base``."""
+        fields: Dict[str, Any] = {k: getattr(base, k) for k in cls.__slots__} if base else {}
+        if isinstance(raw, bool) or raw is None:
+            return cls(**fields)
+        if isinstance(raw, int):
+            fields["attempts"] = raw
+        elif isinstance(raw, Mapping):
+            fields.update({k: raw[k] for k in cls.__slots__ if k in raw})
+        else:
+            raise ValueError("retry must be an integer or an object")
+        return cls(**fields)
+
+    def retryable(self, exc: BaseException) -> bool:
+        return bool(self.retry_on & error_classes(exc))
+
+    def delay_s(self, failed_attempts: int) -> float:
+        ms = min(self.backoff_ms * self.multiplier ** (failed_attempts - 1), self.max_backoff_ms)
+        return ms * (1.0 - self.jitter * random.random()) / 1000.0
+
+
+class RetryPlan:
+    """Retry decisions for a compiled plan: per-step policies and idempotent checkpoints.
+
+    A failing idempotent step is retried in place. A failing non-idempotent
+    step rewinds to the closest checkpoint before it -- a navigation or
+    wait-for step, or one marked ``"idempotent": true`` -- and replays from
+    there; without one it is retried in place. Other idempotent steps (``log``,
+    fixed waits) re-establish nothing, so they are never rewind points.
+    """
+
+    def __init__(self, plan: Sequence[Any], default: Any = None) -> None:
+        base = RetryPolicy.from_options(default)
+        self.policies: List[RetryPolicy] = [RetryPolicy.from_options(a.raw.get("retry"), base) for a in plan]
+        self.idempotent: List[bool] = [bool(a.idempotent) for a in plan]
+        self.checkpoints: List[bool] = [a.is_checkpoint() for a in plan]
+        self._failures: Dict[int, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return any(p.attempts > 1 for p in self.policies)
+
+    def checkpoint(self, pos: int) -> int:
+        """Where to resume after step ``pos`` failed."""
+        if self.idempotent[pos]:
+            return pos
+        for j in range(pos - 1, -1, -1):
+            if self.checkpoints[j]:
+                return j
+        return pos
+
+    def on_error(self, pos: int, exc: BaseException) -> Optional[Tuple[int, float, Dict[str, Any]]]:
+        """``(resume position, delay seconds, trace payload)`` for a retry, or None to give up."""
+        policy = self.policies[pos]
+        failed = self._failures.get(pos, 0) + 1
+        self._failures[pos] = failed
+        if failed >= policy.attempts or not policy.retryable(exc):
+            return None
+        resume = self.checkpoint(pos)
+        delay = policy.delay_s(failed)
+        payload = {
+            "attempt": failed + 1,
+            "max_attempts": policy.attempts,
+            "delay_ms": int(delay * 1000),
+            "error_class": sorted(error_classes(exc) - {"any"}),
+            "error": str(exc),
+        }
+        return resume, delay, payload
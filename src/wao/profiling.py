@@ -0,0 +1,525 @@
+"""Per-step profiling hooks and their exporters (``options.profile``).
+
+For every step the profiler records network requests / failures / encoded
+bytes, navigation timing of a document loaded during the step, main-thread
+time from the CDP ``Performance`` domain (task, script, layout, style) and the
+RSS of this process tree (browser processes included). Each step becomes a
+``step_profile`` trace record, feeds the process-wide Prometheus registry
+(text file and/or scrape endpoint) and, optionally, an OpenTelemetry-style
+span in a JSONL file.
+
+CDP is Chromium-only; on other browsers request counts come from page events
+and the CPU fields are omitted.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import secrets as _rand
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from . import secrets
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+# Performance.getMetrics names (seconds, cumulative) -> step_profile cpu keys
+CPU_METRICS = {
+    "TaskDuration": "task_ms",
+    "ScriptDuration": "script_ms",
+    "LayoutDuration": "layout_ms",
+    "RecalcStyleDuration": "style_ms",
+}
+_NAV_JS = """() => {
+  const n = performance.getEntriesByType("navigation")[0];
+  if (!n) return null;
+  return {origin: performance.timeOrigin, type: n.type, ttfb_ms: n.responseStart - n.requestStart,
+          dcl_ms: n.domContentLoadedEventEnd, load_ms: n.loadEventEnd, transfer_bytes: n.transferSize};
+}"""
+
+
+def proc_tree_rss_kb(root: Optional[int] = None) -> Optional[int]:
+    """Sum of VmRSS over ``root`` (default: this process) and its descendants; None off Linux."""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for d in proc.iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            status = (d / "status").read_text()
+        except OSError:
+            continue
+        ppid, kb = 0, 0
+        for line in status.splitlines():
+            if line.startswith("PPid:"):
+                ppid = int(line.split()[1])
+            elif line.startswith("VmRSS:"):
+                kb = int(line.split()[1])
+        children.setdefault(ppid, []).append(int(d.name))
+        rss[int(d.name)] = kb
+    total, stack = 0, [root or os.getpid()]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, ()))
+    return total
+
+
+class ProfileOptions:
+    """``options.profile``: ``true`` or an object; ``WAO_PROFILE=1`` enables the defaults."""
+
+    __slots__ = ("enabled", "cdp", "rss", "spans", "prometheus_file", "prometheus_port")
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        cdp: bool = True,
+        rss: bool = True,
+        spans: Optional[str] = None,
+        prometheus_file: Optional[str] = None,
+        prometheus_port: Optional[int] = None,
+    ) -> None:
+        self.enabled = enabled
+        self.cdp = cdp
+        self.rss = rss
+        self.spans = spans
+        self.prometheus_file = prometheus_file
+        self.prometheus_port = prometheus_port
+
+    @classmethod
+    def from_options(cls, raw: Any) -> "ProfileOptions":
+        if raw is None:
+            raw = str(secrets.get("WAO_PROFILE", "0") or "0").strip().lower() in {"1", "true", "on", "yes"}
+        if isinstance(raw, bool):
+            raw = {"enabled": raw}
+        opts = dict(raw)
+        opts.setdefault("enabled", True)
+        if opts.get("spans") is True:
+            opts["spans"] = str(Path("artifacts") / "profile" / "spans.jsonl")
+        elif opts.get("spans") is False:
+            opts["spans"] = None
+        opts.setdefault("prometheus_file", secrets.get("WAO_PROM_FILE"))
+        port = opts.get("prometheus_port", secrets.get("WAO_METRICS_PORT"))
+        opts["prometheus_port"] = int(port) if port else None
+        return cls(**{k: opts[k] for k in cls.__slots__ if k in opts})
+
+
+# ---- Prometheus ----
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metrics:
+    """Process-wide counters/gauges rendered in the Prometheus text exposition format."""
+
+    HELP = {
+        "wao_runs_total": ("counter", "Finished flow runs by status"),
+        "wao_run_duration_seconds_sum": ("counter", "Total wall time of finished runs"),
+        "wao_run_duration_seconds_count": ("counter", "Number of timed runs"),
+        "wao_step_duration_seconds_sum": ("counter", "Total wall time spent in a step"),
+        "wao_step_duration_seconds_count": ("counter", "Number of executions of a step"),
+        "wao_step_requests_total": ("counter", "Network requests issued during a step"),
+        "wao_step_failed_requests_total": ("counter", "Network requests that failed during a step"),
+        "wao_step_response_bytes_total": ("counter", "Encoded response bytes received during a step"),
+        "wao_step_cpu_seconds_total": ("counter", "Renderer main-thread time during a step by phase"),
+        "wao_browser_rss_bytes": ("gauge", "RSS of the runner process tree at the end of the last step"),
+    }
+
+    def __init__(self) -> None:
+        self._values: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe_step(self, site: str, profile: Mapping[str, Any]) -> None:
+        labels = {"site": site, "step": str(profile.get("name") or f"{profile['i']:02d}_{profile.get('act')}")}
+        self.add("wao_step_duration_seconds_sum", profile.get("ms", 0) / 1000.0, **labels)
+        self.add("wao_step_duration_seconds_count", 1, **labels)
+        self.add("wao_step_requests_total", profile.get("requests", 0), **labels)
+        self.add("wao_step_failed_requests_total", profile.get("failed", 0), **labels)
+        self.add("wao_step_response_bytes_total", profile.get("bytes", 0), **labels)
+        for phase, ms in (profile.get("cpu") or {}).items():
+            self.add("wao_step_cpu_seconds_total", ms / 1000.0, phase=phase.replace("_ms", ""), **labels)
+        if profile.get("rss_kb") is not None:
+            self.set("wao_browser_rss_bytes", profile["rss_kb"] * 1024.0, site=site)
+
+    def observe_run(self, site: str, status: str, seconds: float) -> None:
+        self.add("wao_runs_total", 1, site=site, status=status)
+        self.add("wao_run_duration_seconds_sum", seconds, site=site)
+        self.add("wao_run_duration_seconds_count", 1, site=site)
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines: List[str] = []
+        family = None
+        for (name, labels), value in items:
+            base = re.sub(r"_(sum|count)$", "", name)
+            if base != family:
+                family = base
+                kind, text = self.HELP.get(name, ("untyped", name))
+                if name != base:
+                    kind, text = "summary", text
+                lines.append(f"# HELP {base} {text}")
+                lines.append(f"# TYPE {base} {kind}")
+            lab = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{lab}}} {value:g}" if lab else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path) -> None:
+        """Atomic write for node_exporter's textfile collector (``*.prom``)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+METRICS = Metrics()
+_servers: Dict[int, ThreadingHTTPServer] = {}
+_servers_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: object) -> None:
+        log.debug("metrics %s", format % args)
+
+    def do_GET(self) -> None:
+        body = METRICS.render().encode("utf-8") if self.path.split("?")[0] in ("/", "/metrics") else b""
+        self.send_response(200 if body else 404)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Start (once per port) a ``/metrics`` scrape endpoint on a daemon thread."""
+    with _servers_lock:
+        server = _servers.get(port)
+        if server is None:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="wao-metrics", daemon=True).start()
+            _servers[port] = server
+            log.info("Prometheus metrics on http://%s:%d/metrics", host, server.server_port)
+        return server
+
+
+# ---- spans ----
+class SpanWriter:
+    """OpenTelemetry-style spans (one run span, one child per step) appended as JSON lines."""
+
+    def __init__(self, path: Path, service: str = "wao") -> None:
+        self.path = Path(path)
+        self.service = service
+        self.trace_id = _rand.token_hex(16)
+        self.root_id = _rand.token_hex(8)
+        self._spans: List[Dict[str, Any]] = []
+
+    def span(
+        self, name: str, start_ns: int, end_ns: int, attributes: Mapping[str, Any], ok: bool, root: bool = False
+    ) -> None:
+        self._spans.append(
+            {
+                "traceId": self.trace_id,
+                "spanId": self.root_id if root else _rand.token_hex(8),
+                "parentSpanId": None if root else self.root_id,
+                "name": name,
+                "kind": "SPAN_KIND_INTERNAL",
+                "startTimeUnixNano": start_ns,
+                "endTimeUnixNano": end_ns,
+                "attributes": {k: v for k, v in attributes.items() if v is not None},
+                "status": {"code": "STATUS_CODE_OK" if ok else "STATUS_CODE_ERROR"},
+                "resource": {"service.name": self.service},
+            }
+        )
+
+    def flush(self) -> None:
+        if not self._spans:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for s in self._spans:
+                f.write(json.dumps(s, ensure_ascii=False) + "\n")
+        self._spans = []
+
+
+def _flatten(prefix: str, values: Mapping[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in values.items():
+        if isinstance(v, Mapping):
+            out.update(_flatten(f"{prefix}{k}.", v))
+        else:
+            out[f"{prefix}{k}"] = v
+    return out
+
+
+# ---- the hook layer ----
+class StepProfiler:
+    """Counters fed by browser events plus per-step snapshots; see the module docstring.
+
+    ``attach``/``begin``/``end`` drive a sync Playwright page, ``aattach``/
+    ``abegin``/``aend`` an async one. All failures are swallowed: profiling
+    must never fail a run.
+    """
+
+    def __init__(self, options: ProfileOptions, site: str, trace: Any) -> None:
+        self.options = options
+        self.site = site
+        self._trace = trace
+        self._cdp: Any = None
+        self.requests = 0
+        self.failed = 0
+        self.bytes = 0
+        self._origin: Optional[float] = None
+        self._run_start_ns = time.time_ns()
+        self.spans = SpanWriter(Path(options.spans)) if options.spans else None
+        if options.prometheus_port:
+            try:
+                serve_metrics(options.prometheus_port)
+            except OSError as e:
+                log.warning("Metrics endpoint not started on :%s (%s)", options.prometheus_port, e)
+
+    # event callbacks (run on the Playwright dispatcher)
+    def _on_request(self, *_: Any) -> None:
+        self.requests += 1
+
+    def _on_failed(self, *_: Any) -> None:
+        self.failed += 1
+
+    def _on_finished(self, params: Mapping[str, Any]) -> None:
+        self.bytes += int(params.get("encodedDataLength") or 0)
+
+    def _on_response(self, response: Any) -> None:
+        try:
+            self.bytes += int(response.headers.get("content-length") or 0)
+        except (TypeError, ValueError):
+            pass
+
+    def _page_events(self, page: Any) -> None:
+        page.on("request", self._on_request)
+        page.on("requestfailed", self._on_failed)
+        page.on("response", self._on_response)
+
+    def _cdp_events(self, cdp: Any) -> None:
+        cdp.on("Network.requestWillBeSent", self._on_request)
+        cdp.on("Network.loadingFailed", self._on_failed)
+        cdp.on("Network.loadingFinished", self._on_finished)
+
+    def attach(self, context: Any, page: Any) -> None:
+        if self.options.cdp:
+            try:
+                cdp = context.new_cdp_session(page)
+                cdp.send("Performance.enable")
+                cdp.send("Network.enable")
+                self._cdp_events(cdp)
+                self._cdp = cdp
+                return
+            except Exception as e:
+                log.debug("CDP profiling unavailable (%s); using page events", e)
+        self._page_events(page)
+
+    async def aattach(self, context: Any, page: Any) -> None:
+        if self.options.cdp:
+            try:
+                cdp = await context.new_cdp_session(page)
+                await cdp.send("Performance.enable")
+                await cdp.send("Network.enable")
+                self._cdp_events(cdp)
+                self._cdp = cdp
+                return
+            except Exception as e:
+                log.debug("CDP profiling unavailable (%s); using page events", e)
+        self._page_events(page)
+
+    # snapshots
+    @staticmethod
+    def _cpu(metrics: Any) -> Dict[str, float]:
+        values = {m["name"]: float(m["value"]) for m in (metrics or {}).get("metrics", [])}
+        out = {key: values[name] * 1000.0 for name, key in CPU_METRICS.items() if name in values}
+        if "JSHeapUsedSize" in values:
+            out["heap_bytes"] = values["JSHeapUsedSize"]
+        return out
+
+    def _snapshot(self, cpu: Dict[str, float]) -> Dict[str, Any]:
+        return {
+            "t": time.perf_counter(),
+            "ns": time.time_ns(),
+            "req": self.requests,
+            "fail": self.failed,
+            "bytes": self.bytes,
+            "cpu": cpu,
+        }
+
+    def begin(self) -> Dict[str, Any]:
+        cpu: Dict[str, float] = {}
+        if self._cdp is not None:
+            try:
+                cpu = self._cpu(self._cdp.send("Performance.getMetrics"))
+            except Exception:
+                pass
+        return self._snapshot(cpu)
+
+    async def abegin(self) -> Dict[str, Any]:
+        cpu: Dict[str, float] = {}
+        if self._cdp is not None:
+            try:
+                cpu = self._cpu(await self._cdp.send("Performance.getMetrics"))
+            except Exception:
+                pass
+        return self._snapshot(cpu)
+
+    def end(self, snap: Dict[str, Any], action: Any, page: Any, ok: bool) -> None:
+        cpu: Dict[str, float] = {}
+        nav = None
+        try:
+            if self._cdp is not None:
+                cpu = self._cpu(self._cdp.send("Performance.getMetrics"))
+            nav = page.evaluate(_NAV_JS)
+        except Exception:
+            pass
+        self._emit(snap, action, cpu, nav, ok)
+
+    async def aend(self, snap: Dict[str, Any], action: Any, page: Any, ok: bool) -> None:
+        cpu: Dict[str, float] = {}
+        nav = None
+        try:
+            if self._cdp is not None:
+                cpu = self._cpu(await self._cdp.send("Performance.getMetrics"))
+            nav = await page.evaluate(_NAV_JS)
+        except Exception:
+            pass
+        self._emit(snap, action, cpu, nav, ok)
+
+    def _emit(
+        self, snap: Dict[str, Any], action: Any, cpu: Dict[str, float], nav: Optional[Dict[str, Any]], ok: bool
+    ) -> None:
+        try:
+            profile = self.step_profile(snap, action, cpu, nav, ok)
+            self._trace("step_profile", profile)
+            METRICS.observe_step(self.site, profile)
+            if self.spans is not None:
+                attrs = _flatten("wao.", {k: v for k, v in profile.items() if k not in ("ok",)})
+                self.spans.span(f"step {profile['name'] or action.kind}", snap["ns"], time.time_ns(), attrs, ok)
+        except Exception as e:
+            log.debug("step profile dropped: %s", e)
+
+    def step_profile(
+        self, snap: Dict[str, Any], action: Any, cpu: Dict[str, float], nav: Optional[Dict[str, Any]], ok: bool
+    ) -> Dict[str, Any]:
+        profile: Dict[str, Any] = {
+            "i": action.index,
+            "act": action.kind,
+            "name": action.name,
+            "ok": ok,
+            "ms": round((time.perf_counter() - snap["t"]) * 1000.0, 1),
+            "requests": self.requests - snap["req"],
+            "failed": self.failed - snap["fail"],
+            "bytes": self.bytes - snap["bytes"],
+        }
+        if cpu and snap["cpu"]:
+            profile["cpu"] = {k: round(v - snap["cpu"].get(k, 0.0), 1) for k, v in cpu.items() if k != "heap_bytes"}
+            if "heap_bytes" in cpu:
+                profile["heap_mb"] = round(cpu["heap_bytes"] / 1e6, 1)
+        if nav and nav.get("origin") != self._origin:
+            # a new document was loaded during this step
+            self._origin = nav.get("origin")
+            profile["nav"] = {k: round(float(v), 1) for k, v in nav.items() if k not in ("origin", "type") and v}
+        if self.options.rss:
+            profile["rss_kb"] = proc_tree_rss_kb()
+        return profile
+
+    def finish(self, status: str) -> None:
+        """Run-level metrics/span and exporter flushes; called once from the runner's finally."""
+        seconds = (time.time_ns() - self._run_start_ns) / 1e9
+        try:
+            METRICS.observe_run(self.site, status, seconds)
+            if self.spans is not None:
+                attrs = {"wao.site": self.site, "wao.status": status}
+                self.spans.span(f"run {self.site}", self._run_start_ns, time.time_ns(), attrs, status == "ok", True)
+                self.spans.flush()
+            if self.options.prometheus_file:
+                METRICS.write_textfile(Path(self.options.prometheus_file))
+        except Exception as e:
+            log.warning("Profile export failed: %s", e)
+
+
+# ---- reports ----
+def _p50(values: List[float]) -> float:
+    data = sorted(values)
+    return data[(len(data) - 1) // 2] if data else 0.0
+
+
+def hot_steps(records: Iterable[Mapping[str, Any]], sort: str = "ms") -> List[Dict[str, Any]]:
+    """Aggregate ``step_profile`` records per step (median across runs), hottest first."""
+    groups: Dict[Tuple[int, str], List[Mapping[str, Any]]] = {}
+    for r in records:
+        groups.setdefault((int(r["i"]), str(r.get("name") or r.get("act"))), []).append(r)
+    rows: List[Dict[str, Any]] = []
+    for (i, name), rs in groups.items():
+        cpu = [sum((r.get("cpu") or {}).values()) for r in rs]
+        rows.append(
+            {
+                "i": i,
+                "step": name,
+                "act": rs[0].get("act"),
+                "runs": len(rs),
+                "ms": _p50([float(r.get("ms", 0)) for r in rs]),
+                "max_ms": max(float(r.get("ms", 0)) for r in rs),
+                "requests": _p50([float(r.get("requests", 0)) for r in rs]),
+                "bytes": _p50([float(r.get("bytes", 0)) for r in rs]),
+                "cpu": _p50(cpu),
+                "script": _p50([float((r.get("cpu") or {}).get("script_ms", 0)) for r in rs]),
+                "rss_mb": max(float(r.get("rss_kb") or 0) for r in rs) / 1024.0,
+                "errors": sum(1 for r in rs if not r.get("ok", True)),
+            }
+        )
+    rows.sort(key=lambda row: float(row[sort]), reverse=True)
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]], top: Optional[int] = None) -> str:
+    total = sum(r["ms"] for r in rows) or 1.0
+    head = f"{'step':<28} {'runs':>4} {'p50 ms':>9} {'max ms':>9} {'%':>5} {'req':>5} {'KiB':>9} {'cpu ms':>8} "
+    head += f"{'js ms':>7} {'rss MiB':>8} {'err':>3}"
+    lines = [head, "-" * len(head)]
+    for r in rows[:top] if top else rows:
+        label = f"{r['i']:02d} {r['step']}"[:28]
+        lines.append(
+            f"{label:<28} {r['runs']:>4} {r['ms']:>9.1f} {r['max_ms']:>9.1f} {r['ms'] * 100 / total:>5.1f} "
+            f"{r['requests']:>5.0f} {r['bytes'] / 1024:>9.1f} {r['cpu']:>8.1f} {r['script']:>7.1f} "
+            f"{r['rss_mb']:>8.1f} {r['errors']:>3}"
+        )
+    return "\n".join(lines)
+
+
+def read_profiles(paths: Iterable[Path]) -> List[Dict[str, Any]]:
+    """``step_profile`` records from run traces (plain, .gz or .zst)."""
+    from .trace import open_trace
+
+    out: List[Dict[str, Any]] = []
+    for p in paths:
+        with open_trace(Path(p)) as fh:
+            for line in fh:
+                if '"step_profile"' not in line:
+                    continue
+                rec = json.loads(line)
+                if rec.get("kind") == "step_profile":
+                    out.append(rec)
+    return out
@@ -1,15 +1,11 @@
 from __future__ import annotations
 
-import hashlib
-import json
-import random
-import re
 import sys
 import time
+from concurrent.futures import Future
 from contextlib import contextmanager
-from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from playwright.sync_api import (
     Browser,
@@ -20,16 +16,32 @@ from playwright.sync_api import (
 )
 
 from . import secrets
+from .actions import Action, compile_steps
+from .actions.waits import track_requests, uses_network_idle
+from .artifact_store import ArtifactOptions, ArtifactUploads
+from .browser_pool import BrowserLease, BrowserPool
+from .capture import CaptureOptions, FailureCapture
+from .downloads import DownloadStore
 from .logging_setup import get_logger
+from .network import NetworkPolicy
+from .policies import RetryPlan
+from .profiling import ProfileOptions, StepProfiler
+from .session_cache import SessionPlan
+from .templating import Scope
+from .trace import TraceSink
 
 log = get_logger(__name__)
 
 
 class Runner:
-    def __init__(self, dsl: Dict[str, Any]):
+    def __init__(self, dsl: Dict[str, Any], pool: Optional[BrowserPool] = None):
         self.dsl = dsl
         self.state: Dict[str, Any] = {}
-        self.artifacts_dir = Path("artifacts")
+        # {{var}} lookups: loop frames (foreach) over state
+        self.vars = Scope(self.state)
+        # Local artifact root and the store finished files are shipped to (options.artifacts)
+        self.artifact_options = ArtifactOptions.from_flow(self.dsl)
+        self.artifacts_dir = Path(self.artifact_options.dir)
         self.failed_dir = self.artifacts_dir / "failed"
         self.artifacts_dir.mkdir(parents=True, exist_ok=True)
         self.failed_dir.mkdir(parents=True, exist_ok=True)
@@ -37,17 +49,30 @@ class Runner:
         # Downloads directory (for wait_download / verify_file)
         self.downloads_dir = self.artifacts_dir / "downloads"
         self.downloads_dir.mkdir(parents=True, exist_ok=True)
+        # Download manifest / content store (options.downloads, skip_if_unchanged, dedupe)
+        self.download_store = DownloadStore.from_flow(self.dsl, self.downloads_dir)
 
-        # Trace (JSONL) output
+        # Trace (JSONL) output: one buffered handle per run (options.trace)
         self.trace_dir = self.artifacts_dir / "trace"
-        self.trace_dir.mkdir(parents=True, exist_ok=True)
-        self.trace_path = self.trace_dir / f"run_{self._timestamp()}.jsonl"
+        self._tracer = TraceSink.for_run(self.trace_dir, (self.dsl.get("options") or {}).get("trace"))
+        self.trace_path = self._tracer.path
+        # Background uploads (wait_download "to": "s3://...", mirrored artifacts)
+        self.uploads = ArtifactUploads(self.artifact_options, self.trace_path.name.split(".")[0], self._trace)
 
         self._pw: Optional[Playwright] = None
         self._browser: Optional[Browser] = None
         self._context: Optional[BrowserContext] = None
         self._page: Optional[Page] = None
 
+        # Compile steps into pre-bound actions before paying for a browser
+        self._plan: List[Action] = compile_steps(self.dsl.get("steps", []))
+        # network_idle waits count requests from page creation on
+        self._track_network = uses_network_idle(self.dsl.get("steps"))
+
+        # Optional shared browser pool: the Runner then only owns its context
+        self._pool = pool
+        self._lease: Optional[BrowserLease] = None
+
         # Determine HTTPS error policy (DSL option > env var)
         # DSL example:
         # {
@@ -63,19 +88,53 @@ class Runner:
             # Environment override: WAO_IGNORE_HTTPS_ERRORS=1/true/on
             _env_val = secrets.get("WAO_IGNORE_HTTPS_ERRORS", "0") or "0"
             ignore_https_errors = str(_env_val).strip().lower() in {"1", "true", "on", "yes"}
+        self.ignore_https_errors = ignore_https_errors
+
+        # Request blocking/interception (options.network)
+        self._network = NetworkPolicy.from_options(_opts.get("network"), self.dsl.get("site"))
+
+        # Authenticated session reuse (options.session + "segment": "login" steps)
+        self._session = SessionPlan.from_flow(self.dsl, self._plan, self.artifacts_dir / "sessions")
+        self._probing = False
+        self._retries = RetryPlan(self._plan, _opts.get("retry"))
+        self._capture = FailureCapture(
+            self.failed_dir, CaptureOptions.from_options(_opts.get("failure_artifacts")), self._trace
+        )
+        self._deferred: List[Tuple[str, "Future[Any]", Callable[[Any], Optional[str]]]] = []
+        # Extra keys for step records (parallel branch runtimes set {"parent", "branch"})
+        self._trace_scope: Dict[str, Any] = {}
+        # Per-step profiling hooks (options.profile / WAO_PROFILE)
+        _profile = ProfileOptions.from_options(_opts.get("profile"))
+        self._profiler = (
+            StepProfiler(_profile, str(self.dsl.get("site", "-")), self._trace) if _profile.enabled else None
+        )
+        context_options: Dict[str, Any] = {
+            "accept_downloads": True,
+            "ignore_https_errors": ignore_https_errors,
+        }
+        if self._session is not None and self._session.state is not None:
+            context_options["storage_state"] = self._session.state
 
         # --- Playwright bootstrap (single browser/page reused across steps) ---
         try:
-            self._pw = sync_playwright().start()
-            # Headless by default; adjust if needed
-            self._browser = self._pw.chromium.launch(headless=True)
-            # use a context for future trace/download features
-            self._context = self._browser.new_context(
-                accept_downloads=True,
-                ignore_https_errors=ignore_https_errors,
-            )
+            if self._pool is not None:
+                # Fresh isolated context on a warm, pooled browser
+                self._lease = self._pool.acquire(**context_options)
+                self._context = self._lease.context
+            else:
+                self._pw = sync_playwright().start()
+                # Headless by default; adjust if needed
+                self._browser = self._pw.chromium.launch(headless=True)
+                # use a context for future trace/download features
+                self._context = self._browser.new_context(**context_options)
             log.info("Browser context: ignore_https_errors=%s", ignore_https_errors)
+            if self._network is not None:
+                self._network.install(self._context)
             self._page = self._context.new_page()
+            if self._track_network:
+                track_requests(self._page)
+            if self._profiler is not None:
+                self._profiler.attach(self._context, self._page)
         except Exception as e:
             log.error("Failed to initialize Playwright: %s", e)
             raise
@@ -86,31 +145,29 @@ class Runner:
             raise RuntimeError("Playwright page not initialized")
         return self._page
 
-    def _trace(self, kind: str, payload: Dict[str, Any]) -> None:
-        """Append a single JSON record to the run trace (artifacts/trace/*.jsonl)."""
-        rec: Dict[str, Any] = {"ts": self._timestamp(), "kind": kind}
-        rec.update(payload or {})
-        try:
-            with self.trace_path.open("a", encoding="utf-8") as w:
-                w.write(json.dumps(rec, ensure_ascii=False) + "\n")
-        except Exception:
-            # tracing must never crash the runner
-            pass
+    def _trace(self, kind: str, payload: Dict[str, Any], encoded: Optional[Dict[str, str]] = None) -> None:
+        """Queue a single JSON record for the run trace (artifacts/trace/*.jsonl); never raises."""
+        self._tracer.write(kind, payload, encoded)
 
     @contextmanager
-    def _step_scope(self, idx: int, step: Dict[str, Any]) -> Any:
+    def _step_scope(self, action: Action) -> Any:
         """Trace step start/ok/err with timing and page URL when possible."""
+        idx = action.index
         t0 = time.perf_counter()
-        self._trace("step_start", {"i": idx, "step": step})
+        self._trace("step_start", {"i": idx, **self._trace_scope}, {"step": action.trace_json()})
+        prof = self._profiler
+        snap = prof.begin() if prof is not None else None
         try:
             yield
+            if prof is not None and snap is not None:
+                prof.end(snap, action, self._page, True)
             ms = int((time.perf_counter() - t0) * 1000)
             url = ""
             try:
                 url = getattr(self._page, "url", "") or ""
             except Exception:
                 pass
-            self._trace("step_ok", {"i": idx, "ms": ms, "url": url})
+            self._trace("step_ok", {"i": idx, **self._trace_scope, "ms": ms, "url": url})
         except Exception as e:
             ms = int((time.perf_counter() - t0) * 1000)
             url = ""
@@ -118,11 +175,134 @@ class Runner:
                 url = getattr(self._page, "url", "") or ""
             except Exception:
                 pass
-            self._trace("step_err", {"i": idx, "ms": ms, "url": url, "error": str(e)})
+            if prof is not None and snap is not None:
+                prof.end(snap, action, self._page, False)
+            self._trace("step_err", {"i": idx, **self._trace_scope, "ms": ms, "url": url, "error": str(e)})
             raise
 
+    @property
+    def page(self) -> Page:
+        return self._page_req()
+
+    @contextmanager
+    def _branch_browser(self, pool: Optional[BrowserPool] = None) -> Iterator[Union[Browser, BrowserPool]]:
+        """Where the calling thread opens ``parallel`` branch contexts (the sync API is thread-affine).
+
+        ``pool`` is the helper thread's own pool (see ``BrowserPool.run_threads``),
+        whose browser stays warm after the group; without one a Chromium is
+        launched for the group and closed afterwards.
+        """
+        if pool is not None:
+            yield pool
+            return
+        pw = sync_playwright().start()
+        try:
+            browser = pw.chromium.launch(headless=True)
+            try:
+                yield browser
+            finally:
+                browser.close()
+        finally:
+            pw.stop()
+
+    @contextmanager
+    def _branch_context(self, browser: Union[Browser, BrowserPool], storage_state: Any) -> Iterator[BrowserContext]:
+        """A branch context carrying the run's cookies/storage and request policy; closed (or released) on exit."""
+        options: Dict[str, Any] = {
+            "accept_downloads": True,
+            "ignore_https_errors": self.ignore_https_errors,
+            "storage_state": storage_state,
+        }
+        lease: Optional[BrowserLease] = None
+        if isinstance(browser, BrowserPool):
+            lease = browser.acquire(**options)
+            context = lease.context
+        else:
+            context = browser.new_context(**options)
+        try:
+            if self._network is not None:
+                self._network.install(context)
+            yield context
+        finally:
+            if isinstance(browser, BrowserPool) and lease is not None:
+                browser.release(lease)
+            else:
+                try:
+                    context.close()
+                except Exception:
+                    pass
+
+    def fail(self, reason: str, message: str) -> None:
+        """Assertion-style failure (assert_title / verify_file): save artifacts and exit(1)."""
+        if self._probing:
+            # a failed session probe only means "log in again"
+            raise AssertionError(message)
+        self._save_failure_artifacts(reason=reason)
+        sys.exit(1)
+
+    def defer(self, reason: str, future: "Future[Any]", check: Callable[[Any], Optional[str]]) -> None:
+        """Register background work (e.g. verify_file hashing) that is checked before run_end."""
+        self._deferred.append((reason, future, check))
+
+    def _join_deferred(self) -> None:
+        while self._deferred:
+            reason, future, check = self._deferred.pop(0)
+            msg = check(future.result())
+            if msg is not None:
+                self.fail(reason, msg)
+        errors = self.uploads.drain()
+        if errors:
+            raise RuntimeError("; ".join(errors))
+
+    def _retry_point(self, pos: int, exc: BaseException) -> Optional[Tuple[int, float]]:
+        """Resume position and backoff after a failed step (traced as step_retry), or None to fail the run."""
+        decision = self._retries.on_error(pos, exc)
+        if decision is None:
+            return None
+        resume, delay, payload = decision
+        action, target = self._plan[pos], self._plan[resume]
+        log.warning(
+            "Step %d failed (%s): attempt %d/%d from step %d in %.1fs",
+            action.index,
+            exc,
+            payload["attempt"],
+            payload["max_attempts"],
+            target.index,
+            delay,
+        )
+        self._trace("step_retry", {"i": action.index, "resume_at": target.index, **payload})
+        return resume, delay
+
+    def _probe_session(self, session: SessionPlan) -> bool:
+        """Run the flow's probe steps on the restored session; False means log in again."""
+        t0 = time.perf_counter()
+        self._probing = True
+        try:
+            for action in session.probe:
+                action.execute(self)
+        except Exception as e:
+            log.info("Cached session rejected by probe: %s", e)
+            self._trace("session_probe", {"ok": False, "ms": int((time.perf_counter() - t0) * 1000)})
+            session.cache.invalidate(session.site, session.account)
+            if self._context is not None:
+                self._context.clear_cookies()
+            return False
+        finally:
+            self._probing = False
+        log.info("Cached session reused: login steps skipped")
+        self._trace("session_probe", {"ok": True, "ms": int((time.perf_counter() - t0) * 1000)})
+        return True
+
+    def _save_session(self, session: SessionPlan) -> None:
+        # caching is an optimization: it must never fail the run
+        try:
+            if self._context is not None:
+                state = self._context.storage_state()
+                session.cache.save(session.site, session.account, state, session.started_at)
+        except Exception as e:
+            log.warning("Could not save session cache: %s", e)
+
     def run(self) -> None:  # noqa: C901
-        steps: List[Dict[str, Any]] = self.dsl.get("steps", [])
         log.info(
             "Run started: site=%s version=%s",
             self.dsl.get("site", "-"),
@@ -139,298 +319,53 @@ class Runner:
         run_status = "ok"
         run_error = None
         try:
-            for i, step in enumerate(steps, start=1):
-                # New DSL uses "act", old one used "action"
-                kind = step.get("act") or step.get("action")
-                log.info("Step %d: act=%s", i, kind)
+            session = self._session
+            if session is not None and session.state is not None:
+                session.reused = self._probe_session(session)
+            pos = 0
+            while pos < len(self._plan):
+                action = self._plan[pos]
+                if session is not None and session.skip(action.index):
+                    log.info("Step %d: act=%s (skipped: cached session)", action.index, action.kind)
+                    self._trace("step_skip", {"i": action.index, "reason": "session"})
+                    pos += 1
+                    continue
+                log.info("Step %d: act=%s", action.index, action.kind)
                 try:
-                    with self._step_scope(i, step):
-                        # ---- Navigation / open ----
-                        if kind in ("open_url", "goto"):
-                            url = secrets.resolve(step["url"])
-                            log.info("  → goto %s", url)
-                            page = self._page_req()
-                            page.goto(url)
-
-                        elif kind == "wait_for_selector":
-                            selector = step["selector"]
-                            timeout = int(step.get("timeout", 10000))
-                            state = step.get("state") or "visible"  # "attached" | "detached" | "hidden" | "visible"
-                            log.info(
-                                "  → wait_for_selector selector=%s state=%s timeout=%d",
-                                selector,
-                                state,
-                                timeout,
-                            )
-                            page = self._page_req()
-                            page.wait_for_selector(selector, state=state, timeout=timeout)
-
-                        elif kind == "wait_for_url":
-                            substr = step.get("url_substr") or step.get("contains")
-                            timeout = int(step.get("timeout", 10000))
-                            if not substr:
-                                raise ValueError("wait_for_url requires 'url_substr' (or 'contains')")
-                            log.info(
-                                "  → wait_for_url contains=%s timeout=%d",
-                                substr,
-                                timeout,
-                            )
-                            page = self._page_req()
-                            page.wait_for_load_state("load", timeout=timeout)
-                            deadline = time.time() + (timeout / 1000.0)
-                            while time.time() < deadline:
-                                if substr in page.url:
-                                    break
-                                time.sleep(0.05)
-                            else:
-                                last = page.url
-                                raise TimeoutError(
-                                    "URL did not contain " f"'{substr}' within {timeout} ms " f"(last={last})"
-                                )
-
-                        # ---- Form fill ----
-                        elif kind == "fill":
-                            sel = step["selector"]
-                            val = secrets.resolve(step.get("value"))
-                            mask = bool(step.get("mask", False))
-                            # Backward-compat: allow "text" if "value" missing
-                            if val is None:
-                                val = step.get("text", "")
-                            log.info("  → fill %s value=%s", sel, ("***" if mask else val))
-                            page = self._page_req()
-                            page.fill(sel, str(val))
-
-                        # ---- Click ----
-                        elif kind == "click":
-                            selector = step.get("selector")
-                            log.info("  → click selector=%s", selector)
-                            if selector:
-                                page = self._page_req()
-                                page.click(selector)
-
-                        # ---- Waits (basic stub) ----
-                        elif kind in ("wait", "wait_for"):
-                            timeout = int(step.get("timeout", 1000))
-                            log.info("  → %s timeout=%d ms", kind, timeout)
-                            time.sleep(timeout / 1000.0)
-
-                        # ---- Log ----
-                        elif kind == "log":
-                            level = step.get("level", "info")
-                            msg = step.get("message", "")
-                            if level == "warn":
-                                log.warning("%s", msg)
-                            elif level == "error":
-                                log.error("%s", msg)
-                            else:
-                                log.info("%s", msg)
-
-                        # ---- Random sleep ----
-                        elif kind == "sleep_random":
-                            min_ms = int(step.get("min_ms", 0))
-                            max_ms = int(step.get("max_ms", min_ms))
-                            if max_ms < min_ms:
-                                min_ms, max_ms = max_ms, min_ms
-                            dur = random.randint(min_ms, max_ms)
-                            log.info("  → sleep_random %d ms", dur)
-                            time.sleep(dur / 1000.0)
-
-                        # ---- Screenshot (stub artifact) ----
-                        elif kind == "screenshot":
-                            target = step.get("target", "viewport")  # fullpage | viewport | selector
-                            path = step.get("path")
-                            if not path:
-                                log.warning("  ! screenshot skipped: path is required")
-                            else:
-                                p = Path(path)
-                                p.parent.mkdir(parents=True, exist_ok=True)
-                                try:
-                                    page = self._page_req()
-                                    if target == "selector" and step.get("selector"):
-                                        page.locator(step["selector"]).screenshot(path=str(p))
-                                    else:
-                                        full_page = True if target == "fullpage" else False
-                                        page.screenshot(path=str(p), full_page=full_page)
-                                    log.info("  → screenshot saved: %s", str(p))
-                                except Exception as e:
-                                    log.error("  ! screenshot failed: %s", e)
-
-                        # ---- Title assertion ----
-                        elif kind == "assert_title":
-                            try:
-                                page = self._page_req()
-                                actual = page.title() or ""
-                            except Exception:
-                                actual = self.state.get("title", "")
-                            expected = step.get("expected")
-                            match_mode = step.get("match_mode", "equals")
-                            includes = step.get("includes")
-                            equals = step.get("equals")
-                            log.info("  → assert_title against: %s", actual)
-
-                            failed = False
-                            if expected is not None:
-                                if match_mode == "equals":
-                                    failed = actual != expected
-                                elif match_mode == "contains":
-                                    failed = expected not in actual
-                                elif match_mode == "matches":
-                                    try:
-                                        failed = re.search(expected, actual) is None
-                                    except re.error as e:
-                                        log.error("assert_title regex error: %s", e)
-                                        failed = True
-                                else:
-                                    log.warning(
-                                        "  ! unknown match_mode=%s (fallback equals)",
-                                        match_mode,
-                                    )
-                                    failed = actual != expected
-                                if failed:
-                                    msg = step.get("message") or (
-                                        "assert_title failed: "
-                                        f"mode={match_mode} expected='{expected}' "
-                                        f"got='{actual}'"
-                                    )
-                                    log.error("%s", msg)
-                            else:
-                                # Backward compatibility with old DSL (includes/equals)
-                                if includes:
-                                    for s in includes:
-                                        if s not in actual:
-                                            log.error(
-                                                "assert_title failed: '%s' not in '%s'",
-                                                s,
-                                                actual,
-                                            )
-                                            failed = True
-                                if equals is not None and actual != equals:
-                                    log.error(
-                                        "assert_title failed: expected '%s', got '%s'",
-                                        equals,
-                                        actual,
-                                    )
-                                    failed = True
-
-                            if failed:
-                                self._save_failure_artifacts(reason="assert_title")
-                                sys.exit(1)
-
-                        # ---- Wait for a download and save it ----
-                        elif kind == "wait_download":
-                            pattern = step.get("pattern")
-                            if not pattern:
-                                raise ValueError("wait_download requires 'pattern' (regex)")
-                            timeout = int(step.get("timeout", 30000))
-                            to_dir_val = step.get("to", str(self.downloads_dir))
-                            to_dir = Path(secrets.resolve(to_dir_val) if isinstance(to_dir_val, str) else to_dir_val)
-                            selector = step.get("selector")
-
-                            to_dir.mkdir(parents=True, exist_ok=True)
-                            page = self._page_req()
-                            log.info(
-                                "  → wait_download pattern=%s timeout=%d to=%s",
-                                pattern,
-                                timeout,
-                                to_dir,
-                            )
-                            # Expect the download, optionally trigger a click
-                            with page.expect_download(timeout=timeout) as dl_info:
-                                if selector:
-                                    log.info("  → click selector=%s (to trigger download)", selector)
-                                    page.click(selector)
-                            download = dl_info.value
-                            suggested = download.suggested_filename
-                            if re.search(pattern, suggested) is None:
-                                raise ValueError(
-                                    f"Downloaded filename '{suggested}' does not match pattern '{pattern}'"
-                                )
-                            dest_path = to_dir / suggested
-                            download.save_as(str(dest_path))
-                            self.state["last_download_path"] = str(dest_path)
-                            log.info("  → downloaded: %s", dest_path)
-
-                        # ---- Verify a file's hash ----
-                        elif kind == "verify_file":
-                            path_val = step.get("path")
-                            algo = (step.get("hash") or "").lower()
-                            expected = step.get("expected")
-                            if not path_val or not algo or not expected:
-                                raise ValueError("verify_file requires 'path', 'hash', and 'expected'")
-                            file_path = Path(secrets.resolve(path_val) if isinstance(path_val, str) else path_val)
-                            if not file_path.is_file():
-                                raise FileNotFoundError(f"verify_file: not found: {file_path}")
-                            if algo not in {"sha256", "sha1", "md5"}:
-                                raise ValueError("verify_file 'hash' must be one of: sha256, sha1, md5")
-
-                            h = hashlib.new(algo)
-                            with open(file_path, "rb") as rf:
-                                for chunk in iter(lambda: rf.read(8192), b""):
-                                    h.update(chunk)
-                            actual = h.hexdigest()
-                            if actual.lower() != str(expected).lower():
-                                msg = f"verify_file failed: {algo} expected={expected} actual={actual} path={file_path}"
-                                log.error("%s", msg)
-                                self._save_failure_artifacts(reason="verify_file")
-                                sys.exit(1)
-                            log.info("  → verify_file OK: %s=%s (%s)", algo, actual, file_path)
-
-                        # ---- Download (actual implementation) ----
-                        elif kind == "download":
-                            # Supports either clicking a selector OR opening a direct URL.
-                            # Optional keys:
-                            #   - selector: CSS selector to click to trigger download
-                            #   - url: direct URL that triggers download
-                            #   - path: destination file path (defaults to artifacts/downloads/<suggested>)
-                            #   - timeout: ms (default 30000)
-                            timeout = int(step.get("timeout", 30000))
-                            selector = step.get("selector")
-                            url_value = step.get("url")
-
-                            if not selector and not url_value:
-                                raise ValueError("download requires either 'selector' or 'url'")
-
-                            # Resolve destination path (if provided), else default to downloads/<suggested_filename>
-                            dest_val = step.get("path")
-                            page = self._page_req()
-                            log.info("  → download start timeout=%d selector=%s url=%s", timeout, selector, url_value)
-
-                            with page.expect_download(timeout=timeout) as dl_info:
-                                if selector:
-                                    log.info("  → click selector=%s (to trigger download)", selector)
-                                    page.click(selector)
-                                else:
-                                    # Direct URL download (navigate to the file URL)
-                                    resolved_url = secrets.resolve(url_value)
-                                    log.info("  → open download URL: %s", resolved_url)
-                                    page.goto(resolved_url)
-
-                            download = dl_info.value
-                            suggested = download.suggested_filename
-                            # Decide destination path
-                            if dest_val:
-                                dest_path = Path(secrets.resolve(dest_val) if isinstance(dest_val, str) else dest_val)
-                            else:
-                                dest_path = self.downloads_dir / suggested
-
-                            dest_path.parent.mkdir(parents=True, exist_ok=True)
-                            download.save_as(str(dest_path))
-                            self.state["last_download_path"] = str(dest_path)
-                            log.info("  → download saved: %s (suggested=%s)", dest_path, suggested)
-
-                        else:
-                            log.warning("  ! unknown act/action: %s (skip)", kind)
-
+                    with self._step_scope(action):
+                        action.execute(self)
+                    if session is not None and not session.reused and action.index == session.last_login:
+                        self._save_session(session)
                 except Exception as e:
-                    log.error("Step %d failed: %s", i, e)
+                    retry = self._retry_point(pos, e)
+                    if retry is not None:
+                        time.sleep(retry[1])
+                        pos = retry[0]
+                        continue
+                    log.error("Step %d failed: %s", action.index, e)
                     run_status = "error"
                     run_error = str(e)
                     self._save_failure_artifacts(reason="step")
                     raise
+                pos += 1
+            try:
+                self._join_deferred()
+            except Exception as e:
+                log.error("Background check failed: %s", e)
+                run_status = "error"
+                run_error = str(e)
+                self._save_failure_artifacts(reason="step")
+                raise
 
         finally:
+            if self._network is not None:
+                self._trace("network", self._network.stats())
             try:
-                if self._context is not None:
+                if self._lease is not None and self._pool is not None:
+                    # pooled: close only our context; the browser stays warm
+                    self._pool.release(self._lease)
+                    self._lease = None
+                elif self._context is not None:
                     try:
                         self._context.close()
                     except Exception:
@@ -438,6 +373,14 @@ class Runner:
                 if self._browser is not None:
                     self._browser.close()
             finally:
+                # failure screenshots/HTML are written in the background: make them durable first
+                self._capture.flush()
+                for path in self._capture.saved:
+                    self.uploads.mirror(path, "failed")
+                for err in self.uploads.drain():
+                    log.error("%s", err)
+                if self._profiler is not None:
+                    self._profiler.finish(run_status)
                 # write a single run_end record based on aggregated status
                 try:
                     payload = {"status": run_status}
@@ -446,32 +389,15 @@ class Runner:
                     self._trace("run_end", payload)
                 except Exception:
                     pass
+                # drain + fsync so run_end is durable
+                self._tracer.close()
+                self.uploads.ship_trace(self.trace_path)
                 if self._pw is not None:
                     self._pw.stop()
 
         log.info("Run finished")
 
-    def _timestamp(self) -> str:
-        return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-
     def _save_failure_artifacts(self, reason: str = "error") -> None:
-        try:
-            page = self._page
-            if page is None:
-                return
-            ts = self._timestamp()
-            png = self.failed_dir / f"failed_{reason}_{ts}.png"
-            html = self.failed_dir / f"failed_{reason}_{ts}.html"
-            try:
-                page.screenshot(path=str(png), full_page=True)
-                log.error("Saved failure screenshot: %s", png)
-            except Exception:
-                pass
-            try:
-                html_content = page.content()
-                html.write_text(html_content, encoding="utf-8")
-                log.error("Saved failure HTML: %s", html)
-            except Exception:
-                pass
-        except Exception:
-            pass
+        """Screenshot + HTML of the current page (options.failure_artifacts); written in the background."""
+        if self._page is not None:
+            self._capture.capture(self._page, reason)
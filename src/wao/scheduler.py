@@ -0,0 +1,310 @@
+"""Job scheduling for ``wao serve``: per-site limits, fair sharing between tenants, a durable queue.
+
+When every tenant's monthly jobs are queued at 08:00 on the 1st they target
+the same few portals. The scheduler decides which queued job may start:
+
+* per ``site`` (the flow's ``site`` field): a token bucket of
+  ``rate_per_min`` starts with ``burst`` headroom, and at most
+  ``max_sessions`` jobs running at once;
+* ``jitter_s``: each job becomes eligible a random 0..jitter_s seconds
+  after it was queued, so a cron burst is spread instead of arriving as one
+  wave of logins;
+* across tenants, weighted fair queuing: each job gets a virtual finish
+  time ``max(V, tenant's last finish) + 1 / weight``, and the eligible job
+  with the smallest one starts first. A tenant queuing 500 jobs delays
+  another tenant's single job by at most one slot per weight ratio, not by
+  500 jobs.
+
+Queued jobs live in SQLite (``--db``), with their eligibility time and
+virtual finish time, so a restart resumes the same order; jobs that were
+running when the process died are queued again.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, site TEXT NOT NULL, tenant TEXT NOT NULL,
+  payload TEXT NOT NULL, status TEXT NOT NULL, not_before REAL NOT NULL, vstart REAL NOT NULL, vfinish REAL NOT NULL);
+"""
+
+
+class SiteLimit:
+    """Limits for one site; 0 disables a limit."""
+
+    __slots__ = ("rate_per_min", "burst", "max_sessions", "jitter_s")
+
+    def __init__(self, rate_per_min: float = 0, burst: int = 1, max_sessions: int = 0, jitter_s: float = 0) -> None:
+        self.rate_per_min = max(0.0, float(rate_per_min))
+        self.burst = max(1, int(burst))
+        self.max_sessions = max(0, int(max_sessions))
+        self.jitter_s = max(0.0, float(jitter_s))
+
+    @classmethod
+    def from_options(cls, raw: Optional[Mapping[str, Any]], base: Optional["SiteLimit"] = None) -> "SiteLimit":
+        merged = {k: getattr(base, k) for k in cls.__slots__} if base else {}
+        unknown = sorted(set(raw or {}) - set(cls.__slots__))
+        if unknown:
+            raise ValueError(f"unknown site limit(s): {', '.join(unknown)}")
+        return cls(**{**merged, **(raw or {})})
+
+
+class SchedulePolicy:
+    """``--schedule`` file: ``{"default": {...}, "sites": {"<site>": {...}}, "tenants": {"<tenant>": weight}}``."""
+
+    def __init__(
+        self,
+        default: Optional[SiteLimit] = None,
+        sites: Optional[Mapping[str, SiteLimit]] = None,
+        weights: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        self.default = default or SiteLimit()
+        self.sites = dict(sites or {})
+        self.weights = {k: float(v) for k, v in (weights or {}).items()}
+        if any(w <= 0 for w in self.weights.values()):
+            raise ValueError("tenant weights must be positive")
+
+    @classmethod
+    def from_mapping(cls, raw: Mapping[str, Any]) -> "SchedulePolicy":
+        default = SiteLimit.from_options(raw.get("default"))
+        sites = {str(k): SiteLimit.from_options(v, default) for k, v in (raw.get("sites") or {}).items()}
+        return cls(default, sites, raw.get("tenants"))
+
+    @classmethod
+    def from_file(cls, path: Path) -> "SchedulePolicy":
+        return cls.from_mapping(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def limit(self, site: str) -> SiteLimit:
+        return self.sites.get(site, self.default)
+
+    def weight(self, tenant: str) -> float:
+        return self.weights.get(tenant, 1.0)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate_per_s: float, burst: int, now: float) -> None:
+        self.rate = rate_per_s
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.stamp = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 = take one now)."""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+@dataclass(order=True)
+class Ticket:
+    """A queued job as the scheduler sees it; ``payload`` is whatever the daemon needs to rebuild the job."""
+
+    vfinish: float
+    seq: int
+    id: str = field(compare=False)
+    site: str = field(compare=False)
+    tenant: str = field(compare=False)
+    payload: Dict[str, Any] = field(compare=False, repr=False)
+    not_before: float = field(compare=False, default=0.0)
+    vstart: float = field(compare=False, default=0.0)
+
+
+class Scheduler:
+    """Persisted queue + dispatch decisions; thread-safe (``pop`` blocks worker threads).
+
+    ``db_path=None`` keeps the queue in memory (lost on restart).
+    """
+
+    def __init__(
+        self,
+        policy: Optional[SchedulePolicy] = None,
+        db_path: Optional[Path] = None,
+        clock: Callable[[], float] = time.time,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.policy = policy or SchedulePolicy()
+        self._clock = clock
+        self._rng = rng or random.Random()
+        if db_path is not None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(db_path) if db_path else ":memory:", check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self._cond = threading.Condition()
+        self._delayed: List[Tuple[float, int, Ticket]] = []
+        self._ready: Dict[str, List[Ticket]] = {}
+        self._running: Dict[str, int] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._tenant_finish: Dict[str, float] = {}
+        self._vtime = 0.0
+        self._depth = 0
+        self._stopped = False
+
+    # ---- queue ----
+    def recover(self) -> List[Ticket]:
+        """Load the persisted queue (interrupted jobs included); returns the tickets in start order."""
+        with self._cond:
+            self.db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self.db.commit()
+            rows = self.db.execute(
+                "SELECT seq, id, site, tenant, payload, not_before, vstart, vfinish FROM jobs ORDER BY vfinish, seq"
+            ).fetchall()
+            tickets = [Ticket(vf, seq, i, s, t, json.loads(p), nb, vs) for seq, i, s, t, p, nb, vs, vf in rows]
+            if tickets:
+                self._vtime = min(t.vstart for t in tickets)
+            for t in tickets:
+                self._tenant_finish[t.tenant] = max(self._tenant_finish.get(t.tenant, 0.0), t.vfinish)
+                self._index(t)
+            self._cond.notify_all()
+        if tickets:
+            log.info("Scheduler: %d queued job(s) recovered", len(tickets))
+        return tickets
+
+    def push(self, job_id: str, site: str, tenant: str, payload: Dict[str, Any], capacity: int = 0) -> Optional[Ticket]:
+        """Queue a job (persisted before it is visible to workers); None when ``capacity`` is reached."""
+        with self._cond:
+            if capacity and self._depth >= capacity:
+                return None
+            vstart = max(self._vtime, self._tenant_finish.get(tenant, 0.0))
+            vfinish = vstart + 1.0 / self.policy.weight(tenant)
+            jitter = self.policy.limit(site).jitter_s
+            not_before = self._clock() + (self._rng.uniform(0, jitter) if jitter else 0.0)
+            try:
+                cur = self.db.execute(
+                    "INSERT INTO jobs (id, site, tenant, payload, status, not_before, vstart, vfinish)"
+                    " VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, site, tenant, json.dumps(payload, ensure_ascii=False), not_before, vstart, vfinish),
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"job {job_id} is already queued") from None
+            self.db.commit()
+            self._tenant_finish[tenant] = vfinish
+            ticket = Ticket(vfinish, int(cur.lastrowid or 0), job_id, site, tenant, payload, not_before, vstart)
+            self._index(ticket)
+            self._cond.notify()
+            return ticket
+
+    def _index(self, ticket: Ticket) -> None:
+        self._depth += 1
+        if ticket.not_before > self._clock():
+            heapq.heappush(self._delayed, (ticket.not_before, ticket.seq, ticket))
+        else:
+            heapq.heappush(self._ready.setdefault(ticket.site, []), ticket)
+
+    def _promote(self, now: float) -> None:
+        while self._delayed and self._delayed[0][0] <= now:
+            ticket = heapq.heappop(self._delayed)[2]
+            heapq.heappush(self._ready.setdefault(ticket.site, []), ticket)
+
+    def _bucket(self, site: str, limit: SiteLimit, now: float) -> TokenBucket:
+        bucket = self._buckets.get(site)
+        if bucket is None:
+            bucket = self._buckets[site] = TokenBucket(limit.rate_per_min / 60.0, limit.burst, now)
+        return bucket
+
+    def _pick(self, now: float) -> Tuple[Optional[Ticket], Optional[float]]:
+        """The startable ticket with the smallest virtual finish, else how long until one may be."""
+        best: Optional[Ticket] = None
+        wait = self._delayed[0][0] - now if self._delayed else None
+        for site, heap in self._ready.items():
+            if not heap:
+                continue
+            limit = self.policy.limit(site)
+            if limit.max_sessions and self._running.get(site, 0) >= limit.max_sessions:
+                continue  # done() wakes the waiters
+            delay = self._bucket(site, limit, now).wait_time(now)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            if best is None or heap[0] < best:
+                best = heap[0]
+        return best, wait
+
+    # ---- dispatch ----
+    def pop(self, timeout: Optional[float] = None) -> Optional[Ticket]:
+        """Block until a job may start (then it counts as running); None on timeout or after :meth:`stop`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._stopped:
+                now = self._clock()
+                self._promote(now)
+                ticket, wait = self._pick(now)
+                if ticket is not None:
+                    self._start(ticket, now)
+                    return ticket
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+            return None
+
+    def _start(self, ticket: Ticket, now: float) -> None:
+        heapq.heappop(self._ready[ticket.site])
+        limit = self.policy.limit(ticket.site)
+        self._bucket(ticket.site, limit, now).take()
+        self._running[ticket.site] = self._running.get(ticket.site, 0) + 1
+        self._depth -= 1
+        self._vtime = max(self._vtime, ticket.vstart)
+        self.db.execute("UPDATE jobs SET status = 'running' WHERE seq = ?", (ticket.seq,))
+        self.db.commit()
+
+    def done(self, ticket: Ticket) -> None:
+        """A started job finished (either way): free its session slot and drop it from the queue store."""
+        with self._cond:
+            self._running[ticket.site] = max(0, self._running.get(ticket.site, 0) - 1)
+            self.db.execute("DELETE FROM jobs WHERE seq = ?", (ticket.seq,))
+            self.db.commit()
+            self._cond.notify_all()
+
+    # ---- lifecycle / status ----
+    def depth(self) -> int:
+        with self._cond:
+            return self._depth
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """``{site: {"queued", "running"}}`` for ``/status``."""
+        with self._cond:
+            out: Dict[str, Dict[str, int]] = {}
+            for site, heap in self._ready.items():
+                out.setdefault(site, {"queued": 0, "running": 0})["queued"] += len(heap)
+            for _, _, ticket in self._delayed:
+                out.setdefault(ticket.site, {"queued": 0, "running": 0})["queued"] += 1
+            for site, n in self._running.items():
+                out.setdefault(site, {"queued": 0, "running": 0})["running"] = n
+            return {k: v for k, v in out.items() if v["queued"] or v["running"]}
+
+    def stop(self) -> None:
+        """Wake every waiting worker; ``pop`` returns None from now on (queued jobs stay in the store)."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self.db.close()
@@ -2,30 +2,46 @@ from __future__ import annotations
 
 import os
 import re
+import threading
 from pathlib import Path
 from typing import Any, Mapping, Sequence
 
-from dotenv import load_dotenv
-
-# --- .env auto-load ---
+# --- .env auto-load (deferred to the first lookup so importing wao stays cheap) ---
 _HERE = Path(__file__).resolve()
 _REPO_ROOT = _HERE.parents[2] if len(_HERE.parents) >= 2 else Path.cwd()
-_DOTENV_CANDIDATES = [
-    _REPO_ROOT / ".env",
-    Path.cwd() / ".env",
-]
-for _p in _DOTENV_CANDIDATES:
-    if _p.is_file():
-        load_dotenv(dotenv_path=_p, override=False)
+_dotenv_loaded = False
+_dotenv_lock = threading.Lock()
+
+
+def _load_dotenv_once() -> None:
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    with _dotenv_lock:
+        if _dotenv_loaded:
+            return
+        candidates = [p for p in (_REPO_ROOT / ".env", Path.cwd() / ".env") if p.is_file()]
+        if candidates:
+            from dotenv import load_dotenv
+
+            for p in candidates:
+                load_dotenv(dotenv_path=p, override=False)
+        _dotenv_loaded = True
+
 
 _ENV_PATTERN = re.compile(r"\$\{ENV:([A-Za-z_][A-Za-z0-9_]*)\}")
 
 
 def get(key: str, default: str | None = None) -> str | None:
+    _load_dotenv_once()
     return os.environ.get(key, default)
 
 
 def _resolve_str(s: str) -> str:
+    if "${ENV:" not in s:
+        return s
+    _load_dotenv_once()
+
     def _sub(m: re.Match[str]) -> str:
         k = m.group(1)
         return os.environ.get(k, "")
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Mapping, Optional, Protocol
+
+from . import secrets
+from .logging_setup import get_logger
+
+try:  # POSIX advisory locks; elsewhere we only serialize threads of this process
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+log = get_logger(__name__)
+
+_THREAD_LOCKS: Dict[str, threading.Lock] = {}
+_THREAD_LOCKS_GUARD = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock on ``path`` (via ``<path>.lock``) across threads and, on POSIX, processes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _THREAD_LOCKS_GUARD:
+        tlock = _THREAD_LOCKS.setdefault(str(path), threading.Lock())
+    with tlock:
+        if fcntl is None:
+            yield
+            return
+        with open(str(path) + ".lock", "a+b") as lf:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+
+class SessionCipher(Protocol):
+    """At-rest encryption hook for cached sessions (docs/50-operations.md: 暗号化必須)."""
+
+    suffix: str
+
+    def encrypt(self, data: bytes) -> bytes: ...
+
+    def decrypt(self, data: bytes) -> bytes: ...
+
+
+class FernetCipher:
+    """AES (Fernet) encryption keyed by ``WAO_SESSION_KEY``; needs the ``cryptography`` package."""
+
+    suffix = ".enc"
+
+    def __init__(self, key: str) -> None:
+        from cryptography.fernet import Fernet
+
+        self._fernet = Fernet(key.encode("ascii"))
+
+    def encrypt(self, data: bytes) -> bytes:
+        return bytes(self._fernet.encrypt(data))
+
+    def decrypt(self, data: bytes) -> bytes:
+        return bytes(self._fernet.decrypt(data))
+
+
+class SessionCache:
+    """Playwright ``storage_state`` cache keyed by (site, account).
+
+    Entries live under ``root/<site>/<sha256(account)>.json`` (account names never
+    appear on disk), expire after ``ttl_s`` seconds, and are written atomically
+    under a per-entry lock so concurrent runs cannot interleave or clobber a
+    fresher session with an older one.
+    """
+
+    def __init__(self, root: Path, ttl_s: float = 12 * 3600, cipher: Optional[SessionCipher] = None) -> None:
+        self.root = Path(root)
+        self.ttl_s = ttl_s
+        self.cipher = cipher
+
+    @classmethod
+    def from_env(cls, root: Path, ttl_s: float = 12 * 3600) -> "SessionCache":
+        """Cache with Fernet encryption when ``WAO_SESSION_KEY`` is set."""
+        key = secrets.get("WAO_SESSION_KEY")
+        cipher: Optional[SessionCipher] = FernetCipher(key) if key else None
+        if cipher is None:
+            log.warning("WAO_SESSION_KEY is not set: session cache is stored unencrypted (0600)")
+        return cls(root, ttl_s=ttl_s, cipher=cipher)
+
+    # ---- paths / locking ----
+    def path_for(self, site: str, account: str) -> Path:
+        digest = hashlib.sha256(account.encode("utf-8")).hexdigest()[:32]
+        safe_site = "".join(c if c.isalnum() or c in "-._" else "_" for c in site) or "_"
+        return self.root / safe_site / (digest + ".json" + (self.cipher.suffix if self.cipher else ""))
+
+    def _locked(self, path: Path) -> ContextManager[None]:
+        return file_lock(path)
+
+    # ---- entries ----
+    def _read(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            data = path.read_bytes()
+            if self.cipher is not None:
+                data = self.cipher.decrypt(data)
+            entry = json.loads(data.decode("utf-8"))
+            return entry if isinstance(entry, dict) else None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning("Session cache entry unreadable (%s): %s", path.name, e)
+            return None
+
+    def load(self, site: str, account: str) -> Optional[Dict[str, Any]]:
+        """Return the cached storage_state, or None when missing/expired/unreadable."""
+        path = self.path_for(site, account)
+        with self._locked(path):
+            entry = self._read(path)
+            if entry is None:
+                return None
+            if time.time() - float(entry.get("saved_at", 0)) > self.ttl_s:
+                path.unlink(missing_ok=True)
+                log.info("Session cache expired: site=%s", site)
+                return None
+        state = entry.get("state")
+        return state if isinstance(state, dict) else None
+
+    def save(self, site: str, account: str, state: Mapping[str, Any], started_at: float = 0.0) -> bool:
+        """Store a session atomically. Skipped when another run saved a newer one after ``started_at``."""
+        path = self.path_for(site, account)
+        with self._locked(path):
+            current = self._read(path)
+            if current is not None and float(current.get("saved_at", 0)) > started_at > 0:
+                log.info("Session cache: newer session already saved by a concurrent run (site=%s)", site)
+                return False
+            data = json.dumps({"saved_at": time.time(), "site": site, "state": dict(state)}).encode("utf-8")
+            if self.cipher is not None:
+                data = self.cipher.encrypt(data)
+            tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as w:
+                w.write(data)
+            os.replace(tmp, path)
+        self.evict_expired()
+        return True
+
+    def invalidate(self, site: str, account: str) -> None:
+        path = self.path_for(site, account)
+        with self._locked(path):
+            path.unlink(missing_ok=True)
+
+    def evict_expired(self) -> int:
+        """Delete entries older than the TTL (by mtime); returns how many were removed."""
+        removed = 0
+        cutoff = time.time() - self.ttl_s
+        for p in self.root.glob("*/*.json*"):
+            if p.suffix in (".lock", ".tmp"):
+                continue
+            try:
+                if p.stat().st_mtime < cutoff:
+                    p.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+class SessionPlan:
+    """Per-run session reuse decided from a flow's ``options.session`` block.
+
+    ``login`` lists the indices of steps tagged ``"segment": "login"``. When a
+    cached state exists, the Runner runs ``probe`` steps first and skips the login
+    segment if they pass; after the last login step succeeds, the context's
+    storage_state is saved.
+    """
+
+    def __init__(self, cache: SessionCache, site: str, account: str, probe: List[Any], login: List[int]) -> None:
+        self.cache = cache
+        self.site = site
+        self.account = account
+        self.probe = probe
+        self.login = set(login)
+        self.last_login = max(login) if login else 0
+        self.started_at = time.time()
+        self.state: Optional[Dict[str, Any]] = None
+        self.reused = False
+
+    @classmethod
+    def from_flow(cls, dsl: Mapping[str, Any], plan: List[Any], root: Path) -> Optional["SessionPlan"]:
+        from .actions import compile_steps
+
+        opts = (dsl.get("options") or {}).get("session")
+        if not opts:
+            return None
+        login = [a.index for a in plan if a.segment == "login"]
+        if not login:
+            log.warning('options.session is set but no step has "segment": "login"; session cache disabled')
+            return None
+        site = str(dsl.get("site") or dsl.get("name") or "-")
+        account = str(secrets.resolve(opts.get("account", "default")))
+        cache = SessionCache.from_env(root, ttl_s=float(opts.get("ttl_s", 12 * 3600)))
+        probe = compile_steps(opts.get("probe") or [], start=0)
+        session = cls(cache, site, account, probe, login)
+        session.state = cache.load(site, account)
+        return session
+
+    def skip(self, index: int) -> bool:
+        return self.reused and index in self.login
@@ -0,0 +1,195 @@
+"""``{{var}}`` templates and the run's scoped variable store (docs/30-dsl-spec.md 4.6).
+
+Templates are parsed once, when a step is compiled; rendering only walks
+the pre-parsed parts, so steps inside ``foreach`` loops do not re-parse
+their strings on every iteration.
+
+Supported expressions::
+
+    {{name}} {{rep.path}} {{rows[0].id}}      variables (loop frames, then Runner.state)
+    {{yyyy}} {{mm}} {{dd}} {{hh}} {{mi}} {{ss}}  current local time
+    {{env.NAME}}                                environment / .env
+    {{var | default("N/A")}}                    fallback for undefined variables
+    {{join(list, ',')}}                         join a list
+"""
+
+from __future__ import annotations
+
+import ast
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from . import secrets
+
+Renderer = Callable[["Scope"], Any]
+
+_BUILTINS = {"yyyy": "%Y", "mm": "%m", "dd": "%d", "hh": "%H", "mi": "%M", "ss": "%S"}
+_MARK = re.compile(r"\{\{(.*?)\}\}", re.S)
+_PATH = r"[A-Za-z_]\w*(?:\.\w+|\[\d+\])*"
+_LITERAL = r"\"[^\"]*\"|'[^']*'|-?\d+(?:\.\d+)?"
+_VAR = re.compile(rf"^({_PATH})\s*(?:\|\s*default\(\s*({_LITERAL})\s*\))?$")
+_JOIN = re.compile(rf"^join\(\s*({_PATH})\s*(?:,\s*({_LITERAL})\s*)?\)$")
+_SEGMENT = re.compile(r"\.?(\w+)|\[(\d+)\]")
+_MISSING = object()
+
+
+class TemplateError(ValueError):
+    """A malformed template (compile time) or an undefined variable (render time)."""
+
+
+class Scope:
+    """Run variables: loop frames (innermost first) over the run's ``state`` dict."""
+
+    __slots__ = ("root", "frames")
+
+    def __init__(self, root: Dict[str, Any], frames: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.root = root
+        self.frames: List[Dict[str, Any]] = frames or []
+
+    def lookup(self, name: str) -> Any:
+        for frame in reversed(self.frames):
+            if name in frame:
+                return frame[name]
+        if name in self.root:
+            return self.root[name]
+        if name in _BUILTINS:
+            return time.strftime(_BUILTINS[name])
+        raise KeyError(name)
+
+    def set(self, name: str, value: Any, local: bool = False) -> None:
+        """Assign in the innermost frame defining ``name`` (or the current frame if ``local``), else in state."""
+        if local and self.frames:
+            self.frames[-1][name] = value
+            return
+        for frame in reversed(self.frames):
+            if name in frame:
+                frame[name] = value
+                return
+        self.root[name] = value
+
+    @contextmanager
+    def frame(self, values: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        self.frames.append(values)
+        try:
+            yield values
+        finally:
+            self.frames.pop()
+
+    def fork(self, root: Dict[str, Any]) -> "Scope":
+        """A copy over another state dict (parallel branches), sharing no frame with this one."""
+        return Scope(root, [dict(f) for f in self.frames])
+
+
+def scope_of(ctx: Any) -> Scope:
+    """The variable store of a runner (created on first use for runtimes that lack one)."""
+    scope = getattr(ctx, "vars", None)
+    if scope is None:
+        scope = ctx.vars = Scope(ctx.state)
+    return scope
+
+
+def _parse_path(path: str) -> Tuple[Union[str, int], ...]:
+    return tuple(int(idx) if idx else str(key) for key, idx in _SEGMENT.findall(path))
+
+
+def _resolve(scope: Scope, path: Tuple[Union[str, int], ...]) -> Any:
+    head = path[0]
+    try:
+        if head == "env" and len(path) == 2:
+            value = secrets.get(str(path[1]))
+            if value is None:
+                raise KeyError(path[1])
+            return value
+        value = scope.lookup(str(head))
+        for key in path[1:]:
+            value = value[key]
+        return value
+    except (KeyError, IndexError, TypeError):
+        return _MISSING
+
+
+class _Expr:
+    __slots__ = ("source", "path", "default", "join")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.default: Any = _MISSING
+        self.join: Optional[str] = None
+        m = _JOIN.match(source)
+        if m is not None:
+            self.join = ast.literal_eval(m.group(2)) if m.group(2) else ","
+            self.path = _parse_path(m.group(1))
+            return
+        m = _VAR.match(source)
+        if m is None:
+            raise TemplateError(f"unsupported template expression: {{{{{source}}}}}")
+        self.path = _parse_path(m.group(1))
+        if m.group(2) is not None:
+            self.default = ast.literal_eval(m.group(2))
+
+    def evaluate(self, scope: Scope) -> Any:
+        value = _resolve(scope, self.path)
+        if value is _MISSING:
+            if self.default is _MISSING:
+                raise TemplateError(f"undefined template variable: {{{{{self.source}}}}}")
+            return self.default
+        if self.join is not None:
+            if not isinstance(value, Sequence) or isinstance(value, str):
+                raise TemplateError(f"join() needs a list: {{{{{self.source}}}}}")
+            return str(self.join).join(str(v) for v in value)
+        return value
+
+
+class Template:
+    """A string with ``{{...}}`` expressions, pre-split into literal and expression parts."""
+
+    __slots__ = ("source", "parts", "single")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.parts: List[Union[str, _Expr]] = []
+        pos = 0
+        for m in _MARK.finditer(source):
+            if m.start() > pos:
+                self.parts.append(source[pos : m.start()])
+            self.parts.append(_Expr(m.group(1).strip()))
+            pos = m.end()
+        if pos < len(source):
+            self.parts.append(source[pos:])
+        # "{{rows}}" alone renders to the variable itself (a list stays a list)
+        self.single: Optional[_Expr] = (
+            self.parts[0] if len(self.parts) == 1 and isinstance(self.parts[0], _Expr) else None
+        )
+
+    def render(self, scope: Scope) -> str:
+        return "".join(p if isinstance(p, str) else str(p.evaluate(scope)) for p in self.parts)
+
+    def value(self, scope: Scope) -> Any:
+        if self.single is not None:
+            return self.single.evaluate(scope)
+        return self.render(scope)
+
+
+def has_templates(value: Any) -> bool:
+    if isinstance(value, str):
+        return "{{" in value
+    if isinstance(value, Mapping):
+        return any(has_templates(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(has_templates(v) for v in value)
+    return False
+
+
+def compile_value(value: Any) -> Renderer:
+    """A renderer for a JSON value whose strings may hold templates; template-free values are returned as is."""
+    if not has_templates(value):
+        return lambda scope: value
+    if isinstance(value, str):
+        return Template(value).value
+    if isinstance(value, Mapping):
+        items = [(k, compile_value(v)) for k, v in value.items()]
+        return lambda scope: {k: render(scope) for k, render in items}
+    parts = [compile_value(v) for v in value]
+    return lambda scope: [render(scope) for render in parts]
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Dict, List, Mapping, Optional
+
+from . import secrets
+from .logging_setup import get_logger
+
+log = get_logger(__name__)
+
+COMPRESS_SUFFIX = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+_STOP = object()
+
+
+def _timestamp() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+
+class TraceSink:
+    """Run trace writer (JSONL) with a single open handle and batched writes.
+
+    Records are buffered and written when ``flush_bytes`` is reached, when
+    ``flush_interval_s`` has elapsed, or on ``close()``. With ``background=True``
+    serialization stays on the caller's thread but file I/O moves to a writer
+    thread. ``close()`` always drains, flushes and fsyncs, so the last record
+    (``run_end``) is durable. Tracing must never crash the runner: every I/O
+    error is swallowed after a single warning.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        compress: str = "none",
+        flush_bytes: int = 64 * 1024,
+        flush_interval_s: float = 1.0,
+        background: bool = False,
+    ) -> None:
+        if compress not in COMPRESS_SUFFIX:
+            raise ValueError(f"trace compress must be one of: {', '.join(COMPRESS_SUFFIX)}")
+        if compress == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                log.warning("zstandard is not installed; trace falls back to gzip")
+                compress = "gzip"
+        self.compress = compress
+        self.path = Path(str(path) + COMPRESS_SUFFIX[compress])
+        self.flush_bytes = max(0, flush_bytes)
+        self.flush_interval_s = max(0.0, flush_interval_s)
+        self._fh: Optional[IO[str]] = None
+        self._raw: Optional[IO[bytes]] = None
+        self._buf: List[str] = []
+        self._buf_size = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._broken = False
+        self._closed = False
+        self._queue: Optional["queue.SimpleQueue[Any]"] = queue.SimpleQueue() if background else None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def for_run(cls, trace_dir: Path, options: Optional[Mapping[str, Any]] = None) -> "TraceSink":
+        """Create the sink for one run from ``options.trace`` (DSL > WAO_TRACE_* env)."""
+        opts = dict(options or {})
+        compress = opts.get("compress") or secrets.get("WAO_TRACE_COMPRESS", "none") or "none"
+        background = opts.get("background")
+        if background is None:
+            background = str(secrets.get("WAO_TRACE_BACKGROUND", "0") or "0").strip().lower() in {"1", "true", "on"}
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        return cls(
+            trace_dir / f"run_{_timestamp()}.jsonl",
+            compress=str(compress),
+            flush_bytes=int(opts.get("flush_bytes", 64 * 1024)),
+            flush_interval_s=int(opts.get("flush_interval_ms", 1000)) / 1000.0,
+            background=bool(background),
+        )
+
+    # ---- public API ----
+    def write(
+        self, kind: str, payload: Optional[Mapping[str, Any]] = None, encoded: Optional[Dict[str, str]] = None
+    ) -> None:
+        """Queue one record. ``encoded`` maps keys to already JSON-encoded values (e.g. cached step dicts)."""
+        if self._broken or self._closed:
+            return
+        try:
+            rec: Dict[str, Any] = {"ts": _timestamp(), "kind": kind}
+            rec.update(payload or {})
+            line = json.dumps(rec, ensure_ascii=False)
+            if encoded:
+                line = line[:-1] + "".join(f", {json.dumps(k)}: {v}" for k, v in encoded.items()) + "}"
+            line += "\n"
+        except Exception:
+            return
+        if self._queue is not None:
+            if self._thread is None:
+                # started lazily so that runners which never trace own no thread; parallel branches
+                # write from several threads, hence the check again under the lock
+                with self._lock:
+                    if self._thread is None:
+                        self._thread = threading.Thread(target=self._drain, name="wao-trace", daemon=True)
+                        self._thread.start()
+            self._queue.put(line)
+        else:
+            with self._lock:
+                self._append(line)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush(durable=False)
+
+    def close(self) -> None:
+        """Drain pending records, flush and fsync. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            thread = self._thread
+        if self._queue is not None and thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout=30)
+        with self._lock:
+            self._flush(durable=True)
+            for fh in (self._fh, self._raw):
+                if fh is not None:
+                    try:
+                        fh.close()
+                    except Exception:
+                        pass
+            self._fh = self._raw = None
+
+    # ---- internals (self._lock held) ----
+    def _append(self, line: str) -> None:
+        self._buf.append(line)
+        self._buf_size += len(line)
+        if self._buf_size >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval_s:
+            self._flush(durable=False)
+
+    def _flush(self, durable: bool) -> None:
+        self._last_flush = time.monotonic()
+        if self._broken or (not self._buf and not durable):
+            return
+        try:
+            fh = self._fh or self._open()
+            if self._buf:
+                fh.write("".join(self._buf))
+            fh.flush()
+            if durable:
+                if self._raw is not None:
+                    self._raw.flush()
+                    os.fsync(self._raw.fileno())
+        except Exception as e:
+            self._broken = True
+            log.warning("Trace disabled (%s): %s", self.path, e)
+        finally:
+            self._buf.clear()
+            self._buf_size = 0
+
+    def _open(self) -> IO[str]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        raw = open(self.path, "ab")
+        self._raw = raw
+        if self.compress == "gzip":
+            self._fh = io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode="ab"), encoding="utf-8")
+        elif self.compress == "zstd":
+            import zstandard
+
+            writer = zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+            self._fh = io.TextIOWrapper(writer, encoding="utf-8")
+        else:
+            self._fh = io.TextIOWrapper(raw, encoding="utf-8")
+        return self._fh
+
+    def _drain(self) -> None:
+        assert self._queue is not None
+        while True:
+            timeout = self.flush_interval_s or None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self.flush()
+                continue
+            if item is _STOP:
+                return
+            with self._lock:
+                self._append(item)
+
+
+def open_trace(path: Path) -> IO[str]:
+    """Open a trace file for reading whatever its compression (.jsonl/.gz/.zst)."""
+    name = str(path)
+    if name.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    if name.endswith(".zst"):
+        import zstandard
+
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return open(path, encoding="utf-8")
@@ -0,0 +1,327 @@
+"""Incremental SQLite index over run traces and the ``wao trace stats`` aggregates.
+
+Every ``run_*.jsonl[.gz|.zst]`` under the trace directory is parsed once into
+``runs`` / ``steps`` rows; a file is re-read only when its size or mtime
+changed (e.g. a run that was still writing). Aggregates are computed in
+SQLite and by streaming ordered cursors, so memory stays bounded by the
+number of (site, step) groups rather than the number of runs.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .logging_setup import get_logger
+from .trace import open_trace
+
+log = get_logger(__name__)
+
+PERCENTILES = (50, 95, 99)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, runs INTEGER);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, file TEXT NOT NULL, site TEXT, version TEXT, started TEXT,
+    status TEXT, error TEXT, ms INTEGER);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id INTEGER NOT NULL, i INTEGER, step TEXT, act TEXT, ms INTEGER, ok INTEGER,
+    error TEXT, error_sig TEXT);
+CREATE INDEX IF NOT EXISTS runs_file ON runs(file);
+CREATE INDEX IF NOT EXISTS runs_site ON runs(site, started);
+CREATE INDEX IF NOT EXISTS steps_run ON steps(run_id);
+CREATE INDEX IF NOT EXISTS steps_sig ON steps(error_sig) WHERE error_sig IS NOT NULL;
+"""
+# Only these records are decoded; everything else (network, step_profile, ...) is skipped by substring
+_WANTED = re.compile(r'"kind": "(run_start|run_end|step_start|step_ok|step_err)"')
+_SIG_RULES = (
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\"[^\"]*\"|'[^']*'"), '"<s>"'),
+    (re.compile(r"\b[0-9a-fA-F]{8,}\b"), "<hex>"),
+    (re.compile(r"\d+(\.\d+)?"), "N"),
+)
+
+
+def error_signature(message: Optional[str]) -> Optional[str]:
+    """Error message with URLs, quoted values, ids and numbers collapsed, for clustering."""
+    if not message:
+        return None
+    sig = message.strip().splitlines()[0] if message.strip() else message
+    for pattern, repl in _SIG_RULES:
+        sig = pattern.sub(repl, sig)
+    return sig[:200]
+
+
+def _iso(ts: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.strptime(str(ts), "%Y%m%d_%H%M%S_%f")
+    except ValueError:
+        return None
+
+
+class _Run:
+    __slots__ = ("site", "version", "started", "ended", "status", "error", "steps", "open")
+
+    def __init__(self, rec: Dict[str, Any]) -> None:
+        self.site = rec.get("site")
+        self.version = rec.get("version")
+        self.started = _iso(rec.get("ts"))
+        self.ended: Optional[datetime] = None
+        self.status = "incomplete"
+        self.error: Optional[str] = None
+        self.steps: List[Tuple[int, str, str, int, int, Optional[str], Optional[str]]] = []
+        self.open: Dict[Tuple[Optional[str], int, int], Tuple[str, str]] = {}
+
+    def feed(self, kind: str, rec: Dict[str, Any]) -> None:
+        if kind == "step_start":
+            step = rec.get("step")
+            raw: Dict[str, Any] = step if isinstance(step, dict) else {}
+            act = str(raw.get("act") or raw.get("action") or "")
+            name = str(raw.get("name") or act)
+            # steps of parallel branches interleave and nested steps (loops, blocks) restart at 1:
+            # key them by branch and nesting depth, name branch steps by branch
+            branch = rec.get("branch")
+            key = (branch, int(rec.get("depth", 0)), int(rec.get("i", -1)))
+            self.open[key] = (f"{branch}/{name}" if branch else name, act)
+        elif kind in ("step_ok", "step_err"):
+            i = int(rec.get("i", -1))
+            name, act = self.open.pop((rec.get("branch"), int(rec.get("depth", 0)), i), (f"#{i}", ""))
+            err = rec.get("error") if kind == "step_err" else None
+            self.steps.append((i, name, act, int(rec.get("ms", 0)), int(err is None), err, error_signature(err)))
+        elif kind == "run_end":
+            self.status = str(rec.get("status", "ok"))
+            self.error = rec.get("error")
+            self.ended = _iso(rec.get("ts"))
+
+
+def parse_trace(path: Path) -> Iterator[_Run]:
+    """Runs recorded in one trace file (normally one; concatenated files are tolerated)."""
+    run: Optional[_Run] = None
+    with open_trace(path) as fh:
+        for line in fh:
+            m = _WANTED.search(line)
+            if m is None:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line of a run that is still writing
+            if m.group(1) == "run_start":
+                if run is not None:
+                    yield run
+                run = _Run(rec)
+            elif run is not None:
+                run.feed(m.group(1), rec)
+    if run is not None:
+        yield run
+
+
+class TraceIndex:
+    """SQLite index (default ``<trace dir>/.index.sqlite``) refreshed incrementally by :meth:`update`."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.db_path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "TraceIndex":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def update(self, trace_dir: Path, batch: int = 200) -> Tuple[int, int]:
+        """Index new or changed trace files; returns (files parsed, files unchanged)."""
+        known = {p: (s, m) for p, s, m in self.db.execute("SELECT path, size, mtime FROM files")}
+        parsed = unchanged = 0
+        for path in sorted(Path(trace_dir).glob("run_*.jsonl*")):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            key = str(path)
+            if known.get(key) == (st.st_size, st.st_mtime):
+                unchanged += 1
+                continue
+            try:
+                self._index_file(key, path, st.st_size, st.st_mtime)
+            except (OSError, EOFError, ValueError) as e:
+                log.warning("Trace not indexed (%s): %s", path.name, e)
+                continue
+            parsed += 1
+            if parsed % batch == 0:
+                self.db.commit()
+        self.db.commit()
+        return parsed, unchanged
+
+    def _index_file(self, key: str, path: Path, size: int, mtime: float) -> None:
+        runs = list(parse_trace(path))
+        self.db.execute("DELETE FROM steps WHERE run_id IN (SELECT id FROM runs WHERE file = ?)", (key,))
+        self.db.execute("DELETE FROM runs WHERE file = ?", (key,))
+        for run in runs:
+            ms = int((run.ended - run.started).total_seconds() * 1000) if run.ended and run.started else None
+            started = run.started.isoformat(sep=" ", timespec="seconds") if run.started else None
+            cur = self.db.execute(
+                "INSERT INTO runs (file, site, version, started, status, error, ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, run.site, run.version, started, run.status, run.error, ms),
+            )
+            self.db.executemany(
+                "INSERT INTO steps (run_id, i, step, act, ms, ok, error, error_sig) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(cur.lastrowid, *s) for s in run.steps],
+            )
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (key, size, mtime, len(runs)))
+
+    def prune(self) -> int:
+        """Forget files that no longer exist (e.g. after trace rotation)."""
+        gone = [p for (p,) in self.db.execute("SELECT path FROM files") if not os.path.exists(p)]
+        for p in gone:
+            self.db.execute("DELETE FROM steps WHERE run_id IN (SELECT id FROM runs WHERE file = ?)", (p,))
+            self.db.execute("DELETE FROM runs WHERE file = ?", (p,))
+            self.db.execute("DELETE FROM files WHERE path = ?", (p,))
+        self.db.commit()
+        return len(gone)
+
+    # ---- aggregates ----
+    @staticmethod
+    def _where(site: Optional[str], since: Optional[str], alias: str = "r") -> Tuple[str, List[Any]]:
+        clauses, args = [], []
+        if site:
+            clauses.append(f"{alias}.site = ?")
+            args.append(site)
+        if since:
+            clauses.append(f"{alias}.started >= ?")
+            args.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def _ranked(self, sql: str, args: Sequence[Any], counts: Dict[Any, int]) -> Dict[Any, Dict[str, Any]]:
+        """Nearest-rank percentiles and max of ``value`` per key from ``SELECT key..., value ORDER BY key, value``.
+
+        Only the current position per key is kept, so memory is O(keys), not O(rows).
+        """
+        out: Dict[Any, Dict[str, Any]] = {}
+        pos: Dict[Any, int] = {}
+        for *key_parts, value in self.db.execute(sql, args):
+            key = tuple(key_parts)
+            n = counts[key]
+            k = pos.get(key, 0)
+            row = out.setdefault(key, {})
+            for p in PERCENTILES:
+                if k == max(0, -(-p * n // 100) - 1):
+                    row[f"p{p}"] = value
+            row["max_ms"] = value
+            pos[key] = k + 1
+        return out
+
+    def sites(self, site: Optional[str] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Run count, success rate and run-time mean/percentiles per site."""
+        where, args = self._where(site, since)
+        sql = (
+            "SELECT r.site, COUNT(*), SUM(r.status = 'ok'), AVG(r.ms), COUNT(r.ms), MIN(r.started), MAX(r.started) "
+            f"FROM runs r{where} GROUP BY r.site ORDER BY r.site"
+        )
+        rows, timed = [], {}
+        for s, n, ok, avg, n_ms, first, last in self.db.execute(sql, args):
+            timed[(s,)] = n_ms
+            rows.append(
+                {
+                    "site": s,
+                    "runs": n,
+                    "ok": ok or 0,
+                    "success_rate": round((ok or 0) / n, 4) if n else None,
+                    "mean_ms": round(avg) if avg is not None else None,
+                    "first": first,
+                    "last": last,
+                }
+            )
+        cond = f"{where} AND" if where else " WHERE"
+        ranked = self._ranked(
+            f"SELECT r.site, r.ms FROM runs r{cond} r.ms IS NOT NULL ORDER BY r.site, r.ms", args, timed
+        )
+        for row in rows:
+            row.update({f"p{p}": None for p in PERCENTILES})
+            row.update(ranked.get((row["site"],), {}))
+        return rows
+
+    def steps(self, site: Optional[str] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per (site, step) counts, errors and p50/p95/p99 ms; the slowest p95 first within a site."""
+        where, args = self._where(site, since)
+        join = f"FROM steps s JOIN runs r ON r.id = s.run_id{where}"
+        counts, oks = {}, {}
+        for site_, step, n, ok in self.db.execute(
+            f"SELECT r.site, s.step, COUNT(*), SUM(s.ok) {join} GROUP BY 1, 2", args
+        ):
+            counts[(site_, step)] = n
+            oks[(site_, step)] = ok or 0
+        ranked = self._ranked(f"SELECT r.site, s.step, s.ms {join} ORDER BY r.site, s.step, s.ms", args, counts)
+        rows = [
+            {"site": k[0], "step": k[1], "count": n, "errors": n - oks[k], **ranked.get(k, {})}
+            for k, n in counts.items()
+        ]
+        return sorted(rows, key=lambda r: (str(r["site"]), -(r.get("p95") or 0)))
+
+    def slowest(self, limit: int = 10, site: Optional[str] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        where, args = self._where(site, since)
+        sql = (
+            "SELECT r.site, s.step, s.ms, s.ok, r.started, r.file FROM steps s JOIN runs r ON r.id = s.run_id"
+            f"{where} ORDER BY s.ms DESC LIMIT ?"
+        )
+        keys = ("site", "step", "ms", "ok", "started", "file")
+        return [dict(zip(keys, row)) for row in self.db.execute(sql, [*args, limit])]
+
+    def errors(self, limit: int = 10, site: Optional[str] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Step errors grouped by normalized message, most frequent first."""
+        where, args = self._where(site, since)
+        cond = f"{where} AND" if where else " WHERE"
+        sql = (
+            "SELECT s.error_sig, COUNT(*), COUNT(DISTINCT r.site), GROUP_CONCAT(DISTINCT s.step), MIN(r.started), "
+            f"MAX(r.started), MAX(s.error) FROM steps s JOIN runs r ON r.id = s.run_id{cond} s.error_sig IS NOT NULL "
+            "GROUP BY s.error_sig ORDER BY COUNT(*) DESC LIMIT ?"
+        )
+        keys = ("signature", "count", "sites", "steps", "first", "last", "example")
+        return [dict(zip(keys, row)) for row in self.db.execute(sql, [*args, limit])]
+
+    def stats(self, top: int = 10, site: Optional[str] = None, since: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "sites": self.sites(site, since),
+            "steps": self.steps(site, since),
+            "slowest": self.slowest(top, site, since),
+            "errors": self.errors(top, site, since),
+        }
+
+
+def _ms(v: Optional[int]) -> str:
+    return "-" if v is None else str(v)
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Plain-text report for the terminal."""
+    out = ["== runs by site", f"{'site':<24} {'runs':>6} {'ok%':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for r in stats["sites"]:
+        rate = f"{r['success_rate'] * 100:.1f}" if r["success_rate"] is not None else "-"
+        out.append(
+            f"{str(r['site']):<24} {r['runs']:>6} {rate:>6} {_ms(r['mean_ms']):>8} {_ms(r['p50']):>8} "
+            f"{_ms(r['p95']):>8} {_ms(r['p99']):>8}"
+        )
+    out += ["", "== steps (ms)", f"{'site':<20} {'step':<24} {'n':>6} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for r in stats["steps"]:
+        out.append(
+            f"{str(r['site'])[:20]:<20} {str(r['step'])[:24]:<24} {r['count']:>6} {r['errors']:>5} "
+            f"{_ms(r.get('p50')):>8} {_ms(r.get('p95')):>8} {_ms(r.get('p99')):>8}"
+        )
+    out += ["", "== slowest steps"]
+    for r in stats["slowest"]:
+        out.append(f"{r['ms']:>8} ms  {r['site']} / {r['step']}  {r['started']}  {Path(r['file']).name}")
+    out += ["", "== error clusters"]
+    for r in stats["errors"]:
+        out.append(f"{r['count']:>6} x  {r['signature']}  [steps: {r['steps']}; {r['first']} .. {r['last']}]")
+    return "\n".join(out)
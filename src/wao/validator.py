@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import copy
 import json
+import threading
 from pathlib import Path
-from typing import Any, Dict, cast
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union, cast
 
-from jsonschema import ValidationError as _ValidationError
-from jsonschema import validate as _validate
+if TYPE_CHECKING:
+    # jsonschema is imported on first validation, not when wao is imported
+    from jsonschema import ValidationError as _ValidationError
+
+SCHEMA_NAME = "schema.flow.v1.json"
 
 
 class FlowValidationError(Exception):
@@ -34,38 +39,216 @@ def _normalize_flow(flow: dict) -> dict:
     return flow
 
 
-def validate_flow(path: str) -> dict:
-    """Load, normalize, and validate a flow JSON. Returns normalized dict."""
-    flow = _read_json(path)
-    flow = _normalize_flow(flow)
-
-    # Robust schema path resolution
+def find_schema_path() -> Path:
+    """Locate flows/schema.flow.v1.json (repo checkout first, then the CWD)."""
     here = Path(__file__).resolve()
     repo_root = here.parents[2]  # <repo>/
     candidates = [
-        repo_root / "flows" / "schema.flow.v1.json",
-        Path.cwd() / "flows" / "schema.flow.v1.json",
+        repo_root / "flows" / SCHEMA_NAME,
+        Path.cwd() / "flows" / SCHEMA_NAME,
     ]
-    schema_path = next((str(p) for p in candidates if p.is_file()), None)
-    if not schema_path:
+    found = next((p for p in candidates if p.is_file()), None)
+    if found is None:
         searched = "\n- ".join(map(str, candidates))
         raise FlowValidationError("Schema file not found. Looked for:\n- " + searched)
+    return found
 
-    schema = _read_json(schema_path)
-    try:
-        _validate(instance=flow, schema=schema)
-    except _ValidationError as e:
-        # 失敗時は丁寧なメッセージ
-        path_strs = []
-        if e.path:
-            path_strs.append(".".join(map(str, e.path)))
-        detail = f"{' / '.join(path_strs)}: {e.message}" if path_strs else e.message
-        # Normalize message wording so tests expecting "not one of" pass too
-        if "not valid under any of the given schemas" in detail and "not one of" not in detail:
-            detail = detail + " (not one of)"
-        # Also normalize based on the validator type (jsonschema sets validator="oneOf" for this case)
-        if getattr(e, "validator", "") == "oneOf" and "not one of" not in detail:
-            detail = detail + " (not one of)"
-        raise FlowValidationError(f"Flow schema validation failed: {detail}") from e
 
+def _step_acts(branch: Dict[str, Any]) -> Optional[List[str]]:
+    """The act/action names a oneOf step branch accepts, or None if it does not pin them."""
+    names: List[str] = []
+    props = branch.get("properties") or {}
+    for key in ("act", "action"):
+        spec = props.get(key) or {}
+        if "const" in spec:
+            names.append(spec["const"])
+        elif isinstance(spec.get("enum"), list):
+            names.extend(spec["enum"])
+        else:
+            return None
+    return names
+
+
+class CompiledSchema:
+    """A flow schema checked once against its metaschema, with per-act step validators.
+
+    ``iter_errors`` validates the flow minus its steps once, then each step
+    against the single ``oneOf`` branch registered for its ``act``/``action``.
+    Steps with an unknown act (or when the branches cannot be told apart by
+    act) go through the full ``oneOf`` so errors read the same as before.
+    """
+
+    def __init__(self, path: Path, schema: Dict[str, Any]) -> None:
+        from jsonschema import Draft202012Validator
+
+        Draft202012Validator.check_schema(schema)
+        self.path = path
+        self.schema = schema
+        self.validator = Draft202012Validator(schema)
+        steps = (schema.get("properties") or {}).get("steps") or {}
+        items = steps.get("items") or {}
+        # evolve() keeps the root resolver, so "#/..." refs inside branches still resolve
+        self._shell = self.validator.evolve(
+            schema={
+                **schema,
+                "properties": {**schema["properties"], "steps": {k: v for k, v in steps.items() if k != "items"}},
+            }
+        )
+        self._items = self.validator.evolve(schema=items)
+        self.branches: Dict[str, Any] = {}
+        seen: Dict[str, int] = {}
+        branches = items.get("oneOf") if isinstance(items.get("oneOf"), list) else None
+        for branch in branches or []:
+            acts = _step_acts(branch)
+            if acts is None or len(items) != 1:
+                # a branch that does not pin act (or extra item keywords): only the full oneOf is exact
+                self.branches.clear()
+                break
+            for act in set(acts):
+                seen[act] = seen.get(act, 0) + 1
+                self.branches[act] = self.validator.evolve(schema=branch)
+        for act, count in seen.items():
+            if count > 1:
+                self.branches.pop(act, None)
+
+    def iter_errors(self, flow: Any) -> Iterator[_ValidationError]:
+        if not isinstance(flow, dict) or not isinstance(flow.get("steps"), list):
+            yield from self.validator.iter_errors(flow)
+            return
+        yield from self._shell.iter_errors(flow)
+        for i, step in enumerate(flow["steps"]):
+            act = (step.get("act") or step.get("action")) if isinstance(step, dict) else None
+            v = self.branches.get(act) if isinstance(act, str) else None
+            for e in (v or self._items).iter_errors(step):
+                e.path.appendleft(i)
+                e.path.appendleft("steps")
+                yield e
+
+
+_CACHE: Dict[str, Tuple[int, CompiledSchema]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def load_schema(path: Optional[Union[str, Path]] = None) -> CompiledSchema:
+    """Process-wide compiled schema, rebuilt only when the file's mtime changes."""
+    schema_path = Path(path) if path is not None else find_schema_path()
+    key = str(schema_path.resolve())
+    mtime = schema_path.stat().st_mtime_ns
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+        compiled = CompiledSchema(schema_path, _read_json(str(schema_path)))
+        _CACHE[key] = (mtime, compiled)
+        return compiled
+
+
+def _format_error(e: _ValidationError) -> str:
+    path_strs = []
+    if e.path:
+        path_strs.append(".".join(map(str, e.path)))
+    detail = f"{' / '.join(path_strs)}: {e.message}" if path_strs else e.message
+    # Normalize message wording so tests expecting "not one of" pass too
+    if "not valid under any of the given schemas" in detail and "not one of" not in detail:
+        detail = detail + " (not one of)"
+    # Also normalize based on the validator type (jsonschema sets validator="oneOf" for this case)
+    if getattr(e, "validator", "") == "oneOf" and "not one of" not in detail:
+        detail = detail + " (not one of)"
+    return detail
+
+
+def check_flow(flow: Dict[str, Any], schema_path: Optional[Union[str, Path]] = None) -> List[str]:
+    """Validate an in-memory (already normalized) flow; returns every error message."""
+    errors = sorted(load_schema(schema_path).iter_errors(flow), key=lambda e: [str(p) for p in e.path])
+    return [_format_error(e) for e in errors]
+
+
+# Steps after which a fixed sleep usually stands in for "until the page settles"
+_NAVIGATING = {"open_url", "goto", "click", "submit", "press"}
+_TYPING = {"fill", "type", "select", "check", "uncheck"}
+_WAITING = {"wait_for_selector", "wait_for_url", "wait_download", "download"}
+
+
+def _nested_steps(step: Dict[str, Any]) -> Iterator[Tuple[str, List[Any]]]:
+    """(path suffix, step list) of the blocks nested in a step (parallel branches, loop bodies, ...)."""
+    for n, branch in enumerate(step.get("branches") or []):
+        if isinstance(branch, list):
+            yield f".branches[{n}]", branch
+        elif isinstance(branch, dict) and isinstance(branch.get("steps"), list):
+            yield f".branches[{n}].steps", branch["steps"]
+    if isinstance(step.get("steps"), list):
+        yield ".steps", step["steps"]
+
+
+def _lint_wait(step: Dict[str, Any], prev: Optional[str], nxt: Optional[str]) -> Optional[str]:
+    act = step.get("act") or step.get("action")
+    if act == "sleep_random":
+        return (
+            f"sleep_random adds {step.get('min_ms', 0)}-{step.get('max_ms', step.get('min_ms', 0))} ms of dead time; "
+            "keep it only for deliberate pacing"
+        )
+    if act not in ("wait", "wait_for") or step.get("for") or step.get("selector"):
+        return None
+    ms = step.get("timeout", step.get("ms", 1000))
+    if nxt in _WAITING:
+        return f"fixed wait of {ms} ms before {nxt}, which already waits for its condition: remove it"
+    if prev in _TYPING:
+        hint = '{"for": "dom_stable"}'
+    elif prev in _NAVIGATING:
+        hint = '{"for": "network_idle"} (or "response" for a known API call)'
+    else:
+        hint = '{"for": "network_idle"} / "dom_stable" / "selector"'
+    return f"fixed wait of {ms} ms: use a condition wait instead, e.g. {hint}"
+
+
+def _lint_steps(steps: List[Any], path: str) -> Iterator[str]:
+    acts = [(s.get("act") or s.get("action")) if isinstance(s, dict) else None for s in steps]
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            continue
+        msg = _lint_wait(step, acts[i - 1] if i else None, acts[i + 1] if i + 1 < len(acts) else None)
+        if msg:
+            yield f"{path}[{i}] ({step.get('name', '-')}): {msg}"
+        for suffix, nested in _nested_steps(step):
+            yield from _lint_steps(nested, f"{path}[{i}]{suffix}")
+
+
+def lint_flow(flow: Dict[str, Any]) -> List[str]:
+    """Advisory findings (not schema errors): fixed sleeps that a condition wait could replace."""
+    steps = flow.get("steps")
+    return list(_lint_steps(steps, "steps")) if isinstance(steps, list) else []
+
+
+def validate_flow(path: str, schema_path: Optional[Union[str, Path]] = None) -> dict:
+    """Load, normalize, and validate a flow JSON. Returns normalized dict."""
+    return validate_flow_dict(_read_json(path), schema_path)
+
+
+def validate_flow_dict(flow: Mapping[str, Any], schema_path: Optional[Union[str, Path]] = None) -> dict:
+    """Like :func:`validate_flow` for an already-parsed flow (e.g. posted to the daemon); ``flow`` is not modified."""
+    from jsonschema import exceptions
+
+    flow = _normalize_flow(copy.deepcopy(dict(flow)))
+    compiled = load_schema(schema_path)
+    # same error jsonschema.validate() would raise
+    e = exceptions.best_match(compiled.iter_errors(flow))
+    if e is not None:
+        # 失敗時は丁寧なメッセージ
+        raise FlowValidationError(f"Flow schema validation failed: {_format_error(e)}") from e
     return flow
+
+
+def validate_many(
+    paths: Iterable[Union[str, Path]], schema_path: Optional[Union[str, Path]] = None
+) -> Dict[str, List[str]]:
+    """Validate many flows against one compiled schema; maps each path to all of its errors ([] = valid)."""
+    load_schema(schema_path)  # fail fast on a missing/broken schema
+    report: Dict[str, List[str]] = {}
+    for p in paths:
+        try:
+            flow = _normalize_flow(_read_json(str(p)))
+        except (OSError, ValueError) as e:
+            report[str(p)] = [f"cannot read flow: {e}"]
+            continue
+        report[str(p)] = check_flow(flow, schema_path)
+    return report
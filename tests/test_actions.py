@@ -0,0 +1,122 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Mapping
+
+import pytest
+
+from wao.actions import Action, StepCompileError, compile_steps, register
+from wao.actions.assertions import AssertTitleAction
+from wao.actions.base import UnknownAction
+from wao.actions.waits import WaitAction, WaitForSelectorAction
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class FakePage:
+    def __init__(self, title: str = "") -> None:
+        self._title = title
+        self.calls: List[Any] = []
+
+    def title(self) -> str:
+        return self._title
+
+    def goto(self, url: str) -> None:
+        self.calls.append(("goto", url))
+
+    def fill(self, selector: str, value: str) -> None:
+        self.calls.append(("fill", selector, value))
+
+
+class FakeCtx:
+    def __init__(self, page: FakePage) -> None:
+        self.page = page
+        self.state: Dict[str, Any] = {}
+        self.failures: List[str] = []
+
+    def fail(self, reason: str, message: str) -> None:
+        self.failures.append(reason)
+
+
+@pytest.mark.parametrize("name", ["demo_example.json", "demo_login.json", "demo_download.json"])
+def test_demo_flows_compile(name: str) -> None:
+    flow = json.loads((ROOT / "flows" / name).read_text(encoding="utf-8"))
+    plan = compile_steps(flow["steps"])
+    assert [a.index for a in plan] == list(range(1, len(plan) + 1))
+    assert not any(isinstance(a, UnknownAction) for a in plan)
+
+
+def test_params_parsed_once(monkeypatch: Any) -> None:
+    monkeypatch.setenv("WAO_TEST_HOST", "example.org")
+    monkeypatch.setenv("WAO_TEST_PASS", "s3cret")
+    plan = compile_steps(
+        [
+            {"action": "open_url", "name": "o", "url": "https://${ENV:WAO_TEST_HOST}/"},
+            {"action": "fill", "name": "f", "selector": "#p", "value": "${ENV:WAO_TEST_PASS}", "mask": True},
+            {"action": "wait_for", "name": "w", "selector": "#x", "timeout": 5},
+            {"action": "wait_for", "name": "w2", "timeout": 5},
+        ]
+    )
+    assert plan[0].url == "https://example.org/"  # type: ignore[attr-defined]
+    assert plan[1].value == "${ENV:WAO_TEST_PASS}"  # type: ignore[attr-defined]
+    assert isinstance(plan[2], WaitForSelectorAction) and plan[2].timeout == 5
+    assert isinstance(plan[3], WaitAction)
+
+    page = FakePage()
+    ctx = FakeCtx(page)
+    for action in plan[:2]:
+        action.execute(ctx)  # type: ignore[arg-type]
+    assert page.calls == [("goto", "https://example.org/"), ("fill", "#p", "s3cret")]
+
+
+def test_assert_title_regex_precompiled() -> None:
+    (action,) = compile_steps([{"action": "assert_title", "name": "t", "expected": "^Dash", "match_mode": "matches"}])
+    assert isinstance(action, AssertTitleAction) and action.regex is not None
+    ctx = FakeCtx(FakePage("Dashboard"))
+    action.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.failures == []
+    ctx = FakeCtx(FakePage("Login"))
+    action.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.failures == ["assert_title"]
+
+
+def test_compile_errors_before_browser() -> None:
+    with pytest.raises(StepCompileError, match="step 1"):
+        compile_steps([{"action": "wait_download", "name": "d"}])
+
+
+def test_register_custom_action() -> None:
+    @register("test_noop")
+    class NoopAction(Action):
+        __slots__ = ("message",)
+
+        def compile(self, raw: Mapping[str, Any]) -> None:
+            self.message = raw["message"]
+
+        def execute(self, ctx: Any) -> None:
+            ctx.state["noop"] = self.message
+
+    (action,) = compile_steps([{"act": "test_noop", "message": "hi"}])
+    ctx = FakeCtx(FakePage())
+    action.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.state == {"noop": "hi"}
+    assert not NoopAction.supports_async()
+
+
+def test_wait_for_url_matchers() -> None:
+    from wao.actions.waits import WaitForUrlAction
+
+    sub, rx, glob = compile_steps(
+        [
+            {"action": "wait_for_url", "name": "a", "contains": "/home"},
+            {"action": "wait_for_url", "name": "b", "regex": r"/home\?id=\d+", "wait_until": "commit"},
+            {"action": "wait_for_url", "name": "c", "glob": "**/home*"},
+        ]
+    )
+    assert isinstance(sub, WaitForUrlAction) and callable(sub.matcher)
+    assert sub.matcher("https://x/home")  # type: ignore[operator]
+    assert isinstance(rx, WaitForUrlAction) and rx.wait_until == "commit"
+    assert rx.matcher.search("https://x/home?id=3")  # type: ignore[union-attr]
+    assert isinstance(glob, WaitForUrlAction) and glob.matcher == "**/home*"
+
+    with pytest.raises(StepCompileError):
+        compile_steps([{"action": "wait_for_url", "name": "d", "contains": "x", "wait_until": "idle"}])
@@ -0,0 +1,140 @@
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from wao.actions import compile_steps
+from wao.artifact_store import MIB, ArtifactOptions, ArtifactUploads, LocalStore, S3Store
+
+
+class FakeS3:
+    """In-memory S3 client (the calls boto3's ``s3`` client answers); ``gate`` holds uploads back."""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.uploads: Dict[str, List[bytes]] = {}
+        self.calls: List[str] = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail_part = 0
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **extra: Any) -> None:
+        self.gate.wait(5)
+        self.calls.append("put_object")
+        self.objects[f"{Bucket}/{Key}"] = {"body": Body, **extra}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **extra: Any) -> Dict[str, str]:
+        self.calls.append("create_multipart_upload")
+        self.objects[f"{Bucket}/{Key}"] = dict(extra)
+        self.uploads["u1"] = []
+        return {"UploadId": "u1"}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes) -> Dict[str, str]:
+        self.calls.append("upload_part")
+        if PartNumber == self.fail_part:
+            raise ConnectionError("reset by peer")
+        self.uploads[UploadId].append(Body)
+        return {"ETag": f"e{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Any) -> None:
+        self.calls.append("complete_multipart_upload")
+        assert [p["PartNumber"] for p in MultipartUpload["Parts"]] == list(range(1, len(self.uploads[UploadId]) + 1))
+        self.objects[f"{Bucket}/{Key}"]["body"] = b"".join(self.uploads.pop(UploadId))
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> None:
+        self.calls.append("abort_multipart_upload")
+        self.uploads.pop(UploadId)
+        self.objects.pop(f"{Bucket}/{Key}")
+
+    def generate_presigned_url(self, op: str, Params: Dict[str, str], ExpiresIn: int) -> str:
+        return f"https://s3.local/{Params['Bucket']}/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+def uploader(client: FakeS3, **opts: Any) -> Tuple[ArtifactUploads, List[Tuple[str, Dict[str, Any]]]]:
+    traces: List[Tuple[str, Dict[str, Any]]] = []
+    options = ArtifactOptions(**{"tenant": "acme", "part_size_mb": 5, **opts})
+    s3 = S3Store("bucket", client, options.part_size_mb * MIB, options.sse, options.kms_key_id)
+    return ArtifactUploads(options, "run_1", lambda k, p: traces.append((k, p)), lambda root: s3), traces
+
+
+def test_multipart_upload_with_tenant_prefix_sse_and_ttl(tmp_path: Path) -> None:
+    big = tmp_path / "売上_202610.csv"
+    big.write_bytes(b"x" * (11 * MIB))
+    client = FakeS3()
+    uploads, traces = uploader(client, sse="aws:kms", kms_key_id="alias/wao", ttl_days=30)
+    assert uploads.submit(big, "s3://bucket/reports/") == "s3://bucket/acme/reports/売上_202610.csv"
+    assert uploads.drain() == []
+    obj = client.objects["bucket/acme/reports/売上_202610.csv"]
+    assert obj["body"] == big.read_bytes() and client.calls.count("upload_part") == 3
+    assert obj["ServerSideEncryption"] == "aws:kms" and obj["SSEKMSKeyId"] == "alias/wao"
+    assert obj["Metadata"]["expires"] == (date.today() + timedelta(days=30)).isoformat()
+    assert obj["Tagging"] == "wao-tenant=acme&wao-ttl-days=30"
+    kind, payload = traces[-1]
+    assert kind == "artifact_upload" and payload["ok"] and payload["parts"] == 3 and payload["bytes"] == 11 * MIB
+
+
+def test_failed_multipart_is_aborted_and_reported(tmp_path: Path) -> None:
+    big = tmp_path / "big.bin"
+    big.write_bytes(b"x" * (6 * MIB))
+    client = FakeS3()
+    client.fail_part = 2
+    uploads, traces = uploader(client)
+    uploads.submit(big, "s3://bucket/out/big.bin")
+    (error,) = uploads.drain()
+    assert "reset by peer" in error and "s3://bucket/acme/out/big.bin" in error
+    assert client.calls[-1] == "abort_multipart_upload" and client.objects == {}
+    assert traces[-1][1]["ok"] is False and uploads.drain() == []
+
+
+def test_submit_never_waits_for_the_upload(tmp_path: Path) -> None:
+    small = tmp_path / "a.pdf"
+    small.write_bytes(b"%PDF")
+    client = FakeS3()
+    client.gate.clear()
+    uploads, _ = uploader(client)
+    t0 = time.perf_counter()
+    uploads.submit(small, "s3://bucket/x/")
+    assert time.perf_counter() - t0 < 0.5 and client.objects == {}
+    client.gate.set()
+    assert uploads.drain() == [] and client.objects["bucket/acme/x/a.pdf"]["body"] == b"%PDF"
+    uploads.close()
+
+
+def test_local_store_mirror_and_prune(tmp_path: Path) -> None:
+    shot = tmp_path / "shot.png"
+    shot.write_bytes(b"png")
+    root = tmp_path / "store"
+    uploads = ArtifactUploads(ArtifactOptions(store=str(root), tenant="a/b", mirror=["screenshots"]), "run_9")
+    uri = uploads.mirror(shot, "screenshots")
+    assert uploads.mirror(shot, "trace") is None and uploads.drain() == []
+    saved = root / "a_b" / "run_9" / "screenshots" / "shot.png"
+    assert uri == saved.resolve().as_uri() and saved.read_bytes() == b"png"
+    store = LocalStore(root)
+    assert store.prune(date.today()) == 0
+    assert store.prune(date.today() + timedelta(days=91)) == 1 and not saved.exists()
+
+
+def test_options_and_signed_url(monkeypatch: Any) -> None:
+    monkeypatch.setenv("WAO_ARTIFACT_STORE", "s3://env-bucket/")
+    opts = ArtifactOptions.from_flow({"options": {"session": {"account": "user@example.com"}}})
+    assert opts.store == "s3://env-bucket/" and opts.tenant == "user_example.com" and opts.ttl_days == 90
+    with pytest.raises(ValueError, match="mirror"):
+        ArtifactOptions(mirror=["videos"])
+    url = S3Store("b", FakeS3()).signed_url("acme/r.csv", seconds=3600)
+    assert url.endswith("X-Amz-Expires=900")
+
+
+def test_download_to_s3_is_queued(tmp_path: Path) -> None:
+    (action,) = compile_steps([{"act": "wait_download", "pattern": r"\.csv$", "to": "s3://bucket/reports/"}])
+    assert action.to is None and action.remote == "s3://bucket/reports/"  # type: ignore[attr-defined]
+    dest = tmp_path / "r.csv"
+    dest.write_text("a,b\n")
+    client = FakeS3()
+    ctx = SimpleNamespace(state={}, uploads=uploader(client)[0])
+    action._finish(ctx, dest, None)  # type: ignore[attr-defined]
+    assert ctx.state["last_download_uri"] == "s3://bucket/acme/reports/r.csv"
+    assert ctx.uploads.drain() == [] and "bucket/acme/reports/r.csv" in client.objects
@@ -0,0 +1,157 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from wao import async_runner
+from wao.async_runner import AsyncRunner, FlowAssertionError
+from wao.trace import open_trace
+
+
+class Page:
+    """Records the calls steps make; ``title`` is what assert_title sees."""
+
+    def __init__(self, calls: List[str], title: str) -> None:
+        self.calls = calls
+        self._title = title
+        self.url = "about:blank"
+
+    def on(self, event: str, handler: Any) -> None:
+        pass
+
+    async def goto(self, url: str) -> None:
+        self.calls.append(f"goto {url}")
+        self.url = url
+
+    async def fill(self, selector: str, value: str) -> None:
+        self.calls.append(f"fill {selector}={value}")
+
+    async def click(self, selector: str) -> None:
+        self.calls.append(f"click {selector}")
+
+    async def title(self) -> str:
+        return self._title
+
+    async def content(self) -> str:
+        return "<html><h1>error</h1></html>"
+
+    async def screenshot(self, **kwargs: Any) -> bytes:
+        self.calls.append("screenshot")
+        return b"png"
+
+
+class Browser:
+    """A shared browser whose contexts count how many flows are open at once."""
+
+    def __init__(self, title: str = "明細一覧") -> None:
+        self.title = title
+        self.calls: List[str] = []
+        self.open = 0
+        self.peak = 0
+
+    async def new_context(self, **options: Any) -> "Context":
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+        return Context(self)
+
+    async def close(self) -> None:
+        pass
+
+
+class Context:
+    def __init__(self, browser: Browser) -> None:
+        self.browser = browser
+
+    async def new_page(self) -> Page:
+        return Page(self.browser.calls, self.browser.title)
+
+    async def close(self) -> None:
+        self.browser.open -= 1
+
+
+def flow(*steps: Dict[str, Any]) -> Dict[str, Any]:
+    return {"version": "0.1.0", "site": "bank.example", "steps": list(steps)}
+
+
+def run_end(runner: AsyncRunner) -> Optional[Dict[str, Any]]:
+    with open_trace(runner.trace_path) as f:
+        records = [json.loads(line) for line in f]
+    return next((r for r in records if r.get("kind") == "run_end"), None)
+
+
+@pytest.fixture(autouse=True)
+def artifacts(tmp_path: Path, monkeypatch: Any) -> None:
+    monkeypatch.setenv("WAO_ARTIFACTS_DIR", str(tmp_path))
+
+
+def test_steps_dispatch_to_the_async_page() -> None:
+    browser = Browser()
+    runner = AsyncRunner(
+        flow(
+            {"act": "open_url", "url": "https://bank.example/login"},
+            {"act": "fill", "selector": "#user", "value": "taro"},
+            {"act": "click", "selector": "#submit"},
+            {"act": "assert_title", "expected": "明細", "match_mode": "contains"},
+        ),
+        browser=browser,  # type: ignore[arg-type]
+    )
+    asyncio.run(runner.run())
+    assert browser.calls == ["goto https://bank.example/login", "fill #user=taro", "click #submit"]
+    end = run_end(runner)
+    assert end is not None and end["status"] == "ok" and browser.open == 0
+
+
+def test_assert_failure_raises_and_records_error() -> None:
+    browser = Browser(title="Service Unavailable")
+    runner = AsyncRunner(
+        flow(
+            {"act": "open_url", "url": "https://bank.example/"},
+            {"act": "assert_title", "expected": "明細", "match_mode": "contains"},
+        ),
+        browser=browser,  # type: ignore[arg-type]
+    )
+    with pytest.raises(FlowAssertionError, match="assert_title failed"):
+        asyncio.run(runner.run())
+    end = run_end(runner)
+    assert end is not None and end["status"] == "error" and "assert_title failed" in end["error"]
+    assert "screenshot" in browser.calls and browser.open == 0
+
+
+def test_run_many_bounds_concurrency(monkeypatch: Any) -> None:
+    browser = Browser()
+
+    class Playwright:
+        def __init__(self) -> None:
+            self.chromium = self
+
+        async def launch(self, headless: bool = True) -> Browser:
+            return browser
+
+        async def __aenter__(self) -> "Playwright":
+            return self
+
+        async def __aexit__(self, *exc: Any) -> None:
+            pass
+
+    monkeypatch.setattr(async_runner, "async_playwright", Playwright)
+    ok = flow({"act": "wait", "timeout": 50})
+    bad = flow({"act": "assert_title", "expected": "nope"})
+    results = asyncio.run(async_runner.run_many([ok, ok, bad, ok, ok], concurrency=2))
+    assert browser.peak == 2
+    assert [r is None for r in results] == [True, True, False, True, True]
+    assert isinstance(results[2], FlowAssertionError)
+
+
+def test_start_failure_records_error(monkeypatch: Any) -> None:
+    runner = AsyncRunner(flow({"act": "wait", "timeout": 50}), browser=Browser())  # type: ignore[arg-type]
+
+    async def start() -> None:
+        raise RuntimeError("browser launch failed")
+
+    monkeypatch.setattr(runner, "_start", start)
+    with pytest.raises(RuntimeError, match="launch failed"):
+        asyncio.run(runner.run())
+    end = run_end(runner)
+    assert end is not None and end["status"] == "error" and end["error"] == "browser launch failed"
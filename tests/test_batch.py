@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from wao import batch
+
+
+def _write_flow(path: Path, site: str) -> Path:
+    flow = {
+        "version": "0.1.0",
+        "site": site,
+        "steps": [{"action": "log", "name": "l", "message": "hi"}],
+    }
+    path.write_text(json.dumps(flow), encoding="utf-8")
+    return path
+
+
+def test_collect_and_site(tmp_path: Path) -> None:
+    _write_flow(tmp_path / "a.json", "a.example")
+    (tmp_path / "schema.flow.v1.json").write_text("{}", encoding="utf-8")
+    assert [p.name for p in batch.collect_flows(str(tmp_path))] == ["a.json"]
+    flow = {"steps": [{"action": "open_url", "url": "https://portal.example/login"}]}
+    assert batch.flow_site(flow) == "portal.example"
+
+
+def test_per_site_cap_and_exit_code(tmp_path: Path, monkeypatch: Any) -> None:
+    paths = [_write_flow(tmp_path / f"s{i}.json", "same.example" if i < 4 else "other.example") for i in range(6)]
+    (tmp_path / "broken.json").write_text('{"steps": []}', encoding="utf-8")
+    paths.append(tmp_path / "broken.json")
+
+    lock = threading.Lock()
+    running: Counter = Counter()
+    peak: Counter = Counter()
+
+    def fake_execute(job: Any, pool: Any) -> batch.FlowResult:
+        with lock:
+            running[job.site] += 1
+            peak[job.site] = max(peak[job.site], running[job.site])
+        time.sleep(0.05)
+        with lock:
+            running[job.site] -= 1
+        return batch.FlowResult(job.path, job.site, "ok")
+
+    monkeypatch.setattr(batch, "execute_flow", fake_execute)
+    results = batch.run_many(paths, workers=4, per_site=1)
+
+    assert [r.path for r in results] == [str(p) for p in paths]
+    assert peak["same.example"] == 1
+    assert results[-1].status == "invalid"
+    assert batch.exit_code(results) == 1
+    assert batch.exit_code(results[:-1]) == 0
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_worker_fails_its_flow_and_is_replaced(tmp_path: Path, monkeypatch: Any) -> None:
+    paths = [_write_flow(tmp_path / f"f{i}.json", f"s{i}.example") for i in range(4)]
+
+    def fake_execute(job: Any, pool: Any) -> batch.FlowResult:
+        if job.path.endswith("f1.json"):
+            raise SystemExit  # ends the worker thread without a result, like a crashed process
+        return batch.FlowResult(job.path, job.site, "ok")
+
+    monkeypatch.setattr(batch, "execute_flow", fake_execute)
+    results = batch.run_many(paths, workers=2)
+    assert [r.status for r in results] == ["ok", "failed", "ok", "ok"]
+    assert results[1].error == "worker died"
@@ -0,0 +1,35 @@
+import urllib.request
+from http.cookiejar import CookieJar
+
+from benchmarks.harness import compare, measure_trace_overhead, percentiles
+from benchmarks.site import StandInSite, parse_size
+
+
+def test_percentiles_nearest_rank() -> None:
+    p = percentiles(range(1, 101))
+    assert (p["p50"], p["p95"], p["p99"], p["max"], p["n"]) == (50, 95, 99, 100, 100)
+    assert percentiles([]) == {"n": 0}
+
+
+def test_compare_flags_only_real_regressions() -> None:
+    base = {"metrics": {"startup_ms": {"p50": 400, "n": 5}, "flows": {"login": {"run_ms": {"p95": 100}}}}}
+    cur = {"metrics": {"startup_ms": {"p50": 402, "n": 50}, "flows": {"login": {"run_ms": {"p95": 150}}}}}
+    assert compare(cur, base, threshold=0.2) == [("flows.login.run_ms.p95", 100.0, 150.0, 1.5)]
+    assert compare(base, base) == []
+
+
+def test_stand_in_site_login_redirects_and_download() -> None:
+    assert parse_size("10m") == 10 * 1024 * 1024
+    with StandInSite() as site:
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        with opener.open(site.base_url + "/redirect/3") as resp:
+            assert resp.url.endswith("/login") and b"<title>Test Login" in resp.read()
+        with opener.open(site.base_url + "/login", data=b"username=a&password=b") as resp:
+            assert resp.url.endswith("/home") and b"Logged In Successfully" in resp.read()
+        with opener.open(site.base_url + "/download/64k") as resp:
+            assert "attachment" in resp.headers["Content-Disposition"]
+            assert len(resp.read()) == 64 * 1024
+
+
+def test_trace_overhead_reports_every_mode() -> None:
+    assert set(measure_trace_overhead(records=200)) == {"none", "gzip", "none+bg", "gzip+bg"}
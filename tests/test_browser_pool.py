@@ -0,0 +1,108 @@
+from typing import Any, List
+
+import pytest
+
+from wao.browser_pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self) -> None:
+        self.connected = True
+        self.contexts: List[FakeContext] = []
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def new_context(self, **_: Any) -> FakeContext:
+        ctx = FakeContext()
+        self.contexts.append(ctx)
+        return ctx
+
+    def close(self) -> None:
+        self.connected = False
+
+
+class FakeChromium:
+    def __init__(self) -> None:
+        self.browsers: List[FakeBrowser] = []
+
+    def launch(self, **_: Any) -> FakeBrowser:
+        b = FakeBrowser()
+        self.browsers.append(b)
+        return b
+
+
+class FakePlaywright:
+    def __init__(self) -> None:
+        self.chromium = FakeChromium()
+
+
+def test_reuses_browser_with_fresh_contexts() -> None:
+    pw = FakePlaywright()
+    with BrowserPool(size=2, playwright=pw) as pool:  # type: ignore[arg-type]
+        a = pool.acquire()
+        pool.release(a)
+        b = pool.acquire()
+        pool.release(b)
+        assert len(pw.chromium.browsers) == 1
+        assert a.context is not b.context
+        assert a.context.closed and b.context.closed
+
+
+def test_prewarm_and_size_cap() -> None:
+    pw = FakePlaywright()
+    with BrowserPool(size=2, prewarm=True, playwright=pw) as pool:  # type: ignore[arg-type]
+        assert len(pw.chromium.browsers) == 2
+        leases = [pool.acquire() for _ in range(3)]
+        assert len(pw.chromium.browsers) == 2
+        assert pool.stats()["active"] == 3
+        for lease in leases:
+            pool.release(lease)
+
+
+def test_recycles_after_max_contexts() -> None:
+    pw = FakePlaywright()
+    with BrowserPool(size=1, max_contexts=2, playwright=pw) as pool:  # type: ignore[arg-type]
+        for _ in range(3):
+            pool.release(pool.acquire())
+        first = pw.chromium.browsers[0]
+        assert not first.connected
+        assert len(pw.chromium.browsers) == 2
+
+
+def test_closes_browser_when_new_context_fails() -> None:
+    pw = FakePlaywright()
+
+    def broken(**_: Any) -> FakeContext:
+        raise RuntimeError("Target closed")
+
+    with BrowserPool(size=1, playwright=pw) as pool:  # type: ignore[arg-type]
+        pool.release(pool.acquire())
+        pw.chromium.browsers[0].new_context = broken  # type: ignore[method-assign]
+        lease = pool.acquire()  # retried on a fresh browser
+        assert not pw.chromium.browsers[0].connected
+        assert len(pw.chromium.browsers) == 2 and pool.stats()["browsers"] == 1
+        pool.release(lease)
+
+
+def test_drops_disconnected_browser() -> None:
+    pw = FakePlaywright()
+    with BrowserPool(size=1, playwright=pw) as pool:  # type: ignore[arg-type]
+        pool.release(pool.acquire())
+        pw.chromium.browsers[0].connected = False
+        assert pool.health_check() == 0
+        pool.release(pool.acquire())
+        assert len(pw.chromium.browsers) == 2
+
+
+def test_rejects_invalid_size() -> None:
+    with pytest.raises(ValueError):
+        BrowserPool(size=0)
@@ -0,0 +1,81 @@
+import gzip
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from wao.capture import CaptureOptions, FailureCapture
+
+
+class FakePage:
+    """content() embeds a changing timestamp; screenshot size depends on the requested format."""
+
+    def __init__(self, body: str = "<h1>Service Unavailable</h1>") -> None:
+        self.body = body
+        self.calls = 0
+        self.shots: List[Dict[str, Any]] = []
+
+    def content(self) -> str:
+        self.calls += 1
+        return f"<html><!-- rendered 2024-06-0{self.calls} 12:00:{self.calls:02d} -->{self.body}</html>"
+
+    def screenshot(self, **kwargs: Any) -> bytes:
+        self.shots.append(kwargs)
+        size = 10_000 if kwargs.get("full_page") else 1_000
+        return (self.body.encode() * size)[: size // (2 if kwargs["type"] == "jpeg" else 1)]
+
+
+def _capture(tmp_path: Path, **opts: Any) -> Tuple[FailureCapture, List[Tuple[str, Dict[str, Any]]]]:
+    traces: List[Tuple[str, Dict[str, Any]]] = []
+    cap = FailureCapture(tmp_path, CaptureOptions(**opts), lambda k, p: traces.append((k, p)))
+    return cap, traces
+
+
+def test_repeated_failure_is_deduplicated_in_window(tmp_path: Path) -> None:
+    cap, traces = _capture(tmp_path, dedupe_window_s=600)
+    page = FakePage()
+    cap.capture(page, "step")
+    cap.capture(page, "step")  # same page, different timestamp digits
+    cap.flush()
+    assert len(page.shots) == 1  # the duplicate never paid for a screenshot
+    first, second = (p for _, p in traces)
+    assert sorted(Path(f).suffix for f in first["files"]) == [".html", ".png"]
+    assert all((tmp_path / f).is_file() for f in first["files"])
+    assert second["files"] == [] and second["deduped"].startswith("step:dom:")
+    index = json.loads((tmp_path / "index.json").read_text())
+    assert index[second["deduped"]]["count"] == 2
+
+    # a fresh process (new FailureCapture) still sees the persisted index
+    other, _ = _capture(tmp_path, dedupe_window_s=600)
+    other.capture(FakePage(), "step")
+    other.flush()
+    assert len(list(tmp_path.glob("failed_*"))) == 2
+
+    # different page -> captured
+    cap.capture(FakePage("<h1>Login failed</h1>"), "step")
+    cap.flush()
+    assert len(list(tmp_path.glob("failed_*"))) == 4
+
+
+def test_size_caps_and_formats(tmp_path: Path) -> None:
+    cap, traces = _capture(
+        tmp_path, screenshot="jpeg", quality=50, html="gzip", max_screenshot_bytes=2_000, max_html_bytes=40
+    )
+    page = FakePage("x" * 500)
+    cap.capture(page, "assert_title")
+    cap.flush()
+    # full-page jpeg was over the cap -> retaken as viewport
+    assert [s["full_page"] for s in page.shots] == [True, False] and page.shots[0]["quality"] == 50
+    files = traces[0][1]["files"]
+    shot = next(f for f in files if f.endswith(".jpg"))
+    assert (tmp_path / shot).stat().st_size == 500
+    html = gzip.decompress((tmp_path / next(f for f in files if f.endswith(".html.gz"))).read_bytes())
+    assert html.startswith(b"<html>") and b"wao: truncated" in html
+
+
+def test_no_dedupe_and_foreground(tmp_path: Path) -> None:
+    cap, traces = _capture(tmp_path, dedupe_window_s=0, background=False, screenshot="none", html="plain")
+    page = FakePage()
+    cap.capture(page, "step")
+    cap.capture(page, "step")
+    assert page.shots == [] and len(list(tmp_path.glob("failed_*.html"))) == 2
+    assert not (tmp_path / "index.json").exists()
@@ -0,0 +1,236 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+import pytest
+
+from wao.actions import Action, StepCompileError, compile_steps
+from wao.actions.control import ForeachAction
+from wao.actions.registry import TemplatedAction
+from wao.templating import Scope, Template, TemplateError, compile_value
+from wao.trace_stats import _Run
+
+
+class Page:
+    """Records gotos; URLs containing "flaky" fail until ``flaky`` reaches 0, "?ms=" sleeps."""
+
+    def __init__(self) -> None:
+        self.urls: List[str] = []
+        self.flaky = 0
+        self.text = {"#total": "  合計 12,340 円 ", "#id": "A-17"}
+
+    def _go(self, url: str) -> float:
+        if "flaky" in url and self.flaky > 0:
+            self.flaky -= 1
+            raise TimeoutError("flaky")
+        self.urls.append(url)
+        return int(url.rsplit("ms=", 1)[-1]) / 1000.0 if "ms=" in url else 0.0
+
+    def goto(self, url: str) -> None:
+        time.sleep(self._go(url))
+
+    def locator(self, selector: str) -> Any:
+        page = self
+
+        class Loc:
+            first = None
+
+            def evaluate(self, script: str, attr: str, timeout: int = 0) -> Any:
+                return page.text.get(selector)
+
+            def evaluate_all(self, script: str, attr: str) -> List[Any]:
+                return [v for k, v in page.text.items() if k.startswith(selector)]
+
+        loc = Loc()
+        loc.first = loc  # type: ignore[assignment]
+        return loc
+
+
+class AsyncPage(Page):
+    async def goto(self, url: str) -> None:  # type: ignore[override]
+        await asyncio.sleep(self._go(url))
+
+
+class Ctx:
+    """The parts of Runner a block touches."""
+
+    def __init__(self, page: Any = None) -> None:
+        self.page = page or Page()
+        self.state: Dict[str, Any] = {"params": {"year": "2026"}}
+        self.vars = Scope(self.state)
+        self._trace_scope: Dict[str, Any] = {}
+        self.traces: List[Tuple[str, Dict[str, Any]]] = []
+
+    def _trace(self, kind: str, payload: Dict[str, Any]) -> None:
+        self.traces.append((kind, payload))
+
+    @contextmanager
+    def _step_scope(self, action: Action) -> Iterator[None]:
+        self._trace("step_start", {"i": action.index, **self._trace_scope, "step": dict(action.raw)})
+        try:
+            yield
+        except Exception as e:
+            self._trace("step_err", {"i": action.index, **self._trace_scope, "ms": 1, "error": str(e)})
+            raise
+        self._trace("step_ok", {"i": action.index, **self._trace_scope, "ms": 1})
+
+
+class AsyncCtx(Ctx):
+    def __init__(self) -> None:
+        super().__init__(AsyncPage())
+
+    @asynccontextmanager
+    async def _step_scope(self, action: Action) -> AsyncIterator[None]:  # type: ignore[override]
+        with Ctx._step_scope(self, action):
+            yield
+
+
+def test_templates() -> None:
+    scope = Scope({"rep": {"path": "r/1"}, "rows": [{"id": 7}], "months": ["01", "02"]})
+    assert Template("https://x/{{rep.path}}?id={{ rows[0].id }}").render(scope) == "https://x/r/1?id=7"
+    assert Template("{{months}}").value(scope) == ["01", "02"]
+    assert Template("{{join(months, '-')}}").value(scope) == "01-02"
+    assert Template("{{missing | default('N/A')}}/{{yyyy}}").render(scope) == f"N/A/{time.strftime('%Y')}"
+    with pytest.raises(TemplateError, match="undefined"):
+        Template("{{missing}}").render(scope)
+    with pytest.raises(TemplateError, match="unsupported"):
+        Template("{{ a + b }}")
+    render = compile_value({"url": "{{rep.path}}", "n": 3, "list": ["{{months}}", "x"]})
+    assert render(scope) == {"url": "r/1", "n": 3, "list": [["01", "02"], "x"]}
+
+    with scope.frame({"rep": {"path": "inner"}}):
+        assert Template("{{rep.path}}").render(scope) == "inner"
+        scope.set("rep", "loop-only")
+        scope.set("total", 1)
+    assert scope.root["rep"] == {"path": "r/1"} and scope.root["total"] == 1
+
+
+def test_templated_steps_parse_once_and_cache_by_rendering(monkeypatch: Any) -> None:
+    (goto,) = compile_steps([{"act": "goto", "url": "https://bank/{{params.year}}/{{m}}"}])
+    assert isinstance(goto, TemplatedAction) and goto.idempotent and goto.supports_async()
+    parsed: List[str] = []
+    real = Template.__init__
+
+    def counting(self: Template, source: str) -> None:
+        parsed.append(source)
+        real(self, source)
+
+    monkeypatch.setattr(Template, "__init__", counting)
+    ctx = Ctx()
+    for _ in range(2):
+        for m in ("01", "02"):
+            with ctx.vars.frame({"m": m}):
+                goto.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.page.urls == ["https://bank/2026/01", "https://bank/2026/02"] * 2
+    assert parsed == [] and len(goto.bound) == 2
+    with pytest.raises(StepCompileError, match="unsupported template"):
+        compile_steps([{"act": "goto", "url": "{{ 1 + 1 }}"}])
+
+
+def test_foreach_traces_every_iteration() -> None:
+    flow = [
+        {"act": "set_var", "name": "months", "value": ["01", "02", "03"]},
+        {
+            "act": "foreach",
+            "name": "loop",
+            "listVar": "months",
+            "item": "m",
+            "varIndex": "k",
+            "steps": [
+                {"act": "goto", "name": "open", "url": "https://bank/{{m}}?k={{k}}"},
+                {"act": "set_var", "name": "last", "value": "{{m}}"},
+            ],
+        },
+    ]
+    plan = compile_steps(flow)
+    assert isinstance(plan[1], ForeachAction) and plan[1].idempotent  # goto/set_var only
+    ctx = Ctx()
+    for action in plan:
+        action.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.page.urls == ["https://bank/01?k=0", "https://bank/02?k=1", "https://bank/03?k=2"]
+    assert ctx.state["last"] == "03" and "m" not in ctx.state and ctx.vars.frames == []
+    iters = [p for k, p in ctx.traces if k == "loop_iter"]
+    assert [(p["iter"], p["status"]) for p in iters] == [(0, "ok"), (1, "ok"), (2, "ok")]
+    starts = [p for k, p in ctx.traces if k == "step_start"]
+    assert {(p["parent"], p["depth"]) for p in starts} == {(2, 1)} and [p["iter"] for p in starts][::2] == [0, 1, 2]
+
+    run = _Run({"site": "bank"})
+    for kind, payload in [("step_start", {"i": 2, "step": {"act": "foreach", "name": "loop"}})] + ctx.traces:
+        run.feed(kind, payload)
+    run.feed("step_ok", {"i": 2, "ms": 5})
+    assert [s[1] for s in run.steps].count("open") == 3 and run.steps[-1][1] == "loop"
+
+
+def test_foreach_stops_on_failure() -> None:
+    (loop,) = compile_steps(
+        [{"act": "foreach", "items": ["a", "flaky", "c"], "steps": [{"act": "goto", "url": "https://x/{{item}}"}]}]
+    )
+    ctx = Ctx()
+    ctx.page.flaky = 1
+    with pytest.raises(TimeoutError):
+        loop.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.page.urls == ["https://x/a"]
+    assert [p["status"] for k, p in ctx.traces if k == "loop_iter"] == ["ok", "error"]
+    with pytest.raises(StepCompileError, match="listVar"):
+        compile_steps([{"act": "foreach", "steps": [{"act": "goto", "url": "x"}]}])
+
+
+def test_retry_block_replays_its_steps() -> None:
+    (block,) = compile_steps(
+        [
+            {
+                "act": "retry",
+                "max_attempts": 3,
+                "backoff_ms": 1,
+                "steps": [{"act": "goto", "url": "https://x/open"}, {"act": "goto", "url": "https://x/flaky"}],
+            }
+        ]
+    )
+    ctx = Ctx()
+    ctx.page.flaky = 2
+    block.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.page.urls == ["https://x/open"] * 3 + ["https://x/flaky"]
+    assert [p["attempt"] for k, p in ctx.traces if k == "block_retry"] == [2, 3]
+
+    actx = AsyncCtx()
+    actx.page.flaky = 5
+    with pytest.raises(TimeoutError, match="flaky"):
+        asyncio.run(block.aexecute(actx))  # type: ignore[arg-type]
+    assert len([k for k, _ in actx.traces if k == "block_retry"]) == 2
+
+
+def test_timeout_block() -> None:
+    (block,) = compile_steps(
+        [
+            {
+                "act": "timeout",
+                "ms": 150,
+                "steps": [{"act": "goto", "url": "https://x/a?ms=100"}, {"act": "goto", "url": "https://x/b?ms=100"}],
+            }
+        ]
+    )
+    ctx = Ctx()
+    with pytest.raises(TimeoutError, match="within 150 ms"):
+        block.execute(ctx)  # type: ignore[arg-type]
+    t0 = time.perf_counter()
+    with pytest.raises(TimeoutError, match="within 150 ms"):
+        asyncio.run(block.aexecute(AsyncCtx()))  # type: ignore[arg-type]
+    assert time.perf_counter() - t0 < 0.19  # cancelled at the deadline, not after the second step
+
+
+def test_extract_and_set_var() -> None:
+    plan = compile_steps(
+        [
+            {"act": "extract", "selector": "#total", "regex": r"([0-9,]+)", "as": "total"},
+            {"act": "extract", "selector": "#", "all": True, "as": "cells"},
+            {"act": "extract", "selector": "#none", "as": "x", "default": "-"},
+            {"act": "set_var", "name": "summary", "value": "{{total}} / {{join(cells, '|')}} / {{x}}"},
+        ]
+    )
+    ctx = Ctx()
+    for action in plan:
+        action.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.state["total"] == "12,340" and ctx.state["summary"] == "12,340 / 合計 12,340 円|A-17 / -"
+    with pytest.raises(ValueError, match="no text for #none"):
+        compile_steps([{"act": "extract", "selector": "#none", "as": "x"}])[0].execute(ctx)  # type: ignore[arg-type]
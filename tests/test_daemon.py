@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from wao.batch import FlowResult
+from wao.daemon import Daemon, JobRejected, make_server, spool_job
+
+FLOW = {"version": "0.1.0", "site": "example.com", "steps": [{"action": "log", "name": "l", "message": "hi"}]}
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.jobs: List[Any] = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, job: Any, pool: Any) -> FlowResult:
+        self.release.wait(5)
+        self.jobs.append(job)
+        return FlowResult(job.path, job.site, "ok", 0.01)
+
+
+def _wait(pred: Any, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not pred():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_submit_runs_job_with_params() -> None:
+    rec = Recorder()
+    daemon = Daemon(workers=1, execute=rec, pool_factory=lambda: None).start()
+    try:
+        job = daemon.submit({"flow": FLOW, "params": {"month": "2026-10"}})
+        _wait(lambda: daemon.get(job.id).status == "ok")  # type: ignore[union-attr]
+        assert rec.jobs[0].params == {"month": "2026-10"} and rec.jobs[0].site == "example.com"
+        assert daemon.status()["completed"]["ok"] == 1
+        with pytest.raises(JobRejected):
+            daemon.submit({"flow": {"version": "0.1.0", "steps": [{"action": "nope"}]}})
+    finally:
+        daemon.stop(timeout=5)
+
+
+def test_queue_depth_and_full_queue() -> None:
+    rec = Recorder()
+    rec.release.clear()
+    daemon = Daemon(workers=1, max_queue=2, execute=rec, pool_factory=lambda: None).start()
+    try:
+        first = daemon.submit({"flow": FLOW})
+        _wait(lambda: daemon.get(first.id).status == "running")  # type: ignore[union-attr]
+        daemon.submit({"flow": FLOW})
+        daemon.submit({"flow": FLOW})
+        assert daemon.status()["queue_depth"] == 2 and daemon.status()["running"] == 1
+        with pytest.raises(JobRejected) as ei:
+            daemon.submit({"flow": FLOW})
+        assert ei.value.status == 503
+    finally:
+        rec.release.set()
+        daemon.stop(timeout=5)
+
+
+def test_duplicate_id_in_the_queue_is_a_conflict() -> None:
+    daemon = Daemon(workers=1, execute=Recorder(), pool_factory=lambda: None)
+    daemon._sched.push("dup", "example.com", "t", {})  # e.g. recovered from the queue db, not yet in _jobs
+    with pytest.raises(JobRejected, match="already queued") as ei:
+        daemon.submit({"flow": FLOW}, job_id="dup")
+    assert ei.value.status == 409 and daemon.get("dup") is None
+
+
+def test_http_api() -> None:
+    daemon = Daemon(workers=1, execute=Recorder(), pool_factory=lambda: None).start()
+    server = make_server(daemon, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        req = urllib.request.Request(base + "/jobs", data=json.dumps({"flow": FLOW}).encode(), method="POST")
+        with urllib.request.urlopen(req) as resp:
+            assert resp.status == 202
+            job_id = json.loads(resp.read())["id"]
+        _wait(lambda: daemon.get(job_id).status == "ok")  # type: ignore[union-attr]
+        with urllib.request.urlopen(f"{base}/jobs/{job_id}") as resp:
+            assert json.loads(resp.read())["status"] == "ok"
+        with urllib.request.urlopen(base + "/status") as resp:
+            assert json.loads(resp.read())["queue_depth"] == 0
+        bad = urllib.request.Request(base + "/jobs", data=b'{"flow_path": "/nonexistent.json"}', method="POST")
+        with pytest.raises(urllib.error.HTTPError) as ei:
+            urllib.request.urlopen(bad)
+        assert ei.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.stop(timeout=5)
+
+
+def test_spool_roundtrip_and_recovery(tmp_path: Path) -> None:
+    flow_path = tmp_path / "flow.json"
+    flow_path.write_text(json.dumps(FLOW))
+    spool = tmp_path / "spool"
+    job_id = spool_job(spool, {"flow_path": str(flow_path), "params": {"a": 1}})
+    bad_id = spool_job(spool, {"flow_path": str(tmp_path / "missing.json")})
+    # a job claimed by a daemon that died before finishing
+    (spool / "accepted").mkdir(parents=True)
+    (spool / "accepted" / "orphan.json").write_text(json.dumps({"flow": FLOW}))
+
+    rec = Recorder()
+    daemon = Daemon(workers=1, spool_dir=spool, spool_interval_s=0.05, execute=rec, pool_factory=lambda: None).start()
+    try:
+        _wait(lambda: all((spool / "done" / f"{i}.json").exists() for i in (job_id, bad_id, "orphan")))
+    finally:
+        daemon.stop(timeout=5)
+    assert json.loads((spool / "done" / f"{job_id}.json").read_text())["status"] == "ok"
+    assert json.loads((spool / "done" / f"{bad_id}.json").read_text())["status"] == "invalid"
+    assert not list((spool / "incoming").glob("*.json"))
+    assert sorted(j.params.get("a", 0) for j in rec.jobs) == [0, 1]
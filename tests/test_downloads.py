@@ -0,0 +1,208 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from wao.actions import compile_steps
+from wao.downloads import ContentStore, DownloadStore, is_unchanged
+
+DATA = b"statement 2024-05\n" * 1000
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: Dict[str, str]) -> None:
+        self.status = status
+        self.headers = headers
+
+    def dispose(self) -> None:
+        pass
+
+
+class FakeServer:
+    """HEAD endpoint with an ETag; the "browser" download always returns DATA."""
+
+    def __init__(self, etag: str = '"v1"') -> None:
+        self.etag = etag
+        self.heads: List[Dict[str, str]] = []
+
+    def head(self, url: str, headers: Dict[str, str], timeout: int) -> FakeResponse:
+        self.heads.append(headers)
+        if headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304, {})
+        return FakeResponse(200, {"etag": self.etag, "content-length": str(len(DATA))})
+
+
+class FakeDownload:
+    def __init__(self, src: Path, url: str) -> None:
+        self.src = src
+        self.url = url
+        self.suggested_filename = "statement.pdf"
+
+    def path(self) -> str:
+        return str(self.src)
+
+    def save_as(self, path: str) -> None:
+        Path(path).write_bytes(self.src.read_bytes())
+
+
+class FakeExpect:
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __enter__(self) -> "FakeExpect":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        pass
+
+
+class FakePage:
+    def __init__(self, server: FakeServer, src: Path) -> None:
+        self.context = type("Ctx", (), {"request": server})()
+        self.src = src
+        self.downloads = 0
+
+    def expect_download(self, timeout: int) -> FakeExpect:
+        self.downloads += 1
+        return FakeExpect(FakeDownload(self.src, "https://bank.example/statement.pdf"))
+
+    def goto(self, url: str) -> None:
+        pass
+
+
+class FakeCtx:
+    def __init__(self, root: Path, page: FakePage, options: Dict[str, Any]) -> None:
+        self.downloads_dir = root
+        self.page = page
+        self.state: Dict[str, Any] = {}
+        self.traces: List[Tuple[str, Dict[str, Any]]] = []
+        self.download_store = DownloadStore(root, "bank", options)
+
+    def _trace(self, kind: str, payload: Dict[str, Any]) -> None:
+        self.traces.append((kind, payload))
+
+    def fail(self, reason: str, message: str) -> None:
+        raise AssertionError(message)
+
+
+def test_is_unchanged() -> None:
+    entry = {"etag": '"a"', "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT", "size": 10}
+    assert is_unchanged(entry, 304, {})
+    assert is_unchanged(entry, 200, {"ETag": '"a"'})
+    assert not is_unchanged(entry, 200, {"etag": '"b"'})
+    lm = {"last_modified": entry["last_modified"], "size": 10}
+    assert is_unchanged(lm, 200, {"last-modified": entry["last_modified"], "content-length": "10"})
+    assert not is_unchanged(lm, 200, {"last-modified": entry["last_modified"], "content-length": "11"})
+    assert not is_unchanged({"size": 10}, 200, {"content-length": "10"})  # nothing to compare
+    assert not is_unchanged(entry, 404, {})
+
+
+def test_content_store_dedupes_and_restores(tmp_path: Path) -> None:
+    store = ContentStore(tmp_path / ".store")
+    a, b = tmp_path / "acct1" / "s.pdf", tmp_path / "acct2" / "s.pdf"
+    for p in (a, b):
+        p.parent.mkdir()
+        p.write_bytes(DATA)
+    assert not store.adopt(a, "ab" * 32)  # first copy becomes the blob
+    assert store.adopt(b, "ab" * 32)
+    assert os.path.samefile(a, b) and b.read_bytes() == DATA
+    a.unlink()
+    assert store.restore("ab" * 32, a) and a.read_bytes() == DATA
+    assert not store.restore("cd" * 32, tmp_path / "missing")
+
+
+def test_download_skips_when_unchanged(tmp_path: Path) -> None:
+    src = tmp_path / "pw_tmp"
+    src.write_bytes(DATA)
+    dest = tmp_path / "dl" / "statement.pdf"
+    (action,) = compile_steps(
+        [{"action": "download", "name": "stmt", "url": "https://bank.example/statement.pdf", "path": str(dest)}]
+    )
+    server = FakeServer()
+
+    first = FakeCtx(tmp_path, FakePage(server, src), {"skip_if_unchanged": True, "dedupe": True})
+    action.execute(first)  # type: ignore[arg-type]
+    assert first.page.downloads == 1 and dest.read_bytes() == DATA
+    store = first.download_store
+    entry = store.manifest.get(store.key(action.url, "stmt"))  # type: ignore[attr-defined]
+    assert entry is not None and entry["etag"] == '"v1"' and entry["size"] == len(DATA)
+    assert store.cas.path_for(entry["sha256"]).is_file()
+
+    # next scheduled run: conditional HEAD -> 304, no transfer; the file is relinked from the store
+    dest.unlink()
+    second = FakeCtx(tmp_path, FakePage(server, src), {"skip_if_unchanged": True})
+    action.execute(second)  # type: ignore[arg-type]
+    assert second.page.downloads == 0 and dest.read_bytes() == DATA
+    assert server.heads[-1] == {"If-None-Match": '"v1"'}
+    assert [k for k, _ in second.traces] == ["download_check", "download_skip"]
+    assert second.state["last_download_digests"] == {"sha256": entry["sha256"]}
+
+    # the server publishes a new version -> fetched again
+    server.etag = '"v2"'
+    third = FakeCtx(tmp_path, FakePage(server, src), {"skip_if_unchanged": True})
+    action.execute(third)  # type: ignore[arg-type]
+    assert third.page.downloads == 1
+
+
+def test_manifest_mode_needs_no_request(tmp_path: Path) -> None:
+    src = tmp_path / "pw_tmp"
+    src.write_bytes(DATA)
+    (action,) = compile_steps(
+        [
+            {
+                "action": "wait_download",
+                "name": "w",
+                "pattern": r"\.pdf$",
+                "selector": "#dl",
+                "url": "https://bank.example/statement.pdf",
+                "skip_if_unchanged": "manifest",
+            }
+        ]
+    )
+    server = FakeServer()
+    page = FakePage(server, src)
+    page.click = lambda selector: None  # type: ignore[attr-defined]
+    ctx = FakeCtx(tmp_path, page, {})
+    action.execute(ctx)  # type: ignore[arg-type]
+    action.execute(ctx)  # type: ignore[arg-type]
+    assert page.downloads == 1 and server.heads == []
+    assert ctx.state["last_download_path"] == str(tmp_path / "statement.pdf")
+
+
+def test_wait_download_refetches_when_the_url_changes(tmp_path: Path) -> None:
+    src = tmp_path / "pw_tmp"
+    src.write_bytes(DATA)
+    server = FakeServer()
+    page = FakePage(server, src)
+    page.click = lambda selector: None  # type: ignore[attr-defined]
+    ctx = FakeCtx(tmp_path, page, {"skip_if_unchanged": "manifest"})
+
+    def step(url: str) -> Any:
+        (action,) = compile_steps(
+            [{"action": "wait_download", "name": "w", "pattern": r"\.pdf$", "selector": "#dl", "url": url}]
+        )
+        return action
+
+    step("https://bank.example/2024-05.pdf").execute(ctx)
+    step("https://bank.example/2024-05.pdf").execute(ctx)
+    assert page.downloads == 1
+    # next month's statement: same step, new URL -> downloaded, not skipped
+    step("https://bank.example/2024-06.pdf").execute(ctx)
+    assert page.downloads == 2
+
+
+def test_wait_download_without_url_or_key_never_skips(tmp_path: Path) -> None:
+    src = tmp_path / "pw_tmp"
+    src.write_bytes(DATA)
+    page = FakePage(FakeServer(), src)
+    page.click = lambda selector: None  # type: ignore[attr-defined]
+    ctx = FakeCtx(tmp_path, page, {"skip_if_unchanged": "manifest"})
+    (action,) = compile_steps([{"action": "wait_download", "name": "w", "pattern": r"\.pdf$", "selector": "#dl"}])
+    action.execute(ctx)  # type: ignore[arg-type]
+    action.execute(ctx)  # type: ignore[arg-type]
+    assert page.downloads == 2
+    with pytest.raises(ValueError, match="'url' or 'key'"):
+        compile_steps(
+            [{"action": "wait_download", "name": "w", "pattern": "x", "selector": "#dl", "skip_if_unchanged": True}]
+        )
@@ -0,0 +1,113 @@
+import asyncio
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from wao.actions import StepCompileError, compile_steps
+from wao.actions.data import ExtractTableAction
+
+ROWS = [{"date": f" 2026-10-{d:02d} ", "amount": f"¥{d * 1000:,}", "tags": ["a", "b"]} for d in range(1, 8)]
+
+
+class Page:
+    """``evaluate`` answers the in-page record reader from ROWS, honouring offset/limit; counts calls."""
+
+    def __init__(self) -> None:
+        self.calls: List[Tuple[Optional[str], List[Dict[str, Any]], int, int]] = []
+
+    def evaluate(self, script: str, args: List[Any]) -> List[Dict[str, Any]]:
+        rows, fields, offset, limit = args
+        self.calls.append((rows, fields, offset, limit))
+        if rows is None:
+            return [{"title": " 請求一覧 ", "total": "合計 28,000 円"}]
+        picked = ROWS[offset : offset + limit if limit else None]
+        return [{f["name"]: r.get(f["name"]) for f in fields} for r in picked]
+
+
+class AsyncPage(Page):
+    async def evaluate(self, script: str, args: List[Any]) -> List[Dict[str, Any]]:  # type: ignore[override]
+        return super().evaluate(script, args)
+
+
+class Ctx:
+    def __init__(self, page: Any) -> None:
+        self.page = page
+        self.state: Dict[str, Any] = {}
+        self.traces: List[Tuple[str, Dict[str, Any]]] = []
+
+    def _trace(self, kind: str, payload: Dict[str, Any]) -> None:
+        self.traces.append((kind, payload))
+
+
+def table(**extra: Any) -> ExtractTableAction:
+    (action,) = compile_steps(
+        [
+            {
+                "act": "extract_table",
+                "rows": "#bills tbody tr",
+                "as": "bills",
+                "fields": {
+                    "date": {"col": 0},
+                    "amount": {"selector": "td.amount", "type": "number"},
+                    "tags": {"selector": "span.tag", "all": True},
+                },
+                **extra,
+            }
+        ]
+    )
+    assert isinstance(action, ExtractTableAction)
+    return action
+
+
+def test_table_is_one_round_trip() -> None:
+    page = Page()
+    ctx = Ctx(page)
+    table().execute(ctx)  # type: ignore[arg-type]
+    assert len(page.calls) == 1
+    rows, fields, _, _ = page.calls[0]
+    assert rows == "#bills tbody tr"
+    assert fields[0] == {"name": "date", "sel": ":scope > :nth-child(1)", "attr": "text", "all": False}
+    bills = ctx.state["bills"]
+    assert len(bills) == 7 and bills[0] == {"date": "2026-10-01", "amount": 1000, "tags": ["a", "b"]}
+    assert ctx.state["last_extract"] == {"rows": 7, "path": None}
+    assert ctx.traces[-1][1]["calls"] == 1
+
+
+def test_batches_stream_to_jsonl_and_csv(tmp_path: Path) -> None:
+    page = Page()
+    ctx = Ctx(page)
+    out = tmp_path / "bills.jsonl"
+    table(out=str(out), batch=3, keep=False).execute(ctx)  # type: ignore[arg-type]
+    assert [c[2:] for c in page.calls] == [(0, 3), (3, 3), (6, 3)]
+    lines = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 7 and lines[-1]["amount"] == 7000
+    assert "bills" not in ctx.state and ctx.state["last_extract"] == {"rows": 7, "path": str(out)}
+
+    out = tmp_path / "bills.csv"
+    asyncio.run(table(out=str(out)).aexecute(Ctx(AsyncPage())))  # type: ignore[arg-type]
+    with open(out, encoding="utf-8", newline="") as fh:
+        records = list(csv.DictReader(fh))
+    assert records[1] == {"date": "2026-10-02", "amount": "2000", "tags": '["a", "b"]'}
+
+
+def test_extract_many() -> None:
+    (action,) = compile_steps(
+        [
+            {
+                "act": "extract_many",
+                "as": "summary",
+                "fields": {"title": "h1", "total": {"selector": "#total", "regex": r"([0-9,]+)", "type": "number"}},
+            }
+        ]
+    )
+    page = Page()
+    ctx = Ctx(page)
+    action.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.state["summary"] == {"title": "請求一覧", "total": 28000} and len(page.calls) == 1
+    with pytest.raises(StepCompileError, match="fields"):
+        compile_steps([{"act": "extract_many", "as": "x", "fields": {}}])
+    with pytest.raises(StepCompileError, match="type"):
+        compile_steps([{"act": "extract_many", "as": "x", "fields": {"a": {"selector": "b", "type": "date"}}}])
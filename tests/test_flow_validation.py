@@ -36,3 +36,51 @@ def test_invalid_action(tmp_path: Path) -> None:
     with pytest.raises(FlowValidationError) as ei:
         validate_flow(str(flow_path))
     assert "not one of" in str(ei.value)
+
+
+def test_compiled_schema_cached_until_mtime_changes(tmp_path: Path) -> None:
+    from wao.validator import find_schema_path, load_schema
+
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text(find_schema_path().read_text(encoding="utf-8"), encoding="utf-8")
+    first = load_schema(schema_path)
+    assert load_schema(schema_path) is first
+    assert "open_url" in first.branches
+    os.utime(schema_path, ns=(0, first.path.stat().st_mtime_ns + 1_000_000))
+    assert load_schema(schema_path) is not first
+
+
+def test_fast_path_reports_branch_error(tmp_path: Path) -> None:
+    flow = {"version": "0.1.0", "steps": [{"action": "open_url", "name": "go"}]}
+    flow_path = tmp_path / "flow.json"
+    flow_path.write_text(__import__("json").dumps(flow), encoding="utf-8")
+
+    with pytest.raises(FlowValidationError, match=r"steps\.0: 'url' is a required property"):
+        validate_flow(str(flow_path))
+
+
+def test_validate_many_collects_all_errors(tmp_path: Path) -> None:
+    import json
+
+    from wao.validator import validate_many
+
+    ok = tmp_path / "ok.json"
+    ok.write_text(json.dumps({"version": "0.1.0", "steps": [{"action": "log", "name": "l", "message": "m"}]}))
+    ng = tmp_path / "ng.json"
+    ng.write_text(
+        json.dumps(
+            {
+                "version": "0.1.0",
+                "bogus": 1,
+                "steps": [{"action": "goto", "name": "x"}, {"action": "click", "name": "c"}],
+            }
+        )
+    )
+    broken = tmp_path / "broken.json"
+    broken.write_text("{")
+
+    report = validate_many([ok, ng, broken])
+    assert report[str(ok)] == []
+    assert len(report[str(ng)]) == 3
+    assert any("not one of" in e for e in report[str(ng)])
+    assert report[str(broken)][0].startswith("cannot read flow")
@@ -0,0 +1,104 @@
+import hashlib
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pytest
+
+from wao import hashing
+from wao.actions import StepCompileError, compile_steps
+
+DATA = bytes(range(256)) * 4096 + b"tail"
+
+
+class FakeCtx:
+    def __init__(self, downloads_dir: Path) -> None:
+        self.downloads_dir = downloads_dir
+        self.state: Dict[str, Any] = {}
+        self.traces: List[Tuple[str, Dict[str, Any]]] = []
+        self.failures: List[str] = []
+        self.deferred: List[Tuple[str, "Future[Any]", Callable[[Any], Optional[str]]]] = []
+
+    def _trace(self, kind: str, payload: Dict[str, Any]) -> None:
+        self.traces.append((kind, payload))
+
+    def fail(self, reason: str, message: str) -> None:
+        self.failures.append(reason)
+
+    def defer(self, reason: str, future: "Future[Any]", check: Callable[[Any], Optional[str]]) -> None:
+        self.deferred.append((reason, future, check))
+
+
+class FakeDownload:
+    def __init__(self, src: Path) -> None:
+        self.src = src
+
+    def path(self) -> str:
+        return str(self.src)
+
+
+def _expected(*algos: str) -> Dict[str, str]:
+    return {a: hashlib.new(a, DATA).hexdigest() for a in algos}
+
+
+@pytest.mark.parametrize("mmap_min", [1, 1 << 40])
+def test_multi_digest_single_pass(tmp_path: Path, monkeypatch: Any, mmap_min: int) -> None:
+    monkeypatch.setattr(hashing, "MMAP_MIN_SIZE", mmap_min)
+    path = tmp_path / "f.bin"
+    path.write_bytes(DATA)
+    result = hashing.multi_digest(path, ["sha256", "md5", "sha1"], chunk_size=100_000)
+    assert result.digests == _expected("sha256", "md5", "sha1")
+    assert result.size == len(DATA)
+    assert result.mode == ("mmap" if mmap_min == 1 else "read")
+
+
+def test_copy_with_digest_is_reused_by_verify(tmp_path: Path) -> None:
+    src = tmp_path / "tmp_download"
+    src.write_bytes(DATA)
+    dest = tmp_path / "out" / "f.bin"
+    result = hashing.copy_with_digest(src, dest, ["sha256"])
+    assert dest.read_bytes() == DATA and result.digests == _expected("sha256")
+    assert hashing.multi_digest(dest, ["sha256"]).mode == "cached"
+    assert hashing.recall(dest, ["sha256", "md5"]) is None
+
+
+def test_download_hashes_while_saving(tmp_path: Path) -> None:
+    src = tmp_path / "pw_tmp"
+    src.write_bytes(DATA)
+    (action,) = compile_steps(
+        [
+            {
+                "action": "download",
+                "url": "https://x/f.bin",
+                "path": str(tmp_path / "f.bin"),
+                "expected": _expected("md5"),
+            }
+        ]
+    )
+    ctx = FakeCtx(tmp_path)
+    action._save(ctx, FakeDownload(src), tmp_path / "f.bin")  # type: ignore[attr-defined]
+    assert ctx.state["last_download_digests"] == _expected("md5")
+    assert ctx.traces[0][0] == "hash" and ctx.traces[0][1]["mode"] == "copy"
+    assert ctx.failures == []
+
+
+def test_verify_file_background_multi(tmp_path: Path) -> None:
+    path = tmp_path / "f.bin"
+    path.write_bytes(DATA)
+    bad = dict(_expected("sha256"), md5="00")
+    ok, ng = compile_steps(
+        [
+            {"action": "verify_file", "path": str(path), "expected": _expected("sha256", "md5"), "background": True},
+            {"action": "verify_file", "path": str(path), "expected": bad},
+        ]
+    )
+    ctx = FakeCtx(tmp_path)
+    ok.execute(ctx)  # type: ignore[arg-type]
+    ((reason, future, check),) = ctx.deferred
+    assert check(future.result()) is None
+    ng.execute(ctx)  # type: ignore[arg-type]
+    assert ctx.failures == ["verify_file"]
+    assert [t[1]["bytes"] for t in ctx.traces] == [len(DATA), len(DATA)]
+
+    with pytest.raises(StepCompileError):
+        compile_steps([{"action": "verify_file", "path": "x", "expected": {"crc32": "00"}}])
@@ -0,0 +1,173 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from benchmarks.site import StandInSite
+from wao.actions import StepCompileError, compile_steps
+from wao.httpfetch import ConnectionPool, FetchError, HttpDownload, filename_from
+
+
+@pytest.fixture(scope="module")
+def site() -> Any:
+    with StandInSite() as s:
+        yield s
+
+
+def test_filename_from() -> None:
+    assert filename_from({"Content-Disposition": 'attachment; filename="a b.pdf"'}, "http://x/y") == "a b.pdf"
+    cd = "attachment; filename=fallback.pdf; filename*=UTF-8''%E6%98%8E%E7%B4%B0.pdf"
+    assert filename_from({"Content-Disposition": cd}, "http://x/y") == "明細.pdf"
+    assert filename_from({}, "http://x/files/report%202024.csv?x=1") == "report 2024.csv"
+    assert filename_from({"Content-Disposition": 'attachment; filename="../../etc/passwd"'}, "http://x/") == "passwd"
+    assert filename_from({}, "http://x/") == "download"
+
+
+def test_small_file_single_stream(site: Any, tmp_path: Path) -> None:
+    dl = HttpDownload(site.base_url + "/download/64k", pool=ConnectionPool())
+    res = dl.fetch(lambda probe: tmp_path / probe.filename)
+    assert res.path == tmp_path / "64k.bin" and res.size == 64 * 1024
+    assert res.segments == 1 and res.headers["etag"] == '"10000"'
+    assert not (tmp_path / "64k.bin.part").exists()
+
+
+def test_segmented_fetch_reports_progress(site: Any, tmp_path: Path) -> None:
+    seen: List[Tuple[int, Optional[int]]] = []
+    dl = HttpDownload(
+        site.base_url + "/download/2m",
+        segments=4,
+        segment_min_size=1024,
+        chunk_size=16 * 1024,
+        progress=lambda done, total, s: seen.append((done, total)),
+        progress_interval_s=0.001,
+        pool=ConnectionPool(),
+    )
+    res = dl.save(tmp_path / "f.bin")
+    assert res.segments == 4 and res.size == 2 * 1024 * 1024
+    assert (tmp_path / "f.bin").read_bytes() == b"\0" * res.size
+    assert all(total == res.size for _, total in seen)
+    assert not (tmp_path / "f.bin.part.json").exists()
+
+
+def test_interrupted_segmented_fetch_resumes(site: Any, tmp_path: Path) -> None:
+    url = site.base_url + "/download/32m"
+    dest = tmp_path / "f.bin"
+
+    def stop(done: int, total: Optional[int], seconds: float) -> None:
+        if done > 0:
+            raise KeyboardInterrupt
+
+    opts: Dict[str, Any] = {"segments": 2, "segment_min_size": 1024, "pool": ConnectionPool()}
+    first = HttpDownload(url, chunk_size=8 * 1024, progress=stop, progress_interval_s=0.001, **opts)
+    with pytest.raises(KeyboardInterrupt):
+        first.save(dest)
+    state: Dict[str, Any] = json.loads((tmp_path / "f.bin.part.json").read_text())
+    assert state["etag"] == '"2000000"' and len(state["segments"]) == 2
+
+    res = HttpDownload(url, **opts).save(dest)
+    assert 0 < res.resumed < res.size == 32 * 1024 * 1024
+    assert dest.stat().st_size == res.size and not (tmp_path / "f.bin.part").exists()
+
+
+def test_stale_resume_state_restarts(site: Any, tmp_path: Path) -> None:
+    dest = tmp_path / "f.bin"
+    total = 1024 * 1024
+    sidecar = {"total": total, "etag": '"old"', "last_modified": None, "segments": [[0, total - 1, 4096]]}
+    (tmp_path / "f.bin.part.json").write_text(json.dumps(sidecar))
+    res = HttpDownload(site.base_url + "/download/1m", segment_min_size=1024, pool=ConnectionPool()).save(dest)
+    assert res.resumed == 0 and res.size == total
+
+
+def test_resume_state_without_part_restarts(site: Any, tmp_path: Path) -> None:
+    total = 1024 * 1024
+    sidecar = {"total": total, "etag": '"100000"', "last_modified": None, "segments": [[0, total - 1, 4096]]}
+    (tmp_path / "f.bin.part.json").write_text(json.dumps(sidecar))  # the .part itself was deleted
+    res = HttpDownload(site.base_url + "/download/1m", segment_min_size=1024, pool=ConnectionPool()).save(
+        tmp_path / "f.bin"
+    )
+    assert res.resumed == 0 and res.size == total
+
+
+class HalfRanges(BaseHTTPRequestHandler):
+    """Answers every range with a 206 for only the first half of it (a consistent but short Content-Range)."""
+
+    size = 64 * 1024
+
+    def do_GET(self) -> None:
+        m = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range") or "")
+        start, end = (int(m.group(1)), int(m.group(2))) if m else (0, self.size - 1)
+        end = start + (end - start) // 2 if end > start else end
+        self.send_response(206)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{self.size}")
+        self.send_header("ETag", '"half"')
+        self.end_headers()
+        self.wfile.write(b"x" * (end - start + 1))
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def test_short_segments_fail_and_keep_resume_state(tmp_path: Path) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HalfRanges)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/f.bin"
+        dl = HttpDownload(url, segments=2, segment_min_size=1024, pool=ConnectionPool())
+        with pytest.raises(FetchError, match="2 of 2 segments ended early"):
+            dl.save(tmp_path / "f.bin")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not (tmp_path / "f.bin").exists() and (tmp_path / "f.bin.part").exists()
+    state: Dict[str, Any] = json.loads((tmp_path / "f.bin.part.json").read_text())
+    assert [s[2] for s in state["segments"]] == [16 * 1024, 16 * 1024]
+
+
+class FakePage:
+    def __init__(self) -> None:
+        self.url = "about:blank"
+        self.context = self
+
+    def cookies(self, urls: List[str]) -> List[Dict[str, Any]]:
+        return [{"name": "sid", "value": "ok"}]
+
+    def evaluate(self, script: str) -> str:
+        return "test-agent"
+
+
+class FakeCtx:
+    def __init__(self, root: Path) -> None:
+        from wao.downloads import DownloadStore
+
+        self.page = FakePage()
+        self.downloads_dir = root
+        self.ignore_https_errors = False
+        self.state: Dict[str, Any] = {}
+        self.traces: List[Tuple[str, Dict[str, Any]]] = []
+        self.download_store = DownloadStore(root, "bench")
+
+    def _trace(self, kind: str, payload: Dict[str, Any]) -> None:
+        self.traces.append((kind, payload))
+
+    def fail(self, reason: str, message: str) -> None:
+        raise AssertionError(message)
+
+
+def test_download_action_http_mode(site: Any, tmp_path: Path) -> None:
+    (action,) = compile_steps(
+        [{"action": "download", "mode": "http", "url": site.base_url + "/download/256k", "hash": ["sha256"]}]
+    )
+    ctx = FakeCtx(tmp_path)
+    action.execute(ctx)  # type: ignore[arg-type]
+    assert (tmp_path / "256k.bin").stat().st_size == 256 * 1024
+    kinds = [k for k, _ in ctx.traces]
+    assert "download_http" in kinds and "hash" in kinds
+    assert ctx.state["last_download_path"] == str(tmp_path / "256k.bin")
+
+    with pytest.raises(StepCompileError):
+        compile_steps([{"action": "download", "mode": "http", "selector": "#a"}])
@@ -0,0 +1,40 @@
+import pytest
+
+from wao.network import NetworkPolicy, site_of
+
+
+def test_site_of() -> None:
+    assert site_of("members.mytokyogas.co.jp") == "mytokyogas.co.jp"
+    assert site_of("cdn.example.com") == "example.com"
+
+
+def test_from_options_disabled_when_empty() -> None:
+    assert NetworkPolicy.from_options(None) is None
+    assert NetworkPolicy.from_options({"block_third_party": False}) is None
+    with pytest.raises(ValueError):
+        NetworkPolicy.from_options({"block_resource_types": ["document"]})
+
+
+def test_check_rules_and_stats() -> None:
+    policy = NetworkPolicy.from_options(
+        {
+            "block_resource_types": ["image", "font"],
+            "block_url_regex": [r"google-analytics\.com"],
+            "block_third_party": True,
+            "allow_domains": ["static-cdn.net"],
+        }
+    )
+    assert policy is not None
+    assert policy.check("https://portal.example.jp/login", "document", is_navigation=True) is None
+    assert policy.check("https://portal.example.jp/a.png", "image") == "type"
+    assert policy.check("https://www.google-analytics.com/g.js", "script") == "regex"
+    assert policy.check("https://ads.tracker.io/x.js", "script") == "third_party"
+    assert policy.check("https://a.static-cdn.net/app.js", "script") is None
+    assert policy.check("https://sso.other.jp/auth", "document") is None
+
+    policy._record("type", "image")
+    policy._record(None, "script")
+    policy._record_response({"content-length": "1200"})
+    stats = policy.stats()
+    assert stats["blocked"] == 1 and stats["blocked_by_type"] == {"image": 1}
+    assert stats["allowed"] == 1 and stats["allowed_bytes"] == 1200
@@ -0,0 +1,252 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Tuple
+
+import pytest
+
+from wao.actions import Action, StepCompileError, compile_steps, register
+from wao.actions.control import BranchError, ParallelAction
+from wao.browser_pool import BrowserPool
+
+
+@register("test_mark")
+class MarkAction(Action):
+    """Navigates to ``url`` then records it in state under ``key``."""
+
+    __slots__ = ("url", "key")
+
+    def compile(self, raw: Mapping[str, Any]) -> None:
+        self.url = str(raw["url"])
+        self.key = str(raw["key"])
+
+    def execute(self, ctx: Any) -> None:
+        ctx.page.goto(self.url)
+        ctx.state[self.key] = self.url
+
+    async def aexecute(self, ctx: Any) -> None:
+        await ctx.page.goto(self.url)
+        ctx.state[self.key] = self.url
+
+
+class Page:
+    """``goto`` takes ``?ms=`` milliseconds; URLs containing "fail" raise."""
+
+    def __init__(self, log: List[Tuple[str, str]], owner: str) -> None:
+        self.log = log
+        self.owner = owner
+
+    def _go(self, url: str) -> float:
+        if "fail" in url:
+            raise RuntimeError(f"cannot open {url}")
+        self.log.append((self.owner, url))
+        return int(url.rsplit("ms=", 1)[-1]) / 1000.0 if "ms=" in url else 0.0
+
+    def goto(self, url: str) -> None:
+        time.sleep(self._go(url))
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncPage(Page):
+    async def goto(self, url: str) -> None:  # type: ignore[override]
+        await asyncio.sleep(self._go(url))
+
+    async def close(self) -> None:  # type: ignore[override]
+        pass
+
+
+class Context:
+    def __init__(self, log: List[Tuple[str, str]], owner: str, page_cls: type = Page) -> None:
+        self.log, self.owner, self.page_cls = log, owner, page_cls
+
+    def storage_state(self) -> Dict[str, Any]:
+        return {"cookies": [{"name": "sid", "value": "1"}]}
+
+    def new_page(self) -> Page:
+        return self.page_cls(self.log, self.owner)
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncContext(Context):
+    async def new_page(self) -> Page:  # type: ignore[override]
+        return AsyncPage(self.log, self.owner)
+
+
+class FakeRunner:
+    """The parts of Runner/AsyncRunner a parallel group touches."""
+
+    def __init__(self, asynchronous: bool = False) -> None:
+        self.visits: List[Tuple[str, str]] = []
+        self.traces: List[Tuple[str, Dict[str, Any]]] = []
+        self.failures: List[str] = []
+        self.state: Dict[str, Any] = {"params": {"month": "2026-10"}}
+        self._trace_scope: Dict[str, Any] = {}
+        self._track_network = False
+        self._context: Any = AsyncContext(self.visits, "main") if asynchronous else Context(self.visits, "main")
+        self._page: Any = None
+        self.browsers: List[str] = []
+        self.pools: List[Any] = []
+        self.states: List[Any] = []
+        self._pool: Any = None
+
+    @property
+    def page(self) -> Any:
+        return self._page
+
+    def _trace(self, kind: str, payload: Dict[str, Any]) -> None:
+        self.traces.append((kind, payload))
+
+    @contextmanager
+    def _step_scope(self, action: Action) -> Iterator[None]:
+        self._trace("step_start", {"i": action.index, **self._trace_scope})
+        yield
+
+    @asynccontextmanager
+    async def _astep_scope(self, action: Action) -> AsyncIterator[None]:
+        self._trace("step_start", {"i": action.index, **self._trace_scope})
+        yield
+
+    def _save_failure_artifacts(self, reason: str = "error") -> None:
+        self.failures.append(reason)
+
+    @contextmanager
+    def _branch_browser(self, pool: Any = None) -> Iterator[Any]:
+        self.browsers.append(threading.current_thread().name)
+        self.pools.append(pool)
+        yield pool or "browser"
+
+    @contextmanager
+    def _branch_context(self, browser: Any, storage_state: Any) -> Iterator[Context]:
+        self.states.append(storage_state)
+        yield Context(self.visits, threading.current_thread().name)
+
+
+class AsyncFakeRunner(FakeRunner):
+    def __init__(self) -> None:
+        super().__init__(asynchronous=True)
+        self._step_scope = self._astep_scope  # type: ignore[assignment]
+
+    async def _save_failure_artifacts(self, reason: str = "error") -> None:  # type: ignore[override]
+        self.failures.append(reason)
+
+
+def group(join: str = "all", max_concurrency: int = 3, fail: str = "") -> ParallelAction:
+    branches: List[Any] = [
+        {
+            "name": m,
+            "steps": [
+                {"act": "test_mark", "url": f"https://bank/{m}{fail if m == 'feb' else ''}?ms=300", "key": f"stmt_{m}"}
+            ],
+        }
+        for m in ("jan", "feb", "mar")
+    ]
+    (action,) = compile_steps(
+        [{"act": "parallel", "name": "stmts", "join": join, "max_concurrency": max_concurrency, "branches": branches}]
+    )
+    assert isinstance(action, ParallelAction)
+    return action
+
+
+def test_compile() -> None:
+    action = group(max_concurrency=2)
+    assert [b.name for b in action.branches] == ["jan", "feb", "mar"] and action.max_concurrency == 2
+    (bare,) = compile_steps([{"act": "parallel", "branches": [[{"act": "goto", "url": "https://a"}]]}])
+    assert [b.name for b in bare.branches] == ["b1"] and bare.supports_async()  # type: ignore[attr-defined]
+    with pytest.raises(StepCompileError, match="join"):
+        compile_steps([{"act": "parallel", "join": "first", "branches": [[{"act": "goto", "url": "x"}]]}])
+    with pytest.raises(StepCompileError, match="unique"):
+        compile_steps([{"act": "parallel", "branches": [{"name": "a", "steps": []}, {"name": "a", "steps": []}]}])
+
+
+def test_sync_branches_run_concurrently_on_their_own_threads() -> None:
+    ctx = FakeRunner()
+    t0 = time.perf_counter()
+    group().execute(ctx)  # type: ignore[arg-type]
+    assert time.perf_counter() - t0 < 0.8  # 3 x 300 ms branches take ~ the slowest one
+    assert len(set(ctx.browsers)) == 3 and ctx.states == [ctx._context.storage_state()] * 3
+    assert {owner for owner, _ in ctx.visits} == set(ctx.browsers)
+    assert ctx.state["stmt_jan"] == "https://bank/jan?ms=300" and ctx.state["params"] == {"month": "2026-10"}
+    assert ctx.state["branches"]["mar"] == {"stmt_mar": "https://bank/mar?ms=300"}
+    steps = [p for k, p in ctx.traces if k == "step_start"]
+    assert sorted(p["branch"] for p in steps) == ["feb", "jan", "mar"] and all(p["parent"] == 1 for p in steps)
+    assert ctx.traces[-1] == ("parallel", {**ctx.traces[-1][1], "ok": 3, "error": 0, "cancelled": 0})
+
+
+def test_sync_branches_reuse_the_run_pools_helper_threads() -> None:
+    ctx = FakeRunner()
+    ctx._pool = BrowserPool()
+    try:
+        group().execute(ctx)  # type: ignore[arg-type]
+        group().execute(ctx)  # type: ignore[arg-type]
+    finally:
+        ctx._pool.close()
+    assert len(ctx.browsers) == 6 and len(set(ctx.browsers)) == 3  # the second group found the helpers warm
+    assert len({id(p) for p in ctx.pools}) == 3 and all(isinstance(p, BrowserPool) for p in ctx.pools)
+    assert ctx.state["stmt_mar"] == "https://bank/mar?ms=300"
+
+
+def test_sync_join_all_fails_and_respects_the_limit() -> None:
+    ctx = FakeRunner()
+    with pytest.raises(BranchError, match="branch 'feb' failed: cannot open"):
+        group(max_concurrency=1, fail="/fail").execute(ctx)  # type: ignore[arg-type]
+    assert len(ctx.browsers) == 1 and ctx.failures == ["branch"]
+    ends = {p["branch"]: p["status"] for k, p in ctx.traces if k == "branch_end"}
+    assert ends == {"jan": "ok", "feb": "error", "mar": "cancelled"}
+    assert "stmt_mar" not in ctx.state
+
+
+def test_sync_join_any() -> None:
+    ctx = FakeRunner()
+    group(join="any", fail="/fail").execute(ctx)  # type: ignore[arg-type]
+    assert ctx.state["stmt_jan"] and "stmt_feb" not in ctx.state
+
+
+def test_async_branches_share_the_context() -> None:
+    ctx = AsyncFakeRunner()
+    t0 = time.perf_counter()
+    asyncio.run(group().aexecute(ctx))  # type: ignore[arg-type]
+    assert time.perf_counter() - t0 < 0.8
+    assert {owner for owner, _ in ctx.visits} == {"main"} and ctx.browsers == []
+    assert sorted(k for k in ctx.state if k.startswith("stmt_")) == ["stmt_feb", "stmt_jan", "stmt_mar"]
+
+
+def test_async_join_any_cancels_the_rest() -> None:
+    ctx = AsyncFakeRunner()
+    (action,) = compile_steps(
+        [
+            {
+                "act": "parallel",
+                "join": "any",
+                "branches": [
+                    [{"act": "test_mark", "url": "https://a?ms=50", "key": "a"}],
+                    [{"act": "test_mark", "url": "https://b?ms=2000", "key": "b"}],
+                ],
+            }
+        ]
+    )
+    t0 = time.perf_counter()
+    asyncio.run(action.aexecute(ctx))  # type: ignore[arg-type]
+    assert time.perf_counter() - t0 < 1.0
+    assert ctx.state["a"] and "b" not in ctx.state
+    assert {p["branch"]: p["status"] for k, p in ctx.traces if k == "branch_end"} == {"b1": "ok", "b2": "cancelled"}
+
+    with pytest.raises(BranchError, match="no branch succeeded"):
+        asyncio.run(_all_fail())
+
+
+async def _all_fail() -> None:
+    (action,) = compile_steps(
+        [
+            {
+                "act": "parallel",
+                "join": "any",
+                "branches": [[{"act": "goto", "url": "https://fail"}], [{"act": "goto", "url": "https://fail2"}]],
+            }
+        ]
+    )
+    await action.aexecute(AsyncFakeRunner())  # type: ignore[arg-type]
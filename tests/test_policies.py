@@ -0,0 +1,66 @@
+from typing import Any
+
+import pytest
+
+from wao.actions import compile_steps
+from wao.policies import RetryPlan, RetryPolicy, error_classes
+
+
+class TimeoutError(Exception):  # same name as playwright's, different module
+    pass
+
+
+def test_error_classes() -> None:
+    assert error_classes(TimeoutError("x")) == {"any", "timeout"}
+    assert "network" in error_classes(RuntimeError("page.goto: net::ERR_CONNECTION_RESET"))
+    assert error_classes(ValueError("bad")) == {"any"}
+
+
+def test_backoff_grows_and_jitters(monkeypatch: Any) -> None:
+    policy = RetryPolicy(attempts=5, backoff_ms=100, multiplier=2, max_backoff_ms=300, jitter=0.5)
+    monkeypatch.setattr("wao.policies.random.random", lambda: 0.0)
+    assert [policy.delay_s(n) for n in (1, 2, 3, 4)] == [0.1, 0.2, 0.3, 0.3]
+    monkeypatch.setattr("wao.policies.random.random", lambda: 1.0)
+    assert policy.delay_s(1) == pytest.approx(0.05)
+
+
+def test_step_policy_inherits_flow_default() -> None:
+    base = RetryPolicy.from_options({"attempts": 3, "backoff_ms": 10, "retry_on": ["any"]})
+    step = RetryPolicy.from_options({"backoff_ms": 50}, base)
+    assert (step.attempts, step.backoff_ms, step.retry_on) == (3, 50, frozenset({"any"}))
+    assert RetryPolicy.from_options(5, base).attempts == 5
+    with pytest.raises(ValueError):
+        RetryPolicy.from_options({"retry_on": ["flaky"]})
+
+
+def test_plan_rewinds_to_last_idempotent_step() -> None:
+    plan = compile_steps(
+        [
+            {"action": "open_url", "url": "https://example.com/"},
+            {"action": "click", "selector": "#a", "retry": {"attempts": 3, "backoff_ms": 0}},
+            {"action": "click", "selector": "#b", "idempotent": True, "retry": 2},
+            {"action": "click", "selector": "#c", "retry": 2},
+            {"action": "log", "message": "x"},
+            {"action": "wait", "timeout": 10},
+            {"action": "click", "selector": "#d"},
+            {"action": "wait_for_selector", "selector": "#e"},
+            {"action": "click", "selector": "#f"},
+        ]
+    )
+    retries = RetryPlan(plan, {"backoff_ms": 0})
+    assert retries.enabled
+    # log/wait are idempotent but re-establish nothing: #d rewinds past them to the marked #b
+    assert [retries.checkpoint(i) for i in range(9)] == [0, 0, 2, 2, 4, 5, 2, 7, 7]
+
+    resume, delay, payload = retries.on_error(1, TimeoutError("t"))  # type: ignore[misc]
+    assert (resume, delay, payload["attempt"], payload["max_attempts"]) == (0, 0.0, 2, 3)
+    assert retries.on_error(1, TimeoutError("t")) is not None
+    assert retries.on_error(1, TimeoutError("t")) is None  # 3 attempts used
+    assert retries.on_error(2, ValueError("not retryable")) is None
+
+
+def test_no_retry_by_default() -> None:
+    plan = compile_steps([{"action": "click", "selector": "#a"}])
+    retries = RetryPlan(plan)
+    assert not retries.enabled
+    assert retries.on_error(0, TimeoutError("t")) is None
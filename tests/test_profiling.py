@@ -0,0 +1,120 @@
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from wao.actions import compile_steps
+from wao.cli import main
+from wao.profiling import Metrics, ProfileOptions, StepProfiler, hot_steps, read_profiles
+from wao.trace import TraceSink
+
+
+class FakeCDP:
+    """Performance metrics advance by a fixed amount per call; events are fired by the test."""
+
+    def __init__(self) -> None:
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self.sent: List[str] = []
+        self.task = 0.0
+
+    def send(self, method: str) -> Dict[str, Any]:
+        self.sent.append(method)
+        if method != "Performance.getMetrics":
+            return {}
+        self.task += 0.05
+        return {"metrics": [{"name": "TaskDuration", "value": self.task}, {"name": "JSHeapUsedSize", "value": 4e6}]}
+
+    def on(self, event: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+        self.handlers[event] = handler
+
+
+class FakeContext:
+    def __init__(self, cdp: FakeCDP) -> None:
+        self.cdp = cdp
+
+    def new_cdp_session(self, page: Any) -> FakeCDP:
+        return self.cdp
+
+
+class FakePage:
+    def __init__(self) -> None:
+        self.origin = 1.0
+
+    def evaluate(self, script: str) -> Dict[str, Any]:
+        return {"origin": self.origin, "type": "navigate", "ttfb_ms": 12.0, "dcl_ms": 80.0, "load_ms": 0}
+
+
+def test_step_profile_deltas(tmp_path: Path) -> None:
+    records: List[Tuple[str, Dict[str, Any]]] = []
+    opts = ProfileOptions.from_options({"rss": False, "spans": str(tmp_path / "spans.jsonl")})
+    prof = StepProfiler(opts, "bank", lambda kind, payload: records.append((kind, payload)))
+    cdp, page = FakeCDP(), FakePage()
+    prof.attach(FakeContext(cdp), page)
+    assert cdp.sent == ["Performance.enable", "Network.enable"]
+    goto, click = compile_steps([{"act": "goto", "url": "https://x"}, {"act": "click", "selector": "#b"}])
+
+    snap = prof.begin()
+    for _ in range(3):
+        cdp.handlers["Network.requestWillBeSent"]({})
+        cdp.handlers["Network.loadingFinished"]({"encodedDataLength": 1000})
+    cdp.handlers["Network.loadingFailed"]({})
+    prof.end(snap, goto, page, True)
+    snap = prof.begin()
+    prof.end(snap, click, page, False)  # same document: no nav timing
+    prof.finish("error")
+
+    (_, first), (_, second) = records
+    assert (first["requests"], first["failed"], first["bytes"]) == (3, 1, 3000)
+    assert first["cpu"] == {"task_ms": 50.0} and first["heap_mb"] == 4.0
+    assert first["nav"] == {"ttfb_ms": 12.0, "dcl_ms": 80.0}
+    assert "nav" not in second and second["requests"] == 0 and second["ok"] is False
+
+    spans = [json.loads(line) for line in (tmp_path / "spans.jsonl").read_text().splitlines()]
+    assert [s["name"] for s in spans] == ["step goto", "step click", "run bank"]
+    root = spans[-1]
+    assert root["parentSpanId"] is None and all(s["parentSpanId"] == root["spanId"] for s in spans[:2])
+    assert spans[0]["attributes"]["wao.bytes"] == 3000 and spans[1]["status"]["code"] == "STATUS_CODE_ERROR"
+
+
+def test_prometheus_render() -> None:
+    m = Metrics()
+    profile = {"i": 0, "act": "goto", "name": "open", "ms": 250, "requests": 4, "bytes": 2048, "cpu": {"task_ms": 30}}
+    m.observe_step('si"te', profile)
+    m.observe_step('si"te', profile)
+    m.observe_run('si"te', "ok", 1.5)
+    text = m.render()
+    assert "# TYPE wao_step_duration_seconds summary" in text
+    assert 'wao_step_duration_seconds_sum{site="si\\"te",step="open"} 0.5' in text
+    assert 'wao_step_requests_total{site="si\\"te",step="open"} 8' in text
+    assert 'wao_step_cpu_seconds_total{phase="task",site="si\\"te",step="open"} 0.06' in text
+    assert 'wao_runs_total{site="si\\"te",status="ok"} 1' in text
+
+
+def test_options_from_env(monkeypatch: Any) -> None:
+    monkeypatch.setenv("WAO_PROFILE", "1")
+    monkeypatch.setenv("WAO_METRICS_PORT", "9464")
+    opts = ProfileOptions.from_options(None)
+    assert opts.enabled and opts.prometheus_port == 9464 and opts.spans is None
+    assert not ProfileOptions.from_options(False).enabled  # the flow wins over the environment
+    assert ProfileOptions.from_options({"spans": True}).spans == str(Path("artifacts") / "profile" / "spans.jsonl")
+
+
+def test_hot_steps_report_from_trace(tmp_path: Path, capsys: Any) -> None:
+    sink = TraceSink(tmp_path / "run.jsonl", compress="gzip")
+    for ms in (100, 300, 200):
+        sink.write("step_profile", {"i": 0, "act": "goto", "name": "", "ok": True, "ms": ms, "requests": 10})
+        sink.write("step_profile", {"i": 1, "act": "click", "name": "submit", "ok": True, "ms": 50, "bytes": 9000})
+        sink.write("step_ok", {"i": 1, "ms": 50})
+    sink.close()
+
+    records = read_profiles([sink.path])
+    assert len(records) == 6
+    rows = hot_steps(records)
+    assert [(r["step"], r["ms"], r["max_ms"], r["runs"]) for r in rows] == [
+        ("goto", 200, 300, 3),
+        ("submit", 50, 50, 3),
+    ]
+    assert hot_steps(records, sort="bytes")[0]["step"] == "submit"
+
+    assert main(["profile", "--trace", str(sink.path), "--top", "1"]) == 0
+    out = capsys.readouterr().out
+    assert "00 goto" in out and "submit" not in out
@@ -0,0 +1,84 @@
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from wao.actions import compile_steps
+from wao.session_cache import SessionCache, SessionPlan
+
+STATE = {"cookies": [{"name": "sid", "value": "abc", "domain": "example.com", "path": "/"}], "origins": []}
+
+
+class XorCipher:
+    suffix = ".enc"
+
+    def encrypt(self, data: bytes) -> bytes:
+        return bytes(b ^ 0x5A for b in data)
+
+    def decrypt(self, data: bytes) -> bytes:
+        return bytes(b ^ 0x5A for b in data)
+
+
+def test_roundtrip_hashes_account_and_sets_0600(tmp_path: Path) -> None:
+    cache = SessionCache(tmp_path)
+    assert cache.save("example.com", "alice@example.com", STATE)
+    path = cache.path_for("example.com", "alice@example.com")
+    assert "alice" not in str(path)
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert cache.load("example.com", "alice@example.com") == STATE
+    assert cache.load("example.com", "bob") is None
+
+
+def test_expired_entry_is_dropped(tmp_path: Path) -> None:
+    cache = SessionCache(tmp_path, ttl_s=1)
+    cache.save("s", "a", STATE)
+    path = cache.path_for("s", "a")
+    old = time.time() - 10
+    os.utime(path, (old, old))
+    assert cache.evict_expired() == 1
+    assert cache.load("s", "a") is None
+
+
+def test_older_run_does_not_clobber_newer_session(tmp_path: Path) -> None:
+    cache = SessionCache(tmp_path)
+    started = time.time() - 5
+    assert cache.save("s", "a", {"cookies": [], "origins": [{"origin": "new"}]})
+    assert not cache.save("s", "a", STATE, started_at=started)
+    assert cache.load("s", "a") == {"cookies": [], "origins": [{"origin": "new"}]}
+
+
+def test_cipher_encrypts_at_rest(tmp_path: Path) -> None:
+    cache = SessionCache(tmp_path, cipher=XorCipher())
+    cache.save("s", "a", STATE)
+    path = cache.path_for("s", "a")
+    assert path.name.endswith(".json.enc")
+    assert b"sid" not in path.read_bytes()
+    assert cache.load("s", "a") == STATE
+
+
+def test_plan_skips_login_segment_only_when_reused(tmp_path: Path, monkeypatch: Any) -> None:
+    monkeypatch.delenv("WAO_SESSION_KEY", raising=False)
+    flow = {
+        "site": "example.com",
+        "options": {"session": {"account": "alice", "probe": [{"action": "open_url", "url": "https://example.com/"}]}},
+        "steps": [
+            {"action": "open_url", "url": "https://example.com/login", "segment": "login"},
+            {"action": "click", "selector": "#submit", "segment": "login"},
+            {"action": "screenshot", "path": "x.png"},
+        ],
+    }
+    plan = compile_steps(flow["steps"])  # type: ignore[arg-type]
+    session = SessionPlan.from_flow(flow, plan, tmp_path)
+    assert session is not None and session.state is None and session.last_login == 2
+    assert not session.skip(1)
+
+    session.cache.save("example.com", "alice", STATE)
+    session = SessionPlan.from_flow(flow, plan, tmp_path)
+    assert session is not None and session.state == STATE and len(session.probe) == 1
+    session.reused = True
+    assert [session.skip(a.index) for a in plan] == [True, True, False]
+
+
+def test_plan_requires_login_segment(tmp_path: Path) -> None:
+    flow = {"options": {"session": {"account": "a"}}, "steps": [{"action": "log", "message": "x"}]}
+    assert SessionPlan.from_flow(flow, compile_steps(flow["steps"]), tmp_path) is None  # type: ignore[arg-type]
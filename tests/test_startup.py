@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+# Cumulative import time allowed for ``import wao.cli`` (best of 3); override on slow machines
+BUDGET_MS = float(os.environ.get("WAO_IMPORT_BUDGET_MS", "120"))
+
+
+def _importtime(*args: str) -> Dict[str, int]:
+    """Run python -X importtime and return {module: cumulative microseconds}."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT / "src"), os.environ.get("PYTHONPATH", "")]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    modules: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, cumulative, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        modules[name] = int(cumulative)
+    return modules
+
+
+def _heavy(modules: Dict[str, int]) -> List[str]:
+    return sorted(m for m in modules if m.split(".")[0] in ("playwright", "jsonschema", "dotenv"))
+
+
+def test_import_cli_is_light() -> None:
+    runs = [_importtime("-c", "import wao.cli") for _ in range(3)]
+    assert _heavy(runs[0]) == []
+    best_ms = min(r["wao.cli"] for r in runs) / 1000
+    assert best_ms < BUDGET_MS, f"import wao.cli took {best_ms:.1f} ms (budget {BUDGET_MS:.0f} ms)"
+
+
+def test_validate_does_not_import_playwright() -> None:
+    modules = _importtime("-m", "wao.cli", "--validate", "--run", "flows/demo_example.json")
+    assert "jsonschema" in modules
+    assert not any(m.startswith("playwright") for m in modules)
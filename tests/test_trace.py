@@ -0,0 +1,60 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from wao.trace import TraceSink, open_trace
+
+
+def _records(path: Path) -> list:
+    with open_trace(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("compress", ["none", "gzip"])
+@pytest.mark.parametrize("background", [False, True])
+def test_roundtrip(tmp_path: Path, compress: str, background: bool) -> None:
+    sink = TraceSink(tmp_path / "run.jsonl", compress=compress, background=background)
+    sink.write("step_start", {"i": 1}, {"step": json.dumps({"act": "log", "message": "日本語"})})
+    sink.write("run_end", {"status": "ok"})
+    sink.close()
+    sink.write("late", {})  # ignored after close
+    recs = _records(sink.path)
+    assert [r["kind"] for r in recs] == ["step_start", "run_end"]
+    assert recs[0]["step"]["message"] == "日本語"
+
+
+def test_concurrent_first_writes_start_one_writer_thread(tmp_path: Path) -> None:
+    sink = TraceSink(tmp_path / "run.jsonl", background=True)
+    gate = threading.Barrier(8)
+    before = set(threading.enumerate())
+
+    def branch(k: int) -> None:
+        gate.wait()
+        sink.write("step_ok", {"i": k})
+
+    threads = [threading.Thread(target=branch, args=(k,)) for k in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [t.name for t in set(threading.enumerate()) - before] == ["wao-trace"]
+    sink.close()
+    assert sorted(r["i"] for r in _records(sink.path)) == list(range(8))
+
+
+def test_buffers_until_threshold(tmp_path: Path) -> None:
+    sink = TraceSink(tmp_path / "run.jsonl", flush_bytes=10_000, flush_interval_s=3600)
+    sink.write("step_ok", {"i": 1})
+    assert not sink.path.exists() or sink.path.stat().st_size == 0
+    sink.close()
+    assert len(_records(sink.path)) == 1
+
+
+def test_io_errors_never_raise(tmp_path: Path) -> None:
+    blocker = tmp_path / "file"
+    blocker.write_text("x", encoding="utf-8")
+    sink = TraceSink(blocker / "run.jsonl", flush_bytes=0)
+    sink.write("run_start", {})
+    sink.close()
@@ -0,0 +1,93 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from wao.cli import main
+from wao.trace import TraceSink
+from wao.trace_stats import TraceIndex, error_signature
+
+
+def write_run(
+    trace_dir: Path, n: int, site: str, steps: List[Tuple[str, int, Optional[str]]], compress: str = "none"
+) -> Path:
+    """One run trace whose timestamps are synthetic (2026-10-<n % 28 + 1>), as TraceSink writes them."""
+    sink = TraceSink(trace_dir / f"run_{n:05d}.jsonl", compress=compress)
+    day = f"202610{n % 28 + 1:02d}"
+    lines = [{"ts": f"{day}_080000_000000", "kind": "run_start", "site": site, "version": "1"}]
+    status = "ok"
+    for i, (name, ms, err) in enumerate(steps):
+        lines.append(
+            {"ts": f"{day}_080000_000000", "kind": "step_start", "i": i, "step": {"act": "click", "name": name}}
+        )
+        lines.append({"kind": "step_profile", "i": i, "ms": ms})  # ignored by the index
+        if err:
+            status = "error"
+            lines.append({"ts": f"{day}_080001_000000", "kind": "step_err", "i": i, "ms": ms, "error": err})
+        else:
+            lines.append({"ts": f"{day}_080001_000000", "kind": "step_ok", "i": i, "ms": ms})
+    lines.append({"ts": f"{day}_080002_500000", "kind": "run_end", "status": status})
+    sink._buf = [json.dumps(rec, ensure_ascii=False) + "\n" for rec in lines]
+    sink.close()
+    return sink.path
+
+
+def test_error_signature() -> None:
+    a = error_signature('Timeout 30000ms exceeded waiting for "#row-8812"\nCall log: ...')
+    b = error_signature('Timeout 15000ms exceeded waiting for "#row-17"')
+    assert a == b == 'Timeout Nms exceeded waiting for "<s>"'
+    assert error_signature("net::ERR at https://x.example/a?id=1") == "net::ERR at <url>"
+    assert error_signature(None) is None
+
+
+def test_index_is_incremental_and_aggregates(tmp_path: Path) -> None:
+    tdir = tmp_path / "trace"
+    for n in range(100):
+        err = f"Timeout {n}ms exceeded" if n % 10 == 0 else None
+        write_run(
+            tdir, n, "bank", [("login", 100 + n, None), ("fetch", 1000 + 10 * n, err)], "gzip" if n % 2 else "none"
+        )
+    write_run(tdir, 100, "shop", [("open", 5, "Element 'x' not found")])
+    db = tmp_path / "index.sqlite"
+
+    with TraceIndex(db) as index:
+        assert index.update(tdir) == (101, 0)
+        assert index.update(tdir) == (0, 101)
+        stats = index.stats(top=3)
+
+    bank, shop = stats["sites"]
+    assert (bank["runs"], bank["ok"], bank["success_rate"]) == (100, 90, 0.9)
+    assert bank["mean_ms"] == 2500 and bank["p50"] == bank["p99"] == 2500
+    assert (shop["runs"], shop["success_rate"]) == (1, 0.0)
+
+    fetch = next(r for r in stats["steps"] if r["step"] == "fetch")
+    assert (fetch["count"], fetch["errors"]) == (100, 10)
+    assert (fetch["p50"], fetch["p95"], fetch["p99"], fetch["max_ms"]) == (1490, 1940, 1980, 1990)
+    assert [r["step"] for r in stats["steps"] if r["site"] == "bank"] == ["fetch", "login"]
+
+    assert [r["ms"] for r in stats["slowest"]] == [1990, 1980, 1970]
+    top = stats["errors"][0]
+    assert (top["signature"], top["count"], top["steps"]) == ("Timeout Nms exceeded", 10, "fetch")
+    assert stats["errors"][1]["signature"] == 'Element "<s>" not found'
+
+    # a run that grew (or was rewritten) is re-read, the others are not
+    (tdir / "run_00004.jsonl").unlink()
+    path = write_run(tdir, 4, "bank", [("login", 100, None), ("fetch", 1000, None), ("logout", 10, None)])
+    os.utime(path, (1, 1))
+    with TraceIndex(db) as index:
+        assert index.update(tdir) == (1, 100)
+        assert index.stats(site="bank")["sites"][0]["runs"] == 100
+        assert len(index.steps(site="bank")) == 3
+        assert index.sites(since="2026-10-28")[0]["runs"] == 3
+        path.unlink()
+        assert index.prune() == 1 and index.sites(site="bank")[0]["runs"] == 99
+
+
+def test_cli_trace_stats(tmp_path: Path, capsys: Any) -> None:
+    write_run(tmp_path, 1, "bank", [("login", 120, None)])
+    assert main(["trace", "stats", "--dir", str(tmp_path), "--json"]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["sites"][0]["site"] == "bank" and stats["steps"][0]["p95"] == 120
+    assert (tmp_path / ".index.sqlite").is_file()
+    assert main(["trace", "stats", "--dir", str(tmp_path)]) == 0
+    assert "== error clusters" in capsys.readouterr().out
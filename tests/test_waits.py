@@ -0,0 +1,198 @@
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from wao.actions import StepCompileError, compile_steps
+from wao.actions.waits import (
+    WaitAction,
+    WaitDomStableAction,
+    WaitNetworkIdleAction,
+    WaitResponseAction,
+    WaitSelectorAction,
+    glob_to_regex,
+    url_predicate,
+    uses_network_idle,
+)
+from wao.async_runner import AsyncRunner
+from wao.cli import main
+from wao.validator import lint_flow
+
+
+class NetPage:
+    """Fires request events from a timer thread; ``wait_for_timeout`` just sleeps."""
+
+    def __init__(self) -> None:
+        self.handlers: Dict[str, List[Callable[[Any], None]]] = {}
+
+    def on(self, event: str, handler: Callable[[Any], None]) -> None:
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event: str, request: Any) -> None:
+        for handler in self.handlers.get(event, []):
+            handler(request)
+
+    def later(self, seconds: float, event: str, request: Any) -> None:
+        threading.Timer(seconds, self.emit, (event, request)).start()
+
+    def wait_for_timeout(self, ms: float) -> None:
+        time.sleep(ms / 1000.0)
+
+
+class Ctx:
+    def __init__(self, page: Any) -> None:
+        self.page = page
+        self.state: Dict[str, Any] = {}
+
+
+def test_wait_dispatches_on_for() -> None:
+    plan = compile_steps(
+        [
+            {"act": "wait", "timeout": 5},
+            {"act": "wait", "for": "network_idle", "quiet_ms": 50},
+            {"act": "wait", "for": "dom_stable", "selector": "#list"},
+            {"act": "wait", "for": "selector", "selector": "tr", "min_count": 3, "text": "2026"},
+            {"act": "wait", "for": "response", "glob": "**/api/*", "status": 200},
+        ]
+    )
+    assert [type(a) for a in plan] == [
+        WaitAction,
+        WaitNetworkIdleAction,
+        WaitDomStableAction,
+        WaitSelectorAction,
+        WaitResponseAction,
+    ]
+    assert plan[1].timeout == 10000 and not plan[4].IDEMPOTENT
+    with pytest.raises(StepCompileError, match="'for' must be one of"):
+        compile_steps([{"act": "wait", "for": "load"}])
+    with pytest.raises(StepCompileError, match="requires 'url_substr'"):
+        compile_steps([{"act": "wait", "for": "response"}])
+
+
+def test_url_predicates() -> None:
+    assert glob_to_regex("**/api/*.json").match("https://x/api/list.json")
+    assert not glob_to_regex("**/api/*.json").match("https://x/api/v2/list.json")
+    match, desc = url_predicate({"contains": "/statements"})
+    assert match("https://bank/statements?m=10") and not match("https://bank/") and "/statements" in desc
+    match, _ = url_predicate({"regex": r"/stmt/\d+$"})
+    assert match("https://bank/stmt/12") and not match("https://bank/stmt/x")
+
+
+def test_network_idle_waits_for_quiet_window() -> None:
+    page = NetPage()
+    action = compile_steps([{"act": "wait", "for": "network_idle", "quiet_ms": 150, "timeout": 2000}])[0]
+    action.execute(Ctx(page))  # type: ignore[arg-type]  # nothing pending: returns after one quiet window
+
+    page.later(0.05, "request", "a")
+    page.later(0.30, "requestfinished", "a")
+    t0 = time.monotonic()
+    action.execute(Ctx(page))  # type: ignore[arg-type]
+    assert 0.40 <= time.monotonic() - t0 < 1.0  # finished at ~0.3 s, then 150 ms quiet
+
+
+def test_network_idle_threshold_and_timeout() -> None:
+    page = NetPage()
+    busy = compile_steps([{"act": "wait", "for": "network_idle", "quiet_ms": 50, "timeout": 300}])[0]
+    busy.execute(Ctx(page))  # type: ignore[arg-type]  # attaches the tracker
+    page.emit("request", "poll")
+    with pytest.raises(TimeoutError, match="1 request"):
+        busy.execute(Ctx(page))  # type: ignore[arg-type]
+    tolerant = compile_steps([{"act": "wait", "for": "network_idle", "quiet_ms": 50, "max_inflight": 1}])[0]
+
+    async def run() -> None:
+        await tolerant.aexecute(Ctx(page))  # type: ignore[arg-type]
+
+    asyncio.run(run())
+
+
+class LoadingPage(NetPage):
+    """``goto`` starts a request that is still pending when the next step begins."""
+
+    url = "https://bank.example/"
+
+    async def goto(self, url: str) -> None:
+        self.emit("request", "api")
+        self.later(0.3, "requestfinished", "api")
+
+
+class Browser:
+    def __init__(self, page: Any) -> None:
+        self.page = page
+
+    async def new_context(self, **options: Any) -> "Browser":
+        return self
+
+    async def new_page(self) -> Any:
+        return self.page
+
+    async def close(self) -> None:
+        pass
+
+
+def test_network_idle_sees_requests_from_earlier_steps(tmp_path: Path, monkeypatch: Any) -> None:
+    monkeypatch.setenv("WAO_ARTIFACTS_DIR", str(tmp_path))
+    steps = [
+        {"act": "open_url", "url": "https://bank.example/"},
+        {"act": "wait", "for": "network_idle", "quiet_ms": 50, "timeout": 2000},
+    ]
+    runner = AsyncRunner({"version": "0.1.0", "steps": steps}, browser=Browser(LoadingPage()))  # type: ignore[arg-type]
+    t0 = time.monotonic()
+    asyncio.run(runner.run())
+    assert time.monotonic() - t0 >= 0.3  # the request began in open_url, before the wait step
+    assert uses_network_idle([{"act": "foreach", "steps": [steps[1]]}]) and not uses_network_idle(steps[:1])
+
+
+class DomPage:
+    def __init__(self, result: Dict[str, Any]) -> None:
+        self.result = result
+        self.calls: List[Any] = []
+
+    def evaluate(self, script: str, args: Any) -> Dict[str, Any]:
+        self.calls.append(args)
+        return self.result
+
+
+def test_dom_stable_is_one_round_trip() -> None:
+    action = compile_steps([{"act": "wait", "for": "dom_stable", "selector": "#list", "timeout": 4000}])[0]
+    page = DomPage({"ok": True, "mutations": 7})
+    action.execute(Ctx(page))  # type: ignore[arg-type]
+    assert page.calls == [["#list", 300, 4000]]
+    with pytest.raises(TimeoutError, match="still changing"):
+        action.execute(Ctx(DomPage({"ok": False, "mutations": 900})))  # type: ignore[arg-type]
+    with pytest.raises(TimeoutError, match="root not found"):
+        action.execute(Ctx(DomPage({"ok": False, "missing": True})))  # type: ignore[arg-type]
+
+
+def test_lint_flags_fixed_waits() -> None:
+    flow = {
+        "steps": [
+            {"act": "goto", "url": "https://x"},
+            {"act": "wait", "name": "w1", "timeout": 2000},
+            {"act": "fill", "selector": "#q", "value": "a"},
+            {"act": "wait", "name": "w2", "timeout": 500},
+            {"act": "wait", "name": "w3", "timeout": 500},
+            {"act": "wait_for_selector", "selector": "#r"},
+            {"act": "wait", "for": "network_idle"},
+            {"act": "parallel", "branches": [[{"act": "click", "selector": "#a"}, {"act": "wait_for", "timeout": 9}]]},
+        ]
+    }
+    findings = lint_flow(flow)
+    assert len(findings) == 4
+    assert findings[0].startswith("steps[1] (w1)") and "network_idle" in findings[0]
+    assert "dom_stable" in findings[1] and "remove it" in findings[2]
+    assert findings[3].startswith("steps[7].branches[0][1]")
+
+
+def test_cli_lint_exit_code(tmp_path: Path, capsys: Any) -> None:
+    flow = {"version": "0.1.0", "steps": [{"act": "open_url", "name": "o", "url": "https://x"}]}
+    path = tmp_path / "flow.json"
+    path.write_text(json.dumps(flow), encoding="utf-8")
+    assert main(["--run", str(path), "--lint"]) == 0
+    flow["steps"].append({"act": "wait", "name": "w", "timeout": 1000})
+    path.write_text(json.dumps(flow), encoding="utf-8")
+    assert main(["--run", str(path), "--lint"]) == 1
+    assert "[LINT]" in capsys.readouterr().out